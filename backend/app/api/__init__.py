@@ -4,7 +4,7 @@ API Router configuration
 
 from fastapi import APIRouter
 
-from app.api.endpoints import auth, empresas, clientes, productos, facturas, usuarios
+from app.api.endpoints import auth, empresas, clientes, productos, facturas, usuarios, metrics
 
 api_router = APIRouter()
 
@@ -14,4 +14,5 @@ api_router.include_router(empresas.router, prefix="/empresas", tags=["empresas"]
 api_router.include_router(usuarios.router, prefix="/usuarios", tags=["usuarios"])
 api_router.include_router(clientes.router, prefix="/clientes", tags=["clientes"])
 api_router.include_router(productos.router, prefix="/productos", tags=["productos"])
-api_router.include_router(facturas.router, prefix="/facturas", tags=["facturas"])
\ No newline at end of file
+api_router.include_router(facturas.router, prefix="/facturas", tags=["facturas"])
+api_router.include_router(metrics.router, prefix="/metrics", tags=["métricas"])
\ No newline at end of file
@@ -2,23 +2,71 @@
 Endpoints de autenticación
 """
 
-from datetime import timedelta
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.security import HTTPAuthorizationCredentials, OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
 from app.core.database import get_db
-from app.core.auth import get_current_user
-from app.schemas.auth import Token, UserLogin
+from app.core.auth import get_current_user, security
+from app.schemas.auth import RefreshRequest, Token, UserLogin
 from app.services.auth_service import AuthService
+from app.services.sesiones_service import SesionesService, nuevo_refresh_token
 
 router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
 
 
+async def _emitir_tokens(
+    db: AsyncSession,
+    request: Request,
+    usuario_id: int,
+    email: str,
+    nombre: str,
+    apellido: str,
+    empresa_id: int,
+    familia: Optional[str] = None
+) -> dict:
+    """Emitir un token de acceso y un refresh token, registrando la sesión"""
+    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    jti = uuid.uuid4().hex
+    access_token = AuthService(db).create_access_token(
+        data={"sub": email, "jti": jti}, expires_delta=access_token_expires
+    )
+    refresh_token = nuevo_refresh_token()
+    
+    # Registrar la sesión para poder revocar el token y rotar el refresh token
+    SesionesService(db).registrar(
+        usuario_id=usuario_id,
+        jti=jti,
+        expira=datetime.utcnow() + access_token_expires,
+        ip_address=request.client.host if request.client else None,
+        user_agent=request.headers.get("user-agent"),
+        refresh_token=refresh_token,
+        familia=familia,
+    )
+    await db.commit()
+    
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "refresh_token": refresh_token,
+        "expires_in": int(access_token_expires.total_seconds()),
+        "user": {
+            "id": usuario_id,
+            "email": email,
+            "nombre": f"{nombre} {apellido}",
+            "empresa_id": empresa_id
+        }
+    }
+
+
 @router.post("/login", response_model=Token)
 async def login(
+    request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: AsyncSession = Depends(get_db)
 ):
@@ -35,21 +83,34 @@ async def login(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = auth_service.create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
+    return await _emitir_tokens(
+        db, request, user.id, user.email, user.nombre, user.apellido, user.empresa_id
     )
+
+
+@router.post("/refresh", response_model=Token)
+async def refresh(
+    request: Request,
+    datos: RefreshRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Renovar el token de acceso con un refresh token (sin verificar la contraseña)
+    Cada refresh token se usa una sola vez; reutilizarlo revoca todas las
+    sesiones derivadas del mismo login
+    """
+    sesion = await SesionesService(db).rotar(datos.refresh_token)
+    if sesion is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Refresh token inválido, vencido o reutilizado",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     
-    return {
-        "access_token": access_token,
-        "token_type": "bearer",
-        "user": {
-            "id": user.id,
-            "email": user.email,
-            "nombre": f"{user.nombre} {user.apellido}",
-            "empresa_id": user.empresa_id
-        }
-    }
+    return await _emitir_tokens(
+        db, request, sesion.id, sesion.email, sesion.nombre, sesion.apellido, sesion.empresa_id,
+        familia=sesion.familia
+    )
 
 
 @router.get("/me", response_model=dict)
@@ -70,9 +131,26 @@ async def get_current_user_info(
 
 
 @router.post("/logout")
-async def logout():
+async def logout(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    current_user = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
     """
     Endpoint para cerrar sesión
-    En JWT stateless, el logout se maneja del lado del cliente eliminando el token
+    Revoca el token: deja de aceptarse en este proceso al instante y en los
+    demás tras la siguiente sincronización de revocaciones
     """
+    payload = AuthService(db).decode_token(credentials.credentials)
+    if payload is None or payload.get("jti") is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El token no identifica una sesión"
+        )
+    
+    await SesionesService(db).revocar(
+        usuario_id=current_user.id,
+        jti=payload["jti"],
+        expira=datetime.utcfromtimestamp(payload["exp"]),
+    )
     return {"message": "Sesión cerrada exitosamente"}
\ No newline at end of file
@@ -2,18 +2,39 @@
 Endpoints CRUD para Cliente
 """
 
-from typing import List
+from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, delete
+from pydantic import TypeAdapter
+from sqlalchemy import case, delete, func, select, update
 
-from app.core.database import get_db
+from app.core.database import get_db, get_db_lectura, get_db_replica
 from app.core.auth import get_current_active_user, get_empresa_id_from_user
+from app.core.paginacion import paginar_keyset, publicar_siguiente_cursor
+from app.core.serializacion import respuesta_json
 from app.models import Cliente, Usuario
-from app.schemas.cliente import ClienteCreate, ClienteUpdate, Cliente as ClienteSchema, ClienteList
+from app.schemas.cliente import ClienteCreate, ClienteUpdate, Cliente as ClienteSchema, ClienteList, ClienteListFila
 
 router = APIRouter()
 
+# Serializador precompilado del listado (filas proyectadas -> JSON)
+LISTADO_JSON = TypeAdapter(List[ClienteListFila])
+
+# Equivalente en SQL de Cliente.get_nombre_completo()
+NOMBRE_COMPLETO = case(
+    (
+        Cliente.tipo_persona == "JURIDICA",
+        func.coalesce(func.nullif(Cliente.razon_social, ""), Cliente.nombre_comercial)
+    ),
+    else_=func.concat_ws(
+        " ",
+        func.nullif(Cliente.primer_nombre, ""),
+        func.nullif(Cliente.segundo_nombre, ""),
+        func.nullif(Cliente.primer_apellido, ""),
+        func.nullif(Cliente.segundo_apellido, ""),
+    )
+)
+
 
 @router.post("/", response_model=ClienteSchema, status_code=status.HTTP_201_CREATED)
 async def create_cliente(
@@ -53,46 +74,42 @@ async def create_cliente(
 async def list_clientes(
     skip: int = 0,
     limit: int = 100,
+    after: Optional[str] = None,
     activo: bool = True,
     current_user: Usuario = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db_replica)
 ):
-    """Listar clientes de mi empresa"""
+    """Listar clientes de mi empresa (paginación por offset o por cursor `after`)"""
     
     empresa_id = current_user.empresa_id
     
-    stmt = (
-        select(Cliente)
-        .where(Cliente.empresa_id == empresa_id, Cliente.activo == activo)
-        .offset(skip)
-        .limit(limit)
-    )
+    # Solo las columnas del listado: las filas se serializan sin instanciar modelos
+    stmt = select(
+        Cliente.id,
+        Cliente.tipo_documento,
+        Cliente.numero_documento,
+        NOMBRE_COMPLETO.label("nombre_completo"),
+        Cliente.email,
+        Cliente.telefono,
+        Cliente.ciudad,
+        Cliente.activo,
+    ).where(Cliente.empresa_id == empresa_id, Cliente.activo == activo)
+    stmt = paginar_keyset(stmt, (Cliente.id,), after, limit)
+    if not after:
+        stmt = stmt.offset(skip)
     result = await db.execute(stmt)
-    clientes = result.scalars().all()
-    
-    # Agregar nombre completo para el response
-    response_clientes = []
-    for cliente in clientes:
-        cliente_dict = {
-            "id": cliente.id,
-            "tipo_documento": cliente.tipo_documento,
-            "numero_documento": cliente.numero_documento,
-            "nombre_completo": cliente.get_nombre_completo(),
-            "email": cliente.email,
-            "telefono": cliente.telefono,
-            "ciudad": cliente.ciudad,
-            "activo": cliente.activo
-        }
-        response_clientes.append(ClienteList(**cliente_dict))
-    
-    return response_clientes
+    rows = result.all()
+    
+    response = respuesta_json(LISTADO_JSON, rows)
+    publicar_siguiente_cursor(response, rows, (Cliente.id,), limit)
+    return response
 
 
 @router.get("/{cliente_id}", response_model=ClienteSchema)
 async def get_cliente(
     cliente_id: int,
     current_user: Usuario = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db_lectura)
 ):
     """Obtener cliente por ID"""
     
@@ -194,7 +211,7 @@ async def delete_cliente(
 async def get_cliente_by_documento(
     numero_documento: str,
     current_user: Usuario = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db_replica)
 ):
     """Obtener cliente por número de documento"""
     
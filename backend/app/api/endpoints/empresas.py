@@ -7,7 +7,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, update, delete
 
-from app.core.database import get_db
+from app.core.database import get_db, get_db_lectura
 from app.core.auth import get_current_active_user, get_empresa_id_from_user
 from app.models import Empresa, Usuario
 from app.schemas.empresa import EmpresaCreate, EmpresaUpdate, Empresa as EmpresaSchema, EmpresaList
@@ -45,7 +45,7 @@ async def create_empresa(
 @router.get("/", response_model=EmpresaSchema)
 async def get_mi_empresa(
     current_user: Usuario = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db_lectura)
 ):
     """Obtener información de mi empresa"""
     
@@ -95,7 +95,7 @@ async def update_mi_empresa(
 @router.get("/nit/{nit}", response_model=EmpresaSchema)
 async def get_empresa_by_nit(
     nit: str,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db_lectura)
 ):
     """Obtener empresa por NIT"""
     
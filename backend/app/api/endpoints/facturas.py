@@ -2,121 +2,52 @@
 Endpoints CRUD para Factura
 """
 
-from typing import List
-from decimal import Decimal
-from fastapi import APIRouter, Depends, HTTPException, status
+import os
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from fastapi.responses import FileResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, delete
+from pydantic import TypeAdapter
+from sqlalchemy import func, select, update
 from sqlalchemy.orm import selectinload
+from starlette.background import BackgroundTask
 
-from app.core.database import get_db
+from app.core.config import settings
+from app.core.database import get_db, get_db_lectura, get_db_replica
 from app.core.auth import get_current_active_user
-from app.models import Factura, FacturaDetalle, FacturaImpuesto, Producto, Cliente, Empresa, Usuario
+from app.core.paginacion import paginar_keyset, publicar_siguiente_cursor
+from app.core.serializacion import respuesta_json
+from app.models import Factura, Cliente, Empresa, Usuario
 from app.schemas.factura import (
-    FacturaCreate, FacturaUpdate, Factura as FacturaSchema, FacturaList
+    FacturaCreate, FacturaUpdate, Factura as FacturaSchema, FacturaList, FacturaListFila,
+    FacturaBatchCreate, FacturaBatchResponse
 )
+from app.services.cache_facturas import ESTADOS_CACHEABLES, calcular_etag, etag_coincide, obtener_cache_facturas
+from app.services.cola_dian import encolar_envio
+from app.services.contingencia_service import obtener_contingencia
+from app.services.cufe_service import calcular_cufe, datos_cufe, hora_actual
+from app.services.documentos_service import TIPO_XML, DocumentosService
+from app.services.factura_service import FacturaService
+from app.services.firma_service import obtener_firma_service
+from app.services.pdf_service import ESTADOS_INMUTABLES, datos_pdf, obtener_pdf_service
+from app.services.qr_service import (
+    FORMATOS, ContenidoQrNoDisponibleError, contenido_qr, contenido_qr_emitido, obtener_qr_service, referencia_qr
+)
+from app.services.ubl_service import ImpuestosLineaInconsistentesError, UblService
 
 router = APIRouter()
 
+# Orden de los listados: más recientes primero, id como desempate
+ORDEN_LISTADO = (Factura.created_at, Factura.id)
 
-async def calculate_factura_totals(factura_id: int, db: AsyncSession):
-    """Calcular totales de la factura"""
-    
-    # Obtener detalles de la factura
-    stmt = select(FacturaDetalle).where(FacturaDetalle.factura_id == factura_id)
-    result = await db.execute(stmt)
-    detalles = result.scalars().all()
-    
-    subtotal = Decimal("0.00")
-    total_descuentos = Decimal("0.00")
-    total_iva = Decimal("0.00")
-    total_inc = Decimal("0.00")
-    total_ica = Decimal("0.00")
-    
-    for detalle in detalles:
-        # Calcular subtotal de línea
-        subtotal_linea = detalle.cantidad * detalle.precio_unitario
-        descuento_linea = subtotal_linea * (detalle.descuento_porcentaje / 100)
-        base_gravable_linea = subtotal_linea - descuento_linea
-        
-        # Obtener producto para calcular impuestos
-        stmt_producto = select(Producto).where(Producto.id == detalle.producto_id)
-        result_producto = await db.execute(stmt_producto)
-        producto = result_producto.scalar_one()
-        
-        # Calcular impuestos de línea
-        impuestos_linea = Decimal("0.00")
-        if producto.incluye_iva:
-            iva_linea = base_gravable_linea * (producto.porcentaje_iva / 100)
-            total_iva += iva_linea
-            impuestos_linea += iva_linea
-        
-        if producto.incluye_inc:
-            inc_linea = base_gravable_linea * (producto.porcentaje_inc / 100)
-            total_inc += inc_linea
-            impuestos_linea += inc_linea
-        
-        if producto.incluye_ica:
-            ica_linea = base_gravable_linea * (producto.porcentaje_ica / 100)
-            total_ica += ica_linea
-            impuestos_linea += ica_linea
-        
-        # Actualizar detalle
-        detalle.subtotal_linea = subtotal_linea
-        detalle.total_descuentos_linea = descuento_linea
-        detalle.total_impuestos_linea = impuestos_linea
-        detalle.total_linea = base_gravable_linea + impuestos_linea
-        
-        subtotal += base_gravable_linea
-        total_descuentos += descuento_linea
-    
-    total_impuestos = total_iva + total_inc + total_ica
-    total_factura = subtotal + total_impuestos
-    
-    # Actualizar factura
-    stmt_update = update(Factura).where(Factura.id == factura_id).values(
-        subtotal=subtotal,
-        total_descuentos=total_descuentos,
-        total_iva=total_iva,
-        total_inc=total_inc,
-        total_ica=total_ica,
-        total_impuestos=total_impuestos,
-        total_factura=total_factura
-    )
-    await db.execute(stmt_update)
-    
-    # Crear registros de impuestos
-    await db.execute(delete(FacturaImpuesto).where(FacturaImpuesto.factura_id == factura_id))
-    
-    if total_iva > 0:
-        impuesto_iva = FacturaImpuesto(
-            factura_id=factura_id,
-            tipo_impuesto="IVA",
-            porcentaje=Decimal("19.00"),  # Podría ser dinámico
-            base_gravable=subtotal,
-            valor_impuesto=total_iva
-        )
-        db.add(impuesto_iva)
-    
-    if total_inc > 0:
-        impuesto_inc = FacturaImpuesto(
-            factura_id=factura_id,
-            tipo_impuesto="INC",
-            porcentaje=Decimal("8.00"),  # Podría ser dinámico
-            base_gravable=subtotal,
-            valor_impuesto=total_inc
-        )
-        db.add(impuesto_inc)
-    
-    if total_ica > 0:
-        impuesto_ica = FacturaImpuesto(
-            factura_id=factura_id,
-            tipo_impuesto="ICA",
-            porcentaje=Decimal("1.00"),  # Podría ser dinámico
-            base_gravable=subtotal,
-            valor_impuesto=total_ica
-        )
-        db.add(impuesto_ica)
+# Serializador precompilado del listado (filas proyectadas -> JSON)
+LISTADO_JSON = TypeAdapter(List[FacturaListFila])
+
+# Nombre del cliente en el listado: razón social o primer nombre y apellido
+NOMBRE_CLIENTE = func.coalesce(
+    func.nullif(Cliente.razon_social, ""),
+    func.trim(func.concat_ws(" ", Cliente.primer_nombre, Cliente.primer_apellido))
+)
 
 
 @router.post("/", response_model=FacturaSchema, status_code=status.HTTP_201_CREATED)
@@ -127,108 +58,62 @@ async def create_factura(
 ):
     """Crear nueva factura"""
     
-    empresa_id = current_user.empresa_id
-    
-    # Verificar que el cliente existe
-    stmt_cliente = select(Cliente).where(
-        Cliente.id == factura_data.cliente_id,
-        Cliente.empresa_id == empresa_id,
-        Cliente.activo == True
-    )
-    result_cliente = await db.execute(stmt_cliente)
-    cliente = result_cliente.scalar_one_or_none()
+    # Validación, totales, numeración e inserción en una sola transacción
+    factura = await FacturaService(db).crear(factura_data, current_user.empresa_id)
+    return factura
+
+
+@router.post("/batch", response_model=FacturaBatchResponse)
+async def create_facturas_batch(
+    batch_data: FacturaBatchCreate,
+    current_user: Usuario = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Crear facturas en lote (resultado por factura)"""
     
-    if not cliente:
+    if len(batch_data.facturas) > settings.FACTURAS_BATCH_MAX:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Cliente no encontrado"
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"El lote supera el máximo de {settings.FACTURAS_BATCH_MAX} facturas"
         )
     
-    # Obtener configuración de empresa para numeración
-    stmt_empresa = select(Empresa).where(Empresa.id == empresa_id)
-    result_empresa = await db.execute(stmt_empresa)
-    empresa = result_empresa.scalar_one()
-    
-    # Generar número de factura (simplificado)
-    stmt_last = select(Factura).where(Factura.empresa_id == empresa_id).order_by(Factura.numero.desc()).limit(1)
-    result_last = await db.execute(stmt_last)
-    last_factura = result_last.scalar_one_or_none()
-    
-    numero = 1 if not last_factura else last_factura.numero + 1
-    numero_completo = f"{empresa.prefijo_factura or ''}{numero}"
-    
-    # Crear factura
-    factura = Factura(
-        **factura_data.model_dump(exclude={"detalles"}),
-        empresa_id=empresa_id,
-        numero=numero,
-        numero_completo=numero_completo,
-        prefijo=empresa.prefijo_factura
-    )
-    db.add(factura)
-    await db.flush()  # Para obtener el ID
-    
-    # Crear detalles
-    for detalle_data in factura_data.detalles:
-        # Verificar que el producto existe
-        stmt_producto = select(Producto).where(
-            Producto.id == detalle_data.producto_id,
-            Producto.empresa_id == empresa_id,
-            Producto.activo == True
-        )
-        result_producto = await db.execute(stmt_producto)
-        producto = result_producto.scalar_one_or_none()
-        
-        if not producto:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Producto con ID {detalle_data.producto_id} no encontrado"
-            )
-        
-        # Crear detalle
-        detalle = FacturaDetalle(
-            factura_id=factura.id,
-            producto_id=detalle_data.producto_id,
-            codigo_producto=producto.codigo,
-            nombre_producto=producto.nombre,
-            descripcion=producto.descripcion,
-            cantidad=detalle_data.cantidad,
-            precio_unitario=detalle_data.precio_unitario,
-            descuento_porcentaje=detalle_data.descuento_porcentaje,
-            descuento_valor=Decimal("0.00"),  # Se calculará
-            subtotal_linea=Decimal("0.00"),  # Se calculará
-            total_descuentos_linea=Decimal("0.00"),  # Se calculará
-            total_impuestos_linea=Decimal("0.00"),  # Se calculará
-            total_linea=Decimal("0.00")  # Se calculará
-        )
-        db.add(detalle)
-    
-    await db.commit()
+    resultados = await FacturaService(db).crear_lote(batch_data.facturas, current_user.empresa_id)
+    creadas = sum(1 for resultado in resultados if resultado["creada"])
     
-    # Calcular totales
-    await calculate_factura_totals(factura.id, db)
-    await db.commit()
-    
-    # Recargar factura con relaciones
-    await db.refresh(factura)
-    return factura
+    return {
+        "total": len(resultados),
+        "creadas": creadas,
+        "fallidas": len(resultados) - creadas,
+        "resultados": resultados
+    }
 
 
 @router.get("/", response_model=List[FacturaList])
 async def list_facturas(
     skip: int = 0,
     limit: int = 100,
+    after: Optional[str] = None,
     activo: bool = True,
     estado_dian: str = None,
     current_user: Usuario = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db_replica)
 ):
-    """Listar facturas de mi empresa"""
+    """Listar facturas de mi empresa (paginación por offset o por cursor `after`)"""
     
     empresa_id = current_user.empresa_id
     
+    # Solo las columnas del listado: las filas se serializan sin instanciar modelos
     stmt = (
-        select(Factura, Cliente.razon_social, Cliente.primer_nombre, Cliente.primer_apellido)
+        select(
+            Factura.id,
+            Factura.numero_completo,
+            Factura.fecha_emision,
+            NOMBRE_CLIENTE.label("cliente_nombre"),
+            Factura.estado_dian,
+            Factura.total_factura,
+            Factura.activo,
+            Factura.created_at,
+        )
         .join(Cliente, Factura.cliente_id == Cliente.id)
         .where(Factura.empresa_id == empresa_id, Factura.activo == activo)
     )
@@ -236,38 +121,32 @@ async def list_facturas(
     if estado_dian:
         stmt = stmt.where(Factura.estado_dian == estado_dian)
     
-    stmt = stmt.offset(skip).limit(limit).order_by(Factura.created_at.desc())
+    stmt = paginar_keyset(stmt, ORDEN_LISTADO, after, limit, descendente=True)
+    if not after:
+        stmt = stmt.offset(skip)
     result = await db.execute(stmt)
     rows = result.all()
     
-    # Construir response
-    facturas_list = []
-    for row in rows:
-        factura, razon_social, primer_nombre, primer_apellido = row
-        cliente_nombre = razon_social or f"{primer_nombre or ''} {primer_apellido or ''}".strip()
-        
-        factura_dict = {
-            "id": factura.id,
-            "numero_completo": factura.numero_completo,
-            "fecha_emision": factura.fecha_emision,
-            "cliente_nombre": cliente_nombre,
-            "estado_dian": factura.estado_dian,
-            "total_factura": factura.total_factura,
-            "activo": factura.activo
-        }
-        facturas_list.append(FacturaList(**factura_dict))
-    
-    return facturas_list
+    response = respuesta_json(LISTADO_JSON, rows)
+    publicar_siguiente_cursor(response, rows, ORDEN_LISTADO, limit)
+    return response
 
 
 @router.get("/{factura_id}", response_model=FacturaSchema)
 async def get_factura(
     factura_id: int,
     empresa_id: int,
-    db: AsyncSession = Depends(get_db)
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db_lectura)
 ):
-    """Obtener factura por ID"""
+    """Obtener factura por ID (con ETag; las facturas finalizadas se sirven desde caché)"""
     
+    cache = obtener_cache_facturas()
+    entrada = await cache.obtener(factura_id, empresa_id)
+    if entrada is not None:
+        return _respuesta_factura(entrada.cuerpo, entrada.etag, if_none_match)
+    
+    generacion = cache.generacion
     stmt = (
         select(Factura)
         .options(
@@ -285,7 +164,167 @@ async def get_factura(
             detail="Factura no encontrada"
         )
     
-    return factura
+    cuerpo = FacturaSchema.model_validate(factura).model_dump_json().encode("utf-8")
+    if factura.estado_dian in ESTADOS_CACHEABLES:
+        etag = (await cache.guardar(factura_id, empresa_id, cuerpo, generacion)).etag
+    else:
+        etag = calcular_etag(cuerpo)
+    return _respuesta_factura(cuerpo, etag, if_none_match)
+
+
+def _respuesta_factura(cuerpo: bytes, etag: str, if_none_match: Optional[str]) -> Response:
+    """JSON de la factura, o 304 si el cliente ya tiene esa versión"""
+    if etag_coincide(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return Response(content=cuerpo, media_type="application/json", headers={"ETag": etag})
+
+
+@router.get("/{factura_id}/xml")
+async def get_factura_xml(
+    factura_id: int,
+    current_user: Usuario = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db_lectura)
+):
+    """XML UBL de una factura emitida de mi empresa"""
+    
+    empresa_id = current_user.empresa_id
+    
+    result = await db.execute(
+        select(Factura.id).where(Factura.id == factura_id, Factura.empresa_id == empresa_id)
+    )
+    xml_content = None
+    if result.scalar_one_or_none() is not None:
+        xml_content = await DocumentosService(db).obtener(factura_id, TIPO_XML)
+    
+    if xml_content is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Factura no encontrada o sin emitir"
+        )
+    
+    return Response(content=xml_content, media_type="application/xml")
+
+
+@router.get("/{factura_id}/qr")
+async def get_factura_qr(
+    factura_id: int,
+    formato: str = Query("png", pattern="^(png|svg)$"),
+    current_user: Usuario = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db_lectura)
+):
+    """Código QR DIAN de una factura emitida de mi empresa (PNG o SVG)"""
+    
+    empresa_id = current_user.empresa_id
+    
+    qr_service = obtener_qr_service()
+    result = await db.execute(
+        select(Factura.qr_code).where(Factura.id == factura_id, Factura.empresa_id == empresa_id)
+    )
+    referencia = result.scalar_one_or_none()
+    
+    # La referencia es el hash del contenido: si ya está en caché no hace falta leer más
+    ruta = qr_service.cache.obtener(referencia, formato) if referencia else None
+    if ruta is None:
+        stmt = (
+            select(Factura, Empresa, Cliente)
+            .join(Empresa, Factura.empresa_id == Empresa.id)
+            .join(Cliente, Factura.cliente_id == Cliente.id)
+            .where(
+                Factura.id == factura_id,
+                Factura.empresa_id == empresa_id,
+                Factura.cufe.isnot(None)
+            )
+        )
+        row = (await db.execute(stmt)).one_or_none()
+        if not row:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Factura no encontrada o sin emitir"
+            )
+        try:
+            contenido = await contenido_qr_emitido(db, *row)
+        except ContenidoQrNoDisponibleError as e:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=str(e)
+            )
+        ruta = await qr_service.obtener(contenido, formato)
+    
+    return FileResponse(
+        ruta,
+        media_type=FORMATOS[formato],
+        headers={"Cache-Control": "private, max-age=31536000, immutable"}
+    )
+
+
+@router.get("/{factura_id}/pdf")
+async def get_factura_pdf(
+    factura_id: int,
+    current_user: Usuario = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db_lectura)
+):
+    """Representación gráfica (PDF) de una factura de mi empresa"""
+    
+    empresa_id = current_user.empresa_id
+    
+    pdf_service = obtener_pdf_service()
+    result = await db.execute(
+        select(Factura.numero_completo, Factura.cufe, Factura.estado_dian)
+        .where(Factura.id == factura_id, Factura.empresa_id == empresa_id)
+    )
+    resumen = result.one_or_none()
+    
+    if not resumen:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Factura no encontrada"
+        )
+    
+    headers = {"Content-Disposition": f'inline; filename="{resumen.numero_completo}.pdf"'}
+    inmutable = resumen.estado_dian in ESTADOS_INMUTABLES and resumen.cufe is not None
+    
+    # Las facturas inmutables se renderizan una sola vez y luego se sirven desde disco
+    if inmutable:
+        ruta = pdf_service.persistido(empresa_id, resumen.cufe)
+        if ruta is not None:
+            return FileResponse(ruta, media_type="application/pdf", headers=headers)
+    
+    stmt = (
+        select(Factura, Empresa, Cliente)
+        .join(Empresa, Factura.empresa_id == Empresa.id)
+        .join(Cliente, Factura.cliente_id == Cliente.id)
+        .options(selectinload(Factura.detalles), selectinload(Factura.impuestos))
+        .where(Factura.id == factura_id, Factura.empresa_id == empresa_id)
+    )
+    factura, empresa, cliente = (await db.execute(stmt)).one()
+    
+    qr_png = None
+    if factura.cufe:
+        try:
+            contenido = await contenido_qr_emitido(db, factura, empresa, cliente)
+        except ContenidoQrNoDisponibleError as e:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=str(e)
+            )
+        ruta_qr = await obtener_qr_service().obtener(contenido, "png")
+        qr_png = ruta_qr.read_bytes()
+    datos = datos_pdf(
+        factura, empresa, cliente,
+        sorted(factura.detalles, key=lambda detalle: detalle.id),
+        sorted(factura.impuestos, key=lambda impuesto: impuesto.id),
+        qr_png
+    )
+    
+    if inmutable:
+        ruta = await pdf_service.persistir(empresa_id, datos)
+        return FileResponse(ruta, media_type="application/pdf", headers=headers)
+    
+    ruta = await pdf_service.temporal(datos)
+    return FileResponse(
+        ruta, media_type="application/pdf", headers=headers,
+        background=BackgroundTask(os.unlink, ruta)
+    )
 
 
 @router.put("/{factura_id}", response_model=FacturaSchema)
@@ -351,6 +390,8 @@ async def delete_factura(
     )
     await db.execute(stmt)
     await db.commit()
+    
+    await obtener_cache_facturas().invalidar(factura_id)
 
 
 @router.patch("/{factura_id}/emitir", response_model=FacturaSchema)
@@ -359,31 +400,67 @@ async def emitir_factura(
     empresa_id: int,
     db: AsyncSession = Depends(get_db)
 ):
-    """Emitir factura (cambiar estado a EMITIDA)"""
+    """Emitir factura (cambiar estado a EMITIDA, o CONTINGENCIA si la DIAN no responde, y generar CUFE)"""
     
-    stmt = select(Factura).where(
-        Factura.id == factura_id, 
-        Factura.empresa_id == empresa_id,
-        Factura.estado_dian == "BORRADOR"
+    # Factura, empresa emisora y cliente en una sola consulta
+    stmt = (
+        select(Factura, Empresa, Cliente)
+        .join(Empresa, Factura.empresa_id == Empresa.id)
+        .join(Cliente, Factura.cliente_id == Cliente.id)
+        .where(
+            Factura.id == factura_id, 
+            Factura.empresa_id == empresa_id,
+            Factura.estado_dian == "BORRADOR"
+        )
     )
     result = await db.execute(stmt)
-    factura = result.scalar_one_or_none()
+    row = result.one_or_none()
     
-    if not factura:
+    if not row:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Factura no encontrada o no se puede emitir"
         )
+    factura, empresa, cliente = row
+    
+    if not empresa.clave_tecnica:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="La empresa no tiene clave técnica DIAN configurada"
+        )
     
-    # Aquí iría la lógica de generación CUFE, XML, QR, etc.
-    cufe = f"CUFE-{factura_id}-{factura.numero_completo}"  # Simplificado
+    # Hora y CUFE se escriben junto con el cambio de estado en un solo UPDATE
+    factura.hora_emision = hora_actual()
+    factura.cufe = calcular_cufe(datos_cufe(factura, empresa, cliente))
+    # Solo la referencia: la imagen se renderiza y se guarda en caché al pedirla
+    factura.qr_code = referencia_qr(contenido_qr(factura, empresa, cliente))
+    try:
+        with db.no_autoflush:
+            xml_content = await UblService(db).generar(factura, empresa, cliente)
+    except ImpuestosLineaInconsistentesError as e:
+        # La DIAN rechazaría un documento cuyas líneas no suman los totales
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
     
-    # Actualizar estado
-    stmt = update(Factura).where(Factura.id == factura_id).values(
-        estado_dian="EMITIDA",
-        cufe=cufe
-    )
-    await db.execute(stmt)
+    # La firma corre en el pool de procesos para no bloquear el event loop
+    firma_service = obtener_firma_service()
+    if firma_service is not None:
+        xml_content = await firma_service.firmar(xml_content)
+    
+    # El XML va al almacenamiento comprimido, fuera de la fila de facturas
+    await DocumentosService(db).guardar(factura.id, TIPO_XML, xml_content)
+    
+    contingencia = obtener_contingencia()
+    if contingencia.activa:
+        # Sin DIAN: la emisión queda en el journal local y se encola al reproducirlo
+        factura.estado_dian = "CONTINGENCIA"
+        await contingencia.registrar_emision(factura)
+    else:
+        # El envío a la DIAN queda en cola en la misma transacción que la emisión
+        factura.estado_dian = "EMITIDA"
+        encolar_envio(db, factura)
     await db.commit()
     await db.refresh(factura)
     
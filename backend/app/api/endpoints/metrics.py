@@ -0,0 +1,111 @@
+"""
+Endpoints de métricas operativas
+"""
+
+from fastapi import APIRouter, Depends
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.auth import get_current_active_user
+from app.core.database import get_db_replica, metricas_pools, replicas
+from app.models import EnvioDian, Usuario
+from app.services.auth_service import cache_principales
+from app.services.cache_facturas import obtener_cache_facturas
+from app.services.cola_dian import obtener_cola_dian
+from app.services.contingencia_service import obtener_contingencia
+from app.services.firma_service import obtener_firma_service
+from app.services.password_service import obtener_password_service
+from app.services.permisos_service import matriz_permisos
+from app.services.sesiones_service import revocaciones
+from app.services.pdf_service import obtener_pdf_service
+from app.services.qr_service import obtener_qr_service
+
+router = APIRouter()
+
+
+@router.get("/firma", response_model=dict)
+async def metricas_firma(current_user: Usuario = Depends(get_current_active_user)):
+    """Throughput, cola y latencia del servicio de firma XAdES"""
+    
+    firma_service = obtener_firma_service()
+    if firma_service is None:
+        return {"habilitada": False}
+    
+    return {"habilitada": True, **firma_service.metricas()}
+
+
+@router.get("/qr", response_model=dict)
+async def metricas_qr(current_user: Usuario = Depends(get_current_active_user)):
+    """Aciertos y tamaño de la caché de códigos QR"""
+    return obtener_qr_service().metricas()
+
+
+@router.get("/pdf", response_model=dict)
+async def metricas_pdf(current_user: Usuario = Depends(get_current_active_user)):
+    """PDF renderizados, servidos desde disco y latencia de renderizado"""
+    return obtener_pdf_service().metricas()
+
+
+@router.get("/auth", response_model=dict)
+async def metricas_auth(current_user: Usuario = Depends(get_current_active_user)):
+    """Aciertos de la caché de usuarios autenticados"""
+    return cache_principales.metricas()
+
+
+@router.get("/sesiones", response_model=dict)
+async def metricas_sesiones(current_user: Usuario = Depends(get_current_active_user)):
+    """Revocaciones vigentes en memoria y tokens rechazados"""
+    return revocaciones.metricas()
+
+
+@router.get("/permisos", response_model=dict)
+async def metricas_permisos(current_user: Usuario = Depends(get_current_active_user)):
+    """Tamaño, antigüedad y verificaciones de la matriz de permisos"""
+    return matriz_permisos.metricas()
+
+
+@router.get("/password", response_model=dict)
+async def metricas_password(current_user: Usuario = Depends(get_current_active_user)):
+    """Cola, rechazos (503), espera en cola y duración de bcrypt"""
+    return obtener_password_service().metricas()
+
+
+@router.get("/cache-facturas", response_model=dict)
+async def metricas_cache_facturas(current_user: Usuario = Depends(get_current_active_user)):
+    """Aciertos, tamaño e invalidaciones de la caché de facturas finalizadas"""
+    return obtener_cache_facturas().metricas()
+
+
+@router.get("/db-pool", response_model=dict)
+async def metricas_db_pool(current_user: Usuario = Depends(get_current_active_user)):
+    """Conexiones en uso, overflow, espera por conexión y tasa de conexiones de cada pool"""
+    return metricas_pools()
+
+
+@router.get("/replicas", response_model=dict)
+async def metricas_replicas(current_user: Usuario = Depends(get_current_active_user)):
+    """Retraso, rotación y lecturas de cada réplica, y lecturas enviadas al primario"""
+    return replicas.metricas()
+
+
+@router.get("/dian", response_model=dict)
+async def metricas_dian(
+    db: AsyncSession = Depends(get_db_replica),
+    current_user: Usuario = Depends(get_current_active_user)
+):
+    """Envíos a la DIAN por estado y resultados de los workers de este proceso"""
+    
+    result = await db.execute(
+        select(EnvioDian.estado, func.count())
+        .where(EnvioDian.empresa_id == current_user.empresa_id)
+        .group_by(EnvioDian.estado)
+    )
+    envios = {estado: total for estado, total in result.all()}
+    
+    cola_dian = obtener_cola_dian()
+    return {
+        "habilitada": cola_dian is not None,
+        "envios": envios,
+        "contingencia": obtener_contingencia().metricas(),
+        **(cola_dian.metricas() if cola_dian is not None else {}),
+    }
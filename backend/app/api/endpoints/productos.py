@@ -2,13 +2,14 @@
 Endpoints CRUD para Producto
 """
 
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, update, delete
 
-from app.core.database import get_db
+from app.core.database import get_db, get_db_lectura, get_db_replica
 from app.core.auth import get_current_active_user
+from app.core.paginacion import paginar_keyset, publicar_siguiente_cursor
 from app.models import Producto, Usuario
 from app.schemas.producto import ProductoCreate, ProductoUpdate, Producto as ProductoSchema, ProductoList
 
@@ -51,14 +52,16 @@ async def create_producto(
 
 @router.get("/", response_model=List[ProductoList])
 async def list_productos(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    after: Optional[str] = None,
     activo: bool = True,
     tipo: str = None,
     current_user: Usuario = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db_replica)
 ):
-    """Listar productos de mi empresa"""
+    """Listar productos de mi empresa (paginación por offset o por cursor `after`)"""
     
     empresa_id = current_user.empresa_id
     
@@ -70,9 +73,12 @@ async def list_productos(
     if tipo:
         stmt = stmt.where(Producto.tipo == tipo)
     
-    stmt = stmt.offset(skip).limit(limit)
+    stmt = paginar_keyset(stmt, (Producto.id,), after, limit)
+    if not after:
+        stmt = stmt.offset(skip)
     result = await db.execute(stmt)
     productos = result.scalars().all()
+    publicar_siguiente_cursor(response, productos, (Producto.id,), limit)
     
     return productos
 
@@ -81,7 +87,7 @@ async def list_productos(
 async def get_producto(
     producto_id: int,
     empresa_id: int,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db_lectura)
 ):
     """Obtener producto por ID"""
     
@@ -183,7 +189,7 @@ async def delete_producto(
 async def get_producto_by_codigo(
     codigo: str,
     empresa_id: int,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db_replica)
 ):
     """Obtener producto por código"""
     
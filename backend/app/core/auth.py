@@ -5,11 +5,13 @@ Middleware y dependencies de autenticación
 from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import async_sessionmaker
 
-from app.core.database import get_db
+from app.core.database import get_sesiones_lectura
 from app.models import Usuario
-from app.services.auth_service import AuthService
+from app.services.auth_service import AuthService, cache_principales
+from app.services.permisos_service import matriz_permisos
+from app.services.sesiones_service import revocaciones
 
 # Security scheme para JWT Bearer token
 security = HTTPBearer()
@@ -17,26 +19,38 @@ security = HTTPBearer()
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: AsyncSession = Depends(get_db)
+    sesiones_lectura: async_sessionmaker = Depends(get_sesiones_lectura)
 ) -> Usuario:
     """
     Dependency para obtener el usuario actual desde el token JWT
     """
     
-    # Crear instancia del servicio de auth
-    auth_service = AuthService(db)
-    
     # Verificar token
-    email = auth_service.verify_token(credentials.credentials)
-    if email is None:
+    payload = AuthService.decode_token(credentials.credentials)
+    if payload is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token inválido o expirado",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    email = payload["sub"]
+    
+    # Sesiones cerradas (búsqueda en memoria, sin consultar la base de datos)
+    if revocaciones.revocada(payload.get("jti")):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Sesión revocada",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     
-    # Obtener usuario
-    user = await auth_service.get_user_by_email(email)
+    # Obtener usuario (de la caché de principales o de la base de datos)
+    user = cache_principales.obtener(email)
+    if user is None:
+        # Sesión corta de solo lectura: la conexión vuelve al pool antes del endpoint
+        async with sesiones_lectura() as db:
+            user = await AuthService(db).get_user_by_email(email)
+        if user is not None:
+            cache_principales.guardar(user)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -98,4 +112,25 @@ def require_empresa_access(empresa_id: int):
         validate_empresa_access(current_user, empresa_id)
         return current_user
     
-    return _validate_access
\ No newline at end of file
+    return _validate_access
+
+
+def require_permission(modulo: str, accion: str):
+    """
+    Dependency factory para exigir un permiso del rol del usuario
+
+    Ejemplo: `Depends(require_permission("facturas", "anular"))`. La
+    verificación usa la matriz de permisos compilada en memoria y el usuario
+    de la caché de principales: no consulta la base de datos.
+    """
+    async def _verificar_permiso(
+        current_user: Usuario = Depends(get_current_active_user)
+    ) -> Usuario:
+        if not await matriz_permisos.permite(current_user.rol_id, modulo, accion):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=f"No tiene permiso para {accion.lower()} en {modulo.lower()}"
+            )
+        return current_user
+    
+    return _verificar_permiso
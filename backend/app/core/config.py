@@ -19,10 +19,39 @@ class Settings(BaseSettings):
     SECRET_KEY: str = Field(..., description="Clave secreta para JWT")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 30  # Se renueva (rota) en cada uso de /auth/refresh
+    
+    # Caché de usuarios autenticados (evita consultar usuarios en cada request)
+    AUTH_CACHE_TTL: float = 30.0  # Segundos
+    AUTH_CACHE_MAX_ENTRADAS: int = 10000
+    
+    # Segundos entre lecturas de las sesiones revocadas por otros procesos
+    SESIONES_SINCRONIZACION_SEGUNDOS: float = 5.0
+    
+    # Segundos entre recompilaciones de la matriz de permisos (cambios de otros procesos)
+    PERMISOS_RECARGA_SEGUNDOS: float = 60.0
+    
+    # bcrypt en un pool de hilos: por encima de PASSWORD_MAX_PENDIENTES se responde 503
+    PASSWORD_HILOS: int = 4
+    PASSWORD_MAX_PENDIENTES: int = 64
     
     # Base de datos
     DATABASE_URL: str = Field(..., description="URL de conexión a PostgreSQL")
     
+    # Pool de conexiones por proceso (cada engine tiene el suyo; ver /metrics/db-pool)
+    DB_POOL_SIZE: int = 10  # Escrituras (get_db)
+    DB_POOL_MAX_OVERFLOW: int = 10
+    DB_LECTURA_POOL_SIZE: int = 10  # Lecturas del primario y de cada réplica
+    DB_LECTURA_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0  # Segundos esperando una conexión antes de fallar
+    DB_POOL_RECYCLE: int = 3600  # Segundos de vida de una conexión (-1 = sin límite)
+    DB_STATEMENT_CACHE_SIZE: int = 100  # Sentencias preparadas por conexión (0 con pgbouncer en modo transacción)
+    
+    # Réplicas de lectura (streaming replication) para listados, búsquedas y reportes
+    DATABASE_REPLICA_URLS: List[str] = []  # Vacío = todo se lee del primario
+    DATABASE_REPLICA_MAX_LAG: float = 5.0  # Segundos de retraso tolerados (y ventana de read-your-writes)
+    DATABASE_REPLICA_VERIFICACION_SEGUNDOS: float = 2.0  # Entre mediciones del retraso
+    
     # CORS
     ALLOWED_HOSTS: List[str] = ["*"]  # En producción, especificar dominios exactos
     
@@ -32,12 +61,60 @@ class Settings(BaseSettings):
     # Logging
     LOG_LEVEL: str = "INFO"
     
+    # Numeración de facturas por bloques (0 = asignar cada número dentro de la transacción)
+    NUMERACION_BLOQUE_TAMANO: int = 0
+    NUMERACION_BLOQUE_EMPRESAS: List[int] = []  # Vacío = todas las empresas
+    
+    # Máximo de facturas por solicitud en POST /facturas/batch
+    FACTURAS_BATCH_MAX: int = 1000
+    
     # DIAN (Facturación Electrónica)
     DIAN_AMBIENTE: str = "PRUEBAS"  # PRUEBAS o PRODUCCION
     DIAN_WSDL_URL: str = ""
     DIAN_CERTIFICADO_PATH: str = ""
     DIAN_CERTIFICADO_PASSWORD: str = ""
     
+    # Procesos para calcular CUFE en lotes grandes (0 = uno por CPU)
+    CUFE_PROCESOS: int = 0
+    
+    # Firma XAdES (se habilita con DIAN_CERTIFICADO_PATH)
+    FIRMA_PROCESOS: int = 0  # 0 = uno por CPU
+    FIRMA_MAX_PENDIENTES: int = 100  # Firmas en espera o en ejecución a la vez
+    
+    # Cola de envíos a la DIAN (los workers arrancan si DIAN_WSDL_URL está configurada)
+    DIAN_ENVIO_WORKERS: int = 2
+    DIAN_ENVIO_LOTE: int = 50  # Documentos por ZIP de SendBillAsync
+    DIAN_ENVIO_MAX_INTENTOS: int = 10
+    DIAN_ENVIO_BACKOFF_BASE: float = 2.0  # Segundos antes del primer reintento
+    DIAN_ENVIO_BACKOFF_MAX: float = 600.0
+    DIAN_ENVIO_TIMEOUT: float = 30.0
+    DIAN_ENVIO_INTERVALO: float = 1.0  # Espera cuando la cola está vacía
+    DIAN_ENVIO_LEASE: int = 120  # Segundos antes de que otro worker retome un envío en proceso
+    
+    # Contingencia DIAN: emisiones al journal local mientras la DIAN no responde
+    DIAN_CONTINGENCIA_FORZADA: bool = False
+    DIAN_CONTINGENCIA_FALLOS: int = 5  # Envíos seguidos sin respuesta para activarla
+    DIAN_CONTINGENCIA_JOURNAL: str = "contingencia/journal.log"
+    DIAN_CONTINGENCIA_INTERVALO: float = 30.0  # Segundos entre sondeos a la DIAN
+    
+    # Códigos QR: caché en disco por contenido y procesos de renderizado
+    QR_CACHE_DIR: str = "cache/qr"
+    QR_CACHE_MAX_MB: int = 256
+    QR_PROCESOS: int = 0  # 0 = uno por CPU
+    
+    # Nivel de compresión zstd de los documentos de las facturas (XML)
+    DOCUMENTOS_ZSTD_NIVEL: int = 3
+    
+    # PDF de las facturas
+    PDF_PROCESOS: int = 0  # 0 = uno por CPU
+    PDF_DIR: str = "storage/pdf"  # PDF persistidos de facturas EMITIDA/ACEPTADA
+    PDF_LOGOS_DIR: str = ""  # Logos de las empresas como <nit>.png
+    
+    # Caché de respuestas de facturas finalizadas (ACEPTADA/RECHAZADA/ANULADA)
+    FACTURAS_CACHE_MAX_MB: int = 64  # LRU en memoria por proceso
+    FACTURAS_CACHE_REDIS_URL: str = ""  # Almacén compartido opcional (requiere el paquete redis)
+    FACTURAS_CACHE_TTL: int = 86400  # Segundos en el almacén compartido
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
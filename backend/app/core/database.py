@@ -2,20 +2,47 @@
 Configuración de la base de datos usando SQLAlchemy con AsyncPG
 """
 
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
-from sqlalchemy.orm import declarative_base
-from typing import AsyncGenerator
+import asyncio
+import itertools
+import time
+from typing import AsyncGenerator, Dict, List, Optional
+
+from fastapi import Request
+from loguru import logger
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.orm import Session, declarative_base
 
 from app.core.config import settings
+from app.core.pool import opciones_pool
+
+
+def _crear_engine_lectura(url: str) -> AsyncEngine:
+    """Engine de solo lectura: autocommit y escrituras rechazadas por el servidor"""
+    return create_async_engine(
+        url.replace("postgresql://", "postgresql+asyncpg://"),
+        echo=settings.DEBUG,
+        isolation_level="AUTOCOMMIT",
+        **opciones_pool(
+            settings.DB_LECTURA_POOL_SIZE,
+            settings.DB_LECTURA_MAX_OVERFLOW,
+            connect_args={"server_settings": {"default_transaction_read_only": "on"}},
+        ),
+    )
+
 
 # Crear engine asíncrono
 engine = create_async_engine(
     settings.DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://"),
     echo=settings.DEBUG,  # Mostrar queries SQL en modo debug
-    pool_pre_ping=True,
-    pool_recycle=300,
+    **opciones_pool(settings.DB_POOL_SIZE, settings.DB_POOL_MAX_OVERFLOW),
 )
 
+# Engine de lecturas con su propio pool: sin BEGIN/COMMIT por request
+# (autocommit, cada sentencia con su snapshot como en READ COMMITTED) y con
+# el servidor rechazando cualquier escritura
+engine_lectura = _crear_engine_lectura(settings.DATABASE_URL)
+
 # Crear sessionmaker asíncrono
 AsyncSessionLocal = async_sessionmaker(
     engine,
@@ -25,16 +52,217 @@ AsyncSessionLocal = async_sessionmaker(
     autoflush=False,
 )
 
+AsyncSessionLectura = async_sessionmaker(
+    engine_lectura,
+    class_=AsyncSession,
+    expire_on_commit=False,
+    autoflush=False,
+)
+
 # Base para modelos
 Base = declarative_base()
 
+# Retraso de una réplica en segundos. Si ya aplicó todo el WAL recibido es 0:
+# con el primario ocioso la última transacción aplicada envejece sin que haya
+# retraso real. En un servidor que no es réplica ambas posiciones son NULL y
+# el retraso también es 0.
+CONSULTA_RETRASO = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
 
-async def get_db() -> AsyncGenerator[AsyncSession, None]:
+class ReplicasLectura:
+    """
+    Enrutamiento de listados, búsquedas y reportes a las réplicas de lectura
+
+    Se elige la réplica en rotación con menos conexiones en uso, alternando
+    entre las empatadas. Una réplica con más de `max_lag` segundos de
+    retraso, o que no respondió a la última medición, sale de la rotación;
+    sin réplicas en rotación se lee del primario. Tras una escritura, el
+    mismo cliente lee del primario durante `max_lag` segundos
+    (read-your-writes).
+    """
+
+    def __init__(self, urls: List[str], max_lag: float, intervalo: float, primario: async_sessionmaker):
+        self.max_lag = max_lag
+        self.intervalo = intervalo
+        self.primario = primario
+        self._engines = [_crear_engine_lectura(url) for url in urls]
+        self._sesiones = [
+            async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False, autoflush=False)
+            for engine in self._engines
+        ]
+        self._retrasos: List[Optional[float]] = [None] * len(self._engines)  # None = sin medir o caída
+        self._lecturas = [0] * len(self._engines)
+        self._turno = itertools.count()
+        self._escrituras: Dict[str, float] = {}
+        self._tarea: Optional[asyncio.Task] = None
+        self._lecturas_primario = 0
+        self._lecturas_tras_escritura = 0
+
+    @property
+    def activas(self) -> bool:
+        return bool(self._engines)
+
+    @property
+    def con_escrituras_recientes(self) -> bool:
+        return bool(self._escrituras)
+
+    def en_rotacion(self, indice: int) -> bool:
+        retraso = self._retrasos[indice]
+        return retraso is not None and retraso <= self.max_lag
+
+    def marcar_escritura(self, cliente: Optional[str]) -> None:
+        """Enviar al primario las lecturas de este cliente mientras las réplicas se ponen al día"""
+        if cliente is not None and self._engines:
+            self._escrituras[cliente] = time.monotonic() + self.max_lag
+
+    def _escribio_hace_poco(self, cliente: Optional[str]) -> bool:
+        vence = self._escrituras.get(cliente) if cliente is not None else None
+        if vence is None:
+            return False
+        if vence <= time.monotonic():
+            del self._escrituras[cliente]
+            return False
+        return True
+
+    def elegir(self, cliente: Optional[str] = None) -> async_sessionmaker:
+        """Sessionmaker para la próxima lectura de este cliente"""
+        if self._escribio_hace_poco(cliente):
+            self._lecturas_tras_escritura += 1
+            self._lecturas_primario += 1
+            return self.primario
+        candidatas = [indice for indice in range(len(self._engines)) if self.en_rotacion(indice)]
+        if not candidatas:
+            self._lecturas_primario += 1
+            return self.primario
+        inicio = next(self._turno) % len(candidatas)
+        indice = min(
+            candidatas[inicio:] + candidatas[:inicio],
+            key=lambda i: self._engines[i].sync_engine.pool.checkedout()
+        )
+        self._lecturas[indice] += 1
+        return self._sesiones[indice]
+
+    async def _consultar_retraso(self, indice: int):
+        async with self._engines[indice].connect() as conn:
+            return await conn.scalar(CONSULTA_RETRASO)
+
+    async def _medir_replica(self, indice: int) -> None:
+        try:
+            # El timeout cubre también la conexión: una réplica que no responde no frena a las demás
+            retraso = float(await asyncio.wait_for(self._consultar_retraso(indice), timeout=max(self.intervalo, 1.0)))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if self._retrasos[indice] is not None:
+                logger.warning(f"Réplica {indice} fuera de rotación: {e!r}")
+            retraso = None
+        if retraso is not None and retraso > self.max_lag and self.en_rotacion(indice):
+            logger.warning(f"Réplica {indice} fuera de rotación: {retraso:.1f}s de retraso")
+        self._retrasos[indice] = retraso
+
+    async def medir(self) -> None:
+        """Medir el retraso de cada réplica y olvidar las escrituras ya replicadas"""
+        await asyncio.gather(*(self._medir_replica(indice) for indice in range(len(self._engines))))
+        ahora = time.monotonic()
+        for cliente in [cliente for cliente, vence in self._escrituras.items() if vence <= ahora]:
+            del self._escrituras[cliente]
+
+    async def _medir_periodicamente(self) -> None:
+        while True:
+            await asyncio.sleep(self.intervalo)
+            await self.medir()
+
+    def iniciar(self) -> None:
+        if self._tarea is None and self._engines:
+            self._tarea = asyncio.create_task(self._medir_periodicamente())
+
+    async def detener(self) -> None:
+        """Detener las mediciones y cerrar los pools de las réplicas"""
+        if self._tarea is not None:
+            self._tarea.cancel()
+            await asyncio.gather(self._tarea, return_exceptions=True)
+            self._tarea = None
+        for engine in self._engines:
+            await engine.dispose()
+
+    def engines(self) -> Dict[str, AsyncEngine]:
+        """Engine de cada réplica por servidor"""
+        return {f"replica {engine.url.host}:{engine.url.port or 5432}": engine for engine in self._engines}
+
+    def metricas(self) -> dict:
+        return {
+            "max_lag": self.max_lag,
+            "replicas": [
+                {
+                    "servidor": f"{engine.url.host}:{engine.url.port or 5432}",
+                    "retraso_segundos": self._retrasos[indice],
+                    "en_rotacion": self.en_rotacion(indice),
+                    "conexiones_en_uso": engine.sync_engine.pool.checkedout(),
+                    "lecturas": self._lecturas[indice],
+                }
+                for indice, engine in enumerate(self._engines)
+            ],
+            "lecturas_primario": self._lecturas_primario,
+            "lecturas_tras_escritura": self._lecturas_tras_escritura,
+            "clientes_leyendo_del_primario": len(self._escrituras),
+        }
+
+
+replicas = ReplicasLectura(
+    settings.DATABASE_REPLICA_URLS,
+    settings.DATABASE_REPLICA_MAX_LAG,
+    settings.DATABASE_REPLICA_VERIFICACION_SEGUNDOS,
+    AsyncSessionLectura,
+)
+
+
+# Clave en session.info con el usuario cuyas escrituras se marcan al hacer commit
+CLIENTE_ESCRITURA = "cliente_escritura"
+
+
+def metricas_pools() -> dict:
+    """Ocupación, esperas y conexiones de cada pool del proceso"""
+    engines = {"primario": engine, "lectura": engine_lectura, **replicas.engines()}
+    return {nombre: engine.sync_engine.pool.estado() for nombre, engine in engines.items()}
+
+
+def _cliente(request: Request) -> Optional[str]:
+    """
+    Identidad del cliente para read-your-writes: el usuario (sub) de su token
+
+    No se guarda la credencial, y la marca sobrevive a que el cliente renueve
+    el token. Sin un token válido no hay read-your-writes.
+    """
+    # Import diferido: los modelos que usa AuthService importan Base de aquí
+    from app.services.auth_service import AuthService
+
+    esquema, _, token = request.headers.get("authorization", "").partition(" ")
+    if esquema.lower() != "bearer" or not token:
+        return None
+    payload = AuthService.decode_token(token)
+    return payload["sub"] if payload is not None else None
+
+
+@event.listens_for(Session, "after_commit")
+def _marcar_escritura(session: Session) -> None:
+    # Al confirmar y no al terminar el request: FastAPI cierra las
+    # dependencias después de enviar la respuesta
+    cliente = session.info.get(CLIENTE_ESCRITURA)
+    if cliente is not None:
+        replicas.marcar_escritura(cliente)
+
+
+async def get_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
     """
     Dependency para obtener una sesión de base de datos
     Se usa como dependency injection en FastAPI
     """
     async with AsyncSessionLocal() as session:
+        if request.method != "GET" and replicas.activas:
+            session.info[CLIENTE_ESCRITURA] = _cliente(request)
         try:
             yield session
             await session.commit()
@@ -45,6 +273,33 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
             await session.close()
 
 
+async def get_db_lectura() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Dependency de solo lectura para los endpoints GET
+    No abre transacción ni hace commit; una escritura falla en el servidor
+    """
+    async with AsyncSessionLectura() as session:
+        yield session
+
+
+def get_sesiones_lectura() -> async_sessionmaker:
+    """
+    Dependency con el sessionmaker de lectura, para abrir una sesión corta
+    dentro de otra dependency y cerrarla antes de que corra el endpoint
+    """
+    return AsyncSessionLectura
+
+
+async def get_db_replica(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Dependency de solo lectura para listados, búsquedas y reportes
+    Lee de una réplica si hay alguna al día; si no, del primario
+    """
+    cliente = _cliente(request) if replicas.con_escrituras_recientes else None
+    async with replicas.elegir(cliente)() as session:
+        yield session
+
+
 async def init_db():
     """Inicializar base de datos - crear tablas si no existen"""
     async with engine.begin() as conn:
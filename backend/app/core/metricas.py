@@ -0,0 +1,12 @@
+"""
+Utilidades para las métricas de los servicios
+"""
+
+from typing import Optional, Sequence
+
+
+def percentil_ms(ordenados: Sequence[float], p: float) -> Optional[float]:
+    """Percentil `p` (0 a 1) en milisegundos de duraciones en segundos ya ordenadas, o None sin muestras"""
+    if not ordenados:
+        return None
+    return round(ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))] * 1000, 2)
@@ -0,0 +1,70 @@
+"""
+Paginación por cursor (keyset) para listados
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Sequence
+
+from fastapi import HTTPException, Response, status
+from sqlalchemy import DateTime, Select, tuple_
+from sqlalchemy.orm import InstrumentedAttribute
+
+# Header con el cursor de la página siguiente
+HEADER_SIGUIENTE_CURSOR = "X-Next-Cursor"
+
+
+def codificar_cursor(valores: Sequence[Any]) -> str:
+    """Codificar los valores de orden de la última fila en un cursor opaco"""
+    datos = [valor.isoformat() if isinstance(valor, datetime) else valor for valor in valores]
+    return base64.urlsafe_b64encode(json.dumps(datos, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor: str, columnas: Sequence[InstrumentedAttribute]) -> List[Any]:
+    """Decodificar un cursor en los valores de las columnas de orden, o lanzar 400"""
+    try:
+        datos = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(datos, list) or len(datos) != len(columnas):
+            raise ValueError(cursor)
+        return [
+            datetime.fromisoformat(valor) if isinstance(columna.type, DateTime) else int(valor)
+            for columna, valor in zip(columnas, datos)
+        ]
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor de paginación inválido"
+        )
+
+
+def paginar_keyset(
+    stmt: Select,
+    columnas: Sequence[InstrumentedAttribute],
+    after: Optional[str],
+    limit: int,
+    descendente: bool = False
+) -> Select:
+    """
+    Ordenar por `columnas` y limitar a las filas posteriores al cursor
+
+    La comparación de tuplas sobre las mismas columnas del ORDER BY permite
+    que Postgres entre directamente al índice compuesto en el punto del
+    cursor, así que cada página cuesta lo mismo sin importar su profundidad.
+    """
+    if after:
+        valores = decodificar_cursor(after, columnas)
+        clave = tuple_(*columnas)
+        stmt = stmt.where(clave < tuple_(*valores) if descendente else clave > tuple_(*valores))
+
+    orden = [columna.desc() if descendente else columna.asc() for columna in columnas]
+    return stmt.order_by(*orden).limit(limit)
+
+
+def publicar_siguiente_cursor(response: Response, filas: Sequence[Any], columnas: Sequence[InstrumentedAttribute], limit: int) -> None:
+    """Agregar el header X-Next-Cursor si la página vino completa"""
+    if filas and len(filas) >= limit:
+        ultima = filas[-1]
+        response.headers[HEADER_SIGUIENTE_CURSOR] = codificar_cursor(
+            [getattr(ultima, columna.key) for columna in columnas]
+        )
@@ -0,0 +1,122 @@
+"""
+Pool de conexiones configurable desde Settings y con métricas de uso
+"""
+
+import bisect
+import time
+from collections import deque
+from typing import Deque, Optional
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.core.config import settings
+from app.core.metricas import percentil_ms
+
+# Límites (ms) del histograma de espera por una conexión; el último tramo no tiene límite
+TRAMOS_ESPERA_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+# Esperas recientes para los percentiles
+MUESTRAS_METRICAS = 1000
+
+# Ventana para la tasa de conexiones nuevas
+VENTANA_CONEXIONES = 60.0
+
+
+class MetricasPool:
+    """Esperas, timeouts y conexiones abiertas por un pool"""
+
+    def __init__(self):
+        self.tramos = [0] * (len(TRAMOS_ESPERA_MS) + 1)
+        self.adquisiciones = 0
+        self.timeouts = 0
+        self.conexiones = 0
+        self._esperas: Deque[float] = deque(maxlen=MUESTRAS_METRICAS)
+        self._conectadas: Deque[float] = deque(maxlen=10000)
+
+    def registrar_espera(self, segundos: float) -> None:
+        self.tramos[bisect.bisect_left(TRAMOS_ESPERA_MS, segundos * 1000)] += 1
+        self._esperas.append(segundos)
+        self.adquisiciones += 1
+
+    def registrar_conexion(self, *_) -> None:
+        # Listener del evento "connect" del pool: (dbapi_connection, connection_record)
+        self.conexiones += 1
+        self._conectadas.append(time.monotonic())
+
+    def resumen(self) -> dict:
+        esperas = sorted(self._esperas)
+        desde = time.monotonic() - VENTANA_CONEXIONES
+        etiquetas = [f"<={limite}ms" for limite in TRAMOS_ESPERA_MS] + [f">{TRAMOS_ESPERA_MS[-1]}ms"]
+        return {
+            "adquisiciones": self.adquisiciones,
+            "timeouts": self.timeouts,
+            "espera_ms_p50": percentil_ms(esperas, 0.50),
+            "espera_ms_p99": percentil_ms(esperas, 0.99),
+            "espera_ms_histograma": dict(zip(etiquetas, self.tramos)),
+            "conexiones_abiertas_total": self.conexiones,
+            "conexiones_ultimo_minuto": sum(1 for instante in self._conectadas if instante >= desde),
+        }
+
+
+class PoolMedido(AsyncAdaptedQueuePool):
+    """
+    Pool de SQLAlchemy que mide cuánto se espera por una conexión
+
+    La espera incluye abrir la conexión cuando el pool crece y el pre-ping.
+    Toda conexión física nueva (también las recicladas o invalidadas) se
+    cuenta para la tasa de conexiones.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.metricas = MetricasPool()
+        super().__init__(*args, **kwargs)
+        event.listen(self, "connect", self.metricas.registrar_conexion)
+
+    def connect(self):
+        inicio = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            self.metricas.timeouts += 1
+            raise
+        finally:
+            self.metricas.registrar_espera(time.perf_counter() - inicio)
+
+    def recreate(self) -> "PoolMedido":
+        nuevo = super().recreate()
+        # recreate() ya copió el listener que cuenta en estas métricas; sin esto se contaría doble
+        event.remove(nuevo, "connect", nuevo.metricas.registrar_conexion)
+        nuevo.metricas = self.metricas
+        return nuevo
+
+    def estado(self) -> dict:
+        """Ocupación actual del pool y sus métricas acumuladas"""
+        return {
+            "tamano": self.size(),
+            "max_overflow": self._max_overflow,
+            "en_uso": self.checkedout(),
+            "libres": self.checkedin(),
+            "overflow_en_uso": max(0, self.overflow()),
+            "timeout": self._timeout,
+            "recycle": self._recycle,
+            **self.metricas.resumen(),
+        }
+
+
+def opciones_pool(pool_size: int, max_overflow: int, connect_args: Optional[dict] = None) -> dict:
+    """Argumentos de create_async_engine para un pool medido con los parámetros de Settings"""
+    return {
+        "poolclass": PoolMedido,
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+        "connect_args": {
+            # Caché de sentencias preparadas de asyncpg y del dialecto (0 detrás de pgbouncer en modo transacción)
+            "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+            "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+            **(connect_args or {}),
+        },
+    }
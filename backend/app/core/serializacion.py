@@ -0,0 +1,21 @@
+"""
+Serialización directa a JSON de listados (sin instancias ORM ni modelos Pydantic)
+"""
+
+from typing import Any, Sequence
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+
+def respuesta_json(adaptador: TypeAdapter, filas: Sequence[Any]) -> Response:
+    """
+    Serializar las filas de una consulta proyectada con un TypeAdapter precompilado
+
+    El adaptador (sobre un TypedDict) solo serializa: no valida ni crea
+    objetos por fila, y las columnas que no están en el TypedDict se omiten.
+    """
+    return Response(
+        content=adaptador.dump_json([fila._asdict() for fila in filas]),
+        media_type="application/json"
+    )
@@ -8,7 +8,19 @@ from fastapi.middleware.cors import CORSMiddleware
 from loguru import logger
 
 from app.core.config import settings
+from app.core.database import replicas
+from app.core.paginacion import HEADER_SIGUIENTE_CURSOR
 from app.api import api_router
+from app.services.cache_facturas import cerrar_cache_facturas, obtener_cache_facturas
+from app.services.cola_dian import cerrar_cola_dian, obtener_cola_dian
+from app.services.contingencia_service import cerrar_contingencia, obtener_contingencia
+from app.services.firma_service import cerrar_firma_service, obtener_firma_service
+from app.services.numeracion_service import bloques_numeracion
+from app.services.password_service import cerrar_password_service
+from app.services.permisos_service import matriz_permisos
+from app.services.sesiones_service import revocaciones
+from app.services.pdf_service import cerrar_pdf_service
+from app.services.qr_service import cerrar_qr_service
 
 # Configurar logger
 logger.add("logs/app.log", rotation="1 day", retention="30 days", level="INFO")
@@ -29,6 +41,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[HEADER_SIGUIENTE_CURSOR, "ETag"],
 )
 
 # Incluir rutas de la API
@@ -59,9 +72,69 @@ async def startup_event():
     logger.info("🚀 Iniciando Sistema de Facturación Electrónica")
     logger.info(f"🔧 Modo Debug: {settings.DEBUG}")
     logger.info(f"📊 Base de datos: {settings.DATABASE_URL.split('@')[1] if '@' in settings.DATABASE_URL else 'configurada'}")
+    
+    # Validar el certificado de firma al arrancar (si está configurado)
+    obtener_firma_service()
+    
+    # Compilar los permisos por rol (si la base no responde, se compilan en la primera verificación)
+    try:
+        await matriz_permisos.cargar()
+    except Exception as e:
+        logger.warning(f"Permisos no compilados al arrancar: {e}")
+    matriz_permisos.iniciar()
+    
+    # Revocaciones de sesión vigentes (luego se leen de forma incremental)
+    try:
+        await revocaciones.sincronizar()
+    except Exception as e:
+        logger.warning(f"Revocaciones de sesión no cargadas al arrancar: {e}")
+    revocaciones.iniciar()
+    
+    # Retraso de las réplicas de lectura (sin medir, las lecturas van al primario)
+    await replicas.medir()
+    replicas.iniciar()
+    
+    # Caché de facturas finalizadas (escucha de invalidaciones si hay almacén compartido)
+    obtener_cache_facturas().iniciar()
+    
+    # Workers de envío a la DIAN (si el web service está configurado)
+    cola_dian = obtener_cola_dian()
+    if cola_dian is not None:
+        cola_dian.iniciar()
+        obtener_contingencia().iniciar(cola_dian.cliente)
+        logger.info(f"📨 Cola de envíos DIAN con {cola_dian.workers} workers")
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Eventos al cerrar la aplicación"""
-    logger.info("🛑 Cerrando Sistema de Facturación Electrónica")
\ No newline at end of file
+    logger.info("🛑 Cerrando Sistema de Facturación Electrónica")
+    
+    # Devolver o reportar los números de factura reservados y no usados
+    await bloques_numeracion.liberar_todo()
+    
+    # Detener los workers de envío a la DIAN y cerrar el journal de contingencia
+    await cerrar_contingencia()
+    await cerrar_cola_dian()
+    
+    # Detener la recompilación periódica de permisos y la lectura de revocaciones
+    await matriz_permisos.detener()
+    await revocaciones.detener()
+    
+    # Detener la medición del retraso y cerrar los pools de las réplicas
+    await replicas.detener()
+    
+    # Cerrar el almacén compartido de la caché de facturas
+    await cerrar_cache_facturas()
+    
+    # Detener los hilos de bcrypt
+    cerrar_password_service()
+    
+    # Detener los procesos de firma
+    cerrar_firma_service()
+    
+    # Detener los procesos de renderizado de QR
+    cerrar_qr_service()
+    
+    # Detener los procesos de renderizado de PDF
+    cerrar_pdf_service()
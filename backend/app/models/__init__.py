@@ -7,6 +7,9 @@ from .empresa import Empresa
 from .cliente import Cliente
 from .producto import Producto
 from .factura import Factura, FacturaDetalle, FacturaImpuesto
+from .numeracion import NumeracionFactura, NumeracionHueco
+from .envio_dian import EnvioDian
+from .documento_factura import DocumentoFactura
 from .rol import Rol, Permiso, Sesion
 
 __all__ = [
@@ -17,6 +20,10 @@ __all__ = [
     "Factura",
     "FacturaDetalle",
     "FacturaImpuesto",
+    "NumeracionFactura",
+    "NumeracionHueco",
+    "EnvioDian",
+    "DocumentoFactura",
     "Rol",
     "Permiso",
     "Sesion"
@@ -2,9 +2,9 @@
 Modelo SQLAlchemy para Cliente
 """
 
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Index
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 
 from app.core.database import Base
 
@@ -12,6 +12,15 @@ from app.core.database import Base
 class Cliente(Base):
     """Modelo de Cliente con datos fiscales colombianos"""
     __tablename__ = "clientes"
+    __table_args__ = (
+        # Paginación por cursor (id) dentro de la empresa
+        Index("ix_clientes_empresa_activo_id", "empresa_id", "activo", "id"),
+        # Un solo cliente activo por documento en cada empresa
+        Index(
+            "uq_clientes_empresa_numero_documento_activo", "empresa_id", "numero_documento",
+            unique=True, postgresql_where=text("activo")
+        ),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     empresa_id = Column(Integer, ForeignKey("empresas.id"), nullable=False)
@@ -0,0 +1,28 @@
+"""
+Modelo SQLAlchemy para los documentos grandes de una factura (XML UBL)
+"""
+
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, LargeBinary, UniqueConstraint
+from sqlalchemy.sql import func
+
+from app.core.database import Base
+
+
+class DocumentoFactura(Base):
+    """Documento grande de una factura, comprimido con zstd y fuera de la fila de facturas"""
+    __tablename__ = "documentos_factura"
+    __table_args__ = (
+        UniqueConstraint("factura_id", "tipo", name="uq_documentos_factura_factura_tipo"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    factura_id = Column(Integer, ForeignKey("facturas.id", ondelete="CASCADE"), nullable=False)
+    tipo = Column(String(20), nullable=False)  # XML
+    sha256 = Column(String(64), nullable=False)  # Hash del contenido sin comprimir
+    tamano = Column(Integer, nullable=False)  # Bytes sin comprimir
+    contenido = Column(LargeBinary, nullable=False)  # zstd
+
+    created_at = Column(DateTime, server_default=func.now())
+
+    def __repr__(self):
+        return f"<DocumentoFactura(factura_id={self.factura_id}, tipo='{self.tipo}', tamano={self.tamano})>"
@@ -32,6 +32,7 @@ class Empresa(Base):
     ambiente_dian = Column(String(20), default='PRUEBAS', nullable=False)  # PRUEBAS, PRODUCCION
     prefijo_factura = Column(String(10), nullable=True)
     resolucion_dian = Column(String(50), nullable=True)
+    clave_tecnica = Column(String(100), nullable=True)  # Clave técnica de la resolución (CUFE)
     fecha_resolucion = Column(Date, nullable=True)
     rango_autorizado_desde = Column(Integer, nullable=True)
     rango_autorizado_hasta = Column(Integer, nullable=True)
@@ -0,0 +1,36 @@
+"""
+Modelo SQLAlchemy para la cola de envíos a la DIAN
+"""
+
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Index
+from sqlalchemy.sql import func, text
+
+from app.core.database import Base
+
+
+class EnvioDian(Base):
+    """Factura emitida pendiente de envío (o ya enviada) al web service de la DIAN"""
+    __tablename__ = "envios_dian"
+    __table_args__ = (
+        # Los workers solo buscan envíos pendientes o con el lease vencido
+        Index(
+            "ix_envios_dian_pendientes", "proximo_intento",
+            postgresql_where=text("estado IN ('PENDIENTE', 'EN_PROCESO')")
+        ),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    empresa_id = Column(Integer, ForeignKey("empresas.id", ondelete="CASCADE"), nullable=False)
+    factura_id = Column(Integer, ForeignKey("facturas.id", ondelete="CASCADE"), nullable=False, unique=True)
+
+    estado = Column(String(20), nullable=False, default="PENDIENTE")  # PENDIENTE, EN_PROCESO, ACEPTADA, RECHAZADA, ERROR
+    intentos = Column(Integer, nullable=False, default=0)
+    proximo_intento = Column(DateTime, nullable=False, server_default=func.now())  # Reintento o fin del lease
+    track_id = Column(String(100), nullable=True)  # ZipKey de un envío asíncrono en validación
+    respuesta = Column(Text, nullable=True)  # Último mensaje de la DIAN o error de transporte
+
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<EnvioDian(factura_id={self.factura_id}, estado='{self.estado}', intentos={self.intentos})>"
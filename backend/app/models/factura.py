@@ -2,7 +2,7 @@
 Modelos SQLAlchemy para Factura y relacionados
 """
 
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Numeric, Date
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Numeric, Date, Time, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -12,6 +12,13 @@ from app.core.database import Base
 class Factura(Base):
     """Modelo de Factura con compliance DIAN"""
     __tablename__ = "facturas"
+    __table_args__ = (
+        Index("uq_facturas_empresa_numero_completo", "empresa_id", "numero_completo", unique=True),
+        # Paginación por cursor (created_at, id) dentro de la empresa
+        Index("ix_facturas_empresa_activo_created_at_id", "empresa_id", "activo", "created_at", "id"),
+        # Listado filtrado por estado DIAN
+        Index("ix_facturas_empresa_activo_estado_created_at", "empresa_id", "activo", "estado_dian", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     empresa_id = Column(Integer, ForeignKey("empresas.id"), nullable=False)
@@ -25,12 +32,12 @@ class Factura(Base):
     # Fechas
     fecha_emision = Column(Date, nullable=False)
     fecha_vencimiento = Column(Date, nullable=True)
+    hora_emision = Column(Time, nullable=True)  # Se fija al emitir (hora legal colombiana)
     
     # Datos DIAN
     cufe = Column(String(96), nullable=True, index=True)  # Código Único de Facturación Electrónica
-    qr_code = Column(Text, nullable=True)  # QR code en base64
-    xml_content = Column(Text, nullable=True)  # XML para DIAN
-    estado_dian = Column(String(20), default='BORRADOR', nullable=False)  # BORRADOR, EMITIDA, ACEPTADA, RECHAZADA, ANULADA
+    qr_code = Column(String(64), nullable=True)  # Referencia del QR (SHA-256 del contenido) en la caché
+    estado_dian = Column(String(20), default='BORRADOR', nullable=False)  # BORRADOR, EMITIDA, CONTINGENCIA, ACEPTADA, RECHAZADA, ANULADA
     
     # Observaciones
     observaciones = Column(Text, nullable=True)
@@ -65,7 +72,7 @@ class FacturaDetalle(Base):
     __tablename__ = "factura_detalle"
     
     id = Column(Integer, primary_key=True, index=True)
-    factura_id = Column(Integer, ForeignKey("facturas.id"), nullable=False)
+    factura_id = Column(Integer, ForeignKey("facturas.id"), nullable=False, index=True)
     producto_id = Column(Integer, ForeignKey("productos.id"), nullable=False)
     
     # Datos del producto al momento de la factura
@@ -85,6 +92,11 @@ class FacturaDetalle(Base):
     total_impuestos_linea = Column(Numeric(15, 2), nullable=False, default=0)
     total_linea = Column(Numeric(15, 2), nullable=False)
     
+    # Tarifas de impuestos al momento de la factura (NULL = no aplica)
+    porcentaje_iva = Column(Numeric(5, 2), nullable=True)
+    porcentaje_inc = Column(Numeric(5, 2), nullable=True)
+    porcentaje_ica = Column(Numeric(5, 2), nullable=True)
+    
     # Relationships
     factura = relationship("Factura", back_populates="detalles")
     producto = relationship("Producto", back_populates="detalles_factura")
@@ -98,7 +110,7 @@ class FacturaImpuesto(Base):
     __tablename__ = "factura_impuestos"
     
     id = Column(Integer, primary_key=True, index=True)
-    factura_id = Column(Integer, ForeignKey("facturas.id"), nullable=False)
+    factura_id = Column(Integer, ForeignKey("facturas.id"), nullable=False, index=True)
     
     # Tipo de impuesto
     tipo_impuesto = Column(String(10), nullable=False)  # IVA, INC, ICA
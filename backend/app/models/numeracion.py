@@ -0,0 +1,41 @@
+"""
+Modelo SQLAlchemy para la numeración de facturas
+"""
+
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy.sql import func
+
+from app.core.database import Base
+
+
+class NumeracionFactura(Base):
+    """Contador de numeración DIAN por empresa y prefijo"""
+    __tablename__ = "numeracion_facturas"
+    __table_args__ = (
+        UniqueConstraint("empresa_id", "prefijo", name="uq_numeracion_facturas_empresa_prefijo"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    empresa_id = Column(Integer, ForeignKey("empresas.id", ondelete="CASCADE"), nullable=False)
+    prefijo = Column(String(10), nullable=False, default="")  # '' cuando la empresa no usa prefijo
+    ultimo_numero = Column(Integer, nullable=False, default=0)  # Último número asignado
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<NumeracionFactura(empresa_id={self.empresa_id}, prefijo='{self.prefijo}', ultimo={self.ultimo_numero})>"
+
+
+class NumeracionHueco(Base):
+    """Números reservados que no se usaron (auditoría de huecos en la numeración)"""
+    __tablename__ = "numeracion_huecos"
+
+    id = Column(Integer, primary_key=True, index=True)
+    empresa_id = Column(Integer, ForeignKey("empresas.id", ondelete="CASCADE"), nullable=False)
+    prefijo = Column(String(10), nullable=False, default="")
+    numero_desde = Column(Integer, nullable=False)
+    numero_hasta = Column(Integer, nullable=False)
+    motivo = Column(String(50), nullable=False)  # BLOQUE_NO_UTILIZADO
+    created_at = Column(DateTime, server_default=func.now())
+
+    def __repr__(self):
+        return f"<NumeracionHueco(empresa_id={self.empresa_id}, desde={self.numero_desde}, hasta={self.numero_hasta})>"
@@ -2,9 +2,9 @@
 Modelo SQLAlchemy para Producto
 """
 
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Numeric
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Index, Numeric
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 
 from app.core.database import Base
 
@@ -12,6 +12,15 @@ from app.core.database import Base
 class Producto(Base):
     """Modelo de Producto con códigos UNSPSC"""
     __tablename__ = "productos"
+    __table_args__ = (
+        # Paginación por cursor (id) dentro de la empresa
+        Index("ix_productos_empresa_activo_id", "empresa_id", "activo", "id"),
+        # Un solo producto activo por código en cada empresa
+        Index(
+            "uq_productos_empresa_codigo_activo", "empresa_id", "codigo",
+            unique=True, postgresql_where=text("activo")
+        ),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     empresa_id = Column(Integer, ForeignKey("empresas.id"), nullable=False)
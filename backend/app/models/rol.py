@@ -2,9 +2,9 @@
 Modelo SQLAlchemy para Rol
 """
 
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Table, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Table, ForeignKey, Index
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 
 from app.core.database import Base
 
@@ -56,13 +56,24 @@ class Permiso(Base):
 class Sesion(Base):
     """Modelo de Sesión"""
     __tablename__ = "sesiones"
+    __table_args__ = (
+        # La sincronización de revocaciones solo lee sesiones revocadas
+        Index("ix_sesiones_revocada_en", "revocada_en", postgresql_where=text("revocada_en IS NOT NULL")),
+        Index("uq_sesiones_refresh_hash", "refresh_hash", unique=True),
+        Index("ix_sesiones_familia", "familia"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     usuario_id = Column(Integer, ForeignKey("usuarios.id", ondelete="CASCADE"), nullable=False)
-    token = Column(String(255), unique=True, nullable=False)
+    token = Column(String(255), unique=True, nullable=False)  # Claim jti del token de acceso
     ip_address = Column(String, nullable=True)  # INET type for PostgreSQL
     user_agent = Column(String, nullable=True)
     fecha_expiracion = Column(DateTime, nullable=False)
+    revocada_en = Column(DateTime, nullable=True)  # Logout o revocación administrativa
+    refresh_hash = Column(String(64), nullable=True)  # SHA-256 del refresh token
+    refresh_expiracion = Column(DateTime, nullable=True)
+    familia = Column(String(32), nullable=True)  # jti de la primera sesión de la cadena de rotaciones
+    rotada_en = Column(DateTime, nullable=True)  # Uso del refresh token (solo se acepta una vez)
     created_at = Column(DateTime, server_default=func.now())
     
     # Relationships
@@ -9,7 +9,8 @@ from .producto import Producto, ProductoCreate, ProductoUpdate, ProductoList
 from .factura import (
     Factura, FacturaCreate, FacturaUpdate, FacturaList,
     FacturaDetalle, FacturaDetalleCreate,
-    FacturaImpuesto
+    FacturaImpuesto,
+    FacturaBatchCreate, FacturaBatchResultado, FacturaBatchResponse
 )
 
 __all__ = [
@@ -33,5 +34,8 @@ __all__ = [
     "FacturaList",
     "FacturaDetalle",
     "FacturaDetalleCreate",
-    "FacturaImpuesto"
+    "FacturaImpuesto",
+    "FacturaBatchCreate",
+    "FacturaBatchResultado",
+    "FacturaBatchResponse"
 ]
\ No newline at end of file
@@ -10,9 +10,16 @@ class Token(BaseModel):
     """Schema para respuesta de token"""
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None  # Segundos de vida del access token
     user: dict
 
 
+class RefreshRequest(BaseModel):
+    """Schema para renovar el access token"""
+    refresh_token: str
+
+
 class TokenData(BaseModel):
     """Schema para datos del token"""
     email: Optional[str] = None
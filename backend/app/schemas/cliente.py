@@ -5,6 +5,7 @@ Schemas Pydantic para Cliente
 from datetime import datetime
 from typing import Optional
 from pydantic import BaseModel, Field, EmailStr
+from typing_extensions import TypedDict
 
 
 class ClienteBase(BaseModel):
@@ -88,4 +89,16 @@ class ClienteList(BaseModel):
     activo: bool
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class ClienteListFila(TypedDict):
+    """Fila de la consulta proyectada del listado (mismos campos que ClienteList)"""
+    id: int
+    tipo_documento: str
+    numero_documento: str
+    nombre_completo: str
+    email: Optional[str]
+    telefono: Optional[str]
+    ciudad: str
+    activo: bool
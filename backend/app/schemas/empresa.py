@@ -34,7 +34,7 @@ class EmpresaBase(BaseModel):
 
 class EmpresaCreate(EmpresaBase):
     """Schema para crear empresa"""
-    pass
+    clave_tecnica: Optional[str] = Field(None, max_length=100, description="Clave técnica de la resolución DIAN")
 
 
 class EmpresaUpdate(BaseModel):
@@ -52,6 +52,7 @@ class EmpresaUpdate(BaseModel):
     ambiente_dian: Optional[str] = Field(None, pattern="^(PRUEBAS|PRODUCCION)$")
     prefijo_factura: Optional[str] = Field(None, max_length=10)
     resolucion_dian: Optional[str] = Field(None, max_length=50)
+    clave_tecnica: Optional[str] = Field(None, max_length=100)
     fecha_resolucion: Optional[date] = None
     rango_autorizado_desde: Optional[int] = Field(None, ge=1)
     rango_autorizado_hasta: Optional[int] = Field(None, ge=1)
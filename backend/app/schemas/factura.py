@@ -2,10 +2,11 @@
 Schemas Pydantic para Factura
 """
 
-from datetime import date, datetime
+from datetime import date, datetime, time
 from decimal import Decimal
 from typing import List, Optional
 from pydantic import BaseModel, Field
+from typing_extensions import TypedDict
 
 
 class FacturaDetalleBase(BaseModel):
@@ -76,7 +77,7 @@ class FacturaUpdate(BaseModel):
     fecha_vencimiento: Optional[date] = None
     observaciones: Optional[str] = None
     notas: Optional[str] = None
-    estado_dian: Optional[str] = Field(None, pattern="^(BORRADOR|EMITIDA|ACEPTADA|RECHAZADA|ANULADA)$")
+    estado_dian: Optional[str] = Field(None, pattern="^(BORRADOR|EMITIDA|CONTINGENCIA|ACEPTADA|RECHAZADA|ANULADA)$")
 
 
 class Factura(FacturaBase):
@@ -86,6 +87,7 @@ class Factura(FacturaBase):
     prefijo: Optional[str]
     numero: int
     numero_completo: str
+    hora_emision: Optional[time] = None
     cufe: Optional[str]
     qr_code: Optional[str]
     estado_dian: str
@@ -122,4 +124,38 @@ class FacturaList(BaseModel):
     activo: bool
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class FacturaListFila(TypedDict):
+    """Fila de la consulta proyectada del listado (mismos campos que FacturaList)"""
+    id: int
+    numero_completo: str
+    fecha_emision: date
+    cliente_nombre: str
+    estado_dian: str
+    total_factura: Decimal
+    activo: bool
+
+
+class FacturaBatchCreate(BaseModel):
+    """Schema para crear facturas en lote"""
+    facturas: List[FacturaCreate] = Field(..., min_length=1, description="Facturas a crear")
+
+
+class FacturaBatchResultado(BaseModel):
+    """Resultado de una factura dentro del lote"""
+    indice: int = Field(..., description="Posición de la factura en el lote")
+    creada: bool
+    factura_id: Optional[int] = None
+    numero_completo: Optional[str] = None
+    total_factura: Optional[Decimal] = None
+    error: Optional[str] = None
+
+
+class FacturaBatchResponse(BaseModel):
+    """Schema de respuesta para creación de facturas en lote"""
+    total: int
+    creadas: int
+    fallidas: int
+    resultados: List[FacturaBatchResultado]
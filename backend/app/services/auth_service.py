@@ -2,18 +2,19 @@
 Servicio de autenticación
 """
 
+import time
+import uuid
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session, make_transient_to_detached
 
 from app.core.config import settings
 from app.models.usuario import Usuario
-
-# Configurar contexto de hash de contraseñas
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from app.services.password_service import obtener_password_service, pwd_context
 
 
 class AuthService:
@@ -23,11 +24,11 @@ class AuthService:
         self.db = db
     
     def verify_password(self, plain_password: str, hashed_password: str) -> bool:
-        """Verificar contraseña"""
+        """Verificar contraseña (bloqueante: en handlers async usar PasswordService)"""
         return pwd_context.verify(plain_password, hashed_password)
     
     def get_password_hash(self, password: str) -> str:
-        """Generar hash de contraseña"""
+        """Generar hash de contraseña (bloqueante: en handlers async usar PasswordService)"""
         return pwd_context.hash(password)
     
     async def get_user_by_email(self, email: str) -> Optional[Usuario]:
@@ -42,13 +43,14 @@ class AuthService:
         user = await self.get_user_by_email(email)
         if not user:
             return None
-        if not self.verify_password(password, user.password_hash):
+        if not await obtener_password_service().verificar(password, user.password_hash):
             return None
         return user
     
     def create_access_token(self, data: dict, expires_delta: Optional[timedelta] = None):
-        """Crear token de acceso JWT"""
+        """Crear token de acceso JWT (con claim jti para poder revocarlo)"""
         to_encode = data.copy()
+        to_encode.setdefault("jti", uuid.uuid4().hex)
         if expires_delta:
             expire = datetime.utcnow() + expires_delta
         else:
@@ -58,13 +60,113 @@ class AuthService:
         encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
         return encoded_jwt
     
-    def verify_token(self, token: str) -> Optional[str]:
-        """Verificar token JWT"""
+    @staticmethod
+    def decode_token(token: str) -> Optional[dict]:
+        """Claims de un token JWT válido y no vencido"""
         try:
             payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-            email: str = payload.get("sub")
-            if email is None:
-                return None
-            return email
         except JWTError:
-            return None
\ No newline at end of file
+            return None
+        if payload.get("sub") is None:
+            return None
+        return payload
+    
+    def verify_token(self, token: str) -> Optional[str]:
+        """Verificar token JWT"""
+        payload = self.decode_token(token)
+        return payload["sub"] if payload is not None else None
+
+
+class CachePrincipales:
+    """
+    Usuarios autenticados por subject del token (email), con TTL y límite LRU
+
+    Guarda copias desacopladas de la sesión con solo las columnas del
+    usuario: quien las reciba no debe cargar sus relaciones. El TTL acota
+    cuánto tarda otro proceso en ver un cambio hecho fuera de él.
+    """
+
+    def __init__(self, ttl: float, max_entradas: int):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self._entradas: "OrderedDict[str, Tuple[float, Usuario]]" = OrderedDict()
+        self._aciertos = 0
+        self._fallos = 0
+        self._expirados = 0
+        self._invalidaciones = 0
+
+    def obtener(self, email: str) -> Optional[Usuario]:
+        """Usuario vigente en caché, o None"""
+        entrada = self._entradas.get(email)
+        if entrada is None:
+            self._fallos += 1
+            return None
+        vence, usuario = entrada
+        if vence <= time.monotonic():
+            del self._entradas[email]
+            self._expirados += 1
+            self._fallos += 1
+            return None
+        self._entradas.move_to_end(email)
+        self._aciertos += 1
+        return usuario
+
+    def guardar(self, usuario: Usuario) -> None:
+        """Guardar una copia del usuario (activo) recién consultado"""
+        columnas = {atributo.key: getattr(usuario, atributo.key) for atributo in inspect(Usuario).column_attrs}
+        copia = Usuario(**columnas)
+        make_transient_to_detached(copia)
+        self._entradas[usuario.email] = (time.monotonic() + self.ttl, copia)
+        self._entradas.move_to_end(usuario.email)
+        while len(self._entradas) > self.max_entradas:
+            self._entradas.popitem(last=False)
+
+    def invalidar(self, email: Optional[str] = None) -> None:
+        """Descartar un usuario, o toda la caché si no se indica"""
+        if email is None:
+            self._entradas.clear()
+        else:
+            self._entradas.pop(email, None)
+        self._invalidaciones += 1
+
+    def metricas(self) -> dict:
+        consultas = self._aciertos + self._fallos
+        return {
+            "entradas": len(self._entradas),
+            "max_entradas": self.max_entradas,
+            "ttl": self.ttl,
+            "aciertos": self._aciertos,
+            "fallos": self._fallos,
+            "expirados": self._expirados,
+            "tasa_aciertos": round(self._aciertos / consultas, 4) if consultas else None,
+            "invalidaciones": self._invalidaciones,
+        }
+
+
+cache_principales = CachePrincipales(settings.AUTH_CACHE_TTL, settings.AUTH_CACHE_MAX_ENTRADAS)
+
+# Cambios que invalidan el usuario cacheado
+ATRIBUTOS_PRINCIPAL = ("activo", "rol_id", "empresa_id", "email", "password_hash")
+
+
+@event.listens_for(Usuario, "after_update")
+def _invalidar_usuario_actualizado(mapper, connection, usuario: Usuario) -> None:
+    estado = inspect(usuario)
+    if any(estado.attrs[atributo].history.has_changes() for atributo in ATRIBUTOS_PRINCIPAL):
+        cache_principales.invalidar(usuario.email)
+        for email_anterior in estado.attrs.email.history.deleted:
+            cache_principales.invalidar(email_anterior)
+
+
+@event.listens_for(Usuario, "after_delete")
+def _invalidar_usuario_eliminado(mapper, connection, usuario: Usuario) -> None:
+    cache_principales.invalidar(usuario.email)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _invalidar_actualizacion_masiva(orm_execute_state) -> None:
+    # update()/delete() sobre usuarios no pasan por los eventos del mapper
+    # y no se sabe qué filas tocan: se vacía la caché
+    if (orm_execute_state.is_update or orm_execute_state.is_delete) \
+            and orm_execute_state.bind_mapper is inspect(Usuario):
+        cache_principales.invalidar()
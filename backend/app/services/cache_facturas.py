@@ -0,0 +1,244 @@
+"""
+Caché de respuestas de facturas finalizadas: JSON preserializado, LRU en memoria y almacén compartido opcional
+"""
+
+import asyncio
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from loguru import logger
+
+from app.core.config import settings
+
+# Estados cuya única transición posible es la anulación. EMITIDA y
+# CONTINGENCIA no se cachean: la cola de envíos aún las pasa a ACEPTADA/RECHAZADA
+ESTADOS_CACHEABLES = ("ACEPTADA", "RECHAZADA", "ANULADA")
+
+# Canal de Redis por el que los procesos se avisan las invalidaciones
+CANAL_INVALIDACIONES = "facturas:cache:invalidaciones"
+
+
+def calcular_etag(cuerpo: bytes) -> str:
+    """ETag fuerte: hash del cuerpo exacto de la respuesta"""
+    return f'"{hashlib.sha256(cuerpo).hexdigest()[:32]}"'
+
+
+def etag_coincide(if_none_match: Optional[str], etag: str) -> bool:
+    """Evaluar el header If-None-Match contra el ETag de la respuesta"""
+    if not if_none_match:
+        return False
+    candidatos = [valor.strip() for valor in if_none_match.split(",")]
+    return "*" in candidatos or etag in candidatos
+
+
+@dataclass(frozen=True)
+class EntradaFactura:
+    """Respuesta cacheada de una factura"""
+    empresa_id: int
+    etag: str
+    cuerpo: bytes
+
+    def serializar(self) -> bytes:
+        return f"{self.empresa_id}\n{self.etag}\n".encode() + self.cuerpo
+
+    @classmethod
+    def deserializar(cls, datos: bytes) -> "EntradaFactura":
+        empresa_id, etag, cuerpo = datos.split(b"\n", 2)
+        return cls(int(empresa_id), etag.decode(), cuerpo)
+
+
+class AlmacenRedis:
+    """
+    Almacén compartido entre procesos (requiere el paquete redis)
+
+    Además de guardar las respuestas, publica las invalidaciones para que
+    cada proceso descarte su copia en memoria.
+    """
+
+    def __init__(self, url: str, ttl: int):
+        import redis.asyncio as redis  # Dependencia opcional
+
+        self._redis = redis.from_url(url)
+        self.ttl = ttl
+
+    @staticmethod
+    def _clave(factura_id: int) -> str:
+        return f"facturas:cache:{factura_id}"
+
+    async def obtener(self, factura_id: int) -> Optional[bytes]:
+        return await self._redis.get(self._clave(factura_id))
+
+    async def guardar(self, factura_id: int, datos: bytes) -> None:
+        await self._redis.set(self._clave(factura_id), datos, ex=self.ttl)
+
+    async def eliminar(self, factura_id: int) -> None:
+        await self._redis.delete(self._clave(factura_id))
+        await self._redis.publish(CANAL_INVALIDACIONES, str(factura_id))
+
+    async def escuchar(self, descartar: Callable[[int], None]) -> None:
+        """Descartar localmente las facturas invalidadas por cualquier proceso"""
+        pubsub = self._redis.pubsub()
+        await pubsub.subscribe(CANAL_INVALIDACIONES)
+        try:
+            async for mensaje in pubsub.listen():
+                if mensaje["type"] == "message":
+                    descartar(int(mensaje["data"]))
+        finally:
+            await pubsub.aclose()
+
+    async def cerrar(self) -> None:
+        await self._redis.aclose()
+
+
+class CacheFacturas:
+    """
+    LRU en memoria, limitado en bytes, de las respuestas JSON de facturas finalizadas
+
+    Con un almacén compartido, los fallos locales se consultan allí antes de
+    ir a la base de datos y las invalidaciones llegan a todos los procesos.
+    """
+
+    def __init__(self, max_bytes: int, almacen: Optional[AlmacenRedis] = None):
+        self.max_bytes = max_bytes
+        self.almacen = almacen
+        self._entradas: "OrderedDict[int, EntradaFactura]" = OrderedDict()
+        self._bytes = 0
+        self._escucha: Optional[asyncio.Task] = None
+        self.generacion = 0  # Crece con cada invalidación
+        self._aciertos = 0
+        self._aciertos_almacen = 0
+        self._fallos = 0
+        self._invalidaciones = 0
+
+    def _poner(self, factura_id: int, entrada: EntradaFactura) -> None:
+        self._descartar(factura_id)
+        self._entradas[factura_id] = entrada
+        self._bytes += len(entrada.cuerpo)
+        while self._bytes > self.max_bytes and len(self._entradas) > 1:
+            _, antigua = self._entradas.popitem(last=False)
+            self._bytes -= len(antigua.cuerpo)
+
+    def _descartar(self, factura_id: int) -> None:
+        entrada = self._entradas.pop(factura_id, None)
+        if entrada is not None:
+            self._bytes -= len(entrada.cuerpo)
+
+    async def obtener(self, factura_id: int, empresa_id: int) -> Optional[EntradaFactura]:
+        """Respuesta cacheada de la factura, si pertenece a la empresa"""
+        entrada = self._entradas.get(factura_id)
+        if entrada is not None:
+            self._entradas.move_to_end(factura_id)
+        elif self.almacen is not None:
+            try:
+                datos = await self.almacen.obtener(factura_id)
+            except Exception as e:
+                logger.warning(f"Caché de facturas: almacén compartido no disponible: {e}")
+                datos = None
+            if datos is not None:
+                entrada = EntradaFactura.deserializar(datos)
+                self._poner(factura_id, entrada)
+                self._aciertos_almacen += 1
+
+        if entrada is None or entrada.empresa_id != empresa_id:
+            self._fallos += 1
+            return None
+        self._aciertos += 1
+        return entrada
+
+    async def guardar(
+        self, factura_id: int, empresa_id: int, cuerpo: bytes, generacion: Optional[int] = None
+    ) -> EntradaFactura:
+        """
+        Guardar la respuesta de una factura finalizada
+
+        Si hubo invalidaciones desde `generacion` (leída antes de consultar la
+        factura), la respuesta puede ser anterior a una anulación y no se guarda.
+        """
+        entrada = EntradaFactura(empresa_id, calcular_etag(cuerpo), cuerpo)
+        if generacion is not None and generacion != self.generacion:
+            return entrada
+        self._poner(factura_id, entrada)
+        if self.almacen is not None:
+            try:
+                await self.almacen.guardar(factura_id, entrada.serializar())
+            except Exception as e:
+                logger.warning(f"Caché de facturas: almacén compartido no disponible: {e}")
+        return entrada
+
+    async def invalidar(self, factura_id: int) -> None:
+        """Descartar la respuesta de la factura en este proceso y en el almacén compartido"""
+        self._invalidar_local(factura_id)
+        if self.almacen is not None:
+            try:
+                await self.almacen.eliminar(factura_id)
+            except Exception as e:
+                logger.error(f"Caché de facturas: no se pudo invalidar la factura {factura_id}: {e}")
+
+    def _invalidar_local(self, factura_id: int) -> None:
+        self._descartar(factura_id)
+        self.generacion += 1
+        self._invalidaciones += 1
+
+    async def _escuchar(self) -> None:
+        while True:
+            try:
+                await self.almacen.escuchar(self._invalidar_local)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Sin el canal no llegan invalidaciones: vaciar lo local antes de reconectar
+                logger.warning(f"Caché de facturas: canal de invalidaciones caído: {e}")
+                self._entradas.clear()
+                self._bytes = 0
+            await asyncio.sleep(1)
+
+    def iniciar(self) -> None:
+        """Escuchar las invalidaciones de los demás procesos"""
+        if self.almacen is not None and self._escucha is None:
+            self._escucha = asyncio.create_task(self._escuchar())
+
+    async def cerrar(self) -> None:
+        if self._escucha is not None:
+            self._escucha.cancel()
+            await asyncio.gather(self._escucha, return_exceptions=True)
+            self._escucha = None
+        if self.almacen is not None:
+            await self.almacen.cerrar()
+
+    def metricas(self) -> dict:
+        consultas = self._aciertos + self._fallos
+        return {
+            "entradas": len(self._entradas),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "almacen_compartido": self.almacen is not None,
+            "aciertos": self._aciertos,
+            "aciertos_almacen": self._aciertos_almacen,
+            "fallos": self._fallos,
+            "tasa_aciertos": round(self._aciertos / consultas, 4) if consultas else None,
+            "invalidaciones": self._invalidaciones,
+        }
+
+
+_cache_facturas: Optional[CacheFacturas] = None
+
+
+def obtener_cache_facturas() -> CacheFacturas:
+    """Caché de facturas del proceso"""
+    global _cache_facturas
+    if _cache_facturas is None:
+        almacen = None
+        if settings.FACTURAS_CACHE_REDIS_URL:
+            almacen = AlmacenRedis(settings.FACTURAS_CACHE_REDIS_URL, settings.FACTURAS_CACHE_TTL)
+        _cache_facturas = CacheFacturas(settings.FACTURAS_CACHE_MAX_MB * 1024 * 1024, almacen)
+    return _cache_facturas
+
+
+async def cerrar_cache_facturas() -> None:
+    """Dejar de escuchar invalidaciones y cerrar el almacén compartido"""
+    global _cache_facturas
+    if _cache_facturas is not None:
+        await _cache_facturas.cerrar()
+        _cache_facturas = None
@@ -0,0 +1,333 @@
+"""
+Cola persistente de envíos de facturas al web service de la DIAN
+"""
+
+import asyncio
+import random
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence
+
+from loguru import logger
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models import Empresa, EnvioDian, Factura
+from app.services.contingencia_service import ContingenciaDian, obtener_contingencia
+from app.services.dian_client import DianClient, DianError, RespuestaDocumento, comprimir
+from app.services.documentos_service import TIPO_XML, DocumentosService
+
+# Envíos que un worker puede tomar (EN_PROCESO solo cuando venció el lease)
+ESTADOS_ACTIVOS = ("PENDIENTE", "EN_PROCESO")
+
+# Resultados de un envío
+ACEPTADA = "ACEPTADA"
+RECHAZADA = "RECHAZADA"
+CONSULTAR = "CONSULTAR"  # ZIP en validación: consultar el track_id más tarde
+REINTENTAR = "REINTENTAR"  # Error transitorio
+DESCARTAR = "DESCARTAR"  # La factura ya no está emitida
+
+
+@dataclass
+class EnvioPendiente:
+    """Envío reclamado por un worker junto con el documento a enviar"""
+    envio_id: int
+    factura_id: int
+    empresa_id: int
+    intentos: int
+    track_id: Optional[str]
+    nit: str
+    cufe: str
+    xml: str
+
+
+@dataclass
+class ResultadoEnvio:
+    """Resultado de procesar un envío"""
+    envio_id: int
+    factura_id: int
+    resultado: str
+    respuesta: Optional[str] = None
+    track_id: Optional[str] = None
+
+
+def calcular_espera(intentos: int, base: float, maximo: float) -> float:
+    """Backoff exponencial con jitter: entre la mitad y el total de base·2^(n-1)"""
+    return min(maximo, base * 2 ** max(intentos - 1, 0)) * random.uniform(0.5, 1.0)
+
+
+def nombre_zip(envio: EnvioPendiente) -> str:
+    return f"z{envio.nit}{envio.envio_id:010d}.zip"
+
+
+def nombre_xml(envio: EnvioPendiente) -> str:
+    return f"fv{envio.nit}{envio.factura_id:010d}.xml"
+
+
+def _resultado(envio: EnvioPendiente, respuesta: RespuestaDocumento, track_id: Optional[str] = None) -> ResultadoEnvio:
+    if respuesta.en_proceso:
+        return ResultadoEnvio(envio.envio_id, envio.factura_id, CONSULTAR, respuesta.mensaje, track_id)
+    return ResultadoEnvio(
+        envio.envio_id, envio.factura_id,
+        ACEPTADA if respuesta.valido else RECHAZADA,
+        respuesta.mensaje, track_id
+    )
+
+
+async def enviar(cliente: DianClient, envios: Sequence[EnvioPendiente], lote: int) -> List[ResultadoEnvio]:
+    """
+    Enviar a la DIAN los documentos reclamados
+
+    Los envíos con track_id solo consultan el estado del ZIP ya enviado. El
+    resto se agrupa por empresa en ZIP de hasta `lote` documentos: uno solo
+    va por SendBillSync y varios por SendBillAsync, cuyo resultado se consulta
+    en un intento posterior. Un DianError marca todo el grupo para reintento.
+    """
+    resultados: List[ResultadoEnvio] = []
+    por_track: Dict[str, List[EnvioPendiente]] = defaultdict(list)
+    por_empresa: Dict[int, List[EnvioPendiente]] = defaultdict(list)
+    for envio in envios:
+        if envio.track_id:
+            por_track[envio.track_id].append(envio)
+        else:
+            por_empresa[envio.empresa_id].append(envio)
+
+    async def consultar(track_id: str, grupo: List[EnvioPendiente]) -> List[ResultadoEnvio]:
+        try:
+            respuestas = {r.cufe: r for r in await cliente.get_status_zip(track_id)}
+        except DianError as e:
+            return [ResultadoEnvio(envio.envio_id, envio.factura_id, REINTENTAR, str(e), track_id) for envio in grupo]
+        salida = []
+        for envio in grupo:
+            respuesta = respuestas.get(envio.cufe)
+            if respuesta is None:
+                salida.append(ResultadoEnvio(envio.envio_id, envio.factura_id, CONSULTAR, None, track_id))
+            else:
+                salida.append(_resultado(envio, respuesta, track_id))
+        return salida
+
+    async def enviar_grupo(grupo: List[EnvioPendiente]) -> List[ResultadoEnvio]:
+        contenido = comprimir([(nombre_xml(envio), envio.xml) for envio in grupo])
+        try:
+            if len(grupo) == 1:
+                return [_resultado(grupo[0], await cliente.send_bill_sync(nombre_zip(grupo[0]), contenido))]
+            track_id = await cliente.send_bill_async(nombre_zip(grupo[0]), contenido)
+        except DianError as e:
+            return [ResultadoEnvio(envio.envio_id, envio.factura_id, REINTENTAR, str(e)) for envio in grupo]
+        return [ResultadoEnvio(envio.envio_id, envio.factura_id, CONSULTAR, None, track_id) for envio in grupo]
+
+    tareas = [consultar(track_id, grupo) for track_id, grupo in por_track.items()]
+    for grupo in por_empresa.values():
+        tareas.extend(enviar_grupo(grupo[i:i + lote]) for i in range(0, len(grupo), lote))
+
+    for parcial in await asyncio.gather(*tareas):
+        resultados.extend(parcial)
+    return resultados
+
+
+def encolar_envio(db: AsyncSession, factura: Factura) -> EnvioDian:
+    """Registrar el envío de una factura emitida en la misma transacción que la emisión"""
+    envio = EnvioDian(empresa_id=factura.empresa_id, factura_id=factura.id)
+    db.add(envio)
+    return envio
+
+
+class ColaDian:
+    """
+    Workers que vacían la tabla envios_dian
+
+    Cada worker reclama envíos con FOR UPDATE SKIP LOCKED y les asigna un
+    lease (proximo_intento); si el proceso muere, otro worker los retoma al
+    vencer. La tabla es la cola: nada se pierde al reiniciar.
+    """
+
+    def __init__(
+        self,
+        cliente: DianClient,
+        session_factory: async_sessionmaker = AsyncSessionLocal,
+        workers: Optional[int] = None,
+        lote: Optional[int] = None,
+        max_intentos: Optional[int] = None,
+        contingencia: Optional[ContingenciaDian] = None,
+    ):
+        self.cliente = cliente
+        self.session_factory = session_factory
+        self.workers = workers or settings.DIAN_ENVIO_WORKERS
+        self.lote = lote or settings.DIAN_ENVIO_LOTE
+        self.max_intentos = max_intentos or settings.DIAN_ENVIO_MAX_INTENTOS
+        self.contingencia = contingencia
+        self._tareas: List[asyncio.Task] = []
+        self._contadores: Dict[str, int] = defaultdict(int)
+
+    async def reclamar(self, db: AsyncSession, limite: int):
+        """Tomar hasta `limite` envíos vencidos; retorna (envíos, hora de la base de datos)"""
+        candidatos = (
+            select(EnvioDian.id)
+            .where(EnvioDian.estado.in_(ESTADOS_ACTIVOS), EnvioDian.proximo_intento <= func.localtimestamp())
+            .order_by(EnvioDian.proximo_intento)
+            .limit(limite)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        stmt = (
+            update(EnvioDian)
+            .where(EnvioDian.id.in_(candidatos))
+            .values(
+                estado="EN_PROCESO",
+                proximo_intento=func.localtimestamp() + timedelta(seconds=settings.DIAN_ENVIO_LEASE),
+            )
+            .returning(
+                EnvioDian.id, EnvioDian.factura_id, EnvioDian.empresa_id,
+                EnvioDian.intentos, EnvioDian.track_id, func.localtimestamp()
+            )
+            .execution_options(synchronize_session=False)
+        )
+        reclamados = (await db.execute(stmt)).all()
+        if not reclamados:
+            return [], None
+
+        facturas = {
+            fila.id: fila for fila in (await db.execute(
+                select(Factura.id, Factura.cufe, Empresa.nit)
+                .join(Empresa, Factura.empresa_id == Empresa.id)
+                .where(Factura.id.in_([r.factura_id for r in reclamados]), Factura.estado_dian == "EMITIDA")
+            )).all()
+        }
+        xmls = await DocumentosService(db).obtener_lote(facturas, TIPO_XML)
+        envios = []
+        for envio_id, factura_id, empresa_id, intentos, track_id, _ in reclamados:
+            factura = facturas.get(factura_id)
+            xml = xmls.get(factura_id)
+            envios.append(EnvioPendiente(
+                envio_id, factura_id, empresa_id, intentos, track_id,
+                nit=factura.nit.split("-")[0] if factura else "",
+                cufe=factura.cufe if factura else "",
+                xml=xml.decode("utf-8") if factura and xml else "",
+            ))
+        return envios, reclamados[0][-1]
+
+    async def registrar(
+        self,
+        db: AsyncSession,
+        envios: Sequence[EnvioPendiente],
+        resultados: Sequence[ResultadoEnvio],
+        ahora: datetime
+    ) -> None:
+        """Guardar el resultado de cada envío y actualizar estado_dian de las facturas"""
+        intentos = {envio.envio_id: envio.intentos for envio in envios}
+        filas = []
+        facturas: Dict[str, List[int]] = defaultdict(list)
+        for r in resultados:
+            self._contadores[r.resultado.lower()] += 1
+            fila = {"id": r.envio_id, "respuesta": r.respuesta, "track_id": r.track_id}
+            if r.resultado in (ACEPTADA, RECHAZADA):
+                fila["estado"] = r.resultado
+                facturas[r.resultado].append(r.factura_id)
+            elif r.resultado == DESCARTAR:
+                fila.update(estado="ERROR", respuesta="La factura ya no está emitida")
+            elif r.resultado == CONSULTAR:
+                fila.update(estado="PENDIENTE", proximo_intento=ahora + timedelta(seconds=settings.DIAN_ENVIO_BACKOFF_BASE))
+            else:
+                n = intentos[r.envio_id] + 1
+                fila["intentos"] = n
+                if n >= self.max_intentos:
+                    fila["estado"] = "ERROR"
+                    logger.error(f"Envío DIAN de la factura {r.factura_id} agotó {n} intentos: {r.respuesta}")
+                else:
+                    espera = calcular_espera(n, settings.DIAN_ENVIO_BACKOFF_BASE, settings.DIAN_ENVIO_BACKOFF_MAX)
+                    fila.update(estado="PENDIENTE", proximo_intento=ahora + timedelta(seconds=espera))
+            filas.append(fila)
+
+        # UPDATE por clave primaria en lote (executemany)
+        await db.execute(update(EnvioDian), filas)
+        for estado, ids in facturas.items():
+            # Una factura anulada mientras estaba en cola conserva su estado
+            await db.execute(
+                update(Factura)
+                .where(Factura.id.in_(ids), Factura.estado_dian == "EMITIDA")
+                .values(estado_dian=estado)
+                .execution_options(synchronize_session=False)
+            )
+
+    async def procesar_lote(self) -> int:
+        """Reclamar, enviar y registrar un lote; retorna cuántos envíos se procesaron"""
+        # El reclamo se confirma antes de llamar a la DIAN para no mantener
+        # bloqueos ni una transacción abierta durante la llamada de red
+        async with self.session_factory() as db:
+            envios, ahora = await self.reclamar(db, self.lote)
+            await db.commit()
+        if not envios:
+            return 0
+
+        vigentes = [envio for envio in envios if envio.xml]
+        resultados = await enviar(self.cliente, vigentes, self.lote)
+        if self.contingencia is not None and resultados:
+            self.contingencia.reportar(any(r.resultado != REINTENTAR for r in resultados))
+        resultados.extend(
+            ResultadoEnvio(envio.envio_id, envio.factura_id, DESCARTAR) for envio in envios if not envio.xml
+        )
+
+        async with self.session_factory() as db:
+            await self.registrar(db, envios, resultados, ahora)
+            await db.commit()
+        return len(envios)
+
+    async def _worker(self, numero: int) -> None:
+        while True:
+            try:
+                procesados = await self.procesar_lote()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception(f"Worker DIAN {numero}: {e}")
+                procesados = 0
+            if not procesados:
+                await asyncio.sleep(settings.DIAN_ENVIO_INTERVALO)
+
+    def iniciar(self) -> None:
+        """Arrancar los workers en el event loop actual"""
+        if not self._tareas:
+            self._tareas = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def detener(self) -> None:
+        """Detener los workers y cerrar las conexiones HTTP"""
+        for tarea in self._tareas:
+            tarea.cancel()
+        await asyncio.gather(*self._tareas, return_exceptions=True)
+        self._tareas = []
+        await self.cliente.cerrar()
+
+    def metricas(self) -> dict:
+        """Resultados acumulados por este proceso"""
+        return {
+            "workers": len(self._tareas),
+            "lote": self.lote,
+            **{nombre: self._contadores[nombre] for nombre in ("aceptada", "rechazada", "consultar", "reintentar", "descartar")},
+        }
+
+
+_cola_dian: Optional[ColaDian] = None
+
+
+def obtener_cola_dian() -> Optional[ColaDian]:
+    """Cola de envíos del proceso, o None si DIAN_WSDL_URL no está configurada"""
+    global _cola_dian
+    if _cola_dian is None and settings.DIAN_WSDL_URL:
+        cliente = DianClient(
+            settings.DIAN_WSDL_URL,
+            timeout=settings.DIAN_ENVIO_TIMEOUT,
+            max_conexiones=settings.DIAN_ENVIO_WORKERS * 2,
+        )
+        _cola_dian = ColaDian(cliente, contingencia=obtener_contingencia())
+    return _cola_dian
+
+
+async def cerrar_cola_dian() -> None:
+    """Detener los workers de envío"""
+    global _cola_dian
+    if _cola_dian is not None:
+        await _cola_dian.detener()
+        _cola_dian = None
@@ -0,0 +1,353 @@
+"""
+Modo de contingencia DIAN: journal local de emisiones y reproducción hacia la cola de envíos
+"""
+
+import asyncio
+import fcntl
+import json
+import os
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models import EnvioDian, Factura
+
+# Filas por INSERT al reproducir el journal
+TAMANO_BLOQUE_REPRODUCCION = 1000
+
+
+class JournalContingencia:
+    """
+    Archivo append-only de emisiones en contingencia (una línea JSON por factura)
+
+    agregar() retorna cuando el registro está en disco (fsync). Las escrituras
+    concurrentes se agrupan en un solo fsync (group commit) desde una tarea
+    escritora. El avance de la reproducción se guarda en `<ruta>.offset`; una
+    línea final incompleta (caída durante la escritura) se ignora.
+
+    Todos los workers comparten el archivo, así que además del lock del
+    proceso se toman locks de archivo (flock): las escrituras comparten
+    `<ruta>.lock` y la compactación lo toma en exclusiva, de modo que nunca
+    trunca un registro ya confirmado; `<ruta>.reproduccion.lock` deja una
+    sola reproducción en curso entre todos los procesos.
+    """
+
+    def __init__(self, ruta: str):
+        self.ruta = Path(ruta)
+        self.ruta_offset = Path(f"{ruta}.offset")
+        self.ruta_lock = Path(f"{ruta}.lock")
+        self.ruta_lock_reproduccion = Path(f"{ruta}.reproduccion.lock")
+        self._lock = threading.Lock()
+        self._cola: Optional[asyncio.Queue] = None
+        self._escritor: Optional[asyncio.Task] = None
+        self._archivo = None
+
+    @contextmanager
+    def _flock(self, ruta: Path, modo: int) -> Iterator[None]:
+        """Lock de archivo entre procesos; se libera al cerrar el descriptor"""
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        with open(ruta, "ab") as archivo:
+            fcntl.flock(archivo.fileno(), modo)
+            yield
+
+    @contextmanager
+    def reproduccion(self) -> Iterator[bool]:
+        """Tomar la reproducción sin esperar; False si otro proceso la tiene"""
+        self.ruta_lock_reproduccion.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.ruta_lock_reproduccion, "ab") as archivo:
+            try:
+                fcntl.flock(archivo.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            yield True
+
+    def _escribir(self, lineas: List[bytes]) -> None:
+        with self._lock, self._flock(self.ruta_lock, fcntl.LOCK_SH):
+            if self._archivo is None:
+                self.ruta.parent.mkdir(parents=True, exist_ok=True)
+                self._archivo = open(self.ruta, "ab")
+            self._archivo.write(b"".join(lineas))
+            self._archivo.flush()
+            os.fsync(self._archivo.fileno())
+
+    async def _escribir_pendientes(self) -> None:
+        while True:
+            lote = [await self._cola.get()]
+            while not self._cola.empty():
+                lote.append(self._cola.get_nowait())
+            try:
+                await asyncio.to_thread(self._escribir, [linea for linea, _ in lote])
+            except Exception as e:
+                for _, futuro in lote:
+                    if not futuro.done():
+                        futuro.set_exception(e)
+            else:
+                for _, futuro in lote:
+                    if not futuro.done():
+                        futuro.set_result(None)
+
+    async def agregar(self, registro: dict) -> None:
+        """Añadir un registro y esperar a que esté persistido"""
+        if self._escritor is None or self._escritor.done():
+            self._cola = asyncio.Queue()
+            self._escritor = asyncio.create_task(self._escribir_pendientes())
+        futuro = asyncio.get_running_loop().create_future()
+        linea = json.dumps(registro, separators=(",", ":"), default=str).encode("utf-8") + b"\n"
+        await self._cola.put((linea, futuro))
+        await futuro
+
+    def offset(self) -> int:
+        """Bytes del journal ya reproducidos"""
+        try:
+            return int(self.ruta_offset.read_text() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def guardar_offset(self, offset: int) -> None:
+        """Persistir el avance de forma atómica"""
+        temporal = self.ruta_offset.with_suffix(".tmp")
+        with open(temporal, "w") as archivo:
+            archivo.write(str(offset))
+            archivo.flush()
+            os.fsync(archivo.fileno())
+        os.replace(temporal, self.ruta_offset)
+
+    def leer(self, desde: int = 0) -> Iterator[Tuple[int, dict]]:
+        """Registros completos desde `desde`, con el offset en que termina cada uno"""
+        if not self.ruta.exists():
+            return
+        with open(self.ruta, "rb") as archivo:
+            archivo.seek(desde)
+            offset = desde
+            for linea in archivo:
+                if not linea.endswith(b"\n"):
+                    break
+                offset += len(linea)
+                yield offset, json.loads(linea)
+
+    def pendientes(self) -> int:
+        """Bytes del journal aún sin reproducir"""
+        tamano = self.ruta.stat().st_size if self.ruta.exists() else 0
+        return max(tamano - self.offset(), 0)
+
+    def compactar(self) -> bool:
+        """
+        Vaciar el journal si ya se reprodujo completo
+
+        Solo desde la reproducción en curso, que es la única que mueve el offset
+        """
+        with self._lock, self._flock(self.ruta_lock, fcntl.LOCK_EX):
+            tamano = self.ruta.stat().st_size if self.ruta.exists() else 0
+            if tamano == 0 or self.offset() < tamano:
+                return False
+            with open(self.ruta, "r+b") as archivo:
+                archivo.truncate(0)
+                os.fsync(archivo.fileno())
+            self.guardar_offset(0)
+            return True
+
+    async def cerrar(self) -> None:
+        """Esperar las escrituras en curso y cerrar el archivo"""
+        if self._escritor is not None:
+            while not self._cola.empty():
+                await asyncio.sleep(0.001)
+            self._escritor.cancel()
+            await asyncio.gather(self._escritor, return_exceptions=True)
+            self._escritor = None
+        with self._lock:
+            if self._archivo is not None:
+                self._archivo.close()
+                self._archivo = None
+
+
+class ContingenciaDian:
+    """
+    Estado de contingencia y reproducción del journal
+
+    La contingencia se activa por configuración (DIAN_CONTINGENCIA_FORZADA) o
+    automáticamente tras DIAN_CONTINGENCIA_FALLOS envíos seguidos sin
+    respuesta de la DIAN. Mientras está activa, las facturas se emiten en
+    estado CONTINGENCIA y se registran en el journal en lugar de la cola.
+    """
+
+    def __init__(
+        self,
+        journal: JournalContingencia,
+        forzada: bool = False,
+        max_fallos: int = 5,
+        session_factory: async_sessionmaker = AsyncSessionLocal
+    ):
+        self.journal = journal
+        self.forzada = forzada
+        self.max_fallos = max_fallos
+        self.session_factory = session_factory
+        self._automatica = False
+        self._fallos_consecutivos = 0
+        self._tarea: Optional[asyncio.Task] = None
+        self._reproducidas = 0
+
+    @property
+    def activa(self) -> bool:
+        return self.forzada or self._automatica
+
+    def reportar(self, alcanzable: bool) -> None:
+        """Registrar si la última llamada a la DIAN obtuvo respuesta"""
+        if alcanzable:
+            self._fallos_consecutivos = 0
+            if self._automatica:
+                logger.info("DIAN disponible de nuevo: fin de la contingencia")
+                self._automatica = False
+            return
+        self._fallos_consecutivos += 1
+        if not self._automatica and self._fallos_consecutivos >= self.max_fallos:
+            logger.warning(f"DIAN sin respuesta en {self._fallos_consecutivos} envíos: modo contingencia")
+            self._automatica = True
+
+    async def registrar_emision(self, factura: Factura) -> None:
+        """Registrar en el journal una factura emitida en contingencia"""
+        await self.journal.agregar({
+            "empresa_id": factura.empresa_id,
+            "factura_id": factura.id,
+            "cufe": factura.cufe,
+        })
+
+    async def reproducir(self) -> int:
+        """
+        Pasar a la cola de envíos las facturas del journal
+
+        Se omiten CUFE repetidos y facturas que ya no están en CONTINGENCIA
+        (anuladas, o encoladas por una reproducción interrumpida). El
+        proximo_intento crece con la posición en el journal, así que los
+        workers toman las facturas de cada empresa en el orden de emisión.
+        Si otro proceso está reproduciendo el journal, no se hace nada.
+        """
+        with self.journal.reproduccion() as propia:
+            if not propia:
+                return 0
+            return await self._reproducir()
+
+    async def _reproducir(self) -> int:
+        registros = list(self.journal.leer(self.journal.offset()))
+        if not registros:
+            self.journal.compactar()
+            return 0
+
+        vistos = set()
+        unicos = []
+        for _, registro in registros:
+            if registro["cufe"] not in vistos:
+                vistos.add(registro["cufe"])
+                unicos.append(registro)
+
+        encoladas = 0
+        async with self.session_factory() as db:
+            result = await db.execute(
+                select(Factura.id).where(
+                    Factura.id.in_([r["factura_id"] for r in unicos]),
+                    Factura.estado_dian == "CONTINGENCIA"
+                )
+            )
+            vigentes = set(result.scalars().all())
+            filas = [
+                {
+                    "empresa_id": r["empresa_id"],
+                    "factura_id": r["factura_id"],
+                    "proximo_intento": func.localtimestamp() + timedelta(microseconds=posicion),
+                }
+                for posicion, r in enumerate(unicos) if r["factura_id"] in vigentes
+            ]
+            for i in range(0, len(filas), TAMANO_BLOQUE_REPRODUCCION):
+                await db.execute(
+                    insert(EnvioDian)
+                    .values(filas[i:i + TAMANO_BLOQUE_REPRODUCCION])
+                    .on_conflict_do_nothing(index_elements=[EnvioDian.factura_id])
+                )
+            if vigentes:
+                await db.execute(
+                    update(Factura)
+                    .where(Factura.id.in_(vigentes), Factura.estado_dian == "CONTINGENCIA")
+                    .values(estado_dian="EMITIDA")
+                    .execution_options(synchronize_session=False)
+                )
+            await db.commit()
+            encoladas = len(filas)
+
+        # El offset se guarda después del commit: si el proceso cae en medio,
+        # la siguiente reproducción repite registros que el ON CONFLICT descarta
+        self.journal.guardar_offset(registros[-1][0])
+        self.journal.compactar()
+        self._reproducidas += encoladas
+        logger.info(f"Journal de contingencia: {encoladas} facturas pasadas a la cola de envíos")
+        return encoladas
+
+    async def _supervisar(self, cliente) -> None:
+        while True:
+            await asyncio.sleep(settings.DIAN_CONTINGENCIA_INTERVALO)
+            try:
+                if self._automatica:
+                    # Sondeo liviano: cualquier respuesta SOAP indica que la DIAN responde
+                    try:
+                        await cliente.get_status_zip("00000000-0000-0000-0000-000000000000")
+                        self.reportar(True)
+                    except Exception:
+                        continue
+                if not self.activa and self.journal.pendientes():
+                    await self.reproducir()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception(f"Reproducción del journal de contingencia: {e}")
+
+    def iniciar(self, cliente) -> None:
+        """Arrancar la supervisión: sondeo de la DIAN y reproducción del journal"""
+        if self._tarea is None:
+            self._tarea = asyncio.create_task(self._supervisar(cliente))
+
+    async def detener(self) -> None:
+        if self._tarea is not None:
+            self._tarea.cancel()
+            await asyncio.gather(self._tarea, return_exceptions=True)
+            self._tarea = None
+        await self.journal.cerrar()
+
+    def metricas(self) -> dict:
+        return {
+            "activa": self.activa,
+            "forzada": self.forzada,
+            "fallos_consecutivos": self._fallos_consecutivos,
+            "journal_bytes_pendientes": self.journal.pendientes(),
+            "reproducidas": self._reproducidas,
+        }
+
+
+_contingencia: Optional[ContingenciaDian] = None
+
+
+def obtener_contingencia() -> ContingenciaDian:
+    """Estado de contingencia del proceso"""
+    global _contingencia
+    if _contingencia is None:
+        _contingencia = ContingenciaDian(
+            JournalContingencia(settings.DIAN_CONTINGENCIA_JOURNAL),
+            forzada=settings.DIAN_CONTINGENCIA_FORZADA,
+            max_fallos=settings.DIAN_CONTINGENCIA_FALLOS,
+        )
+    return _contingencia
+
+
+async def cerrar_contingencia() -> None:
+    """Detener la supervisión y cerrar el journal"""
+    global _contingencia
+    if _contingencia is not None:
+        await _contingencia.detener()
+        _contingencia = None
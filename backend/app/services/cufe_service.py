@@ -0,0 +1,141 @@
+"""
+Generación del CUFE (Código Único de Factura Electrónica) según el anexo técnico DIAN
+"""
+
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+from typing import List, Optional, Sequence
+
+from app.core.config import settings
+from app.models import Cliente, Empresa, Factura
+from app.services.impuestos_service import redondear
+
+# Códigos de tributo DIAN en el orden exigido por la fórmula del CUFE
+CODIGO_IVA = "01"
+CODIGO_INC = "04"
+CODIGO_ICA = "03"
+
+# Hora legal colombiana (UTC-5, sin horario de verano)
+ZONA_HORARIA = "-05:00"
+HORA_COLOMBIA = timezone(timedelta(hours=-5))
+
+# Facturas por tarea enviada a un proceso del pool
+TAMANO_BLOQUE_LOTE = 2000
+
+
+@dataclass(frozen=True)
+class DatosCufe:
+    """Campos de la factura que intervienen en el CUFE"""
+    numero_completo: str
+    fecha_emision: date
+    hora_emision: time
+    subtotal: Decimal
+    total_iva: Decimal
+    total_inc: Decimal
+    total_ica: Decimal
+    total_factura: Decimal
+    nit_emisor: str
+    documento_adquiriente: str
+    clave_tecnica: str
+    ambiente: str  # "1" producción, "2" pruebas
+
+
+def formato_valor(valor: Decimal) -> str:
+    """Valor con dos decimales y punto decimal, sin separador de miles"""
+    return f"{redondear(Decimal(valor)):f}"
+
+
+def codigo_ambiente(ambiente_dian: str) -> str:
+    """Código de ambiente DIAN: 1 producción, 2 pruebas"""
+    return "1" if ambiente_dian == "PRODUCCION" else "2"
+
+
+def documento_sin_dv(numero: str) -> str:
+    """Número de documento sin dígito de verificación ni separadores"""
+    return numero.split("-")[0].replace(".", "").replace(" ", "")
+
+
+def hora_actual() -> time:
+    """Hora de emisión en hora legal colombiana, con precisión de segundos"""
+    return datetime.now(HORA_COLOMBIA).time().replace(microsecond=0)
+
+
+def cadena_cufe(datos: DatosCufe) -> str:
+    """
+    Concatenación de campos definida por la DIAN
+
+    NumFac + FecFac + HorFac + ValFac + CodImp1 + ValImp1 + CodImp2 + ValImp2
+    + CodImp3 + ValImp3 + ValTot + NitOFE + NumAdq + ClTec + TipoAmbiente
+    """
+    return "".join((
+        datos.numero_completo,
+        datos.fecha_emision.isoformat(),
+        datos.hora_emision.strftime("%H:%M:%S") + ZONA_HORARIA,
+        formato_valor(datos.subtotal),
+        CODIGO_IVA, formato_valor(datos.total_iva),
+        CODIGO_INC, formato_valor(datos.total_inc),
+        CODIGO_ICA, formato_valor(datos.total_ica),
+        formato_valor(datos.total_factura),
+        datos.nit_emisor,
+        datos.documento_adquiriente,
+        datos.clave_tecnica,
+        datos.ambiente,
+    ))
+
+
+def calcular_cufe(datos: DatosCufe) -> str:
+    """CUFE: SHA-384 en hexadecimal de la cadena DIAN"""
+    return hashlib.sha384(cadena_cufe(datos).encode("utf-8")).hexdigest()
+
+
+def _calcular_bloque(bloque: Sequence[DatosCufe]) -> List[str]:
+    """Calcular los CUFE de un bloque (se ejecuta en un proceso del pool)"""
+    return [calcular_cufe(datos) for datos in bloque]
+
+
+def calcular_cufes_lote(
+    lote: Sequence[DatosCufe],
+    procesos: Optional[int] = None,
+    tamano_bloque: int = TAMANO_BLOQUE_LOTE
+) -> List[str]:
+    """
+    Calcular los CUFE de un lote de facturas, en el mismo orden
+
+    El lote se reparte en bloques entre procesos (Settings.CUFE_PROCESOS, o
+    uno por CPU) para no serializar cada factura por separado. Un lote que
+    cabe en un solo bloque se calcula en línea: el costo de arrancar el pool
+    supera al del hash.
+    """
+    if len(lote) <= tamano_bloque:
+        return _calcular_bloque(lote)
+
+    procesos = procesos or settings.CUFE_PROCESOS or os.cpu_count() or 1
+    bloques = [lote[i:i + tamano_bloque] for i in range(0, len(lote), tamano_bloque)]
+    with ProcessPoolExecutor(max_workers=min(procesos, len(bloques))) as pool:
+        return [cufe for resultado in pool.map(_calcular_bloque, bloques) for cufe in resultado]
+
+
+def datos_cufe(factura: Factura, empresa: Empresa, cliente: Cliente) -> DatosCufe:
+    """Extraer de la factura, su empresa y su cliente los campos del CUFE"""
+    documento = cliente.numero_documento
+    if cliente.tipo_documento == "NIT":
+        documento = documento_sin_dv(documento)
+
+    return DatosCufe(
+        numero_completo=factura.numero_completo,
+        fecha_emision=factura.fecha_emision,
+        hora_emision=factura.hora_emision,
+        subtotal=factura.subtotal,
+        total_iva=factura.total_iva,
+        total_inc=factura.total_inc,
+        total_ica=factura.total_ica,
+        total_factura=factura.total_factura,
+        nit_emisor=documento_sin_dv(empresa.nit),
+        documento_adquiriente=documento,
+        clave_tecnica=empresa.clave_tecnica,
+        ambiente=codigo_ambiente(empresa.ambiente_dian),
+    )
@@ -0,0 +1,153 @@
+"""
+Cliente SOAP del web service de facturación electrónica de la DIAN
+"""
+
+import base64
+import io
+import zipfile
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence, Tuple
+from xml.sax.saxutils import escape
+
+import httpx
+from lxml import etree
+
+NS_SOAP = "http://www.w3.org/2003/05/soap-envelope"
+NS_WCF = "http://wcf.dian.colombia"
+ACCION_BASE = "http://wcf.dian.colombia/IWcfDianCustomerServices/"
+
+# Código DIAN de documento aún en validación (consultar de nuevo más tarde)
+CODIGO_EN_PROCESO = "98"
+
+
+class DianError(Exception):
+    """Error de transporte o falla SOAP: el envío se puede reintentar"""
+
+
+@dataclass
+class RespuestaDocumento:
+    """Resultado de validación DIAN de un documento"""
+    cufe: Optional[str]
+    valido: bool
+    codigo: Optional[str]
+    descripcion: Optional[str] = None
+    errores: List[str] = field(default_factory=list)
+
+    @property
+    def en_proceso(self) -> bool:
+        return not self.valido and self.codigo == CODIGO_EN_PROCESO
+
+    @property
+    def mensaje(self) -> str:
+        return "; ".join([self.descripcion or "", *self.errores]).strip("; ")
+
+
+def comprimir(documentos: Sequence[Tuple[str, str]]) -> bytes:
+    """ZIP en memoria con los documentos (nombre_archivo, xml)"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archivo:
+        for nombre, xml in documentos:
+            archivo.writestr(nombre, xml.encode("utf-8"))
+    return buffer.getvalue()
+
+
+def sobre_soap(operacion: str, parametros: Sequence[Tuple[str, str]]) -> bytes:
+    """Sobre SOAP 1.2 para una operación del servicio"""
+    cuerpo = "".join(f"<wcf:{nombre}>{escape(valor)}</wcf:{nombre}>" for nombre, valor in parametros)
+    return (
+        f'<soap:Envelope xmlns:soap="{NS_SOAP}" xmlns:wcf="{NS_WCF}">'
+        '<soap:Header/>'
+        f'<soap:Body><wcf:{operacion}>{cuerpo}</wcf:{operacion}></soap:Body>'
+        '</soap:Envelope>'
+    ).encode("utf-8")
+
+
+def _hijo(elemento, nombre: str) -> Optional[str]:
+    encontrados = elemento.xpath(f"./*[local-name()='{nombre}']")
+    return encontrados[0].text if encontrados else None
+
+
+def _respuesta(elemento) -> RespuestaDocumento:
+    """Leer un DianResponse (o SendBillSyncResult) sin depender de prefijos"""
+    return RespuestaDocumento(
+        cufe=_hijo(elemento, "XmlDocumentKey"),
+        valido=(_hijo(elemento, "IsValid") or "").lower() == "true",
+        codigo=_hijo(elemento, "StatusCode"),
+        descripcion=_hijo(elemento, "StatusDescription"),
+        errores=[e.text for e in elemento.xpath("./*[local-name()='ErrorMessage']/*") if e.text],
+    )
+
+
+class DianClient:
+    """
+    Cliente del servicio SOAP de la DIAN
+
+    Usa un único httpx.AsyncClient para reutilizar conexiones entre envíos.
+    Los errores de transporte, HTTP 5xx y fallas SOAP se lanzan como
+    DianError para que el llamador reintente.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        timeout: float = 30.0,
+        max_conexiones: int = 10,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self.url = url
+        self.http = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_conexiones, max_keepalive_connections=max_conexiones),
+            transport=transport,
+        )
+
+    async def _llamar(self, operacion: str, parametros: Sequence[Tuple[str, str]]):
+        headers = {
+            "Content-Type": f'application/soap+xml; charset=utf-8; action="{ACCION_BASE}{operacion}"'
+        }
+        try:
+            response = await self.http.post(self.url, content=sobre_soap(operacion, parametros), headers=headers)
+        except httpx.HTTPError as e:
+            raise DianError(f"{operacion}: {e.__class__.__name__}: {e}")
+
+        if response.status_code >= 400:
+            raise DianError(f"{operacion}: HTTP {response.status_code}")
+        try:
+            raiz = etree.fromstring(response.content)
+        except etree.XMLSyntaxError as e:
+            raise DianError(f"{operacion}: respuesta inválida: {e}")
+
+        falla = raiz.xpath("//*[local-name()='Fault']")
+        if falla:
+            raise DianError(f"{operacion}: {' '.join(falla[0].itertext()).strip()}")
+
+        resultado = raiz.xpath(f"//*[local-name()='{operacion}Result']")
+        if not resultado:
+            raise DianError(f"{operacion}: respuesta sin {operacion}Result")
+        return resultado[0]
+
+    async def send_bill_sync(self, nombre_zip: str, zip_bytes: bytes) -> RespuestaDocumento:
+        """Enviar un documento y obtener su validación en la misma llamada"""
+        resultado = await self._llamar("SendBillSync", [
+            ("fileName", nombre_zip), ("contentFile", base64.b64encode(zip_bytes).decode())
+        ])
+        return _respuesta(resultado)
+
+    async def send_bill_async(self, nombre_zip: str, zip_bytes: bytes) -> str:
+        """Enviar un ZIP con varios documentos; retorna el ZipKey para consultar el resultado"""
+        resultado = await self._llamar("SendBillAsync", [
+            ("fileName", nombre_zip), ("contentFile", base64.b64encode(zip_bytes).decode())
+        ])
+        zip_key = _hijo(resultado, "ZipKey")
+        if not zip_key:
+            raise DianError(f"SendBillAsync: {' '.join(resultado.itertext()).strip() or 'sin ZipKey'}")
+        return zip_key
+
+    async def get_status_zip(self, track_id: str) -> List[RespuestaDocumento]:
+        """Consultar el resultado de validación de un ZIP enviado de forma asíncrona"""
+        resultado = await self._llamar("GetStatusZip", [("trackId", track_id)])
+        return [_respuesta(elemento) for elemento in resultado.xpath("./*[local-name()='DianResponse']")]
+
+    async def cerrar(self) -> None:
+        """Cerrar las conexiones abiertas"""
+        await self.http.aclose()
@@ -0,0 +1,117 @@
+"""
+Servidor SOAP local que imita el web service de la DIAN (desarrollo y pruebas de carga)
+"""
+
+import asyncio
+import base64
+import io
+import random
+import time
+import uuid
+import zipfile
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import FastAPI, Request, Response
+from lxml import etree
+
+from app.services.dian_client import CODIGO_EN_PROCESO, NS_SOAP, NS_WCF
+
+TIPO_SOAP = "application/soap+xml; charset=utf-8"
+
+
+def _valor(cuerpo, nombre: str) -> str:
+    encontrados = cuerpo.xpath(f".//*[local-name()='{nombre}']")
+    return (encontrados[0].text or "") if encontrados else ""
+
+
+def _cufes(contenido_zip: str) -> List[str]:
+    """CUFE (cbc:UUID) de cada documento del ZIP"""
+    cufes = []
+    with zipfile.ZipFile(io.BytesIO(base64.b64decode(contenido_zip))) as archivo:
+        for nombre in archivo.namelist():
+            documento = etree.fromstring(archivo.read(nombre))
+            uuid_ = documento.xpath("//*[local-name()='UUID']")
+            cufes.append(uuid_[0].text if uuid_ else nombre)
+    return cufes
+
+
+def _dian_response(cufe: Optional[str], valido: bool, codigo: str, descripcion: str, errores=()) -> str:
+    mensajes = "".join(f"<b:string>{error}</b:string>" for error in errores)
+    return (
+        '<b:DianResponse>'
+        f'<b:ErrorMessage>{mensajes}</b:ErrorMessage>'
+        f'<b:IsValid>{"true" if valido else "false"}</b:IsValid>'
+        f'<b:StatusCode>{codigo}</b:StatusCode>'
+        f'<b:StatusDescription>{descripcion}</b:StatusDescription>'
+        f'<b:XmlDocumentKey>{cufe or ""}</b:XmlDocumentKey>'
+        '</b:DianResponse>'
+    )
+
+
+def _sobre(operacion: str, contenido: str) -> str:
+    return (
+        f'<s:Envelope xmlns:s="{NS_SOAP}"><s:Body>'
+        f'<{operacion}Response xmlns="{NS_WCF}">'
+        f'<{operacion}Result xmlns:b="http://schemas.datacontract.org/2004/07/DianResponse">'
+        f'{contenido}</{operacion}Result></{operacion}Response>'
+        '</s:Body></s:Envelope>'
+    )
+
+
+def crear_app_stub(
+    latencia: float = 0.0,
+    tasa_fallo: float = 0.0,
+    tasa_rechazo: float = 0.0,
+    demora_validacion: float = 0.0,
+    semilla: Optional[int] = None
+) -> FastAPI:
+    """
+    Aplicación que responde SendBillSync, SendBillAsync y GetStatusZip
+
+    latencia: segundos por llamada; tasa_fallo: fracción de llamadas que
+    responden HTTP 503; tasa_rechazo: fracción de documentos rechazados;
+    demora_validacion: segundos hasta que un ZIP asíncrono tiene resultado.
+    """
+    app = FastAPI(title="DIAN stub")
+    azar = random.Random(semilla)
+    zips: Dict[str, Tuple[float, List[str]]] = {}
+    app.state.llamadas = {"SendBillSync": 0, "SendBillAsync": 0, "GetStatusZip": 0, "fallos": 0}
+
+    def validar(cufe: str) -> str:
+        if azar.random() < tasa_rechazo:
+            return _dian_response(cufe, False, "99", "Validación contiene errores en campos mandatorios.",
+                                  ["Regla: FAD06, Rechazo: Valor del CUFE no está calculado correctamente"])
+        return _dian_response(cufe, True, "00", "Procesado Correctamente.")
+
+    @app.post("/WcfDianCustomerServices.svc")
+    async def servicio(request: Request):
+        if latencia:
+            await asyncio.sleep(latencia)
+        if azar.random() < tasa_fallo:
+            app.state.llamadas["fallos"] += 1
+            return Response(status_code=503)
+
+        cuerpo = etree.fromstring(await request.body()).xpath("//*[local-name()='Body']/*")[0]
+        operacion = etree.QName(cuerpo).localname
+        app.state.llamadas[operacion] = app.state.llamadas.get(operacion, 0) + 1
+
+        if operacion == "SendBillSync":
+            contenido = "".join(validar(cufe) for cufe in _cufes(_valor(cuerpo, "contentFile"))[:1])
+            # SendBillSyncResult es en sí mismo un DianResponse
+            contenido = contenido.replace("<b:DianResponse>", "").replace("</b:DianResponse>", "")
+        elif operacion == "SendBillAsync":
+            zip_key = str(uuid.uuid4())
+            zips[zip_key] = (time.monotonic() + demora_validacion, _cufes(_valor(cuerpo, "contentFile")))
+            contenido = f"<b:ErrorMessageList/><b:ZipKey>{zip_key}</b:ZipKey>"
+        elif operacion == "GetStatusZip":
+            listo, cufes = zips.get(_valor(cuerpo, "trackId"), (0.0, []))
+            if time.monotonic() < listo:
+                contenido = _dian_response(None, False, CODIGO_EN_PROCESO, "Batch en proceso de validación.")
+            else:
+                contenido = "".join(validar(cufe) for cufe in cufes)
+        else:
+            return Response(status_code=400)
+
+        return Response(content=_sobre(operacion, contenido), media_type=TIPO_SOAP)
+
+    return app
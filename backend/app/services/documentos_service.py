@@ -0,0 +1,81 @@
+"""
+Almacenamiento comprimido (zstd) de los documentos grandes de las facturas
+"""
+
+import asyncio
+import hashlib
+from typing import Dict, Iterable, Optional, Union
+
+import zstandard
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models import DocumentoFactura
+
+# Tipos de documento
+TIPO_XML = "XML"  # XML UBL enviado a la DIAN (firmado si la firma está habilitada)
+
+# Por encima de este tamaño la (des)compresión corre en un hilo para no bloquear el event loop
+UMBRAL_HILO = 256 * 1024
+
+
+def comprimir(contenido: bytes) -> bytes:
+    """Comprimir con zstd (el tamaño original queda en el encabezado del frame)"""
+    return zstandard.ZstdCompressor(level=settings.DOCUMENTOS_ZSTD_NIVEL).compress(contenido)
+
+
+def descomprimir(datos: bytes) -> bytes:
+    return zstandard.ZstdDecompressor().decompress(datos)
+
+
+async def _ejecutar(funcion, datos: bytes) -> bytes:
+    if len(datos) > UMBRAL_HILO:
+        return await asyncio.to_thread(funcion, datos)
+    return funcion(datos)
+
+
+class DocumentosService:
+    """
+    Documentos de las facturas en la tabla documentos_factura
+
+    La fila de facturas queda liviana: los documentos solo se leen en los
+    endpoints y procesos que los necesitan.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def guardar(self, factura_id: int, tipo: str, contenido: Union[str, bytes]) -> None:
+        """Guardar (o reemplazar) un documento de la factura en la transacción actual"""
+        if isinstance(contenido, str):
+            contenido = contenido.encode("utf-8")
+        valores = {
+            "sha256": hashlib.sha256(contenido).hexdigest(),
+            "tamano": len(contenido),
+            "contenido": await _ejecutar(comprimir, contenido),
+        }
+        stmt = insert(DocumentoFactura).values(factura_id=factura_id, tipo=tipo, **valores)
+        await self.db.execute(
+            stmt.on_conflict_do_update(constraint="uq_documentos_factura_factura_tipo", set_=valores)
+        )
+
+    async def obtener(self, factura_id: int, tipo: str) -> Optional[bytes]:
+        """Contenido sin comprimir de un documento, o None si no existe"""
+        result = await self.db.execute(
+            select(DocumentoFactura.contenido).where(
+                DocumentoFactura.factura_id == factura_id, DocumentoFactura.tipo == tipo
+            )
+        )
+        datos = result.scalar_one_or_none()
+        return await _ejecutar(descomprimir, datos) if datos is not None else None
+
+    async def obtener_lote(self, factura_ids: Iterable[int], tipo: str) -> Dict[int, bytes]:
+        """Documentos de varias facturas con una sola consulta"""
+        result = await self.db.execute(
+            select(DocumentoFactura.factura_id, DocumentoFactura.contenido).where(
+                DocumentoFactura.factura_id.in_(list(factura_ids)), DocumentoFactura.tipo == tipo
+            )
+        )
+        return {factura_id: await _ejecutar(descomprimir, datos) for factura_id, datos in result.all()}
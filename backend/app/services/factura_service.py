@@ -0,0 +1,224 @@
+"""
+Servicio de creación de facturas
+"""
+
+from typing import Dict, Iterable, List, Optional, Sequence, Set
+
+from fastapi import HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Factura, FacturaDetalle, FacturaImpuesto, Producto, Cliente, Empresa
+from app.schemas.factura import FacturaCreate
+from app.services.impuestos_service import COLUMNAS_TARIFA, Tarifas, calcular_totales, tarifas_desde_fila
+from app.services.numeracion_service import NumeracionService, RangoNumeracionAgotadoError
+
+
+class FacturaService:
+    """Servicio para crear facturas en una sola transacción"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_clientes_activos(self, empresa_id: int, cliente_ids: Iterable[int]) -> Set[int]:
+        """Obtener en una sola consulta los IDs de clientes activos de la empresa"""
+        result = await self.db.execute(
+            select(Cliente.id).where(
+                Cliente.id.in_(set(cliente_ids)),
+                Cliente.empresa_id == empresa_id,
+                Cliente.activo == True
+            )
+        )
+        return set(result.scalars().all())
+
+    async def get_cliente_activo(self, empresa_id: int, cliente_id: int) -> None:
+        """Verificar que el cliente exista y esté activo, o lanzar 404"""
+        if cliente_id not in await self.get_clientes_activos(empresa_id, [cliente_id]):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Cliente no encontrado"
+            )
+
+    async def cargar_productos(self, empresa_id: int, producto_ids: Iterable[int]) -> Dict[int, Producto]:
+        """Obtener en una sola consulta los productos activos de la empresa"""
+        result = await self.db.execute(
+            select(Producto).where(
+                Producto.id.in_(set(producto_ids)),
+                Producto.empresa_id == empresa_id,
+                Producto.activo == True
+            )
+        )
+        return {producto.id: producto for producto in result.scalars().all()}
+
+    async def get_productos_activos(self, empresa_id: int, producto_ids: List[int]) -> Dict[int, Producto]:
+        """Obtener en una sola consulta los productos activos referenciados, o lanzar 404"""
+        productos = await self.cargar_productos(empresa_id, producto_ids)
+
+        producto_faltante = self.producto_faltante(producto_ids, productos)
+        if producto_faltante is not None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Producto con ID {producto_faltante} no encontrado"
+            )
+        return productos
+
+    @staticmethod
+    def producto_faltante(producto_ids: Iterable[int], productos: Dict[int, Producto]) -> Optional[int]:
+        """Retornar el primer producto referenciado que no está disponible"""
+        for producto_id in producto_ids:
+            if producto_id not in productos:
+                return producto_id
+        return None
+
+    async def get_empresa(self, empresa_id: int) -> Empresa:
+        """Obtener la empresa con su configuración de numeración"""
+        result = await self.db.execute(select(Empresa).where(Empresa.id == empresa_id))
+        return result.scalar_one()
+
+    async def asignar_numeros(self, numeracion: NumeracionService, empresa: Empresa, cantidad: int) -> Sequence[int]:
+        """Asignar números de factura, o lanzar 409 si el rango DIAN no alcanza"""
+        try:
+            return await numeracion.asignar(empresa, cantidad)
+        except RangoNumeracionAgotadoError as e:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Rango de numeración DIAN agotado (autorizado hasta {e.rango_hasta})"
+            )
+
+    @staticmethod
+    def tarifas_productos(productos: Dict[int, Producto]) -> Dict[int, Tarifas]:
+        """Tarifas de impuestos de productos ya cargados"""
+        return {
+            producto.id: tarifas_desde_fila(*(getattr(producto, columna.key) for columna in COLUMNAS_TARIFA))
+            for producto in productos.values()
+        }
+
+    @classmethod
+    def build_factura(
+        cls,
+        factura_data: FacturaCreate,
+        empresa: Empresa,
+        numero: int,
+        productos: Dict[int, Producto],
+        tarifas: Optional[Dict[int, Tarifas]] = None
+    ) -> Factura:
+        """Construir la factura con detalles, totales e impuestos ya calculados"""
+
+        lineas = [detalle.model_dump() for detalle in factura_data.detalles]
+        if tarifas is None:
+            tarifas = cls.tarifas_productos(productos)
+        calculo = calcular_totales(lineas, tarifas)
+
+        detalles = []
+        for linea, totales_linea in zip(lineas, calculo["lineas"]):
+            producto = productos[linea["producto_id"]]
+            detalles.append(FacturaDetalle(
+                producto_id=producto.id,
+                codigo_producto=producto.codigo,
+                nombre_producto=producto.nombre,
+                descripcion=producto.descripcion,
+                cantidad=linea["cantidad"],
+                precio_unitario=linea["precio_unitario"],
+                descuento_porcentaje=linea["descuento_porcentaje"],
+                descuento_valor=totales_linea["total_descuentos_linea"],
+                **totales_linea
+            ))
+
+        return Factura(
+            **factura_data.model_dump(exclude={"detalles"}),
+            empresa_id=empresa.id,
+            numero=numero,
+            numero_completo=f"{empresa.prefijo_factura or ''}{numero}",
+            prefijo=empresa.prefijo_factura,
+            estado_dian="BORRADOR",
+            activo=True,
+            **calculo["totales"],
+            detalles=detalles,
+            impuestos=[FacturaImpuesto(**impuesto) for impuesto in calculo["impuestos"]]
+        )
+
+    async def crear(self, factura_data: FacturaCreate, empresa_id: int) -> Factura:
+        """
+        Crear una factura completa en una sola transacción
+
+        Valida cliente y productos, calcula totales en memoria, asigna el número
+        y escribe encabezado, detalles e impuestos en un único flush y commit.
+        La factura retornada ya tiene sus relaciones cargadas.
+        """
+        await self.get_cliente_activo(empresa_id, factura_data.cliente_id)
+        productos = await self.get_productos_activos(
+            empresa_id, [detalle.producto_id for detalle in factura_data.detalles]
+        )
+        empresa = await self.get_empresa(empresa_id)
+
+        # El número se asigna al final para mantener corto el bloqueo del contador
+        numeracion = NumeracionService(self.db)
+        numeros = await self.asignar_numeros(numeracion, empresa, 1)
+
+        factura = self.build_factura(factura_data, empresa, numeros[0], productos)
+        try:
+            self.db.add(factura)
+            await self.db.commit()
+        except Exception:
+            # Los números tomados de un bloque en memoria no se pierden si falla la creación
+            await numeracion.devolver(empresa, numeros)
+            raise
+
+        return factura
+
+    async def crear_lote(self, facturas_data: List[FacturaCreate], empresa_id: int) -> List[dict]:
+        """
+        Crear un lote de facturas en una sola transacción
+
+        Clientes y productos de todo el lote se validan con una consulta cada
+        uno, los números se asignan de una vez y todas las facturas válidas se
+        insertan en un único flush. Retorna un resultado por factura, en orden.
+        """
+        clientes = await self.get_clientes_activos(empresa_id, (f.cliente_id for f in facturas_data))
+        productos = await self.cargar_productos(
+            empresa_id, (d.producto_id for f in facturas_data for d in f.detalles)
+        )
+
+        resultados: List[dict] = []
+        validas = []
+        for indice, factura_data in enumerate(facturas_data):
+            error = None
+            if factura_data.cliente_id not in clientes:
+                error = "Cliente no encontrado"
+            else:
+                producto_faltante = self.producto_faltante(
+                    (d.producto_id for d in factura_data.detalles), productos
+                )
+                if producto_faltante is not None:
+                    error = f"Producto con ID {producto_faltante} no encontrado"
+
+            resultados.append({"indice": indice, "creada": error is None, "error": error})
+            if error is None:
+                validas.append((indice, factura_data))
+
+        if not validas:
+            return resultados
+
+        empresa = await self.get_empresa(empresa_id)
+        numeracion = NumeracionService(self.db)
+        numeros = await self.asignar_numeros(numeracion, empresa, len(validas))
+
+        tarifas = self.tarifas_productos(productos)
+        facturas = [
+            (indice, self.build_factura(factura_data, empresa, numero, productos, tarifas))
+            for (indice, factura_data), numero in zip(validas, numeros)
+        ]
+        try:
+            self.db.add_all([factura for _, factura in facturas])
+            await self.db.commit()
+        except Exception:
+            await numeracion.devolver(empresa, numeros)
+            raise
+
+        for indice, factura in facturas:
+            resultados[indice].update(
+                factura_id=factura.id,
+                numero_completo=factura.numero_completo,
+                total_factura=factura.total_factura
+            )
+        return resultados
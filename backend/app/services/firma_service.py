@@ -0,0 +1,360 @@
+"""
+Firma XAdES-EPES de facturas electrónicas en un pool de procesos
+"""
+
+import asyncio
+import base64
+import hashlib
+import multiprocessing
+import os
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Deque, List, Optional, Sequence, Tuple
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+from cryptography.hazmat.primitives.serialization import pkcs12
+from cryptography.x509.oid import NameOID
+from loguru import logger
+from lxml import etree
+
+from app.core.config import settings
+from app.core.metricas import percentil_ms
+
+NS_DS = "http://www.w3.org/2000/09/xmldsig#"
+NS_XADES = "http://uri.etsi.org/01903/v1.3.2#"
+NS_EXT = "urn:oasis:names:specification:ubl:schema:xsd:CommonExtensionComponents-2"
+
+C14N = "http://www.w3.org/TR/2001/REC-xml-c14n-20010315"
+RSA_SHA256 = "http://www.w3.org/2001/04/xmldsig-more#rsa-sha256"
+SHA256 = "http://www.w3.org/2001/04/xmlenc#sha256"
+ENVELOPED = "http://www.w3.org/2000/09/xmldsig#enveloped-signature"
+TIPO_SIGNED_PROPERTIES = "http://uri.etsi.org/01903#SignedProperties"
+
+# Política de firma DIAN v2
+POLITICA_FIRMA = "https://facturaelectronica.dian.gov.co/politicadefirma/v2/politicadefirmav2.pdf"
+POLITICA_FIRMA_HASH = "dMoMvtcG5aIzgYo0tIsSQeVJBDnUnfSOfBpxXrmor0Y="
+
+HORA_COLOMBIA = timezone(timedelta(hours=-5))
+
+# Muestras para latencia y throughput en las métricas
+MUESTRAS_METRICAS = 1000
+VENTANA_THROUGHPUT = 60.0
+
+
+class CertificadoInvalidoError(Exception):
+    """El certificado de firma no se pudo cargar"""
+
+
+def cargar_certificado(ruta: str, password: str):
+    """Cargar llave privada y certificado de un archivo PKCS#12 (.p12/.pfx)"""
+    try:
+        with open(ruta, "rb") as archivo:
+            llave, certificado, _ = pkcs12.load_key_and_certificates(
+                archivo.read(), password.encode() if password else None
+            )
+    except (OSError, ValueError) as e:
+        raise CertificadoInvalidoError(f"No se pudo cargar el certificado {ruta}: {e}")
+    if llave is None or certificado is None:
+        raise CertificadoInvalidoError(f"El archivo {ruta} no contiene llave y certificado")
+    return llave, certificado
+
+
+def generar_certificado_prueba(ruta: str, password: str, nombre: str = "Facturacion Pruebas") -> None:
+    """Generar un certificado autofirmado PKCS#12 para desarrollo y pruebas"""
+    llave = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    sujeto = x509.Name([
+        x509.NameAttribute(NameOID.COUNTRY_NAME, "CO"),
+        x509.NameAttribute(NameOID.ORGANIZATION_NAME, nombre),
+        x509.NameAttribute(NameOID.COMMON_NAME, nombre),
+    ])
+    ahora = datetime.now(timezone.utc)
+    certificado = (
+        x509.CertificateBuilder()
+        .subject_name(sujeto)
+        .issuer_name(sujeto)
+        .public_key(llave.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(ahora - timedelta(days=1))
+        .not_valid_after(ahora + timedelta(days=365))
+        .sign(llave, hashes.SHA256())
+    )
+    with open(ruta, "wb") as archivo:
+        archivo.write(pkcs12.serialize_key_and_certificates(
+            nombre.encode(), llave, certificado, None,
+            serialization.BestAvailableEncryption(password.encode())
+            if password else serialization.NoEncryption()
+        ))
+
+
+def _ds(nombre: str) -> str:
+    return f"{{{NS_DS}}}{nombre}"
+
+
+def _xades(nombre: str) -> str:
+    return f"{{{NS_XADES}}}{nombre}"
+
+
+def _c14n(elemento) -> bytes:
+    """Canonicalización C14N 1.0 inclusiva (incluye los namespaces heredados)"""
+    return etree.tostring(elemento, method="c14n", exclusive=False, with_comments=False)
+
+
+def _digest(datos: bytes) -> str:
+    return base64.b64encode(hashlib.sha256(datos).digest()).decode()
+
+
+def _referencia(signed_info, uri: str, digest: str, id_referencia: Optional[str] = None,
+                tipo: Optional[str] = None, transformaciones: Sequence[str] = ()) -> None:
+    referencia = etree.SubElement(signed_info, _ds("Reference"))
+    if id_referencia:
+        referencia.set("Id", id_referencia)
+    if tipo:
+        referencia.set("Type", tipo)
+    referencia.set("URI", uri)
+    if transformaciones:
+        transforms = etree.SubElement(referencia, _ds("Transforms"))
+        for algoritmo in transformaciones:
+            etree.SubElement(transforms, _ds("Transform"), Algorithm=algoritmo)
+    etree.SubElement(referencia, _ds("DigestMethod"), Algorithm=SHA256)
+    etree.SubElement(referencia, _ds("DigestValue")).text = digest
+
+
+def firmar_documento(xml: str, llave, certificado: x509.Certificate, momento: Optional[datetime] = None) -> str:
+    """
+    Firmar un documento UBL con una firma XAdES-EPES envolvente
+
+    La firma se inserta en la primera ext:ExtensionContent vacía. El digest
+    del documento se calcula antes de insertarla, que es el resultado de la
+    transformación enveloped-signature.
+    """
+    raiz = etree.fromstring(xml.encode("utf-8"))
+    destino = next(
+        (c for c in raiz.iterfind(f"{{{NS_EXT}}}UBLExtensions/{{{NS_EXT}}}UBLExtension/{{{NS_EXT}}}ExtensionContent")
+         if len(c) == 0),
+        None
+    )
+    if destino is None:
+        raise ValueError("El documento no tiene una extensión vacía para la firma")
+
+    digest_documento = _digest(_c14n(raiz))
+    momento = momento or datetime.now(HORA_COLOMBIA)
+    certificado_der = certificado.public_bytes(serialization.Encoding.DER)
+    id_firma = f"xmldsig-{uuid.uuid4()}"
+
+    firma = etree.SubElement(destino, _ds("Signature"), Id=id_firma)
+    signed_info = etree.SubElement(firma, _ds("SignedInfo"))
+    etree.SubElement(signed_info, _ds("CanonicalizationMethod"), Algorithm=C14N)
+    etree.SubElement(signed_info, _ds("SignatureMethod"), Algorithm=RSA_SHA256)
+    _referencia(signed_info, "", digest_documento, id_referencia=f"{id_firma}-ref0", transformaciones=[ENVELOPED])
+
+    valor_firma = etree.SubElement(firma, _ds("SignatureValue"), Id=f"{id_firma}-sigvalue")
+
+    key_info = etree.SubElement(firma, _ds("KeyInfo"), Id=f"{id_firma}-keyinfo")
+    x509_data = etree.SubElement(key_info, _ds("X509Data"))
+    etree.SubElement(x509_data, _ds("X509Certificate")).text = base64.b64encode(certificado_der).decode()
+
+    objeto = etree.SubElement(firma, _ds("Object"))
+    calificadoras = etree.SubElement(objeto, _xades("QualifyingProperties"), Target=f"#{id_firma}")
+    propiedades = etree.SubElement(calificadoras, _xades("SignedProperties"), Id=f"{id_firma}-signedprops")
+    propiedades_firma = etree.SubElement(propiedades, _xades("SignedSignatureProperties"))
+    etree.SubElement(propiedades_firma, _xades("SigningTime")).text = momento.isoformat(timespec="milliseconds")
+
+    cert = etree.SubElement(etree.SubElement(propiedades_firma, _xades("SigningCertificate")), _xades("Cert"))
+    cert_digest = etree.SubElement(cert, _xades("CertDigest"))
+    etree.SubElement(cert_digest, _ds("DigestMethod"), Algorithm=SHA256)
+    etree.SubElement(cert_digest, _ds("DigestValue")).text = _digest(certificado_der)
+    emisor_serial = etree.SubElement(cert, _xades("IssuerSerial"))
+    etree.SubElement(emisor_serial, _ds("X509IssuerName")).text = certificado.issuer.rfc4514_string()
+    etree.SubElement(emisor_serial, _ds("X509SerialNumber")).text = str(certificado.serial_number)
+
+    politica = etree.SubElement(
+        etree.SubElement(propiedades_firma, _xades("SignaturePolicyIdentifier")), _xades("SignaturePolicyId")
+    )
+    etree.SubElement(etree.SubElement(politica, _xades("SigPolicyId")), _xades("Identifier")).text = POLITICA_FIRMA
+    politica_hash = etree.SubElement(politica, _xades("SigPolicyHash"))
+    etree.SubElement(politica_hash, _ds("DigestMethod"), Algorithm=SHA256)
+    etree.SubElement(politica_hash, _ds("DigestValue")).text = POLITICA_FIRMA_HASH
+
+    roles = etree.SubElement(etree.SubElement(propiedades_firma, _xades("SignerRole")), _xades("ClaimedRoles"))
+    etree.SubElement(roles, _xades("ClaimedRole")).text = "supplier"
+
+    # KeyInfo y SignedProperties se firman ya ubicados en el documento (namespaces heredados)
+    _referencia(signed_info, f"#{id_firma}-keyinfo", _digest(_c14n(key_info)))
+    _referencia(
+        signed_info, f"#{id_firma}-signedprops", _digest(_c14n(propiedades)), tipo=TIPO_SIGNED_PROPERTIES
+    )
+    valor_firma.text = base64.b64encode(
+        llave.sign(_c14n(signed_info), padding.PKCS1v15(), hashes.SHA256())
+    ).decode()
+
+    return etree.tostring(raiz, xml_declaration=True, encoding="UTF-8", standalone=False).decode("utf-8")
+
+
+def verificar_firma(xml: str) -> bool:
+    """Verificar digests y valor de la firma de un documento firmado"""
+    raiz = etree.fromstring(xml.encode("utf-8"))
+    firma = raiz.find(f".//{_ds('Signature')}")
+    if firma is None:
+        return False
+    signed_info = firma.find(_ds("SignedInfo"))
+
+    for referencia in signed_info.iterfind(_ds("Reference")):
+        uri = referencia.get("URI")
+        if uri == "":
+            documento = etree.fromstring(xml.encode("utf-8"))
+            envuelta = documento.find(f".//{_ds('Signature')}")
+            envuelta.getparent().remove(envuelta)
+            datos = _c14n(documento)
+        else:
+            elemento = raiz.find(f".//*[@Id='{uri[1:]}']")
+            if elemento is None:
+                return False
+            datos = _c14n(elemento)
+        if _digest(datos) != referencia.findtext(_ds("DigestValue")):
+            return False
+
+    certificado = x509.load_der_x509_certificate(
+        base64.b64decode(firma.findtext(f"{_ds('KeyInfo')}/{_ds('X509Data')}/{_ds('X509Certificate')}"))
+    )
+    try:
+        certificado.public_key().verify(
+            base64.b64decode(firma.findtext(_ds("SignatureValue"))),
+            _c14n(signed_info), padding.PKCS1v15(), hashes.SHA256()
+        )
+    except Exception:
+        return False
+    return True
+
+
+# Estado de cada proceso del pool: el certificado se carga una sola vez por proceso
+_llave = None
+_certificado = None
+
+
+def _inicializar_proceso(ruta: str, password: str) -> None:
+    global _llave, _certificado
+    _llave, _certificado = cargar_certificado(ruta, password)
+
+
+def _firmar_en_proceso(xml: str) -> Tuple[str, float]:
+    inicio = time.perf_counter()
+    firmado = firmar_documento(xml, _llave, _certificado)
+    return firmado, time.perf_counter() - inicio
+
+
+class FirmaService:
+    """
+    Servicio de firma con un pool de procesos acotado
+
+    Cada proceso carga el certificado al arrancar. Como mucho
+    `max_pendientes` firmas esperan o se ejecutan a la vez; las demás
+    solicitudes esperan su turno sin bloquear el event loop.
+    """
+
+    def __init__(
+        self,
+        ruta_certificado: str,
+        password: str = "",
+        procesos: Optional[int] = None,
+        max_pendientes: Optional[int] = None
+    ):
+        # Validar el certificado en el proceso principal para fallar al arrancar
+        cargar_certificado(ruta_certificado, password)
+        self.ruta_certificado = ruta_certificado
+        self.password = password
+        self.procesos = procesos or settings.FIRMA_PROCESOS or os.cpu_count() or 1
+        self.max_pendientes = max_pendientes or settings.FIRMA_MAX_PENDIENTES
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._cupos: Optional[asyncio.Semaphore] = None
+        self._pendientes = 0
+        self._firmadas = 0
+        self._errores = 0
+        self._latencias: Deque[Tuple[float, float]] = deque(maxlen=MUESTRAS_METRICAS)
+        self._completadas: Deque[float] = deque(maxlen=MUESTRAS_METRICAS)
+
+    def _obtener_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: los procesos no heredan el event loop ni conexiones abiertas
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.procesos,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_inicializar_proceso,
+                initargs=(self.ruta_certificado, self.password),
+            )
+            self._cupos = asyncio.Semaphore(self.max_pendientes)
+        return self._pool
+
+    async def firmar(self, xml: str) -> str:
+        """Firmar un documento UBL en el pool de procesos"""
+        pool = self._obtener_pool()
+        inicio = time.perf_counter()
+        self._pendientes += 1
+        try:
+            async with self._cupos:
+                firmado, segundos_firma = await asyncio.get_running_loop().run_in_executor(
+                    pool, _firmar_en_proceso, xml
+                )
+        except Exception:
+            self._errores += 1
+            raise
+        finally:
+            self._pendientes -= 1
+
+        self._firmadas += 1
+        self._latencias.append((time.perf_counter() - inicio, segundos_firma))
+        self._completadas.append(time.monotonic())
+        return firmado
+
+    async def firmar_lote(self, xmls: Sequence[str]) -> List[str]:
+        """Firmar varios documentos en paralelo, en el mismo orden"""
+        return list(await asyncio.gather(*(self.firmar(xml) for xml in xmls)))
+
+    def metricas(self) -> dict:
+        """Throughput, profundidad de la cola y latencia por firma"""
+        ahora = time.monotonic()
+        recientes = sum(1 for momento in self._completadas if ahora - momento <= VENTANA_THROUGHPUT)
+        totales = sorted(total for total, _ in self._latencias)
+        firma = [segundos for _, segundos in self._latencias]
+
+        return {
+            "procesos": self.procesos,
+            "max_pendientes": self.max_pendientes,
+            "pendientes": self._pendientes,
+            "firmadas": self._firmadas,
+            "errores": self._errores,
+            "firmas_por_segundo": round(recientes / VENTANA_THROUGHPUT, 2),
+            "latencia_ms_p50": percentil_ms(totales, 0.50),
+            "latencia_ms_p95": percentil_ms(totales, 0.95),
+            "firma_ms_promedio": round(sum(firma) / len(firma) * 1000, 2) if firma else None,
+        }
+
+    def cerrar(self) -> None:
+        """Detener los procesos del pool"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+
+_firma_service: Optional[FirmaService] = None
+
+
+def obtener_firma_service() -> Optional[FirmaService]:
+    """Servicio de firma del proceso, o None si no hay certificado configurado"""
+    global _firma_service
+    if _firma_service is None and settings.DIAN_CERTIFICADO_PATH:
+        _firma_service = FirmaService(settings.DIAN_CERTIFICADO_PATH, settings.DIAN_CERTIFICADO_PASSWORD)
+        logger.info(f"Firma XAdES habilitada con {_firma_service.procesos} procesos")
+    return _firma_service
+
+
+def cerrar_firma_service() -> None:
+    """Detener el pool de firma al cerrar la aplicación"""
+    global _firma_service
+    if _firma_service is not None:
+        _firma_service.cerrar()
+        _firma_service = None
@@ -0,0 +1,209 @@
+"""
+Servicio de cálculo de impuestos de factura (IVA, INC, ICA)
+"""
+
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import select, update, delete, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.factura import Factura, FacturaDetalle, FacturaImpuesto
+from app.models.producto import Producto
+
+CERO = Decimal("0.00")
+CENTAVO = Decimal("0.01")
+
+# (tipo_impuesto, porcentaje) aplicables a un producto
+Tarifas = List[Tuple[str, Decimal]]
+
+# Columnas de producto necesarias para el cálculo de impuestos
+COLUMNAS_TARIFA = (
+    Producto.incluye_iva,
+    Producto.porcentaje_iva,
+    Producto.incluye_inc,
+    Producto.porcentaje_inc,
+    Producto.incluye_ica,
+    Producto.porcentaje_ica,
+)
+
+
+def redondear(valor: Decimal) -> Decimal:
+    """Redondear a centavos (escala de las columnas Numeric(15, 2))"""
+    return valor.quantize(CENTAVO, rounding=ROUND_HALF_UP)
+
+
+def tarifas_desde_fila(
+    incluye_iva: bool, porcentaje_iva: Decimal,
+    incluye_inc: bool, porcentaje_inc: Decimal,
+    incluye_ica: bool, porcentaje_ica: Decimal,
+) -> Tarifas:
+    """Construir las tarifas de un producto a partir de sus columnas de impuestos"""
+    tarifas = []
+    if incluye_iva:
+        tarifas.append(("IVA", Decimal(porcentaje_iva)))
+    if incluye_inc:
+        tarifas.append(("INC", Decimal(porcentaje_inc)))
+    if incluye_ica:
+        tarifas.append(("ICA", Decimal(porcentaje_ica)))
+    return tarifas
+
+
+def tarifas_linea(tarifas: Tarifas) -> dict:
+    """Columnas de tarifa de un detalle de factura (la tarifa que no aplica queda en NULL)"""
+    porcentajes = dict(tarifas)
+    return {f"porcentaje_{tipo.lower()}": porcentajes.get(tipo) for tipo in ("IVA", "INC", "ICA")}
+
+
+def tarifas_detalle(detalle: FacturaDetalle) -> Tarifas:
+    """Tarifas guardadas en un detalle de factura"""
+    return [
+        (tipo, Decimal(porcentaje))
+        for tipo, porcentaje in (
+            ("IVA", detalle.porcentaje_iva), ("INC", detalle.porcentaje_inc), ("ICA", detalle.porcentaje_ica)
+        )
+        if porcentaje is not None
+    ]
+
+
+def calcular_totales(lineas: List[dict], tarifas: Dict[int, Tarifas]) -> dict:
+    """
+    Calcular totales de línea y de encabezado en una sola pasada
+
+    Cada línea debe traer producto_id, cantidad, precio_unitario y
+    descuento_porcentaje. Retorna los totales por línea con sus tarifas (en
+    el mismo orden), los totales del encabezado y el resumen de impuestos
+    por tipo y tarifa.
+    """
+    totales_lineas = []
+    subtotal = CERO
+    total_descuentos = CERO
+    total_por_tipo = {"IVA": CERO, "INC": CERO, "ICA": CERO}
+    resumen: Dict[Tuple[str, Decimal], List[Decimal]] = {}
+
+    for linea in lineas:
+        subtotal_linea = redondear(linea["cantidad"] * linea["precio_unitario"])
+        descuento_linea = redondear(subtotal_linea * (linea["descuento_porcentaje"] / 100))
+        base_gravable_linea = subtotal_linea - descuento_linea
+
+        impuestos_linea = CERO
+        for tipo, porcentaje in tarifas[linea["producto_id"]]:
+            valor = redondear(base_gravable_linea * (porcentaje / 100))
+            impuestos_linea += valor
+            total_por_tipo[tipo] += valor
+
+            acumulado = resumen.setdefault((tipo, porcentaje), [CERO, CERO])
+            acumulado[0] += base_gravable_linea
+            acumulado[1] += valor
+
+        totales_lineas.append({
+            "subtotal_linea": subtotal_linea,
+            "total_descuentos_linea": descuento_linea,
+            "total_impuestos_linea": impuestos_linea,
+            "total_linea": base_gravable_linea + impuestos_linea,
+            **tarifas_linea(tarifas[linea["producto_id"]]),
+        })
+
+        subtotal += base_gravable_linea
+        total_descuentos += descuento_linea
+
+    total_impuestos = sum(total_por_tipo.values(), CERO)
+    totales = {
+        "subtotal": subtotal,
+        "total_descuentos": total_descuentos,
+        "total_iva": total_por_tipo["IVA"],
+        "total_inc": total_por_tipo["INC"],
+        "total_ica": total_por_tipo["ICA"],
+        "total_impuestos": total_impuestos,
+        "total_factura": subtotal + total_impuestos,
+    }
+
+    impuestos = [
+        {
+            "tipo_impuesto": tipo,
+            "porcentaje": porcentaje,
+            "base_gravable": base,
+            "valor_impuesto": valor,
+        }
+        for (tipo, porcentaje), (base, valor) in resumen.items()
+        if valor > 0
+    ]
+
+    return {"lineas": totales_lineas, "totales": totales, "impuestos": impuestos}
+
+
+class ImpuestosService:
+    """Servicio para cálculo de totales e impuestos de facturas"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_tarifas(self, producto_ids: Iterable[int]) -> Dict[int, Tarifas]:
+        """Obtener las tarifas de varios productos en una sola consulta"""
+        ids = set(producto_ids)
+        if not ids:
+            return {}
+
+        result = await self.db.execute(
+            select(Producto.id, *COLUMNAS_TARIFA).where(Producto.id.in_(ids))
+        )
+        return {row[0]: tarifas_desde_fila(*row[1:]) for row in result.all()}
+
+    async def calculate_factura_totals(self, factura_id: int) -> dict:
+        """Recalcular y guardar los totales de una factura existente"""
+
+        # Detalles y tarifas de sus productos en una sola consulta
+        result = await self.db.execute(
+            select(
+                FacturaDetalle.id,
+                FacturaDetalle.producto_id,
+                FacturaDetalle.cantidad,
+                FacturaDetalle.precio_unitario,
+                FacturaDetalle.descuento_porcentaje,
+                *COLUMNAS_TARIFA,
+            )
+            .join(Producto, FacturaDetalle.producto_id == Producto.id)
+            .where(FacturaDetalle.factura_id == factura_id)
+            .order_by(FacturaDetalle.id)
+        )
+        rows = result.all()
+
+        lineas = []
+        tarifas: Dict[int, Tarifas] = {}
+        for row in rows:
+            lineas.append({
+                "id": row.id,
+                "producto_id": row.producto_id,
+                "cantidad": row.cantidad,
+                "precio_unitario": row.precio_unitario,
+                "descuento_porcentaje": row.descuento_porcentaje,
+            })
+            if row.producto_id not in tarifas:
+                tarifas[row.producto_id] = tarifas_desde_fila(*row[5:])
+
+        calculo = calcular_totales(lineas, tarifas)
+        await self.save_totals(factura_id, [linea["id"] for linea in lineas], calculo)
+        return calculo
+
+    async def save_totals(self, factura_id: int, detalle_ids: List[int], calculo: dict) -> None:
+        """Escribir totales de líneas, encabezado e impuestos con sentencias masivas"""
+
+        if detalle_ids:
+            await self.db.execute(
+                update(FacturaDetalle),
+                [
+                    {"id": detalle_id, **totales_linea}
+                    for detalle_id, totales_linea in zip(detalle_ids, calculo["lineas"])
+                ],
+            )
+
+        await self.db.execute(
+            update(Factura).where(Factura.id == factura_id).values(**calculo["totales"])
+        )
+
+        await self.db.execute(delete(FacturaImpuesto).where(FacturaImpuesto.factura_id == factura_id))
+        if calculo["impuestos"]:
+            await self.db.execute(
+                insert(FacturaImpuesto),
+                [{"factura_id": factura_id, **impuesto} for impuesto in calculo["impuestos"]],
+            )
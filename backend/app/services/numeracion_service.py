@@ -0,0 +1,258 @@
+"""
+Servicio de numeración de facturas según la resolución DIAN
+"""
+
+import asyncio
+from collections import deque
+from typing import Deque, Dict, List, Optional, Sequence, Tuple
+
+from loguru import logger
+from sqlalchemy import select, update, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.empresa import Empresa
+from app.models.factura import Factura
+from app.models.numeracion import NumeracionFactura, NumeracionHueco
+
+
+class RangoNumeracionAgotadoError(Exception):
+    """El rango de numeración autorizado por la DIAN no alcanza para la solicitud"""
+
+    def __init__(self, empresa_id: int, rango_hasta: int, cantidad: int = 1):
+        self.empresa_id = empresa_id
+        self.rango_hasta = rango_hasta
+        self.cantidad = cantidad
+        super().__init__(
+            f"Rango de numeración DIAN agotado para la empresa {empresa_id} "
+            f"(autorizado hasta {rango_hasta}, solicitados {cantidad})"
+        )
+
+
+class NumeracionService:
+    """Servicio para asignar números consecutivos de factura por empresa y prefijo"""
+
+    def __init__(self, db: AsyncSession, bloques: Optional["BloquesNumeracion"] = None):
+        self.db = db
+        self.bloques = bloques if bloques is not None else bloques_numeracion
+
+    async def asignar(self, empresa: Empresa, cantidad: int = 1) -> Sequence[int]:
+        """
+        Asignar `cantidad` números a facturas nuevas de la empresa
+
+        Con numeración por bloques habilitada para la empresa los números se
+        entregan desde memoria; si no, se toman del contador dentro de la
+        transacción actual.
+        """
+        if self.bloques.habilitado(empresa.id):
+            return await self.bloques.tomar(empresa, cantidad)
+        return await self.reservar(empresa, cantidad)
+
+    async def devolver(self, empresa: Empresa, numeros: Sequence[int]) -> None:
+        """Devolver números que no llegaron a usarse (solo aplica a numeración por bloques)"""
+        if self.bloques.habilitado(empresa.id):
+            await self.bloques.devolver(empresa, numeros)
+
+    async def reservar(self, empresa: Empresa, cantidad: int = 1) -> range:
+        """
+        Reservar `cantidad` números consecutivos en el contador de la empresa
+
+        La asignación es un único UPDATE ... RETURNING sobre la fila contadora,
+        que bloquea solo esa fila hasta el fin de la transacción. Lanza
+        RangoNumeracionAgotadoError si el rango autorizado no alcanza.
+        """
+        prefijo = empresa.prefijo_factura or ""
+        desde = empresa.rango_autorizado_desde or 1
+        hasta = empresa.rango_autorizado_hasta
+
+        ultimo = await self._incrementar(empresa.id, prefijo, desde, hasta, cantidad)
+        if ultimo is None:
+            # Primera factura con este prefijo: crear el contador y reintentar
+            await self._crear_contador(empresa.id, prefijo, desde)
+            ultimo = await self._incrementar(empresa.id, prefijo, desde, hasta, cantidad)
+
+        if ultimo is None:
+            raise RangoNumeracionAgotadoError(empresa.id, hasta, cantidad)
+
+        return range(ultimo - cantidad + 1, ultimo + 1)
+
+    async def reservar_bloque(self, empresa: Empresa, tamano: int) -> range:
+        """Reservar hasta `tamano` números, reduciendo el bloque al final del rango autorizado"""
+        while True:
+            try:
+                return await self.reservar(empresa, tamano)
+            except RangoNumeracionAgotadoError:
+                if tamano == 1:
+                    raise
+                tamano = max(1, tamano // 2)
+
+    async def liberar(self, empresa_id: int, prefijo: str, numeros: Sequence[int]) -> List[Tuple[int, int]]:
+        """
+        Liberar números reservados que no se usaron
+
+        Si el último tramo coincide con el final del contador se devuelve al
+        contador; el resto queda registrado en numeracion_huecos.
+        Retorna los tramos (desde, hasta) registrados como huecos.
+        """
+        tramos = agrupar_tramos(numeros)
+        if not tramos:
+            return []
+
+        desde, hasta = tramos[-1]
+        result = await self.db.execute(
+            update(NumeracionFactura)
+            .where(
+                NumeracionFactura.empresa_id == empresa_id,
+                NumeracionFactura.prefijo == prefijo,
+                NumeracionFactura.ultimo_numero == hasta,
+            )
+            .values(ultimo_numero=desde - 1)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount:
+            tramos.pop()
+
+        for desde, hasta in tramos:
+            self.db.add(NumeracionHueco(
+                empresa_id=empresa_id,
+                prefijo=prefijo,
+                numero_desde=desde,
+                numero_hasta=hasta,
+                motivo="BLOQUE_NO_UTILIZADO"
+            ))
+        return tramos
+
+    async def _incrementar(
+        self, empresa_id: int, prefijo: str, desde: int, hasta: Optional[int], cantidad: int
+    ) -> Optional[int]:
+        """Avanzar el contador y retornar el último número asignado"""
+
+        # Si la resolución cambió a un rango posterior, continuar desde su inicio
+        base = func.greatest(NumeracionFactura.ultimo_numero, desde - 1)
+
+        stmt = (
+            update(NumeracionFactura)
+            .where(
+                NumeracionFactura.empresa_id == empresa_id,
+                NumeracionFactura.prefijo == prefijo,
+            )
+            .values(ultimo_numero=base + cantidad)
+            .returning(NumeracionFactura.ultimo_numero)
+            .execution_options(synchronize_session=False)
+        )
+        if hasta is not None:
+            stmt = stmt.where(base + cantidad <= hasta)
+
+        result = await self.db.execute(stmt)
+        return result.scalar_one_or_none()
+
+    async def _crear_contador(self, empresa_id: int, prefijo: str, desde: int) -> None:
+        """Crear el contador partiendo del mayor número ya usado por la empresa"""
+
+        ultimo_existente = (
+            select(func.coalesce(func.max(Factura.numero), desde - 1))
+            .where(
+                Factura.empresa_id == empresa_id,
+                func.coalesce(Factura.prefijo, "") == prefijo,
+            )
+            .scalar_subquery()
+        )
+        stmt = (
+            insert(NumeracionFactura)
+            .values(empresa_id=empresa_id, prefijo=prefijo, ultimo_numero=ultimo_existente)
+            .on_conflict_do_nothing(index_elements=["empresa_id", "prefijo"])
+        )
+        await self.db.execute(stmt)
+
+
+def agrupar_tramos(numeros: Sequence[int]) -> List[Tuple[int, int]]:
+    """Agrupar números en tramos consecutivos (desde, hasta)"""
+    tramos: List[Tuple[int, int]] = []
+    for numero in sorted(numeros):
+        if tramos and numero == tramos[-1][1] + 1:
+            tramos[-1] = (tramos[-1][0], numero)
+        else:
+            tramos.append((numero, numero))
+    return tramos
+
+
+class BloquesNumeracion:
+    """
+    Bloques de números reservados por este proceso
+
+    Cada bloque se reserva en una transacción propia y corta, y luego los
+    números se entregan desde memoria sin tocar la fila contadora. Los
+    números sobrantes se liberan con `liberar_todo` al cerrar el proceso.
+    """
+
+    def __init__(self, session_factory: async_sessionmaker = AsyncSessionLocal, tamano: Optional[int] = None):
+        self.session_factory = session_factory
+        self._tamano = tamano
+        self._disponibles: Dict[Tuple[int, str], Deque[int]] = {}
+        self._locks: Dict[Tuple[int, str], asyncio.Lock] = {}
+
+    @property
+    def tamano(self) -> int:
+        """Tamaño del bloque (Settings.NUMERACION_BLOQUE_TAMANO si no se indica)"""
+        return self._tamano if self._tamano is not None else settings.NUMERACION_BLOQUE_TAMANO
+
+    def habilitado(self, empresa_id: int) -> bool:
+        """Indicar si la empresa usa numeración por bloques"""
+        if self.tamano <= 0:
+            return False
+        empresas = settings.NUMERACION_BLOQUE_EMPRESAS
+        return not empresas or empresa_id in empresas
+
+    def disponibles(self, empresa_id: int, prefijo: str = "") -> int:
+        """Cantidad de números en memoria para la empresa y prefijo"""
+        return len(self._disponibles.get((empresa_id, prefijo), ()))
+
+    async def tomar(self, empresa: Empresa, cantidad: int = 1) -> List[int]:
+        """Entregar `cantidad` números, reservando un bloque nuevo si hace falta"""
+        clave = (empresa.id, empresa.prefijo_factura or "")
+        lock = self._locks.setdefault(clave, asyncio.Lock())
+
+        async with lock:
+            disponibles = self._disponibles.setdefault(clave, deque())
+            while len(disponibles) < cantidad:
+                tamano = max(self.tamano, cantidad - len(disponibles))
+                async with self.session_factory() as session:
+                    bloque = await NumeracionService(session, bloques=self).reservar_bloque(empresa, tamano)
+                    await session.commit()
+                disponibles.extend(bloque)
+                logger.info(f"Bloque de numeración reservado empresa={clave[0]} prefijo='{clave[1]}' {bloque.start}-{bloque.stop - 1}")
+
+            return [disponibles.popleft() for _ in range(cantidad)]
+
+    async def devolver(self, empresa: Empresa, numeros: Sequence[int]) -> None:
+        """Devolver números al bloque para que se entreguen primero"""
+        clave = (empresa.id, empresa.prefijo_factura or "")
+        async with self._locks.setdefault(clave, asyncio.Lock()):
+            disponibles = self._disponibles.setdefault(clave, deque())
+            ordenados = sorted([*numeros, *disponibles])
+            disponibles.clear()
+            disponibles.extend(ordenados)
+
+    async def liberar_todo(self) -> Dict[Tuple[int, str], List[Tuple[int, int]]]:
+        """Liberar todos los números en memoria (al apagar el proceso)"""
+        reporte = {}
+        for clave in list(self._disponibles):
+            async with self._locks[clave]:
+                disponibles = self._disponibles[clave]
+                if not disponibles:
+                    continue
+                numeros = list(disponibles)
+                disponibles.clear()
+                async with self.session_factory() as session:
+                    huecos = await NumeracionService(session, bloques=self).liberar(clave[0], clave[1], numeros)
+                    await session.commit()
+            reporte[clave] = huecos
+            for desde, hasta in huecos:
+                logger.warning(f"Números sin usar empresa={clave[0]} prefijo='{clave[1]}' {desde}-{hasta}")
+        return reporte
+
+
+# Bloques de numeración de este proceso
+bloques_numeracion = BloquesNumeracion()
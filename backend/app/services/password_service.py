@@ -0,0 +1,123 @@
+"""
+Hash y verificación de contraseñas (bcrypt) en un pool de hilos acotado
+"""
+
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Deque, Optional, Tuple, TypeVar
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from app.core.config import settings
+from app.core.metricas import percentil_ms
+
+# Configurar contexto de hash de contraseñas
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# Operaciones recientes para las métricas de espera y duración
+MUESTRAS_METRICAS = 1000
+
+T = TypeVar("T")
+
+
+def _medir(funcion: Callable[..., T], encolada: float, *args) -> Tuple[T, float, float]:
+    inicio = time.perf_counter()
+    resultado = funcion(*args)
+    return resultado, inicio - encolada, time.perf_counter() - inicio
+
+
+class PasswordService:
+    """
+    bcrypt fuera del event loop
+
+    bcrypt libera el GIL mientras calcula, así que los hilos del pool no
+    detienen las demás solicitudes. Como mucho `max_pendientes` operaciones
+    esperan o se ejecutan a la vez; por encima se responde 503 en lugar de
+    acumular logins que terminarían vencidos.
+    """
+
+    def __init__(self, hilos: Optional[int] = None, max_pendientes: Optional[int] = None):
+        self.hilos = hilos or settings.PASSWORD_HILOS
+        self.max_pendientes = max_pendientes or settings.PASSWORD_MAX_PENDIENTES
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pendientes = 0
+        self._completadas = 0
+        self._rechazadas = 0
+        self._tiempos: Deque[Tuple[float, float]] = deque(maxlen=MUESTRAS_METRICAS)
+
+    def _obtener_pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.hilos, thread_name_prefix="bcrypt")
+        return self._pool
+
+    async def _ejecutar(self, funcion: Callable[..., T], *args) -> T:
+        if self._pendientes >= self.max_pendientes:
+            self._rechazadas += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Servicio de autenticación saturado, intente de nuevo",
+                headers={"Retry-After": "1"},
+            )
+        self._pendientes += 1
+        try:
+            resultado, espera, duracion = await asyncio.get_running_loop().run_in_executor(
+                self._obtener_pool(), _medir, funcion, time.perf_counter(), *args
+            )
+        finally:
+            self._pendientes -= 1
+        self._completadas += 1
+        self._tiempos.append((espera, duracion))
+        return resultado
+
+    async def verificar(self, plain_password: str, hashed_password: str) -> bool:
+        """Verificar una contraseña contra su hash"""
+        return await self._ejecutar(pwd_context.verify, plain_password, hashed_password)
+
+    async def hash(self, password: str) -> str:
+        """Generar el hash de una contraseña"""
+        return await self._ejecutar(pwd_context.hash, password)
+
+    def metricas(self) -> dict:
+        """Profundidad de la cola, rechazos, espera en cola y duración de bcrypt"""
+        esperas = sorted(espera for espera, _ in self._tiempos)
+        duraciones = sorted(duracion for _, duracion in self._tiempos)
+
+        return {
+            "hilos": self.hilos,
+            "max_pendientes": self.max_pendientes,
+            "pendientes": self._pendientes,
+            "completadas": self._completadas,
+            "rechazadas": self._rechazadas,
+            "espera_ms_p50": percentil_ms(esperas, 0.50),
+            "espera_ms_p99": percentil_ms(esperas, 0.99),
+            "bcrypt_ms_p50": percentil_ms(duraciones, 0.50),
+            "bcrypt_ms_p99": percentil_ms(duraciones, 0.99),
+        }
+
+    def cerrar(self) -> None:
+        """Detener los hilos del pool"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+
+_password_service: Optional[PasswordService] = None
+
+
+def obtener_password_service() -> PasswordService:
+    """Servicio de contraseñas del proceso"""
+    global _password_service
+    if _password_service is None:
+        _password_service = PasswordService()
+    return _password_service
+
+
+def cerrar_password_service() -> None:
+    """Detener el pool de bcrypt al cerrar la aplicación"""
+    global _password_service
+    if _password_service is not None:
+        _password_service.cerrar()
+        _password_service = None
@@ -0,0 +1,417 @@
+"""
+Representación gráfica (PDF) de las facturas en un pool de procesos
+"""
+
+import asyncio
+import io
+import multiprocessing
+import os
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Deque, Dict, Optional, Sequence, Tuple
+
+from fpdf import FPDF
+
+from app.core.config import settings
+from app.core.metricas import percentil_ms
+from app.models import Cliente, Empresa, Factura, FacturaDetalle, FacturaImpuesto
+from app.services.cufe_service import ZONA_HORARIA, formato_valor
+
+# Estados en que la factura ya no cambia: su PDF se guarda en disco
+ESTADOS_INMUTABLES = ("EMITIDA", "ACEPTADA")
+
+# Plantillas compiladas por proceso (una por empresa y versión de sus datos)
+TAMANO_CACHE_PLANTILLAS = 256
+
+MUESTRAS_METRICAS = 1000
+
+
+@dataclass(frozen=True)
+class PlantillaPdf:
+    """Datos de la empresa que van en el encabezado; es la clave de la caché de plantillas"""
+    razon_social: str
+    nit: str
+    direccion: str
+    ciudad: str
+    telefono: Optional[str]
+    email: str
+    regimen_fiscal: str
+    resolucion: Optional[str]
+    fecha_resolucion: Optional[str]
+    prefijo: Optional[str]
+    desde: Optional[int]
+    hasta: Optional[int]
+    logo: Optional[str]  # Ruta del logo
+    logo_mtime: float = 0.0
+
+
+@dataclass(frozen=True)
+class DatosPdf:
+    """Todo lo que necesita un proceso del pool para renderizar una factura"""
+    plantilla: PlantillaPdf
+    numero_completo: str
+    fecha_emision: str
+    hora_emision: Optional[str]
+    fecha_vencimiento: Optional[str]
+    cliente: Tuple[str, ...]  # nombre, documento, dirección, ciudad, email
+    lineas: Tuple[Tuple[str, ...], ...]  # código, nombre, cantidad, precio, descuento, total
+    impuestos: Tuple[Tuple[str, str, str, str], ...]  # tipo, porcentaje, base, valor
+    totales: Tuple[Tuple[str, str], ...]
+    observaciones: Optional[str]
+    cufe: Optional[str]
+    qr_png: Optional[bytes]
+
+
+def _latin1(texto) -> str:
+    """Las fuentes estándar de PDF solo cubren Latin-1"""
+    return str(texto or "").encode("latin-1", "replace").decode("latin-1")
+
+
+@lru_cache(maxsize=TAMANO_CACHE_PLANTILLAS)
+def compilar_plantilla(plantilla: PlantillaPdf) -> Dict[str, object]:
+    """Textos del encabezado y logo decodificado, calculados una vez por empresa en cada proceso"""
+    logo = None
+    if plantilla.logo and os.path.exists(plantilla.logo):
+        from PIL import Image
+        with Image.open(plantilla.logo) as imagen:
+            logo = imagen.convert("RGBA" if imagen.mode in ("RGBA", "LA", "P") else "RGB")
+            logo.load()
+
+    resolucion = None
+    if plantilla.resolucion:
+        resolucion = (
+            f"Resolución DIAN N° {plantilla.resolucion}"
+            + (f" del {plantilla.fecha_resolucion}" if plantilla.fecha_resolucion else "")
+            + (f". Prefijo {plantilla.prefijo}" if plantilla.prefijo else "")
+            + (f" del {plantilla.desde} al {plantilla.hasta}" if plantilla.desde and plantilla.hasta else "")
+            + ". Autoriza facturación electrónica."
+        )
+    return {
+        "logo": logo,
+        "titulo": _latin1(plantilla.razon_social),
+        "lineas": [
+            _latin1(linea) for linea in (
+                f"NIT {plantilla.nit}",
+                plantilla.direccion,
+                plantilla.ciudad,
+                " - ".join(filter(None, (plantilla.telefono, plantilla.email))),
+                f"Régimen {plantilla.regimen_fiscal.replace('_', ' ').lower()}",
+            ) if linea
+        ],
+        "resolucion": _latin1(resolucion) if resolucion else None,
+    }
+
+
+COLUMNAS = (("Código", 25), ("Descripción", 70), ("Cant.", 15), ("Vr. unitario", 27), ("Desc.", 18), ("Total", 27))
+
+
+def renderizar_pdf(datos: DatosPdf) -> bytes:
+    """Renderizar la factura (se ejecuta en un proceso del pool)"""
+    plantilla = compilar_plantilla(datos.plantilla)
+    pdf = FPDF(format="A4")
+    pdf.set_auto_page_break(True, margin=15)
+    pdf.set_title(f"Factura {datos.numero_completo}")
+    pdf.add_page()
+
+    # Encabezado de la empresa
+    x_texto = 10
+    if plantilla["logo"] is not None:
+        pdf.image(plantilla["logo"], x=10, y=10, h=22)
+        x_texto = 45
+    pdf.set_xy(x_texto, 10)
+    pdf.set_font("Helvetica", "B", 12)
+    pdf.cell(100, 6, plantilla["titulo"], new_x="LEFT", new_y="NEXT")
+    pdf.set_font("Helvetica", "", 8)
+    for linea in plantilla["lineas"]:
+        pdf.cell(100, 4, linea, new_x="LEFT", new_y="NEXT")
+
+    # Recuadro con número y fechas
+    pdf.set_xy(140, 10)
+    pdf.set_font("Helvetica", "B", 9)
+    pdf.multi_cell(60, 5, _latin1(f"FACTURA ELECTRÓNICA DE VENTA\nN° {datos.numero_completo}"), border=1, align="C",
+                   new_x="LEFT", new_y="NEXT")
+    pdf.set_font("Helvetica", "", 8)
+    fechas = [f"Fecha: {datos.fecha_emision}"]
+    if datos.hora_emision:
+        fechas.append(f"Hora: {datos.hora_emision}{ZONA_HORARIA}")
+    if datos.fecha_vencimiento:
+        fechas.append(f"Vence: {datos.fecha_vencimiento}")
+    pdf.multi_cell(60, 4, "\n".join(fechas), border=1, align="C")
+
+    pdf.set_y(max(pdf.get_y(), 36) + 2)
+    if plantilla["resolucion"]:
+        pdf.set_font("Helvetica", "I", 7)
+        pdf.multi_cell(0, 3.5, plantilla["resolucion"])
+
+    # Adquiriente
+    pdf.ln(2)
+    pdf.set_font("Helvetica", "B", 8)
+    pdf.cell(0, 5, "Adquiriente", border="B", new_x="LMARGIN", new_y="NEXT")
+    pdf.set_font("Helvetica", "", 8)
+    for linea in datos.cliente:
+        if linea:
+            pdf.cell(0, 4, _latin1(linea), new_x="LMARGIN", new_y="NEXT")
+
+    # Líneas
+    pdf.ln(3)
+    pdf.set_font("Helvetica", "B", 8)
+    pdf.set_fill_color(230, 230, 230)
+    for titulo, ancho in COLUMNAS:
+        pdf.cell(ancho, 6, _latin1(titulo), border=1, fill=True, align="C")
+    pdf.ln()
+    pdf.set_font("Helvetica", "", 7.5)
+    for linea in datos.lineas:
+        for (_, ancho), valor, alineacion in zip(COLUMNAS, linea, "LLRRRR"):
+            pdf.cell(ancho, 5, _latin1(valor)[:60], border="LR", align=alineacion)
+        pdf.ln()
+    pdf.cell(sum(ancho for _, ancho in COLUMNAS), 0, "", border="T", new_x="LMARGIN", new_y="NEXT")
+
+    # Impuestos y totales
+    pdf.ln(3)
+    y_totales = pdf.get_y()
+    pdf.set_font("Helvetica", "B", 8)
+    for titulo in ("Impuesto", "%", "Base", "Valor"):
+        pdf.cell(22, 5, titulo, border=1, align="C", fill=True)
+    pdf.ln()
+    pdf.set_font("Helvetica", "", 8)
+    for fila in datos.impuestos:
+        for valor, alineacion in zip(fila, "LRRR"):
+            pdf.cell(22, 5, valor, border=1, align=alineacion)
+        pdf.ln()
+    y_impuestos = pdf.get_y()
+
+    pdf.set_y(y_totales)
+    for etiqueta, valor in datos.totales:
+        pdf.set_x(132)
+        negrita = etiqueta.startswith("Total a pagar")
+        pdf.set_font("Helvetica", "B" if negrita else "", 8)
+        pdf.cell(38, 5, _latin1(etiqueta), border=1)
+        pdf.cell(30, 5, valor, border=1, align="R", new_x="LMARGIN", new_y="NEXT")
+    pdf.set_y(max(pdf.get_y(), y_impuestos) + 3)
+
+    if datos.observaciones:
+        pdf.set_font("Helvetica", "", 8)
+        pdf.multi_cell(0, 4, _latin1(f"Observaciones: {datos.observaciones}"))
+
+    # CUFE y QR
+    if datos.cufe:
+        pdf.ln(2)
+        y_qr = pdf.get_y()
+        if datos.qr_png:
+            pdf.image(io.BytesIO(datos.qr_png), x=10, y=y_qr, w=32, h=32)
+        pdf.set_xy(46, y_qr)
+        pdf.set_font("Helvetica", "B", 8)
+        pdf.cell(0, 5, "CUFE:", new_x="LEFT", new_y="NEXT")
+        pdf.set_font("Courier", "", 7)
+        pdf.multi_cell(0, 3.5, datos.cufe)
+        pdf.set_y(y_qr + 34)
+
+    pdf.set_font("Helvetica", "I", 7)
+    pdf.cell(0, 4, _latin1("Representación gráfica de la factura electrónica"), align="C")
+    return bytes(pdf.output())
+
+
+def plantilla_empresa(empresa: Empresa) -> PlantillaPdf:
+    """Plantilla de la empresa; el logo se busca como `<PDF_LOGOS_DIR>/<nit>.png`"""
+    logo = None
+    logo_mtime = 0.0
+    if settings.PDF_LOGOS_DIR:
+        ruta = Path(settings.PDF_LOGOS_DIR) / f"{empresa.nit.split('-')[0]}.png"
+        if ruta.exists():
+            logo, logo_mtime = str(ruta), ruta.stat().st_mtime
+    return PlantillaPdf(
+        razon_social=empresa.razon_social,
+        nit=empresa.nit,
+        direccion=empresa.direccion,
+        ciudad=f"{empresa.ciudad}, {empresa.departamento}",
+        telefono=empresa.telefono,
+        email=empresa.email,
+        regimen_fiscal=empresa.regimen_fiscal,
+        resolucion=empresa.resolucion_dian,
+        fecha_resolucion=empresa.fecha_resolucion.isoformat() if empresa.fecha_resolucion else None,
+        prefijo=empresa.prefijo_factura,
+        desde=empresa.rango_autorizado_desde,
+        hasta=empresa.rango_autorizado_hasta,
+        logo=logo,
+        logo_mtime=logo_mtime,
+    )
+
+
+def datos_pdf(
+    factura: Factura,
+    empresa: Empresa,
+    cliente: Cliente,
+    detalles: Sequence[FacturaDetalle],
+    impuestos: Sequence[FacturaImpuesto],
+    qr_png: Optional[bytes] = None
+) -> DatosPdf:
+    """Extraer de los modelos los datos a renderizar (serializables entre procesos)"""
+    totales = [("Subtotal", factura.subtotal)]
+    if factura.total_descuentos:
+        totales.append(("Descuentos", factura.total_descuentos))
+    totales.extend((nombre, valor) for nombre, valor in (
+        ("IVA", factura.total_iva), ("INC", factura.total_inc), ("ICA", factura.total_ica)
+    ) if valor)
+    totales.append(("Total a pagar", factura.total_factura))
+
+    return DatosPdf(
+        plantilla=plantilla_empresa(empresa),
+        numero_completo=factura.numero_completo,
+        fecha_emision=factura.fecha_emision.isoformat(),
+        hora_emision=factura.hora_emision.strftime("%H:%M:%S") if factura.hora_emision else None,
+        fecha_vencimiento=factura.fecha_vencimiento.isoformat() if factura.fecha_vencimiento else None,
+        cliente=(
+            cliente.razon_social or " ".join(filter(None, (
+                cliente.primer_nombre, cliente.segundo_nombre, cliente.primer_apellido, cliente.segundo_apellido
+            ))),
+            f"{cliente.tipo_documento} {cliente.numero_documento}",
+            cliente.direccion,
+            ", ".join(filter(None, (cliente.ciudad, cliente.departamento))),
+            cliente.email,
+        ),
+        lineas=tuple(
+            (
+                detalle.codigo_producto,
+                detalle.nombre_producto,
+                f"{detalle.cantidad.normalize():f}",
+                formato_valor(detalle.precio_unitario),
+                formato_valor(detalle.total_descuentos_linea or 0),
+                formato_valor(detalle.total_linea),
+            )
+            for detalle in detalles
+        ),
+        impuestos=tuple(
+            (impuesto.tipo_impuesto, f"{impuesto.porcentaje}", formato_valor(impuesto.base_gravable),
+             formato_valor(impuesto.valor_impuesto))
+            for impuesto in impuestos
+        ),
+        totales=tuple((nombre, formato_valor(valor)) for nombre, valor in totales),
+        observaciones=factura.observaciones,
+        cufe=factura.cufe,
+        qr_png=qr_png,
+    )
+
+
+def ruta_pdf(empresa_id: int, cufe: str) -> Path:
+    """Ubicación del PDF persistido de una factura inmutable"""
+    return Path(settings.PDF_DIR) / str(empresa_id) / f"{cufe}.pdf"
+
+
+class PdfService:
+    """
+    Renderizado de PDF en un pool de procesos
+
+    Cada proceso conserva sus plantillas compiladas (compilar_plantilla), así
+    que el encabezado y el logo de una empresa se preparan una vez por proceso.
+    """
+
+    def __init__(self, procesos: Optional[int] = None):
+        self.procesos = procesos or settings.PDF_PROCESOS or os.cpu_count() or 1
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._en_curso: Dict[Path, asyncio.Future] = {}
+        self._renderizados = 0
+        self._persistidos_servidos = 0
+        self._latencias: Deque[float] = deque(maxlen=MUESTRAS_METRICAS)
+
+    def _obtener_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.procesos,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._pool
+
+    async def renderizar(self, datos: DatosPdf) -> bytes:
+        """Renderizar en el pool sin bloquear el event loop"""
+        inicio = time.perf_counter()
+        contenido = await asyncio.get_running_loop().run_in_executor(self._obtener_pool(), renderizar_pdf, datos)
+        self._renderizados += 1
+        self._latencias.append(time.perf_counter() - inicio)
+        return contenido
+
+    def persistido(self, empresa_id: int, cufe: Optional[str]) -> Optional[Path]:
+        """PDF ya guardado de una factura inmutable, si existe"""
+        if not cufe:
+            return None
+        ruta = ruta_pdf(empresa_id, cufe)
+        if ruta.exists():
+            self._persistidos_servidos += 1
+            return ruta
+        return None
+
+    async def persistir(self, empresa_id: int, datos: DatosPdf) -> Path:
+        """Renderizar y guardar el PDF de una factura inmutable (una sola vez aunque haya solicitudes concurrentes)"""
+        ruta = ruta_pdf(empresa_id, datos.cufe)
+        en_curso = self._en_curso.get(ruta)
+        if en_curso is not None:
+            return await asyncio.shield(en_curso)
+
+        futuro = asyncio.get_running_loop().create_future()
+        self._en_curso[ruta] = futuro
+        try:
+            contenido = await self.renderizar(datos)
+            await asyncio.to_thread(_escribir_atomico, ruta, contenido)
+            futuro.set_result(ruta)
+            return ruta
+        except BaseException as e:
+            futuro.set_exception(e)
+            futuro.exception()
+            raise
+        finally:
+            del self._en_curso[ruta]
+
+    async def temporal(self, datos: DatosPdf) -> Path:
+        """Renderizar a un archivo temporal (facturas que aún pueden cambiar)"""
+        contenido = await self.renderizar(datos)
+        descriptor, ruta = tempfile.mkstemp(suffix=".pdf")
+        with os.fdopen(descriptor, "wb") as archivo:
+            archivo.write(contenido)
+        return Path(ruta)
+
+    def metricas(self) -> dict:
+        latencias = sorted(self._latencias)
+
+        return {
+            "procesos": self.procesos,
+            "renderizados": self._renderizados,
+            "persistidos_servidos": self._persistidos_servidos,
+            "latencia_ms_p50": percentil_ms(latencias, 0.50),
+            "latencia_ms_p95": percentil_ms(latencias, 0.95),
+        }
+
+    def cerrar(self) -> None:
+        """Detener los procesos del pool"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+
+def _escribir_atomico(ruta: Path, contenido: bytes) -> None:
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    temporal = ruta.with_suffix(".tmp")
+    temporal.write_bytes(contenido)
+    os.replace(temporal, ruta)
+
+
+_pdf_service: Optional[PdfService] = None
+
+
+def obtener_pdf_service() -> PdfService:
+    """Servicio de PDF del proceso"""
+    global _pdf_service
+    if _pdf_service is None:
+        _pdf_service = PdfService()
+    return _pdf_service
+
+
+def cerrar_pdf_service() -> None:
+    """Detener los procesos de renderizado"""
+    global _pdf_service
+    if _pdf_service is not None:
+        _pdf_service.cerrar()
+        _pdf_service = None
@@ -0,0 +1,152 @@
+"""
+Autorización por roles: permisos de cada rol compilados en un bitset y cacheados por proceso
+"""
+
+import asyncio
+import time
+from typing import Dict, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models import Permiso, Rol
+from app.models.rol import rol_permisos
+
+# Tablas cuyos cambios obligan a recompilar la matriz
+TABLAS_PERMISOS = (Rol.__table__, Permiso.__table__, rol_permisos)
+
+# Marca en session.info de una transacción que modificó roles o permisos
+MARCA_MODIFICADOS = "permisos_modificados"
+
+
+def clave_permiso(modulo: str, accion: str) -> Tuple[str, str]:
+    """Clave normalizada de un permiso (el catálogo usa mayúsculas)"""
+    return modulo.upper(), accion.upper()
+
+
+class MatrizPermisos:
+    """
+    Permisos de cada rol como un entero usado de bitset
+
+    Cada permiso ocupa el bit de su id; un rol inactivo no tiene permisos.
+    La matriz se compila al arrancar, cuando una transacción de este
+    proceso modifica roles o permisos, y cada `recarga` segundos para ver
+    los cambios hechos por otros procesos.
+    """
+
+    def __init__(self, recarga: float, session_factory: async_sessionmaker = AsyncSessionLocal):
+        self.recarga = recarga
+        self.session_factory = session_factory
+        self._bits: Dict[Tuple[str, str], int] = {}
+        self._roles: Dict[int, int] = {}
+        self._compilada: Optional[float] = None
+        self._lock = asyncio.Lock()
+        self._tarea: Optional[asyncio.Task] = None
+        self._compilaciones = 0
+        self._verificaciones = 0
+        self._denegadas = 0
+
+    def compilar(self, permisos, asignaciones) -> None:
+        """Compilar la matriz desde filas (id, modulo, accion) y (rol_id, permiso_id)"""
+        bits = {clave_permiso(modulo, accion): 1 << permiso_id for permiso_id, modulo, accion in permisos}
+        roles: Dict[int, int] = {}
+        for rol_id, permiso_id in asignaciones:
+            roles[rol_id] = roles.get(rol_id, 0) | (1 << permiso_id)
+        self._bits, self._roles = bits, roles
+        self._compilada = time.monotonic()
+        self._compilaciones += 1
+
+    async def cargar(self, solo_si_invalidada: bool = False) -> None:
+        """Leer el catálogo de permisos y las asignaciones de los roles activos"""
+        async with self._lock:
+            if solo_si_invalidada and self._compilada is not None:
+                return
+            async with self.session_factory() as db:
+                permisos = (await db.execute(select(Permiso.id, Permiso.modulo, Permiso.accion))).all()
+                asignaciones = (await db.execute(
+                    select(rol_permisos.c.rol_id, rol_permisos.c.permiso_id)
+                    .join(Rol, Rol.id == rol_permisos.c.rol_id)
+                    .where(Rol.activo == True)
+                )).all()
+            self.compilar(permisos, asignaciones)
+        logger.info(f"Permisos compilados: {len(self._bits)} permisos, {len(self._roles)} roles")
+
+    def invalidar(self) -> None:
+        """Forzar la recompilación en la próxima verificación"""
+        self._compilada = None
+
+    async def permite(self, rol_id: int, modulo: str, accion: str) -> bool:
+        """Verificar un permiso (sin consultas salvo tras una invalidación)"""
+        if self._compilada is None:
+            await self.cargar(solo_si_invalidada=True)
+        self._verificaciones += 1
+        bit = self._bits.get(clave_permiso(modulo, accion), 0)
+        if not bit or not self._roles.get(rol_id, 0) & bit:
+            self._denegadas += 1
+            return False
+        return True
+
+    async def _recargar_periodicamente(self) -> None:
+        while True:
+            await asyncio.sleep(self.recarga)
+            try:
+                await self.cargar()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"No se pudieron recargar los permisos: {e}")
+
+    def iniciar(self) -> None:
+        """Recompilar periódicamente para ver los cambios de otros procesos"""
+        if self._tarea is None and self.recarga:
+            self._tarea = asyncio.create_task(self._recargar_periodicamente())
+
+    async def detener(self) -> None:
+        if self._tarea is not None:
+            self._tarea.cancel()
+            await asyncio.gather(self._tarea, return_exceptions=True)
+            self._tarea = None
+
+    def metricas(self) -> dict:
+        return {
+            "permisos": len(self._bits),
+            "roles": len(self._roles),
+            "compilaciones": self._compilaciones,
+            "segundos_desde_compilacion": (
+                round(time.monotonic() - self._compilada, 1) if self._compilada is not None else None
+            ),
+            "verificaciones": self._verificaciones,
+            "denegadas": self._denegadas,
+        }
+
+
+matriz_permisos = MatrizPermisos(settings.PERMISOS_RECARGA_SEGUNDOS)
+
+
+@event.listens_for(Session, "after_flush")
+def _marcar_cambios_flush(session: Session, flush_context) -> None:
+    if any(isinstance(obj, (Rol, Permiso)) for obj in (*session.new, *session.dirty, *session.deleted)):
+        session.info[MARCA_MODIFICADOS] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _marcar_cambios_sentencia(orm_execute_state) -> None:
+    # insert()/update()/delete() directos (también sobre rol_permisos, que no tiene modelo)
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        if getattr(orm_execute_state.statement, "table", None) in TABLAS_PERMISOS:
+            orm_execute_state.session.info[MARCA_MODIFICADOS] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _recompilar_tras_commit(session: Session) -> None:
+    if session.info.pop(MARCA_MODIFICADOS, False):
+        matriz_permisos.invalidar()
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_marca(session: Session) -> None:
+    session.info.pop(MARCA_MODIFICADOS, None)
@@ -0,0 +1,313 @@
+"""
+Código QR DIAN de las facturas: contenido, renderizado en un pool de procesos y caché en disco
+"""
+
+import asyncio
+import hashlib
+import io
+import multiprocessing
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+from pathlib import Path
+from typing import Dict, Optional
+
+import segno
+from loguru import logger
+from lxml import etree
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models import Cliente, Empresa, Factura
+from app.services.cufe_service import ZONA_HORARIA, codigo_ambiente, documento_sin_dv, formato_valor
+from app.services.documentos_service import TIPO_XML, DocumentosService
+from app.services.ubl_service import TRIBUTOS
+
+FORMATOS = {"png": "image/png", "svg": "image/svg+xml"}
+
+# Consulta pública del documento en el catálogo DIAN
+URL_VALIDACION = {
+    "PRODUCCION": "https://catalogo-vpfe.dian.gov.co/document/searchqr?documentkey=",
+    "PRUEBAS": "https://catalogo-vpfe-hab.dian.gov.co/document/searchqr?documentkey=",
+}
+
+# Namespaces UBL para leer el XML emitido
+NAMESPACES = {
+    "cac": "urn:oasis:names:specification:ubl:schema:xsd:CommonAggregateComponents-2",
+    "cbc": "urn:oasis:names:specification:ubl:schema:xsd:CommonBasicComponents-2",
+}
+
+# Tamaño del módulo en píxeles (PNG) o unidades (SVG) y nivel de corrección de errores
+ESCALA = 4
+CORRECCION = "m"
+
+
+class ContenidoQrNoDisponibleError(Exception):
+    """La empresa o el cliente cambiaron desde la emisión y no hay XML guardado de donde tomar el QR"""
+
+    def __init__(self, numero_completo: str):
+        self.numero_completo = numero_completo
+        super().__init__(
+            f"Los datos de la factura {numero_completo} cambiaron desde su emisión "
+            "y no está guardado el documento emitido"
+        )
+
+
+def _contenido(
+    numero: str, fecha: str, hora: str, nit: str, documento: str,
+    subtotal, iva, otros, total, cufe: str, ambiente_dian: str
+) -> str:
+    url = URL_VALIDACION.get(ambiente_dian, URL_VALIDACION["PRUEBAS"])
+    return "\n".join((
+        f"NumFac: {numero}",
+        f"FecFac: {fecha}",
+        f"HorFac: {hora}",
+        f"NitFac: {nit}",
+        f"DocAdq: {documento}",
+        f"ValFac: {formato_valor(subtotal)}",
+        f"ValIva: {formato_valor(iva)}",
+        f"ValOtroIm: {formato_valor(otros)}",
+        f"ValTolFac: {formato_valor(total)}",
+        f"CUFE: {cufe}",
+        f"QRCode: {url}{cufe}",
+    ))
+
+
+def contenido_qr(factura: Factura, empresa: Empresa, cliente: Cliente) -> str:
+    """Texto del QR según el anexo técnico DIAN"""
+    documento = cliente.numero_documento
+    if cliente.tipo_documento == "NIT":
+        documento = documento_sin_dv(documento)
+    return _contenido(
+        factura.numero_completo,
+        factura.fecha_emision.isoformat(),
+        f"{factura.hora_emision.strftime('%H:%M:%S')}{ZONA_HORARIA}",
+        documento_sin_dv(empresa.nit),
+        documento,
+        factura.subtotal,
+        factura.total_iva,
+        factura.total_inc + factura.total_ica,
+        factura.total_factura,
+        factura.cufe,
+        empresa.ambiente_dian,
+    )
+
+
+def contenido_qr_xml(xml: bytes) -> str:
+    """Texto del QR a partir del XML UBL emitido, con los datos tal como se firmaron"""
+    raiz = etree.fromstring(xml)
+
+    def texto(ruta: str) -> str:
+        return raiz.findtext(ruta, default="", namespaces=NAMESPACES)
+
+    por_tributo: Dict[str, Decimal] = {}
+    for total in raiz.findall("cac:TaxTotal", NAMESPACES):
+        tributo = total.findtext("cac:TaxSubtotal/cac:TaxCategory/cac:TaxScheme/cbc:ID", namespaces=NAMESPACES)
+        por_tributo[tributo] = por_tributo.get(tributo, Decimal(0)) + Decimal(
+            total.findtext("cbc:TaxAmount", namespaces=NAMESPACES)
+        )
+    iva = por_tributo.pop(TRIBUTOS["IVA"], Decimal(0))
+    produccion = raiz.find("cbc:UUID", NAMESPACES).get("schemeID") == codigo_ambiente("PRODUCCION")
+    return _contenido(
+        texto("cbc:ID"),
+        texto("cbc:IssueDate"),
+        texto("cbc:IssueTime"),
+        texto("cac:AccountingSupplierParty/cac:Party/cac:PartyTaxScheme/cbc:CompanyID"),
+        texto("cac:AccountingCustomerParty/cac:Party/cac:PartyTaxScheme/cbc:CompanyID"),
+        Decimal(texto("cac:LegalMonetaryTotal/cbc:LineExtensionAmount")),
+        iva,
+        sum(por_tributo.values(), Decimal(0)),
+        Decimal(texto("cac:LegalMonetaryTotal/cbc:TaxInclusiveAmount")),
+        texto("cbc:UUID"),
+        "PRODUCCION" if produccion else "PRUEBAS",
+    )
+
+
+async def contenido_qr_emitido(db: AsyncSession, factura: Factura, empresa: Empresa, cliente: Cliente) -> str:
+    """
+    Texto del QR de una factura emitida, el mismo del documento firmado
+
+    Se arma con las filas actuales solo si reproducen la referencia guardada
+    al emitir; si la empresa o el cliente cambiaron, se toma del XML emitido.
+    """
+    contenido = contenido_qr(factura, empresa, cliente)
+    if referencia_qr(contenido) == factura.qr_code:
+        return contenido
+    xml = await DocumentosService(db).obtener(factura.id, TIPO_XML)
+    if xml is None:
+        raise ContenidoQrNoDisponibleError(factura.numero_completo)
+    contenido = await asyncio.to_thread(contenido_qr_xml, xml)
+    if referencia_qr(contenido) != factura.qr_code:
+        logger.warning(f"El QR del XML emitido de la factura {factura.id} no coincide con su referencia")
+    return contenido
+
+
+def referencia_qr(contenido: str) -> str:
+    """Referencia del QR: SHA-256 del contenido (también es la clave de la caché)"""
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+
+def renderizar_qr(contenido: str, formato: str) -> bytes:
+    """Renderizar el QR (se ejecuta en un proceso del pool)"""
+    buffer = io.BytesIO()
+    segno.make(contenido, error=CORRECCION).save(buffer, kind=formato, scale=ESCALA)
+    return buffer.getvalue()
+
+
+class CacheQR:
+    """
+    Caché en disco direccionada por contenido, con límite de tamaño LRU
+
+    Cada archivo se llama `<referencia>.<formato>`; al leerlo se actualiza su
+    mtime, que es el orden LRU con que se reconstruye el índice al arrancar.
+    """
+
+    def __init__(self, directorio: str, max_bytes: int):
+        self.directorio = Path(directorio)
+        self.max_bytes = max_bytes
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        self._indice: "OrderedDict[str, int]" = OrderedDict()
+        self._bytes = 0
+        archivos = sorted(
+            (ruta for ruta in self.directorio.iterdir() if ruta.suffix.lstrip(".") in FORMATOS),
+            key=lambda ruta: ruta.stat().st_mtime
+        )
+        for ruta in archivos:
+            tamano = ruta.stat().st_size
+            self._indice[ruta.name] = tamano
+            self._bytes += tamano
+
+    def ruta(self, referencia: str, formato: str) -> Path:
+        return self.directorio / f"{referencia}.{formato}"
+
+    def obtener(self, referencia: str, formato: str) -> Optional[Path]:
+        """Ruta del QR si está en caché (y marcarlo como usado)"""
+        nombre = f"{referencia}.{formato}"
+        if nombre not in self._indice:
+            return None
+        ruta = self.directorio / nombre
+        try:
+            os.utime(ruta)
+        except FileNotFoundError:
+            self._bytes -= self._indice.pop(nombre)
+            return None
+        self._indice.move_to_end(nombre)
+        return ruta
+
+    def guardar(self, referencia: str, formato: str, datos: bytes) -> Path:
+        """Escribir el QR de forma atómica y desalojar los menos usados"""
+        nombre = f"{referencia}.{formato}"
+        ruta = self.directorio / nombre
+        temporal = ruta.with_suffix(".tmp")
+        temporal.write_bytes(datos)
+        os.replace(temporal, ruta)
+        self._bytes += len(datos) - self._indice.pop(nombre, 0)
+        self._indice[nombre] = len(datos)
+
+        while self._bytes > self.max_bytes and len(self._indice) > 1:
+            antiguo, tamano = self._indice.popitem(last=False)
+            self._bytes -= tamano
+            (self.directorio / antiguo).unlink(missing_ok=True)
+        return ruta
+
+    def metricas(self) -> dict:
+        return {"archivos": len(self._indice), "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+
+class QrService:
+    """
+    Renderizado de QR fuera del event loop con caché en disco
+
+    Las solicitudes concurrentes del mismo QR comparten un solo renderizado.
+    """
+
+    def __init__(
+        self,
+        directorio: Optional[str] = None,
+        max_bytes: Optional[int] = None,
+        procesos: Optional[int] = None
+    ):
+        self.cache = CacheQR(
+            directorio or settings.QR_CACHE_DIR,
+            max_bytes or settings.QR_CACHE_MAX_MB * 1024 * 1024
+        )
+        self.procesos = procesos or settings.QR_PROCESOS or os.cpu_count() or 1
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._en_curso: Dict[str, asyncio.Future] = {}
+        self._aciertos = 0
+        self._fallos = 0
+
+    def _obtener_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.procesos,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._pool
+
+    async def obtener(self, contenido: str, formato: str = "png") -> Path:
+        """Ruta del QR del contenido, renderizándolo si no está en caché"""
+        referencia = referencia_qr(contenido)
+        ruta = self.cache.obtener(referencia, formato)
+        if ruta is not None:
+            self._aciertos += 1
+            return ruta
+
+        clave = f"{referencia}.{formato}"
+        en_curso = self._en_curso.get(clave)
+        if en_curso is not None:
+            return await asyncio.shield(en_curso)
+
+        self._fallos += 1
+        futuro = asyncio.get_running_loop().create_future()
+        self._en_curso[clave] = futuro
+        try:
+            datos = await asyncio.get_running_loop().run_in_executor(
+                self._obtener_pool(), renderizar_qr, contenido, formato
+            )
+            ruta = self.cache.guardar(referencia, formato, datos)
+            futuro.set_result(ruta)
+            return ruta
+        except BaseException as e:
+            futuro.set_exception(e)
+            # Evitar el aviso de excepción no recuperada si nadie más esperaba
+            futuro.exception()
+            raise
+        finally:
+            del self._en_curso[clave]
+
+    def metricas(self) -> dict:
+        total = self._aciertos + self._fallos
+        return {
+            "procesos": self.procesos,
+            "aciertos": self._aciertos,
+            "fallos": self._fallos,
+            "tasa_aciertos": round(self._aciertos / total, 4) if total else None,
+            **self.cache.metricas(),
+        }
+
+    def cerrar(self) -> None:
+        """Detener los procesos del pool"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+
+_qr_service: Optional[QrService] = None
+
+
+def obtener_qr_service() -> QrService:
+    """Servicio de QR del proceso"""
+    global _qr_service
+    if _qr_service is None:
+        _qr_service = QrService()
+    return _qr_service
+
+
+def cerrar_qr_service() -> None:
+    """Detener los procesos de renderizado"""
+    global _qr_service
+    if _qr_service is not None:
+        _qr_service.cerrar()
+        _qr_service = None
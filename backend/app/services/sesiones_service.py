@@ -0,0 +1,225 @@
+"""
+Sesiones de los tokens de acceso (claim jti), refresh tokens rotativos y revocaciones replicadas en memoria
+"""
+
+import asyncio
+import hashlib
+import secrets
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from loguru import logger
+from sqlalchemy import Row, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models import Sesion, Usuario
+
+# Solapamiento de cada lectura incremental: una revocación confirmada tarde
+# puede llevar un revocada_en anterior al último visto
+SOLAPAMIENTO_SINCRONIZACION = timedelta(seconds=60)
+
+# revocada_en se escribe con el reloj de la base de datos (UTC, sin zona como
+# la columna): el cursor de la sincronización no depende del desfase entre
+# los relojes de los servidores de la aplicación
+AHORA_BD = func.timezone("utc", func.now())
+
+
+def nuevo_refresh_token() -> str:
+    """Refresh token opaco con 256 bits aleatorios"""
+    return secrets.token_urlsafe(32)
+
+
+def hash_refresh_token(refresh_token: str) -> str:
+    """Hash con que se guarda el refresh token (con 256 bits de entropía basta SHA-256, sin bcrypt)"""
+    return hashlib.sha256(refresh_token.encode("utf-8")).hexdigest()
+
+
+class SesionesService:
+    """Registro y revocación de sesiones en la tabla sesiones"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    def registrar(
+        self,
+        usuario_id: int,
+        jti: str,
+        expira: datetime,
+        ip_address: Optional[str] = None,
+        user_agent: Optional[str] = None,
+        refresh_token: Optional[str] = None,
+        familia: Optional[str] = None
+    ) -> None:
+        """Registrar la sesión de un token recién emitido (en la transacción actual)"""
+        self.db.add(Sesion(
+            usuario_id=usuario_id,
+            token=jti,
+            fecha_expiracion=expira,
+            ip_address=ip_address,
+            user_agent=user_agent,
+            refresh_hash=hash_refresh_token(refresh_token) if refresh_token else None,
+            refresh_expiracion=(
+                datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS) if refresh_token else None
+            ),
+            familia=familia or jti,
+        ))
+
+    async def rotar(self, refresh_token: str) -> Optional[Row]:
+        """
+        Consumir un refresh token: marcar su sesión como rotada y retornar el usuario
+
+        Es un único UPDATE sobre el índice de refresh_hash. Si el token ya
+        había sido rotado, alguien lo está reutilizando (robo o copia) y se
+        revoca toda la familia de sesiones.
+        """
+        refresh_hash = hash_refresh_token(refresh_token)
+        ahora = datetime.utcnow()
+        # Sobre las tablas: el update() del ORM descarta del RETURNING las columnas de usuarios
+        sesiones, usuarios = Sesion.__table__, Usuario.__table__
+        result = await self.db.execute(
+            update(sesiones)
+            .where(
+                sesiones.c.refresh_hash == refresh_hash,
+                sesiones.c.rotada_en.is_(None),
+                sesiones.c.revocada_en.is_(None),
+                sesiones.c.refresh_expiracion > ahora,
+                sesiones.c.usuario_id == usuarios.c.id,
+                usuarios.c.activo == True
+            )
+            .values(rotada_en=ahora)
+            .returning(
+                sesiones.c.familia, usuarios.c.id, usuarios.c.email,
+                usuarios.c.nombre, usuarios.c.apellido, usuarios.c.empresa_id
+            )
+        )
+        fila = result.one_or_none()
+        if fila is None:
+            await self._revocar_si_reutilizado(refresh_hash)
+        return fila
+
+    async def _revocar_si_reutilizado(self, refresh_hash: str) -> None:
+        result = await self.db.execute(
+            select(Sesion.familia).where(Sesion.refresh_hash == refresh_hash, Sesion.rotada_en.is_not(None))
+        )
+        familia = result.scalar_one_or_none()
+        if familia is None:
+            return
+        result = await self.db.execute(
+            update(Sesion)
+            .where(Sesion.familia == familia, Sesion.revocada_en.is_(None))
+            .values(revocada_en=AHORA_BD)
+            .returning(Sesion.token, Sesion.fecha_expiracion)
+            .execution_options(synchronize_session=False)
+        )
+        revocadas = result.all()
+        await self.db.commit()
+        for jti, expira in revocadas:
+            revocaciones.agregar(jti, expira)
+        logger.warning(f"Refresh token reutilizado: familia de sesiones {familia} revocada ({len(revocadas)} sesiones)")
+
+    async def revocar(self, usuario_id: int, jti: str, expira: datetime) -> None:
+        """Marcar la sesión como revocada (se crea si el token no tenía sesión registrada)"""
+        result = await self.db.execute(
+            update(Sesion)
+            .where(Sesion.token == jti, Sesion.revocada_en.is_(None))
+            .values(revocada_en=AHORA_BD)
+        )
+        if result.rowcount == 0:
+            existe = await self.db.execute(select(Sesion.id).where(Sesion.token == jti))
+            if existe.scalar_one_or_none() is None:
+                self.db.add(Sesion(
+                    usuario_id=usuario_id,
+                    token=jti,
+                    fecha_expiracion=expira,
+                    revocada_en=AHORA_BD,
+                ))
+        await self.db.commit()
+        revocaciones.agregar(jti, expira)
+
+
+class RevocacionesSesion:
+    """
+    Copia en memoria de los jti revocados y aún no vencidos
+
+    La verificación por request es una búsqueda en un dict. Las revocaciones
+    de este proceso se agregan al instante; las de otros procesos llegan con
+    la sincronización incremental cada `intervalo` segundos.
+    """
+
+    def __init__(self, intervalo: float, session_factory: async_sessionmaker = AsyncSessionLocal):
+        self.intervalo = intervalo
+        self.session_factory = session_factory
+        self._revocadas: Dict[str, datetime] = {}
+        self._ultima: Optional[datetime] = None
+        self._tarea: Optional[asyncio.Task] = None
+        self._sincronizaciones = 0
+        self._rechazadas = 0
+
+    def revocada(self, jti: Optional[str]) -> bool:
+        if jti is not None and jti in self._revocadas:
+            self._rechazadas += 1
+            return True
+        return False
+
+    def agregar(self, jti: str, expira: datetime) -> None:
+        self._revocadas[jti] = expira
+
+    def _purgar(self) -> None:
+        ahora = datetime.utcnow()
+        for jti in [jti for jti, expira in self._revocadas.items() if expira <= ahora]:
+            del self._revocadas[jti]
+
+    async def sincronizar(self) -> int:
+        """Leer las revocaciones nuevas y descartar las de tokens ya vencidos"""
+        stmt = select(Sesion.token, Sesion.fecha_expiracion, Sesion.revocada_en).where(
+            Sesion.revocada_en.is_not(None),
+            Sesion.fecha_expiracion > datetime.utcnow()
+        )
+        if self._ultima is not None:
+            stmt = stmt.where(Sesion.revocada_en >= self._ultima - SOLAPAMIENTO_SINCRONIZACION)
+        async with self.session_factory() as db:
+            filas = (await db.execute(stmt)).all()
+
+        nuevas = 0
+        for jti, expira, revocada_en in filas:
+            if jti not in self._revocadas:
+                nuevas += 1
+            self._revocadas[jti] = expira
+            if self._ultima is None or revocada_en > self._ultima:
+                self._ultima = revocada_en
+        self._purgar()
+        self._sincronizaciones += 1
+        return nuevas
+
+    async def _sincronizar_periodicamente(self) -> None:
+        while True:
+            await asyncio.sleep(self.intervalo)
+            try:
+                await self.sincronizar()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"No se pudieron sincronizar las revocaciones de sesión: {e}")
+
+    def iniciar(self) -> None:
+        if self._tarea is None:
+            self._tarea = asyncio.create_task(self._sincronizar_periodicamente())
+
+    async def detener(self) -> None:
+        if self._tarea is not None:
+            self._tarea.cancel()
+            await asyncio.gather(self._tarea, return_exceptions=True)
+            self._tarea = None
+
+    def metricas(self) -> dict:
+        return {
+            "revocadas_vigentes": len(self._revocadas),
+            "sincronizaciones": self._sincronizaciones,
+            "ultima_revocacion": self._ultima.isoformat() if self._ultima else None,
+            "tokens_rechazados": self._rechazadas,
+        }
+
+
+revocaciones = RevocacionesSesion(settings.SESIONES_SINCRONIZACION_SEGUNDOS)
@@ -0,0 +1,308 @@
+"""
+Generación del XML UBL 2.1 de la factura electrónica DIAN
+"""
+
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, TextIO
+from xml.sax.saxutils import escape, quoteattr
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Cliente, Empresa, Factura, FacturaDetalle, FacturaImpuesto
+from app.services.cufe_service import ZONA_HORARIA, codigo_ambiente, documento_sin_dv, formato_valor
+from app.services.impuestos_service import redondear, tarifas_detalle
+
+# Código y nombre de tributo DIAN por tipo de impuesto
+TRIBUTOS = {"IVA": "01", "ICA": "03", "INC": "04"}
+
+# Tipo de documento de identificación DIAN
+TIPOS_DOCUMENTO = {"CC": "13", "CE": "22", "NIT": "31", "PASAPORTE": "41"}
+
+# Tipo de organización jurídica DIAN
+TIPOS_PERSONA = {"JURIDICA": "1", "PERSONA_JURIDICA": "1", "NATURAL": "2", "PERSONA_NATURAL": "2"}
+
+# NIT de la DIAN como proveedor de autorización
+NIT_DIAN = "800197268"
+
+# Unidad de medida de las líneas (94 = unidad)
+UNIDAD_LINEA = "94"
+
+# Fragmentos de encabezado compilados por empresa
+TAMANO_CACHE_EMPRESAS = 1024
+
+DECLARACION = '<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n'
+
+APERTURA_INVOICE = (
+    '<Invoice xmlns="urn:oasis:names:specification:ubl:schema:xsd:Invoice-2"'
+    ' xmlns:cac="urn:oasis:names:specification:ubl:schema:xsd:CommonAggregateComponents-2"'
+    ' xmlns:cbc="urn:oasis:names:specification:ubl:schema:xsd:CommonBasicComponents-2"'
+    ' xmlns:ds="http://www.w3.org/2000/09/xmldsig#"'
+    ' xmlns:ext="urn:oasis:names:specification:ubl:schema:xsd:CommonExtensionComponents-2"'
+    ' xmlns:sts="dian:gov:co:facturaelectronica:Structures-2-1"'
+    ' xmlns:xades="http://uri.etsi.org/01903/v1.3.2#"'
+    ' xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">\n'
+)
+
+# Extensión vacía donde se inserta la firma XAdES
+EXTENSION_FIRMA = '<ext:UBLExtension><ext:ExtensionContent/></ext:UBLExtension>\n'
+
+
+class ImpuestosLineaInconsistentesError(Exception):
+    """Los impuestos de una línea no suman el total de impuestos guardado para ella"""
+
+    def __init__(self, numero: int, calculado, guardado):
+        self.numero = numero
+        self.calculado = calculado
+        self.guardado = guardado
+        super().__init__(
+            f"Los impuestos de la línea {numero} suman {calculado} "
+            f"y la línea tiene guardados {guardado}"
+        )
+
+
+def _texto(valor) -> str:
+    """Texto escapado para contenido de elemento"""
+    return escape(str(valor)) if valor is not None else ""
+
+
+def _esquema_tributo(tipo_impuesto: str) -> str:
+    return (
+        f'<cac:TaxScheme><cbc:ID>{TRIBUTOS[tipo_impuesto]}</cbc:ID>'
+        f'<cbc:Name>{tipo_impuesto}</cbc:Name></cac:TaxScheme>'
+    )
+
+
+def _subtotal_impuesto(tipo_impuesto: str, porcentaje, base, valor) -> str:
+    return (
+        '<cac:TaxSubtotal>'
+        f'<cbc:TaxableAmount currencyID="COP">{formato_valor(base)}</cbc:TaxableAmount>'
+        f'<cbc:TaxAmount currencyID="COP">{formato_valor(valor)}</cbc:TaxAmount>'
+        f'<cac:TaxCategory><cbc:Percent>{formato_valor(porcentaje)}</cbc:Percent>{_esquema_tributo(tipo_impuesto)}</cac:TaxCategory>'
+        '</cac:TaxSubtotal>'
+    )
+
+
+def _parte(
+    etiqueta: str, tipo_persona: str, tipo_documento: str, numero_documento: str,
+    nombre: str, direccion: str, ciudad: str, departamento: str,
+    email: Optional[str], responsabilidades: str
+) -> str:
+    """Fragmento AccountingSupplierParty / AccountingCustomerParty"""
+    documento = documento_sin_dv(numero_documento) if tipo_documento == "NIT" else numero_documento
+    nombre = _texto(nombre)
+    contacto = f'<cac:Contact><cbc:ElectronicMail>{_texto(email)}</cbc:ElectronicMail></cac:Contact>' if email else ""
+    return (
+        f'<cac:{etiqueta}>'
+        f'<cbc:AdditionalAccountID>{TIPOS_PERSONA.get(tipo_persona, "1")}</cbc:AdditionalAccountID>'
+        '<cac:Party>'
+        f'<cac:PartyName><cbc:Name>{nombre}</cbc:Name></cac:PartyName>'
+        '<cac:PhysicalLocation><cac:Address>'
+        f'<cbc:CityName>{_texto(ciudad)}</cbc:CityName>'
+        f'<cbc:CountrySubentity>{_texto(departamento)}</cbc:CountrySubentity>'
+        f'<cac:AddressLine><cbc:Line>{_texto(direccion)}</cbc:Line></cac:AddressLine>'
+        '<cac:Country><cbc:IdentificationCode>CO</cbc:IdentificationCode></cac:Country>'
+        '</cac:Address></cac:PhysicalLocation>'
+        '<cac:PartyTaxScheme>'
+        f'<cbc:RegistrationName>{nombre}</cbc:RegistrationName>'
+        f'<cbc:CompanyID schemeAgencyID="195" schemeName={quoteattr(TIPOS_DOCUMENTO.get(tipo_documento, "13"))}>{_texto(documento)}</cbc:CompanyID>'
+        f'<cbc:TaxLevelCode>{_texto(responsabilidades or "R-99-PN")}</cbc:TaxLevelCode>'
+        '<cac:TaxScheme><cbc:ID>01</cbc:ID><cbc:Name>IVA</cbc:Name></cac:TaxScheme>'
+        '</cac:PartyTaxScheme>'
+        f'{contacto}'
+        '</cac:Party>'
+        f'</cac:{etiqueta}>\n'
+    )
+
+
+@lru_cache(maxsize=TAMANO_CACHE_EMPRESAS)
+def _compilar_fragmentos(
+    nit: str, razon_social: str, tipo_contribuyente: str, direccion: str, ciudad: str,
+    departamento: str, email: Optional[str], responsabilidades: str, resolucion: Optional[str],
+    fecha_resolucion: Optional[str], prefijo: Optional[str], desde: Optional[int], hasta: Optional[int],
+    ambiente: str
+) -> Dict[str, str]:
+    """Compilar los fragmentos del documento que solo dependen de la empresa"""
+    extensiones = (
+        '<ext:UBLExtensions>\n'
+        '<ext:UBLExtension><ext:ExtensionContent><sts:DianExtensions>'
+        '<sts:InvoiceControl>'
+        f'<sts:InvoiceAuthorization>{_texto(resolucion)}</sts:InvoiceAuthorization>'
+        f'<sts:AuthorizationPeriod><cbc:StartDate>{_texto(fecha_resolucion)}</cbc:StartDate></sts:AuthorizationPeriod>'
+        '<sts:AuthorizedInvoices>'
+        f'<sts:Prefix>{_texto(prefijo)}</sts:Prefix>'
+        f'<sts:From>{_texto(desde)}</sts:From><sts:To>{_texto(hasta)}</sts:To>'
+        '</sts:AuthorizedInvoices>'
+        '</sts:InvoiceControl>'
+        '<sts:InvoiceSource><cbc:IdentificationCode listAgencyID="6" listAgencyName="United Nations Economic Commission for Europe"'
+        ' listSchemeURI="urn:oasis:names:specification:ubl:codelist:gc:CountryIdentificationCode-2.1">CO</cbc:IdentificationCode></sts:InvoiceSource>'
+        f'<sts:AuthorizationProvider><sts:AuthorizationProviderID schemeAgencyID="195" schemeID="4" schemeName="31">{NIT_DIAN}</sts:AuthorizationProviderID></sts:AuthorizationProvider>'
+        '</sts:DianExtensions></ext:ExtensionContent></ext:UBLExtension>\n'
+        f'{EXTENSION_FIRMA}'
+        '</ext:UBLExtensions>\n'
+        '<cbc:UBLVersionID>UBL 2.1</cbc:UBLVersionID>\n'
+        '<cbc:CustomizationID>10</cbc:CustomizationID>\n'
+        '<cbc:ProfileID>DIAN 2.1: Factura Electrónica de Venta</cbc:ProfileID>\n'
+        f'<cbc:ProfileExecutionID>{ambiente}</cbc:ProfileExecutionID>\n'
+    )
+    emisor = _parte(
+        "AccountingSupplierParty", tipo_contribuyente, "NIT", nit, razon_social,
+        direccion, ciudad, departamento, email, responsabilidades
+    )
+    return {"extensiones": extensiones, "emisor": emisor}
+
+
+def fragmentos_empresa(empresa: Empresa) -> Dict[str, str]:
+    """
+    Fragmentos precompilados de la empresa
+
+    La clave de la caché son los propios datos usados en el XML, así que un
+    cambio en la empresa produce fragmentos nuevos sin invalidación explícita.
+    """
+    return _compilar_fragmentos(
+        empresa.nit, empresa.razon_social, empresa.tipo_contribuyente, empresa.direccion,
+        empresa.ciudad, empresa.departamento, empresa.email,
+        ";".join(empresa.responsabilidades_fiscales or ()), empresa.resolucion_dian,
+        empresa.fecha_resolucion.isoformat() if empresa.fecha_resolucion else None,
+        empresa.prefijo_factura, empresa.rango_autorizado_desde, empresa.rango_autorizado_hasta,
+        codigo_ambiente(empresa.ambiente_dian)
+    )
+
+
+def _linea(numero: int, detalle: FacturaDetalle) -> str:
+    """Fragmento InvoiceLine de un detalle, con las tarifas guardadas al crear la factura"""
+    base = detalle.subtotal_linea - detalle.total_descuentos_linea
+
+    descuento = ""
+    if detalle.total_descuentos_linea:
+        descuento = (
+            '<cac:AllowanceCharge><cbc:ID>1</cbc:ID><cbc:ChargeIndicator>false</cbc:ChargeIndicator>'
+            f'<cbc:MultiplierFactorNumeric>{formato_valor(detalle.descuento_porcentaje)}</cbc:MultiplierFactorNumeric>'
+            f'<cbc:Amount currencyID="COP">{formato_valor(detalle.total_descuentos_linea)}</cbc:Amount>'
+            f'<cbc:BaseAmount currencyID="COP">{formato_valor(detalle.subtotal_linea)}</cbc:BaseAmount>'
+            '</cac:AllowanceCharge>'
+        )
+
+    impuestos = []
+    total_impuestos = 0
+    for tipo, porcentaje in tarifas_detalle(detalle):
+        valor = redondear(base * (porcentaje / 100))
+        total_impuestos += valor
+        impuestos.append(
+            f'<cac:TaxTotal><cbc:TaxAmount currencyID="COP">{formato_valor(valor)}</cbc:TaxAmount>'
+            f'{_subtotal_impuesto(tipo, porcentaje, base, valor)}</cac:TaxTotal>'
+        )
+    # Los totales de la factura (y el CUFE) salen de total_impuestos_linea
+    if total_impuestos != detalle.total_impuestos_linea:
+        raise ImpuestosLineaInconsistentesError(numero, total_impuestos, detalle.total_impuestos_linea)
+
+    return (
+        '<cac:InvoiceLine>'
+        f'<cbc:ID>{numero}</cbc:ID>'
+        f'<cbc:InvoicedQuantity unitCode="{UNIDAD_LINEA}">{detalle.cantidad}</cbc:InvoicedQuantity>'
+        f'<cbc:LineExtensionAmount currencyID="COP">{formato_valor(base)}</cbc:LineExtensionAmount>'
+        f'{descuento}{"".join(impuestos)}'
+        '<cac:Item>'
+        f'<cbc:Description>{_texto(detalle.nombre_producto)}</cbc:Description>'
+        f'<cac:StandardItemIdentification><cbc:ID schemeID="999">{_texto(detalle.codigo_producto)}</cbc:ID></cac:StandardItemIdentification>'
+        '</cac:Item>'
+        f'<cac:Price><cbc:PriceAmount currencyID="COP">{formato_valor(detalle.precio_unitario)}</cbc:PriceAmount>'
+        f'<cbc:BaseQuantity unitCode="{UNIDAD_LINEA}">1</cbc:BaseQuantity></cac:Price>'
+        '</cac:InvoiceLine>\n'
+    )
+
+
+def iter_xml(
+    factura: Factura,
+    empresa: Empresa,
+    cliente: Cliente,
+    detalles: Sequence[FacturaDetalle],
+    impuestos: Iterable[FacturaImpuesto]
+) -> Iterator[str]:
+    """
+    Generar el documento UBL 2.1 por fragmentos
+
+    Los fragmentos de la empresa salen de la caché y cada línea se produce
+    y entrega por separado, sin construir un árbol del documento en memoria.
+    El TaxTotal de cada línea usa las tarifas guardadas en el detalle.
+    """
+    fragmentos = fragmentos_empresa(empresa)
+
+    yield DECLARACION
+    yield APERTURA_INVOICE
+    yield fragmentos["extensiones"]
+    yield (
+        f'<cbc:ID>{_texto(factura.numero_completo)}</cbc:ID>\n'
+        f'<cbc:UUID schemeID="{codigo_ambiente(empresa.ambiente_dian)}" schemeName="CUFE-SHA384">{_texto(factura.cufe)}</cbc:UUID>\n'
+        f'<cbc:IssueDate>{factura.fecha_emision.isoformat()}</cbc:IssueDate>\n'
+        f'<cbc:IssueTime>{factura.hora_emision.strftime("%H:%M:%S") + ZONA_HORARIA if factura.hora_emision else ""}</cbc:IssueTime>\n'
+    )
+    if factura.fecha_vencimiento:
+        yield f'<cbc:DueDate>{factura.fecha_vencimiento.isoformat()}</cbc:DueDate>\n'
+    yield '<cbc:InvoiceTypeCode>01</cbc:InvoiceTypeCode>\n'
+    if factura.observaciones:
+        yield f'<cbc:Note>{_texto(factura.observaciones)}</cbc:Note>\n'
+    yield (
+        '<cbc:DocumentCurrencyCode>COP</cbc:DocumentCurrencyCode>\n'
+        f'<cbc:LineCountNumeric>{len(detalles)}</cbc:LineCountNumeric>\n'
+    )
+    yield fragmentos["emisor"]
+    yield _parte(
+        "AccountingCustomerParty", cliente.tipo_persona, cliente.tipo_documento, cliente.numero_documento,
+        cliente.get_nombre_completo(), cliente.direccion, cliente.ciudad, cliente.departamento,
+        cliente.email, cliente.responsabilidad_tributaria
+    )
+
+    # Un TaxTotal por tributo con un TaxSubtotal por tarifa
+    por_tipo: Dict[str, List[FacturaImpuesto]] = {}
+    for impuesto in impuestos:
+        por_tipo.setdefault(impuesto.tipo_impuesto, []).append(impuesto)
+    for tipo, grupo in por_tipo.items():
+        total = sum((impuesto.valor_impuesto for impuesto in grupo), 0)
+        subtotales = "".join(
+            _subtotal_impuesto(tipo, i.porcentaje, i.base_gravable, i.valor_impuesto) for i in grupo
+        )
+        yield f'<cac:TaxTotal><cbc:TaxAmount currencyID="COP">{formato_valor(total)}</cbc:TaxAmount>{subtotales}</cac:TaxTotal>\n'
+
+    yield (
+        '<cac:LegalMonetaryTotal>'
+        f'<cbc:LineExtensionAmount currencyID="COP">{formato_valor(factura.subtotal)}</cbc:LineExtensionAmount>'
+        f'<cbc:TaxExclusiveAmount currencyID="COP">{formato_valor(factura.subtotal)}</cbc:TaxExclusiveAmount>'
+        f'<cbc:TaxInclusiveAmount currencyID="COP">{formato_valor(factura.total_factura)}</cbc:TaxInclusiveAmount>'
+        f'<cbc:PayableAmount currencyID="COP">{formato_valor(factura.total_factura)}</cbc:PayableAmount>'
+        '</cac:LegalMonetaryTotal>\n'
+    )
+
+    for numero, detalle in enumerate(detalles, start=1):
+        yield _linea(numero, detalle)
+
+    yield '</Invoice>\n'
+
+
+def generar_xml(*args, **kwargs) -> str:
+    """Documento UBL 2.1 completo como texto (mismos argumentos que iter_xml)"""
+    return "".join(iter_xml(*args, **kwargs))
+
+
+def escribir_xml(destino: TextIO, *args, **kwargs) -> None:
+    """Escribir el documento UBL 2.1 en un archivo a medida que se genera"""
+    for fragmento in iter_xml(*args, **kwargs):
+        destino.write(fragmento)
+
+
+class UblService:
+    """Servicio para generar el XML UBL 2.1 de facturas guardadas"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def generar(self, factura: Factura, empresa: Empresa, cliente: Cliente) -> str:
+        """Generar el XML cargando detalles e impuestos con una consulta cada uno"""
+        detalles = (await self.db.execute(
+            select(FacturaDetalle).where(FacturaDetalle.factura_id == factura.id).order_by(FacturaDetalle.id)
+        )).scalars().all()
+        impuestos = (await self.db.execute(
+            select(FacturaImpuesto).where(FacturaImpuesto.factura_id == factura.id).order_by(FacturaImpuesto.id)
+        )).scalars().all()
+
+        return generar_xml(factura, empresa, cliente, detalles, impuestos)
@@ -0,0 +1,50 @@
+"""Invoice numbering counters per empresa and prefix
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2024-02-01 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Create numeracion_facturas table
+    op.create_table('numeracion_facturas',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('empresa_id', sa.Integer(), nullable=False),
+        sa.Column('prefijo', sa.String(length=10), nullable=False, server_default=''),
+        sa.Column('ultimo_numero', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True),
+        sa.ForeignKeyConstraint(['empresa_id'], ['empresas.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('empresa_id', 'prefijo', name='uq_numeracion_facturas_empresa_prefijo')
+    )
+    op.create_index(op.f('ix_numeracion_facturas_id'), 'numeracion_facturas', ['id'], unique=False)
+
+    # Initialize counters from the invoices already issued
+    op.execute("""
+    INSERT INTO numeracion_facturas (empresa_id, prefijo, ultimo_numero)
+    SELECT empresa_id, COALESCE(prefijo, ''), MAX(numero)
+    FROM facturas
+    GROUP BY empresa_id, COALESCE(prefijo, '');
+    """)
+
+    # Invoice numbers must be unique per empresa
+    op.create_index(
+        'uq_facturas_empresa_numero_completo', 'facturas',
+        ['empresa_id', 'numero_completo'], unique=True
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('uq_facturas_empresa_numero_completo', table_name='facturas')
+    op.drop_index(op.f('ix_numeracion_facturas_id'), table_name='numeracion_facturas')
+    op.drop_table('numeracion_facturas')
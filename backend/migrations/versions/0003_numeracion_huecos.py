@@ -0,0 +1,36 @@
+"""Audit table for unused invoice numbers from pre-allocated blocks
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2024-02-05 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Create numeracion_huecos table
+    op.create_table('numeracion_huecos',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('empresa_id', sa.Integer(), nullable=False),
+        sa.Column('prefijo', sa.String(length=10), nullable=False, server_default=''),
+        sa.Column('numero_desde', sa.Integer(), nullable=False),
+        sa.Column('numero_hasta', sa.Integer(), nullable=False),
+        sa.Column('motivo', sa.String(length=50), nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True),
+        sa.ForeignKeyConstraint(['empresa_id'], ['empresas.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_numeracion_huecos_id'), 'numeracion_huecos', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_numeracion_huecos_id'), table_name='numeracion_huecos')
+    op.drop_table('numeracion_huecos')
@@ -0,0 +1,43 @@
+"""Composite indexes for keyset pagination of invoice and catalog listings
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2024-02-12 12:00:00.000000
+
+Indexes are built CONCURRENTLY so the migration does not block invoicing
+on large tenants; see 0005 for the autocommit block and IF NOT EXISTS.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+# Listings filter by (empresa_id, activo) and page on the sort key
+INDEXES = [
+    dict(
+        index_name='ix_facturas_empresa_activo_created_at_id', table_name='facturas',
+        columns=['empresa_id', 'activo', 'created_at', 'id']
+    ),
+    dict(index_name='ix_clientes_empresa_activo_id', table_name='clientes', columns=['empresa_id', 'activo', 'id']),
+    dict(index_name='ix_productos_empresa_activo_id', table_name='productos', columns=['empresa_id', 'activo', 'id']),
+]
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for index in INDEXES:
+            op.create_index(unique=False, postgresql_concurrently=True, if_not_exists=True, **index)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for index in reversed(INDEXES):
+            op.drop_index(
+                index['index_name'], table_name=index['table_name'],
+                postgresql_concurrently=True, if_exists=True
+            )
@@ -0,0 +1,64 @@
+"""Tenant-aware composite and partial indexes for the endpoint query shapes
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2024-02-19 12:00:00.000000
+
+Indexes are built CONCURRENTLY so the migration does not block writes on
+large tables. CREATE INDEX CONCURRENTLY cannot run inside a transaction,
+so each statement runs in an autocommit block; IF NOT EXISTS lets a
+failed run be retried after dropping any index left INVALID.
+
+The facturas listing without estado_dian filter is served by
+ix_facturas_empresa_activo_created_at_id from 0004 (scanned backwards
+for ORDER BY created_at DESC, id DESC).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    # GET /facturas/?estado_dian=...
+    dict(
+        index_name='ix_facturas_empresa_activo_estado_created_at', table_name='facturas',
+        columns=['empresa_id', 'activo', 'estado_dian', 'created_at', 'id']
+    ),
+    # Lines and taxes loaded per invoice (selectinload, recalculation)
+    dict(index_name='ix_factura_detalle_factura_id', table_name='factura_detalle', columns=['factura_id']),
+    dict(index_name='ix_factura_impuestos_factura_id', table_name='factura_impuestos', columns=['factura_id']),
+    # Duplicate checks and lookups by code/document only consider active rows
+    dict(
+        index_name='uq_productos_empresa_codigo_activo', table_name='productos',
+        columns=['empresa_id', 'codigo'], unique=True, postgresql_where=sa.text('activo')
+    ),
+    dict(
+        index_name='uq_clientes_empresa_numero_documento_activo', table_name='clientes',
+        columns=['empresa_id', 'numero_documento'], unique=True, postgresql_where=sa.text('activo')
+    ),
+]
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for index in INDEXES:
+            op.create_index(
+                unique=index.get('unique', False),
+                postgresql_concurrently=True,
+                if_not_exists=True,
+                **{k: v for k, v in index.items() if k != 'unique'}
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for index in reversed(INDEXES):
+            op.drop_index(
+                index['index_name'], table_name=index['table_name'],
+                postgresql_concurrently=True, if_exists=True
+            )
@@ -0,0 +1,25 @@
+"""Technical key per empresa and emission time per invoice for the CUFE
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2024-02-26 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('empresas', sa.Column('clave_tecnica', sa.String(length=100), nullable=True))
+    op.add_column('facturas', sa.Column('hora_emision', sa.Time(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('facturas', 'hora_emision')
+    op.drop_column('empresas', 'clave_tecnica')
@@ -0,0 +1,53 @@
+"""Durable queue of invoices to submit to the DIAN web service
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2024-03-04 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Create envios_dian table
+    op.create_table('envios_dian',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('empresa_id', sa.Integer(), nullable=False),
+        sa.Column('factura_id', sa.Integer(), nullable=False),
+        sa.Column('estado', sa.String(length=20), nullable=False, server_default='PENDIENTE'),
+        sa.Column('intentos', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('proximo_intento', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False),
+        sa.Column('track_id', sa.String(length=100), nullable=True),
+        sa.Column('respuesta', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True),
+        sa.ForeignKeyConstraint(['empresa_id'], ['empresas.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['factura_id'], ['facturas.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('factura_id')
+    )
+    op.create_index(op.f('ix_envios_dian_id'), 'envios_dian', ['id'], unique=False)
+    op.create_index(
+        'ix_envios_dian_pendientes', 'envios_dian', ['proximo_intento'], unique=False,
+        postgresql_where=sa.text("estado IN ('PENDIENTE', 'EN_PROCESO')")
+    )
+
+    # Invoices emitted before the queue existed are submitted too
+    op.execute("""
+    INSERT INTO envios_dian (empresa_id, factura_id)
+    SELECT empresa_id, id FROM facturas
+    WHERE estado_dian = 'EMITIDA' AND xml_content IS NOT NULL;
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_envios_dian_pendientes', table_name='envios_dian')
+    op.drop_index(op.f('ix_envios_dian_id'), table_name='envios_dian')
+    op.drop_table('envios_dian')
@@ -0,0 +1,31 @@
+"""Store a reference to the cached QR image instead of the base64 image
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2024-03-11 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Base64 images are dropped; invoices without a reference render the QR from their data
+    op.execute("UPDATE facturas SET qr_code = NULL WHERE length(qr_code) <> 64")
+    op.alter_column('facturas', 'qr_code',
+                    existing_type=sa.Text(),
+                    type_=sa.String(length=64),
+                    existing_nullable=True)
+
+
+def downgrade() -> None:
+    op.alter_column('facturas', 'qr_code',
+                    existing_type=sa.String(length=64),
+                    type_=sa.Text(),
+                    existing_nullable=True)
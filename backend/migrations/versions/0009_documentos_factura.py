@@ -0,0 +1,100 @@
+"""Move invoice XML out of the facturas row into zstd-compressed document storage
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2024-03-18 12:00:00.000000
+
+"""
+import hashlib
+
+from alembic import op
+import sqlalchemy as sa
+import zstandard
+
+# revision identifiers, used by Alembic.
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 500
+
+
+def upgrade() -> None:
+    # Create documentos_factura table
+    op.create_table('documentos_factura',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('factura_id', sa.Integer(), nullable=False),
+        sa.Column('tipo', sa.String(length=20), nullable=False),
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('tamano', sa.Integer(), nullable=False),
+        sa.Column('contenido', sa.LargeBinary(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True),
+        sa.ForeignKeyConstraint(['factura_id'], ['facturas.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('factura_id', 'tipo', name='uq_documentos_factura_factura_tipo')
+    )
+    op.create_index(op.f('ix_documentos_factura_id'), 'documentos_factura', ['id'], unique=False)
+
+    # Copy existing XML in batches (compression happens here, not in SQL)
+    bind = op.get_bind()
+    documentos = sa.table(
+        'documentos_factura',
+        sa.column('factura_id', sa.Integer), sa.column('tipo', sa.String), sa.column('sha256', sa.String),
+        sa.column('tamano', sa.Integer), sa.column('contenido', sa.LargeBinary),
+    )
+    compresor = zstandard.ZstdCompressor(level=3)
+    ultimo_id = 0
+    while True:
+        filas = bind.execute(
+            sa.text(
+                "SELECT id, xml_content FROM facturas "
+                "WHERE xml_content IS NOT NULL AND id > :ultimo ORDER BY id LIMIT :limite"
+            ),
+            {"ultimo": ultimo_id, "limite": BATCH_SIZE},
+        ).all()
+        if not filas:
+            break
+        valores = []
+        for factura_id, xml_content in filas:
+            contenido = xml_content.encode('utf-8')
+            valores.append({
+                "factura_id": factura_id,
+                "tipo": "XML",
+                "sha256": hashlib.sha256(contenido).hexdigest(),
+                "tamano": len(contenido),
+                "contenido": compresor.compress(contenido),
+            })
+        bind.execute(documentos.insert(), valores)
+        ultimo_id = filas[-1][0]
+
+    op.drop_column('facturas', 'xml_content')
+
+
+def downgrade() -> None:
+    op.add_column('facturas', sa.Column('xml_content', sa.Text(), nullable=True))
+
+    bind = op.get_bind()
+    descompresor = zstandard.ZstdDecompressor()
+    ultimo_id = 0
+    while True:
+        filas = bind.execute(
+            sa.text(
+                "SELECT id, factura_id, contenido FROM documentos_factura "
+                "WHERE tipo = 'XML' AND id > :ultimo ORDER BY id LIMIT :limite"
+            ),
+            {"ultimo": ultimo_id, "limite": BATCH_SIZE},
+        ).all()
+        if not filas:
+            break
+        bind.execute(
+            sa.text("UPDATE facturas SET xml_content = :xml WHERE id = :factura_id"),
+            [
+                {"factura_id": factura_id, "xml": descompresor.decompress(contenido).decode('utf-8')}
+                for _, factura_id, contenido in filas
+            ],
+        )
+        ultimo_id = filas[-1][0]
+
+    op.drop_index(op.f('ix_documentos_factura_id'), table_name='documentos_factura')
+    op.drop_table('documentos_factura')
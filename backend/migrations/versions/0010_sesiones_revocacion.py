@@ -0,0 +1,27 @@
+"""Track access-token sessions by jti and record their revocation
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2024-03-25 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('sesiones', sa.Column('revocada_en', sa.DateTime(), nullable=True))
+    # Revocation sync reads only revoked sessions, ordered by revocation time
+    op.create_index('ix_sesiones_revocada_en', 'sesiones', ['revocada_en'],
+                    postgresql_where=sa.text('revocada_en IS NOT NULL'))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_sesiones_revocada_en', table_name='sesiones')
+    op.drop_column('sesiones', 'revocada_en')
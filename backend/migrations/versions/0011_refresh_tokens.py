@@ -0,0 +1,35 @@
+"""Store hashed refresh tokens and their rotation family in sesiones
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2024-04-01 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0011'
+down_revision = '0010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('sesiones', sa.Column('refresh_hash', sa.String(length=64), nullable=True))
+    op.add_column('sesiones', sa.Column('refresh_expiracion', sa.DateTime(), nullable=True))
+    op.add_column('sesiones', sa.Column('familia', sa.String(length=32), nullable=True))
+    op.add_column('sesiones', sa.Column('rotada_en', sa.DateTime(), nullable=True))
+    # /auth/refresh finds the session with a single lookup on this index
+    op.create_index('uq_sesiones_refresh_hash', 'sesiones', ['refresh_hash'], unique=True)
+    # Reuse detection revokes every session of the family
+    op.create_index('ix_sesiones_familia', 'sesiones', ['familia'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_sesiones_familia', table_name='sesiones')
+    op.drop_index('uq_sesiones_refresh_hash', table_name='sesiones')
+    op.drop_column('sesiones', 'rotada_en')
+    op.drop_column('sesiones', 'familia')
+    op.drop_column('sesiones', 'refresh_expiracion')
+    op.drop_column('sesiones', 'refresh_hash')
@@ -0,0 +1,40 @@
+"""Store the tax rates applied to each invoice line
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2024-04-08 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0012'
+down_revision = '0011'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('factura_detalle', sa.Column('porcentaje_iva', sa.Numeric(precision=5, scale=2), nullable=True))
+    op.add_column('factura_detalle', sa.Column('porcentaje_inc', sa.Numeric(precision=5, scale=2), nullable=True))
+    op.add_column('factura_detalle', sa.Column('porcentaje_ica', sa.Numeric(precision=5, scale=2), nullable=True))
+    # Existing lines take the product's current rates; if a rate changed after
+    # the invoice was created, emission rejects the line instead of
+    # sending taxes that do not add up to the stored totals
+    op.execute(
+        """
+        UPDATE factura_detalle AS d
+        SET porcentaje_iva = CASE WHEN p.incluye_iva THEN p.porcentaje_iva END,
+            porcentaje_inc = CASE WHEN p.incluye_inc THEN p.porcentaje_inc END,
+            porcentaje_ica = CASE WHEN p.incluye_ica THEN p.porcentaje_ica END
+        FROM productos AS p
+        WHERE d.producto_id = p.id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('factura_detalle', 'porcentaje_ica')
+    op.drop_column('factura_detalle', 'porcentaje_inc')
+    op.drop_column('factura_detalle', 'porcentaje_iva')
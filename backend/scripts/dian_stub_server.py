@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Servidor SOAP local que imita el web service de la DIAN
+
+Uso: python scripts/dian_stub_server.py [--port 8081] [--latencia 0.2]
+     [--tasa-fallo 0.05] [--tasa-rechazo 0.01] [--demora-validacion 2]
+
+Luego: DIAN_WSDL_URL=http://localhost:8081/WcfDianCustomerServices.svc
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+import uvicorn
+
+# Add the backend directory to Python path
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.services.dian_stub import crear_app_stub
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub local del web service DIAN")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latencia", type=float, default=0.0, help="Segundos por llamada")
+    parser.add_argument("--tasa-fallo", type=float, default=0.0, help="Fracción de llamadas con HTTP 503")
+    parser.add_argument("--tasa-rechazo", type=float, default=0.0, help="Fracción de documentos rechazados")
+    parser.add_argument("--demora-validacion", type=float, default=0.0, help="Segundos hasta el resultado de un ZIP")
+    parser.add_argument("--semilla", type=int, default=None)
+    args = parser.parse_args()
+
+    app = crear_app_stub(args.latencia, args.tasa_fallo, args.tasa_rechazo, args.demora_validacion, args.semilla)
+    print(f"📨 Stub DIAN en http://{args.host}:{args.port}/WcfDianCustomerServices.svc")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Script para generar un certificado de firma autofirmado (solo desarrollo y pruebas)
+
+Uso: python scripts/generar_certificado_prueba.py [ruta.p12] [password]
+"""
+
+import sys
+from pathlib import Path
+
+# Add the backend directory to Python path
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.services.firma_service import generar_certificado_prueba
+
+
+def main():
+    ruta = sys.argv[1] if len(sys.argv) > 1 else str(backend_dir / "certificado_pruebas.p12")
+    password = sys.argv[2] if len(sys.argv) > 2 else "pruebas"
+
+    generar_certificado_prueba(ruta, password)
+    print(f"✅ Certificado de pruebas generado en {ruta}")
+    print(f"   DIAN_CERTIFICADO_PATH={ruta}")
+    print(f"   DIAN_CERTIFICADO_PASSWORD={password}")
+
+
+if __name__ == "__main__":
+    main()
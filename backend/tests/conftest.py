@@ -4,6 +4,7 @@ Pytest configuration and shared fixtures
 
 import asyncio
 import os
+from contextlib import asynccontextmanager
 import pytest
 import pytest_asyncio
 from typing import AsyncGenerator, Generator
@@ -19,7 +20,7 @@ backend_dir = Path(__file__).parent.parent
 sys.path.insert(0, str(backend_dir))
 
 from app.main import app
-from app.core.database import Base, get_db
+from app.core.database import Base, get_db, get_db_lectura, get_db_replica, get_sesiones_lectura
 from app.core.config import settings
 from app.models import *
 from app.services.auth_service import AuthService
@@ -83,11 +84,18 @@ async def db_session(test_engine) -> AsyncGenerator[AsyncSession, None]:
 
 @pytest.fixture
 def override_get_db(db_session: AsyncSession):
-    """Override the get_db dependency for testing."""
+    """Override the database session dependencies for testing."""
     async def _override_get_db():
         yield db_session
     
+    @asynccontextmanager
+    async def _sesion_lectura():
+        yield db_session
+    
     app.dependency_overrides[get_db] = _override_get_db
+    app.dependency_overrides[get_db_lectura] = _override_get_db
+    app.dependency_overrides[get_db_replica] = _override_get_db
+    app.dependency_overrides[get_sesiones_lectura] = lambda: _sesion_lectura
     yield
     app.dependency_overrides.clear()
 
@@ -160,13 +160,25 @@ class TestAuthEndpoints:
     @pytest.mark.integration
     @pytest.mark.auth
     @pytest.mark.asyncio
-    async def test_logout(self, async_client: AsyncClient):
-        """Test logout endpoint"""
-        response = await async_client.post("/api/v1/auth/logout")
+    async def test_logout(self, async_client: AsyncClient, authenticated_headers: dict):
+        """Test that logout revokes the token"""
+        response = await async_client.post("/api/v1/auth/logout", headers=authenticated_headers)
         
         assert response.status_code == status.HTTP_200_OK
         data = response.json()
         assert "mensaje" in data["message"] or "Sesión cerrada" in data["message"]
+        
+        response = await async_client.get("/api/v1/auth/me", headers=authenticated_headers)
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    @pytest.mark.integration
+    @pytest.mark.auth
+    @pytest.mark.asyncio
+    async def test_logout_requires_token(self, async_client: AsyncClient):
+        """Test that logout without a token is rejected"""
+        response = await async_client.post("/api/v1/auth/logout")
+        
+        assert response.status_code == status.HTTP_403_FORBIDDEN
 
     @pytest.mark.integration
     @pytest.mark.auth
@@ -160,6 +160,56 @@ class TestClientesEndpoints:
         assert isinstance(data, list)
         assert len(data) <= 10
 
+    @pytest.mark.integration
+    @pytest.mark.crud
+    @pytest.mark.asyncio
+    async def test_list_clientes_cursor_pagination(
+        self, 
+        async_client: AsyncClient,
+        authenticated_headers: dict
+    ):
+        """Test walking the client list with the X-Next-Cursor header"""
+        for i in range(5):
+            response = await async_client.post(
+                "/api/v1/clientes/",
+                json={
+                    "tipo_persona": "NATURAL",
+                    "tipo_documento": "CC",
+                    "numero_documento": f"7000000{i}",
+                    "primer_nombre": "Cliente",
+                    "primer_apellido": f"Cursor {i}"
+                },
+                headers=authenticated_headers
+            )
+            assert response.status_code == status.HTTP_201_CREATED
+
+        seen_ids = []
+        url = "/api/v1/clientes/?limit=2"
+        while url:
+            response = await async_client.get(url, headers=authenticated_headers)
+            assert response.status_code == status.HTTP_200_OK
+            seen_ids.extend(client["id"] for client in response.json())
+            cursor = response.headers.get("X-Next-Cursor")
+            url = f"/api/v1/clientes/?limit=2&after={cursor}" if cursor else None
+
+        assert len(seen_ids) >= 5
+        assert seen_ids == sorted(set(seen_ids))
+
+    @pytest.mark.integration
+    @pytest.mark.asyncio
+    async def test_list_clientes_invalid_cursor(
+        self, 
+        async_client: AsyncClient,
+        authenticated_headers: dict
+    ):
+        """Test that a malformed cursor is rejected"""
+        response = await async_client.get(
+            "/api/v1/clientes/?after=no-es-un-cursor",
+            headers=authenticated_headers
+        )
+        
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
     @pytest.mark.integration
     @pytest.mark.crud
     @pytest.mark.asyncio
@@ -645,6 +645,7 @@ class TestFacturasAuthorization:
             ("PATCH", "/api/v1/facturas/1/estado"),
             ("GET", "/api/v1/facturas/1/pdf"),
             ("GET", "/api/v1/facturas/1/xml"),
+            ("GET", "/api/v1/facturas/1/qr"),
         ]
         
         for method, url in endpoints:
@@ -0,0 +1,176 @@
+"""
+Integration tests for the query plans of endpoint queries
+"""
+
+import re
+
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+from fastapi import status
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Cliente, Producto, Usuario
+
+
+@pytest_asyncio.fixture
+async def captured_selects(test_engine):
+    """Capture every SELECT statement sent to the database with its parameters"""
+    statements = []
+
+    def _capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and not executemany:
+            statements.append((statement, parameters))
+
+    event.listen(test_engine.sync_engine, "before_cursor_execute", _capture)
+    yield statements
+    event.remove(test_engine.sync_engine, "before_cursor_execute", _capture)
+
+
+# Other tenants seeded next to the test company, and rows per tenant
+EMPRESAS_SEMBRADAS = 20
+FILAS_POR_EMPRESA = 500
+
+# Tables big enough after seeding that a sequential scan means a missing index
+TABLAS_GRANDES = re.compile(r"Seq Scan on (facturas|factura_detalle|factura_impuestos|clientes|productos)\b")
+
+SIEMBRA = [
+    """
+    INSERT INTO empresas (nit, razon_social, direccion, ciudad, departamento, email,
+                          tipo_contribuyente, regimen_fiscal, ambiente_dian, activo)
+    SELECT 'PLAN-' || g, 'Empresa ' || g, 'Calle ' || g, 'Bogotá', 'Cundinamarca', 'e' || g || '@plan.co',
+           'PERSONA_JURIDICA', 'COMUN', 'PRUEBAS', true
+    FROM generate_series(1, CAST(:empresas AS integer)) AS g
+    """,
+    # Every tenant has the test client's document and the test product's code,
+    # so the single-column indexes on them are not selective
+    """
+    INSERT INTO clientes (empresa_id, tipo_persona, tipo_documento, numero_documento,
+                          direccion, ciudad, departamento, activo)
+    SELECT e.id, 'NATURAL', 'CC', CASE WHEN g = 1 THEN :documento ELSE 'PLAN-' || g END,
+           'Calle ' || g, 'Bogotá', 'Cundinamarca', true
+    FROM empresas AS e CROSS JOIN generate_series(1, CAST(:filas AS integer)) AS g
+    WHERE e.nit LIKE 'PLAN-%' OR (e.id = :empresa_id AND g > 1)
+    """,
+    """
+    INSERT INTO productos (empresa_id, codigo, nombre, tipo, precio_unitario, unidad_medida,
+                           incluye_iva, porcentaje_iva, incluye_inc, porcentaje_inc,
+                           incluye_ica, porcentaje_ica, maneja_inventario, activo)
+    SELECT e.id, CASE WHEN g = 1 THEN :codigo ELSE 'PLAN-' || g END, 'Producto ' || g, 'PRODUCTO',
+           1000, 'UNI', true, 19, false, 0, false, 0, false, true
+    FROM empresas AS e CROSS JOIN generate_series(1, CAST(:filas AS integer)) AS g
+    WHERE e.nit LIKE 'PLAN-%' OR (e.id = :empresa_id AND g > 1)
+    """,
+    # Older invoices for every tenant, the test company included, spread over the DIAN states
+    """
+    INSERT INTO facturas (empresa_id, cliente_id, numero, numero_completo, fecha_emision, estado_dian,
+                          subtotal, total_descuentos, total_iva, total_inc, total_ica,
+                          total_impuestos, total_factura, activo, created_at)
+    SELECT e.id, (SELECT min(c.id) FROM clientes AS c WHERE c.empresa_id = e.id), g, 'PLAN-' || g,
+           CURRENT_DATE, (ARRAY['BORRADOR', 'EMITIDA', 'ACEPTADA', 'RECHAZADA', 'ANULADA'])[g % 5 + 1],
+           1000, 0, 190, 0, 0, 190, 1190, true, now() - g * INTERVAL '1 minute'
+    FROM empresas AS e CROSS JOIN generate_series(1, CAST(:filas AS integer)) AS g
+    WHERE e.nit LIKE 'PLAN-%' OR e.id = :empresa_id
+    """,
+    """
+    INSERT INTO factura_detalle (factura_id, producto_id, codigo_producto, nombre_producto, cantidad,
+                                 precio_unitario, descuento_porcentaje, descuento_valor, subtotal_linea,
+                                 total_descuentos_linea, total_impuestos_linea, total_linea, porcentaje_iva)
+    SELECT f.id, (SELECT min(p.id) FROM productos AS p WHERE p.empresa_id = f.empresa_id), 'PLAN', 'Producto',
+           1, 1000, 0, 0, 1000, 0, 190, 1190, 19
+    FROM facturas AS f WHERE f.numero_completo LIKE 'PLAN-%'
+    """,
+    """
+    INSERT INTO factura_impuestos (factura_id, tipo_impuesto, porcentaje, base_gravable, valor_impuesto)
+    SELECT f.id, 'IVA', 19, 1000, 190
+    FROM facturas AS f WHERE f.numero_completo LIKE 'PLAN-%'
+    """,
+    "ANALYZE empresas, clientes, productos, facturas, factura_detalle, factura_impuestos",
+]
+
+
+async def _sembrar(db_session: AsyncSession, empresa_id: int, documento: str, codigo: str) -> None:
+    """Seed several tenants so the planner picks indexes on its own, as on production data"""
+    parametros = {
+        "empresas": EMPRESAS_SEMBRADAS, "filas": FILAS_POR_EMPRESA,
+        "empresa_id": empresa_id, "documento": documento, "codigo": codigo,
+    }
+    for sentencia in SIEMBRA:
+        await db_session.execute(text(sentencia), parametros)
+
+
+async def _explain(db_session: AsyncSession, statement: str, parameters) -> str:
+    """EXPLAIN a captured statement"""
+    connection = await db_session.connection()
+    result = await connection.exec_driver_sql(f"EXPLAIN {statement}", parameters)
+    return "\n".join(row[0] for row in result)
+
+
+class TestEndpointQueryPlans:
+    """Test that hot endpoint queries are served by indexes"""
+
+    @pytest.mark.integration
+    @pytest.mark.performance
+    @pytest.mark.asyncio
+    async def test_endpoint_queries_use_indexes(
+        self,
+        async_client: AsyncClient,
+        authenticated_headers: dict,
+        db_session: AsyncSession,
+        test_usuario: Usuario,
+        test_cliente: Cliente,
+        test_producto: Producto,
+        captured_selects: list
+    ):
+        """Test that each endpoint query is planned on the index built for it"""
+        empresa_id = test_usuario.empresa_id
+        response = await async_client.post(
+            "/api/v1/facturas/",
+            json={
+                "cliente_id": test_cliente.id,
+                "fecha_emision": "2024-01-15",
+                "detalles": [
+                    {"producto_id": test_producto.id, "cantidad": 1.0, "precio_unitario": 50000.00}
+                ]
+            },
+            headers=authenticated_headers
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+        factura_id = response.json()["id"]
+        await _sembrar(db_session, empresa_id, test_cliente.numero_documento, test_producto.codigo)
+
+        response = await async_client.get("/api/v1/facturas/?limit=1", headers=authenticated_headers)
+        cursor = response.headers["X-Next-Cursor"]
+        esperados = {
+            "/api/v1/facturas/?limit=10": ["ix_facturas_empresa_activo_created_at_id"],
+            f"/api/v1/facturas/?limit=10&after={cursor}": ["ix_facturas_empresa_activo_created_at_id"],
+            "/api/v1/facturas/?limit=10&estado_dian=BORRADOR": ["ix_facturas_empresa_activo_estado_created_at"],
+            f"/api/v1/facturas/{factura_id}?empresa_id={empresa_id}": [
+                "ix_factura_detalle_factura_id", "ix_factura_impuestos_factura_id"
+            ],
+            "/api/v1/clientes/?limit=10": ["ix_clientes_empresa_activo_id"],
+            f"/api/v1/clientes/{test_cliente.id}": ["clientes_pkey"],
+            f"/api/v1/clientes/documento/{test_cliente.numero_documento}": [
+                "uq_clientes_empresa_numero_documento_activo"
+            ],
+            "/api/v1/productos/?limit=10": ["ix_productos_empresa_activo_id"],
+            f"/api/v1/productos/{test_producto.id}?empresa_id={empresa_id}": ["productos_pkey"],
+            f"/api/v1/productos/codigo/{test_producto.codigo}?empresa_id={empresa_id}": [
+                "uq_productos_empresa_codigo_activo"
+            ],
+        }
+
+        for url, indices in esperados.items():
+            captured_selects.clear()
+            response = await async_client.get(url, headers=authenticated_headers)
+            assert response.status_code == status.HTTP_200_OK, url
+            statements = list(captured_selects)
+            captured_selects.clear()
+            assert statements, url
+
+            planes = [await _explain(db_session, statement, parameters) for statement, parameters in statements]
+            for (statement, _), plan in zip(statements, planes):
+                assert not TABLAS_GRANDES.search(plan), f"{url}\n{statement}\n{plan}"
+            for indice in indices:
+                assert any(indice in plan for plan in planes), f"{url} does not use {indice}\n" + "\n\n".join(planes)
@@ -665,4 +665,631 @@ class TestScalabilityIndicators:
         
         # Should complete most operations successfully
         assert successful_responses >= len(tasks) * 0.9  # 90% success rate
-        assert execution_time < 15.0  # Should complete within 15 seconds
\ No newline at end of file
+        assert execution_time < 15.0  # Should complete within 15 seconds
+
+class TestImpuestosPerformance:
+    """Test that invoice total calculation scales with line count"""
+
+    @pytest.mark.slow
+    @pytest.mark.performance
+    @pytest.mark.parametrize("num_lineas", [1, 50, 500])
+    def test_calcular_totales_benchmark(self, num_lineas: int):
+        """Benchmark the in-memory tax calculation for 1, 50 and 500 lines"""
+        from decimal import Decimal
+        from app.services.impuestos_service import calcular_totales
+
+        tarifas = {
+            i: [("IVA", Decimal("19.00")), ("INC", Decimal("8.00"))] if i % 2 else [("IVA", Decimal("5.00"))]
+            for i in range(num_lineas)
+        }
+        lineas = [
+            {
+                "producto_id": i,
+                "cantidad": Decimal("2.500"),
+                "precio_unitario": Decimal("12345.67"),
+                "descuento_porcentaje": Decimal("7.50"),
+            }
+            for i in range(num_lineas)
+        ]
+
+        iterations = 20
+        start_time = time.perf_counter()
+        for _ in range(iterations):
+            calculo = calcular_totales(lineas, tarifas)
+        per_invoice = (time.perf_counter() - start_time) / iterations
+
+        assert len(calculo["lineas"]) == num_lineas
+        assert per_invoice / num_lineas < 0.0005  # Under 0.5 ms per line
+
+    @pytest.mark.slow
+    @pytest.mark.performance
+    @pytest.mark.database
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("num_lineas", [1, 50, 500])
+    async def test_factura_totals_query_count_is_flat(
+        self,
+        num_lineas: int,
+        test_engine,
+        db_session,
+        test_empresa,
+        test_cliente
+    ):
+        """Recalculating totals issues the same number of statements for 1, 50 and 500 lines"""
+        from datetime import date
+        from decimal import Decimal
+        from sqlalchemy import event
+        from app.models import FacturaDetalle
+        from app.services.impuestos_service import ImpuestosService
+
+        productos = [
+            Producto(
+                empresa_id=test_empresa.id,
+                codigo=f"TAX{i:04d}",
+                nombre=f"Producto impuestos {i}",
+                tipo="PRODUCTO",
+                precio_unitario=Decimal("1000.00"),
+                unidad_medida="UNI",
+                incluye_iva=True,
+                porcentaje_iva=Decimal("19.00"),
+                incluye_inc=i % 3 == 0,
+                porcentaje_inc=Decimal("8.00")
+            )
+            for i in range(num_lineas)
+        ]
+        db_session.add_all(productos)
+        await db_session.flush()
+
+        factura = Factura(
+            empresa_id=test_empresa.id,
+            cliente_id=test_cliente.id,
+            numero=1,
+            numero_completo="TAX1",
+            fecha_emision=date(2024, 1, 15)
+        )
+        db_session.add(factura)
+        await db_session.flush()
+
+        db_session.add_all([
+            FacturaDetalle(
+                factura_id=factura.id,
+                producto_id=producto.id,
+                codigo_producto=producto.codigo,
+                nombre_producto=producto.nombre,
+                cantidad=Decimal("2.000"),
+                precio_unitario=Decimal("1000.00"),
+                descuento_porcentaje=Decimal("0.00"),
+                subtotal_linea=Decimal("0.00"),
+                total_linea=Decimal("0.00")
+            )
+            for producto in productos
+        ])
+        await db_session.flush()
+
+        statements = []
+
+        def count_statement(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(test_engine.sync_engine, "before_cursor_execute", count_statement)
+        try:
+            start_time = time.perf_counter()
+            calculo = await ImpuestosService(db_session).calculate_factura_totals(factura.id)
+            execution_time = time.perf_counter() - start_time
+        finally:
+            event.remove(test_engine.sync_engine, "before_cursor_execute", count_statement)
+
+        assert calculo["totales"]["subtotal"] == Decimal("2000.00") * num_lineas
+        assert len(statements) <= 5  # SELECT, bulk UPDATE lines, UPDATE header, DELETE + INSERT taxes
+        assert execution_time < 2.0
+
+
+class TestNumeracionConcurrency:
+    """Test invoice numbering under concurrent writers"""
+
+    @pytest.mark.slow
+    @pytest.mark.performance
+    @pytest.mark.database
+    @pytest.mark.asyncio
+    async def test_concurrent_number_allocation_no_duplicates(self, test_engine):
+        """200 concurrent allocations for one empresa yield 200 distinct consecutive numbers"""
+        from sqlalchemy import delete
+        from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+        from app.models import Empresa, NumeracionFactura
+        from app.services.numeracion_service import NumeracionService
+        from tests.conftest import TEST_DATABASE_URL
+
+        num_concurrent = 200
+        engine = create_async_engine(TEST_DATABASE_URL, pool_size=20, max_overflow=0)
+        session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+        async with session_factory() as session:
+            empresa = Empresa(
+                nit="900999888-1",
+                razon_social="Numeración Concurrente S.A.S.",
+                direccion="Calle 1 # 2-3",
+                ciudad="Bogotá",
+                departamento="Cundinamarca",
+                email="numeracion@empresa.com",
+                tipo_contribuyente="PERSONA_JURIDICA",
+                regimen_fiscal="COMUN",
+                prefijo_factura="CC",
+                rango_autorizado_desde=1,
+                rango_autorizado_hasta=num_concurrent
+            )
+            session.add(empresa)
+            await session.commit()
+
+        async def allocate():
+            async with session_factory() as session:
+                numeros = await NumeracionService(session).asignar(empresa)
+                await session.commit()
+                return numeros[0]
+
+        try:
+            start_time = time.time()
+            numeros = await asyncio.gather(*[allocate() for _ in range(num_concurrent)])
+            execution_time = time.time() - start_time
+
+            assert sorted(numeros) == list(range(1, num_concurrent + 1))
+            assert execution_time < 10.0
+        finally:
+            async with session_factory() as session:
+                await session.execute(delete(NumeracionFactura).where(NumeracionFactura.empresa_id == empresa.id))
+                await session.execute(delete(Empresa).where(Empresa.id == empresa.id))
+                await session.commit()
+            await engine.dispose()
+
+
+class TestFacturasBatchPerformance:
+    """Test batch invoice creation throughput"""
+
+    @pytest.mark.slow
+    @pytest.mark.performance
+    @pytest.mark.asyncio
+    async def test_batch_vs_single_throughput(
+        self,
+        async_client: AsyncClient,
+        authenticated_headers: dict,
+        test_cliente: Cliente,
+        test_producto: Producto
+    ):
+        """Compare invoices per second of POST /facturas/batch against one POST per invoice"""
+        factura_data = {
+            "cliente_id": test_cliente.id,
+            "fecha_emision": "2024-01-15",
+            "detalles": [
+                {
+                    "producto_id": test_producto.id,
+                    "cantidad": 1.0,
+                    "precio_unitario": 50000.00
+                }
+            ] * 3
+        }
+
+        num_single = 20
+        start_time = time.perf_counter()
+        for _ in range(num_single):
+            response = await async_client.post(
+                "/api/v1/facturas/",
+                json=factura_data,
+                headers=authenticated_headers
+            )
+            assert response.status_code == status.HTTP_201_CREATED
+        single_rate = num_single / (time.perf_counter() - start_time)
+
+        num_batch = 500
+        start_time = time.perf_counter()
+        response = await async_client.post(
+            "/api/v1/facturas/batch",
+            json={"facturas": [factura_data] * num_batch},
+            headers=authenticated_headers
+        )
+        batch_rate = num_batch / (time.perf_counter() - start_time)
+
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["creadas"] == num_batch
+        assert len({r["numero_completo"] for r in data["resultados"]}) == num_batch
+
+        print(f"single: {single_rate:.1f} facturas/s, batch: {batch_rate:.1f} facturas/s")
+        assert batch_rate >= single_rate * 10  # Target: 10x per-invoice throughput
+
+
+class TestCufePerformance:
+    """Test CUFE generation throughput"""
+
+    @pytest.mark.slow
+    @pytest.mark.performance
+    def test_cufe_batch_throughput(self):
+        """Test hashing a nightly-sized batch of invoices"""
+        from dataclasses import replace
+        from datetime import date, time as hora
+        from decimal import Decimal
+        from app.services.cufe_service import DatosCufe, calcular_cufe, calcular_cufes_lote
+
+        datos = DatosCufe(
+            numero_completo="FT1", fecha_emision=date(2024, 1, 15), hora_emision=hora(10, 0, 0),
+            subtotal=Decimal("100000.00"), total_iva=Decimal("19000.00"), total_inc=Decimal("0.00"),
+            total_ica=Decimal("0.00"), total_factura=Decimal("119000.00"), nit_emisor="900123456",
+            documento_adquiriente="98765432", clave_tecnica="fc8eac422eba16e22ffd8c6f94b3f40a6e38162c",
+            ambiente="2"
+        )
+        lote = [replace(datos, numero_completo=f"FT{i}") for i in range(100000)]
+
+        start_time = time.perf_counter()
+        calcular_cufe(datos)
+        single_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        cufes = calcular_cufes_lote(lote)
+        batch_time = time.perf_counter() - start_time
+
+        assert len(cufes) == len(lote)
+        print(f"CUFE single: {single_time * 1e6:.1f}us, batch: {len(lote) / batch_time:.0f} CUFE/s")
+        assert single_time < 0.001  # Cheap enough to run inline on emission
+        assert batch_time < 10.0
+
+
+class TestUblPerformance:
+    """Test UBL XML generation memory and throughput"""
+
+    @pytest.mark.slow
+    @pytest.mark.performance
+    @pytest.mark.parametrize("num_lineas", [10, 1000, 10000])
+    def test_xml_generation(self, num_lineas):
+        """Test streaming generation of invoices with 10, 1k and 10k lines"""
+        import io
+        import tracemalloc
+        from datetime import date, time as hora
+        from decimal import Decimal
+        from app.models import Empresa, FacturaDetalle, FacturaImpuesto
+        from app.services.ubl_service import escribir_xml
+
+        empresa = Empresa(
+            id=1, nit="900123456-1", razon_social="Empresa Test S.A.S.", tipo_contribuyente="PERSONA_JURIDICA",
+            direccion="Carrera 10 # 20-30", ciudad="Bogotá", departamento="Cundinamarca", email="test@empresa.com",
+            ambiente_dian="PRUEBAS", prefijo_factura="FT", rango_autorizado_desde=1, rango_autorizado_hasta=5000
+        )
+        cliente = Cliente(
+            tipo_persona="NATURAL", tipo_documento="CC", numero_documento="98765432", primer_nombre="Juan",
+            primer_apellido="Pérez", direccion="Calle 15 # 10-20", ciudad="Bogotá", departamento="Cundinamarca"
+        )
+        detalles = [
+            FacturaDetalle(
+                producto_id=1, codigo_producto=f"P{i}", nombre_producto=f"Producto {i}",
+                cantidad=Decimal("1.000"), precio_unitario=Decimal("100.00"), descuento_porcentaje=Decimal("0.00"),
+                subtotal_linea=Decimal("100.00"), total_descuentos_linea=Decimal("0.00"),
+                total_impuestos_linea=Decimal("19.00"), total_linea=Decimal("119.00"),
+                porcentaje_iva=Decimal("19.00")
+            )
+            for i in range(num_lineas)
+        ]
+        factura = Factura(
+            numero_completo="FT1", fecha_emision=date(2024, 1, 15), hora_emision=hora(10, 0, 0), cufe="a" * 96,
+            subtotal=Decimal("100.00") * num_lineas, total_iva=Decimal("19.00") * num_lineas,
+            total_factura=Decimal("119.00") * num_lineas
+        )
+        impuestos = [FacturaImpuesto(
+            tipo_impuesto="IVA", porcentaje=Decimal("19.00"),
+            base_gravable=factura.subtotal, valor_impuesto=factura.total_iva
+        )]
+
+        class _Contador(io.TextIOBase):
+            """Discard output, count characters"""
+            escritos = 0
+
+            def write(self, fragmento):
+                self.escritos += len(fragmento)
+                return len(fragmento)
+
+        destino = _Contador()
+        tracemalloc.start()
+        start_time = time.perf_counter()
+        escribir_xml(destino, factura, empresa, cliente, detalles, impuestos)
+        elapsed = time.perf_counter() - start_time
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print(
+            f"{num_lineas} lines: {elapsed * 1000:.1f}ms, {num_lineas / elapsed:.0f} lines/s, "
+            f"{destino.escritos / 1024:.0f}KB XML, peak {peak / 1024:.0f}KB"
+        )
+        # Streaming: peak memory stays well below the document size
+        assert num_lineas < 1000 or peak < destino.escritos / 4
+        assert elapsed < num_lineas * 0.001 + 0.1
+
+
+class TestFirmaPerformance:
+    """Test XAdES signing throughput in the process pool"""
+
+    @pytest.mark.slow
+    @pytest.mark.performance
+    @pytest.mark.asyncio
+    async def test_signing_throughput(self, tmp_path):
+        """Test signing a batch without blocking the event loop"""
+        from app.services.firma_service import FirmaService, generar_certificado_prueba
+        from tests.unit.test_firma_service import DOCUMENTO
+
+        ruta = str(tmp_path / "pruebas.p12")
+        generar_certificado_prueba(ruta, "secreto")
+        servicio = FirmaService(ruta, "secreto", max_pendientes=50)
+
+        try:
+            # Warm up the pool so process start-up is not measured
+            await servicio.firmar(DOCUMENTO.format(numero="FT0"))
+
+            # The event loop must keep ticking while signatures run
+            ticks = 0
+
+            async def _tick():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.001)
+                    ticks += 1
+
+            ticker = asyncio.create_task(_tick())
+            num_documentos = 500
+            start_time = time.perf_counter()
+            firmados = await servicio.firmar_lote(
+                [DOCUMENTO.format(numero=f"FT{i}") for i in range(num_documentos)]
+            )
+            elapsed = time.perf_counter() - start_time
+            ticker.cancel()
+            metricas = servicio.metricas()
+        finally:
+            servicio.cerrar()
+
+        assert len(firmados) == num_documentos
+        print(f"{num_documentos / elapsed:.0f} firmas/s with {servicio.procesos} processes, metrics: {metricas}")
+        assert ticks > elapsed * 100  # Loop stayed responsive
+        assert metricas["firmadas"] == num_documentos + 1
+
+
+class TestDianQueuePerformance:
+    """Test DIAN submission throughput against the local stub"""
+
+    @pytest.mark.slow
+    @pytest.mark.performance
+    @pytest.mark.asyncio
+    async def test_batched_vs_single_submission(self):
+        """Test that zip batching needs far fewer round trips than one call per invoice"""
+        import httpx
+        from app.services.cola_dian import ACEPTADA, enviar
+        from app.services.dian_client import DianClient
+        from app.services.dian_stub import crear_app_stub
+        from tests.unit.test_cola_dian import URL, _envio
+
+        num_documentos = 500
+        latencia = 0.01  # Simulated network round trip per SOAP call
+
+        async def _medir(lote):
+            app = crear_app_stub(latencia=latencia)
+            cliente = DianClient(URL, transport=httpx.ASGITransport(app=app))
+            envios = [_envio(n, empresa_id=n % 5 if lote == 1 else 1) for n in range(1, num_documentos + 1)]
+            start_time = time.perf_counter()
+            try:
+                if lote == 1:
+                    resultados = []
+                    for envio in envios:
+                        resultados.extend(await enviar(cliente, [envio], lote=1))
+                else:
+                    enviados = {r.envio_id: r.track_id for r in await enviar(cliente, envios, lote=lote)}
+                    for envio in envios:
+                        envio.track_id = enviados[envio.envio_id]
+                    resultados = await enviar(cliente, envios, lote=lote)
+            finally:
+                await cliente.cerrar()
+            return time.perf_counter() - start_time, resultados, app.state.llamadas
+
+        tiempo_individual, individuales, llamadas_individuales = await _medir(1)
+        tiempo_lote, en_lote, llamadas_lote = await _medir(50)
+
+        assert {r.resultado for r in individuales} == {ACEPTADA}
+        assert {r.resultado for r in en_lote} == {ACEPTADA}
+        print(
+            f"single: {num_documentos / tiempo_individual:.0f} docs/s {llamadas_individuales}, "
+            f"batched: {num_documentos / tiempo_lote:.0f} docs/s {llamadas_lote}"
+        )
+        assert llamadas_lote["SendBillAsync"] + llamadas_lote["GetStatusZip"] == 2 * num_documentos // 50
+        assert tiempo_lote < tiempo_individual
+
+
+class TestQrPerformance:
+    """Test QR rendering throughput and cache hit cost"""
+
+    @pytest.mark.slow
+    @pytest.mark.performance
+    @pytest.mark.asyncio
+    async def test_render_vs_cache_hit(self, tmp_path):
+        """Test that serving a cached QR is much cheaper than rendering it"""
+        from app.services.qr_service import QrService
+        from tests.unit.test_qr_service import _factura
+        from app.services.qr_service import contenido_qr
+
+        servicio = QrService(str(tmp_path), max_bytes=64 * 1024 * 1024)
+        base = contenido_qr(*_factura())
+        contenidos = [f"{base}\n#{i}" for i in range(200)]
+        try:
+            await servicio.obtener(base)  # Warm up the pool
+
+            start_time = time.perf_counter()
+            await asyncio.gather(*(servicio.obtener(c) for c in contenidos))
+            tiempo_render = time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            for c in contenidos:
+                await servicio.obtener(c)
+            tiempo_cache = time.perf_counter() - start_time
+        finally:
+            servicio.cerrar()
+
+        print(
+            f"render: {len(contenidos) / tiempo_render:.0f} QR/s with {servicio.procesos} processes, "
+            f"cache hit: {len(contenidos) / tiempo_cache:.0f} QR/s"
+        )
+        assert tiempo_cache * 10 < tiempo_render
+
+
+class TestPdfPerformance:
+    """Test PDF rendering throughput"""
+
+    @pytest.mark.slow
+    @pytest.mark.performance
+    @pytest.mark.asyncio
+    async def test_pdfs_per_second_per_core(self):
+        """Report PDFs per second per rendering process"""
+        from app.services.pdf_service import PdfService
+        from tests.unit.test_pdf_service import _datos
+
+        servicio = PdfService()
+        datos = _datos(20)
+        try:
+            await servicio.renderizar(datos)  # Warm up processes and template caches
+
+            num_pdfs = 100
+            start_time = time.perf_counter()
+            pdfs = await asyncio.gather(*(servicio.renderizar(datos) for _ in range(num_pdfs)))
+            elapsed = time.perf_counter() - start_time
+        finally:
+            servicio.cerrar()
+
+        assert all(pdf.startswith(b"%PDF") for pdf in pdfs)
+        por_segundo = num_pdfs / elapsed
+        print(
+            f"{por_segundo:.0f} PDFs/s with {servicio.procesos} processes, "
+            f"{por_segundo / servicio.procesos:.0f} PDFs/s per core, metrics: {servicio.metricas()}"
+        )
+        assert por_segundo / servicio.procesos > 5
+
+
+class TestListSerializationPerformance:
+    """Test the CPU cost of serializing listing pages"""
+
+    @pytest.mark.slow
+    @pytest.mark.performance
+    def test_projected_rows_vs_response_models(self):
+        """Serializing 1000 projected rows must cost at least 5x less CPU than ORM instances plus response models"""
+        import json
+        from typing import List
+        from fastapi.routing import serialize_response
+        from fastapi.utils import create_response_field
+        from pydantic import TypeAdapter
+        from app.core.serializacion import respuesta_json
+        from app.schemas.factura import FacturaList, FacturaListFila
+        from tests.unit.test_serializacion import _filas_factura
+
+        filas = _filas_factura(1000)
+        campo = create_response_field(name="Response_list_facturas", type_=List[FacturaList])
+        adaptador = TypeAdapter(List[FacturaListFila])
+        repeticiones = 20
+
+        async def por_modelos():
+            # Camino anterior: instancias ORM -> FacturaList -> validación y jsonable_encoder de FastAPI.
+            # Las instancias se construyen aquí como aproximación a la hidratación de las filas
+            facturas = [
+                Factura(
+                    id=fila.id, numero_completo=fila.numero_completo, fecha_emision=fila.fecha_emision,
+                    estado_dian=fila.estado_dian, total_factura=fila.total_factura, activo=fila.activo,
+                    created_at=fila.created_at
+                )
+                for fila in filas
+            ]
+            lista = [
+                FacturaList(
+                    id=f.id, numero_completo=f.numero_completo, fecha_emision=f.fecha_emision,
+                    cliente_nombre=fila.cliente_nombre, estado_dian=f.estado_dian,
+                    total_factura=f.total_factura, activo=f.activo
+                )
+                for f, fila in zip(facturas, filas)
+            ]
+            contenido = await serialize_response(field=campo, response_content=lista)
+            return json.dumps(contenido, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+        def medir(funcion):
+            # Mejor de varias rondas tras un calentamiento, para aislar el ruido del runner
+            resultado = funcion()
+            tiempos = []
+            for _ in range(5):
+                start = time.process_time()
+                for _ in range(repeticiones):
+                    funcion()
+                tiempos.append((time.process_time() - start) / repeticiones)
+            return min(tiempos), resultado
+
+        loop = asyncio.new_event_loop()
+        try:
+            anterior, cuerpo_anterior = medir(lambda: loop.run_until_complete(por_modelos()))
+        finally:
+            loop.close()
+        nuevo, response = medir(lambda: respuesta_json(adaptador, filas))
+
+        assert json.loads(response.body) == json.loads(cuerpo_anterior)
+        ratio = anterior / nuevo
+        print(
+            f"1000-row page: models {anterior * 1000:.2f} ms CPU, "
+            f"projected rows {nuevo * 1000:.2f} ms CPU ({ratio:.1f}x)"
+        )
+        assert ratio >= 5
+
+
+class TestPasswordHashingPerformance:
+    """Test that password hashing does not stall unrelated requests"""
+
+    @pytest.mark.slow
+    @pytest.mark.performance
+    @pytest.mark.asyncio
+    async def test_unrelated_p99_during_concurrent_logins(self):
+        """p99 of an unrelated endpoint stays low during 100 concurrent password verifications"""
+        from httpx import ASGITransport
+        from app.main import app
+        from passlib.hash import bcrypt
+        from app.services.password_service import PasswordService, pwd_context
+
+        servicio = PasswordService(hilos=4, max_pendientes=100)
+        hashed = bcrypt.using(rounds=8).hash("secreto123")
+
+        async def latencias_health(client, n):
+            # Carga abierta: una solicitud cada 5 ms, medida desde su instante programado,
+            # así el tiempo que el event loop pasa bloqueado cuenta como latencia
+            inicio = time.perf_counter()
+
+            async def solicitud(i):
+                programada = inicio + i * 0.005
+                await asyncio.sleep(max(programada - time.perf_counter(), 0))
+                response = await client.get("/health")
+                assert response.status_code == 200
+                return time.perf_counter() - programada
+
+            return sorted(await asyncio.gather(*(solicitud(i) for i in range(n))))
+
+        def p99(valores):
+            return valores[min(len(valores) - 1, int(len(valores) * 0.99))] * 1000
+
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            base = await latencias_health(client, 100)
+
+            inicio = time.perf_counter()
+            logins = asyncio.gather(*(servicio.verificar("secreto123", hashed) for _ in range(100)))
+            carga = await latencias_health(client, 100)
+            resultados = await logins
+            duracion_logins = time.perf_counter() - inicio
+
+            # Comparación: el mismo bcrypt ejecutado dentro del event loop
+            async def login_bloqueante():
+                await asyncio.sleep(0)
+                pwd_context.verify("secreto123", hashed)
+
+            logins = asyncio.gather(*(login_bloqueante() for _ in range(20)))
+            en_loop = await latencias_health(client, 20)
+            await logins
+        servicio.cerrar()
+
+        assert all(resultados)
+        print(
+            f"/health p99: {p99(base):.2f} ms idle, {p99(carga):.2f} ms during 100 pooled logins "
+            f"({duracion_logins:.2f} s), {p99(en_loop):.2f} ms with bcrypt on the event loop; "
+            f"metrics: {servicio.metricas()}"
+        )
+        # Con un solo núcleo los hilos de bcrypt compiten por CPU con el loop, pero no lo bloquean
+        assert p99(carga) < 100
+        assert p99(carga) * 5 < p99(en_loop)
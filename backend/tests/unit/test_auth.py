@@ -219,4 +219,95 @@ class TestTokenSecurity:
         wrong_token = jwt.encode(data, "wrong-secret", algorithm=settings.ALGORITHM)
         
         result = auth_service.verify_token(wrong_token)
-        assert result is None
\ No newline at end of file
+        assert result is None
+
+
+class TestCachePrincipales:
+    """Test the authenticated-principal cache"""
+
+    @staticmethod
+    def _usuario(email="cache@example.com", **cambios):
+        datos = dict(
+            id=1, empresa_id=1, email=email, password_hash="x", nombre="Ana", apellido="Pérez",
+            tipo_documento="CC", numero_documento="1020304050", rol_id=2, activo=True
+        )
+        datos.update(cambios)
+        return Usuario(**datos)
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_get_current_user_queries_once(self, monkeypatch):
+        """Test that repeated requests with the same subject reuse the cached principal"""
+        from unittest.mock import AsyncMock, MagicMock
+        from fastapi.security import HTTPAuthorizationCredentials
+        from app.services.auth_service import CachePrincipales
+        import app.core.auth as auth
+
+        cache = CachePrincipales(ttl=30, max_entradas=10)
+        monkeypatch.setattr(auth, "cache_principales", cache)
+        db = AsyncMock()
+        resultado = MagicMock()
+        resultado.scalar_one_or_none.return_value = self._usuario()
+        db.execute.return_value = resultado
+        token = AuthService(db).create_access_token({"sub": "cache@example.com"})
+        credenciales = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+        contexto = MagicMock()
+        contexto.__aenter__ = AsyncMock(return_value=db)
+        contexto.__aexit__ = AsyncMock(return_value=False)
+        sesiones_lectura = MagicMock(return_value=contexto)
+
+        primero = await get_current_user(credenciales, sesiones_lectura)
+        segundo = await get_current_user(credenciales, sesiones_lectura)
+
+        assert db.execute.await_count == 1
+        assert sesiones_lectura.call_count == 1
+        assert segundo.email == primero.email and segundo.rol_id == 2
+        assert cache.metricas()["aciertos"] == 1
+        assert cache.metricas()["fallos"] == 1
+
+    @pytest.mark.unit
+    def test_ttl_and_lru_bounds(self, monkeypatch):
+        """Test that entries expire after the TTL and the LRU stays bounded"""
+        import app.services.auth_service as auth_service
+        from app.services.auth_service import CachePrincipales
+
+        reloj = [100.0]
+        monkeypatch.setattr(auth_service.time, "monotonic", lambda: reloj[0])
+        cache = CachePrincipales(ttl=30, max_entradas=2)
+        for email in ("a@x.co", "b@x.co", "c@x.co"):
+            cache.guardar(self._usuario(email))
+
+        assert cache.obtener("a@x.co") is None
+        assert cache.obtener("c@x.co") is not None
+        reloj[0] += 31
+        assert cache.obtener("c@x.co") is None
+        assert cache.metricas()["expirados"] == 1
+
+    @pytest.mark.unit
+    def test_invalidated_on_deactivation_and_role_change(self):
+        """Test that ORM updates and bulk updates of usuarios invalidate the cache"""
+        from sqlalchemy import create_engine, update
+        from sqlalchemy.orm import Session
+        from app.services.auth_service import cache_principales
+
+        engine = create_engine("sqlite://")
+        Usuario.__table__.create(engine)
+        with Session(engine) as session:
+            usuario = self._usuario()
+            session.add(usuario)
+            session.commit()
+
+            cache_principales.guardar(usuario)
+            usuario.nombre = "Ana María"
+            session.commit()
+            assert cache_principales.obtener(usuario.email) is not None
+
+            usuario.rol_id = 3
+            session.commit()
+            assert cache_principales.obtener(usuario.email) is None
+
+            cache_principales.guardar(usuario)
+            session.execute(update(Usuario).where(Usuario.id == usuario.id).values(activo=False))
+            session.commit()
+            assert cache_principales.obtener(usuario.email) is None
@@ -0,0 +1,104 @@
+"""
+Unit tests for the finalized-invoice response cache
+"""
+
+import pytest
+
+from app.services.cache_facturas import CacheFacturas, EntradaFactura, calcular_etag, etag_coincide
+
+
+class _AlmacenMemoria:
+    """Shared store stand-in with the same interface as AlmacenRedis"""
+
+    def __init__(self):
+        self.datos = {}
+
+    async def obtener(self, factura_id):
+        return self.datos.get(factura_id)
+
+    async def guardar(self, factura_id, datos):
+        self.datos[factura_id] = datos
+
+    async def eliminar(self, factura_id):
+        self.datos.pop(factura_id, None)
+
+    async def cerrar(self):
+        pass
+
+
+class TestEtag:
+    """Test ETag computation and If-None-Match matching"""
+
+    def test_strong_etag_depends_on_body(self):
+        """Test that the ETag is quoted, strong and changes with the body"""
+        etag = calcular_etag(b'{"id":1}')
+        assert etag.startswith('"') and not etag.startswith("W/")
+        assert etag == calcular_etag(b'{"id":1}')
+        assert etag != calcular_etag(b'{"id":2}')
+
+    @pytest.mark.parametrize("header,coincide", [
+        (None, False), ('"otro"', False), ('"otro", "abc"', True), ('"abc"', True), ("*", True),
+    ])
+    def test_if_none_match(self, header, coincide):
+        """Test matching against single, listed and wildcard validators"""
+        assert etag_coincide(header, '"abc"') is coincide
+
+
+class TestCacheFacturas:
+    """Test the in-process LRU and the shared store"""
+
+    @pytest.mark.asyncio
+    async def test_hit_only_for_owning_empresa(self):
+        """Test that a cached factura is not served to another empresa"""
+        cache = CacheFacturas(max_bytes=1024)
+        entrada = await cache.guardar(1, empresa_id=10, cuerpo=b'{"id":1}')
+
+        assert await cache.obtener(1, empresa_id=10) == entrada
+        assert await cache.obtener(1, empresa_id=11) is None
+        assert cache.metricas()["aciertos"] == 1
+        assert cache.metricas()["fallos"] == 1
+
+    @pytest.mark.asyncio
+    async def test_evicts_least_recently_used_by_bytes(self):
+        """Test that the LRU stays within its byte budget"""
+        cache = CacheFacturas(max_bytes=20)
+        await cache.guardar(1, 10, b"a" * 8)
+        await cache.guardar(2, 10, b"b" * 8)
+        await cache.obtener(1, 10)
+        await cache.guardar(3, 10, b"c" * 8)
+
+        assert await cache.obtener(2, 10) is None
+        assert await cache.obtener(1, 10) is not None
+        assert cache.metricas()["bytes"] == 16
+
+    @pytest.mark.asyncio
+    async def test_invalidation_and_stale_store_race(self):
+        """Test that anulación drops the entry and a response read before it is not cached"""
+        cache = CacheFacturas(max_bytes=1024)
+        await cache.guardar(1, 10, b'{"estado_dian":"ACEPTADA"}')
+
+        generacion = cache.generacion
+        await cache.invalidar(1)
+        await cache.guardar(1, 10, b'{"estado_dian":"ACEPTADA"}', generacion)
+
+        assert await cache.obtener(1, 10) is None
+
+    @pytest.mark.asyncio
+    async def test_shared_store_fills_other_processes(self):
+        """Test that a second process is served from the shared store and sees invalidations"""
+        almacen = _AlmacenMemoria()
+        primero = CacheFacturas(max_bytes=1024, almacen=almacen)
+        segundo = CacheFacturas(max_bytes=1024, almacen=almacen)
+        entrada = await primero.guardar(1, 10, b'{"id":1}')
+
+        assert await segundo.obtener(1, 10) == entrada
+        assert segundo.metricas()["aciertos_almacen"] == 1
+
+        await primero.invalidar(1)
+        segundo._invalidar_local(1)  # Delivered through the invalidation channel
+        assert await segundo.obtener(1, 10) is None
+
+    def test_entry_roundtrip(self):
+        """Test the shared store encoding"""
+        entrada = EntradaFactura(10, calcular_etag(b'{"a":"\\n"}'), b'{"a":"\\n"}\n')
+        assert EntradaFactura.deserializar(entrada.serializar()) == entrada
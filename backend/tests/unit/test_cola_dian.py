@@ -0,0 +1,155 @@
+"""
+Unit tests for the DIAN client and submission queue against the local stub
+"""
+
+import pytest
+from datetime import datetime
+from unittest.mock import AsyncMock, Mock
+
+import httpx
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.services.cola_dian import (
+    ACEPTADA, CONSULTAR, RECHAZADA, REINTENTAR, ColaDian, EnvioPendiente, ResultadoEnvio,
+    calcular_espera, enviar
+)
+from app.services.dian_client import DianClient, DianError, comprimir
+from app.services.dian_stub import crear_app_stub
+
+URL = "http://dian.local/WcfDianCustomerServices.svc"
+
+
+def _cliente(**kwargs) -> DianClient:
+    app = crear_app_stub(**kwargs)
+    cliente = DianClient(URL, transport=httpx.ASGITransport(app=app))
+    cliente.app = app
+    return cliente
+
+
+def _envio(n, empresa_id=1, track_id=None, intentos=0) -> EnvioPendiente:
+    cufe = f"{n:096x}"
+    xml = (
+        '<Invoice xmlns:cbc="urn:oasis:names:specification:ubl:schema:xsd:CommonBasicComponents-2">'
+        f'<cbc:UUID>{cufe}</cbc:UUID></Invoice>'
+    )
+    return EnvioPendiente(n, 100 + n, empresa_id, intentos, track_id, "900123456", cufe, xml)
+
+
+class TestDianClient:
+    """Test the SOAP client"""
+
+    @pytest.mark.asyncio
+    async def test_send_bill_sync(self):
+        """Test that a single document is validated synchronously"""
+        cliente = _cliente()
+        envio = _envio(1)
+        respuesta = await cliente.send_bill_sync("z1.zip", comprimir([("fv1.xml", envio.xml)]))
+        await cliente.cerrar()
+
+        assert respuesta.valido
+        assert respuesta.codigo == "00"
+        assert respuesta.cufe == envio.cufe
+
+    @pytest.mark.asyncio
+    async def test_http_error_raises(self):
+        """Test that HTTP 503 is a retryable DianError"""
+        cliente = _cliente(tasa_fallo=1.0)
+        with pytest.raises(DianError):
+            await cliente.send_bill_sync("z1.zip", comprimir([("fv1.xml", _envio(1).xml)]))
+        await cliente.cerrar()
+
+
+class TestEnviar:
+    """Test grouping, batching and result mapping"""
+
+    @pytest.mark.asyncio
+    async def test_single_documents_use_sync(self):
+        """Test that one document per empresa goes through SendBillSync"""
+        cliente = _cliente()
+        resultados = await enviar(cliente, [_envio(1, empresa_id=1), _envio(2, empresa_id=2)], lote=50)
+        await cliente.cerrar()
+
+        assert {r.resultado for r in resultados} == {ACEPTADA}
+        assert cliente.app.state.llamadas["SendBillSync"] == 2
+
+    @pytest.mark.asyncio
+    async def test_batch_then_status(self):
+        """Test that several documents are zipped together and resolved by track id"""
+        cliente = _cliente()
+        envios = [_envio(n) for n in range(1, 7)]
+        resultados = await enviar(cliente, envios, lote=2)
+
+        assert {r.resultado for r in resultados} == {CONSULTAR}
+        assert cliente.app.state.llamadas["SendBillAsync"] == 3
+        assert len({r.track_id for r in resultados}) == 3
+
+        track_ids = {r.envio_id: r.track_id for r in resultados}
+        for envio in envios:
+            envio.track_id = track_ids[envio.envio_id]
+        finales = await enviar(cliente, envios, lote=2)
+        await cliente.cerrar()
+
+        assert {r.resultado for r in finales} == {ACEPTADA}
+        assert cliente.app.state.llamadas["GetStatusZip"] == 3
+
+    @pytest.mark.asyncio
+    async def test_status_still_processing(self):
+        """Test that a zip still in validation is consulted again later"""
+        cliente = _cliente(demora_validacion=60)
+        resultados = await enviar(cliente, [_envio(1), _envio(2)], lote=50)
+        envios = [_envio(1, track_id=resultados[0].track_id), _envio(2, track_id=resultados[0].track_id)]
+        consulta = await enviar(cliente, envios, lote=50)
+        await cliente.cerrar()
+
+        assert {r.resultado for r in consulta} == {CONSULTAR}
+
+    @pytest.mark.asyncio
+    async def test_rejected_and_failed(self):
+        """Test rejection and transport failure outcomes"""
+        rechazo = _cliente(tasa_rechazo=1.0)
+        resultado, = await enviar(rechazo, [_envio(1)], lote=50)
+        await rechazo.cerrar()
+        assert resultado.resultado == RECHAZADA
+        assert "FAD06" in resultado.respuesta
+
+        caido = _cliente(tasa_fallo=1.0)
+        resultados = await enviar(caido, [_envio(1), _envio(2)], lote=50)
+        await caido.cerrar()
+        assert {r.resultado for r in resultados} == {REINTENTAR}
+
+
+class TestRegistrar:
+    """Test how results are persisted"""
+
+    def test_backoff_grows_and_is_capped(self):
+        """Test exponential backoff with jitter"""
+        for intentos in range(1, 6):
+            espera = calcular_espera(intentos, 2.0, 600.0)
+            assert 2.0 ** intentos / 2 <= espera <= 2.0 ** intentos
+        assert calcular_espera(50, 2.0, 600.0) <= 600.0
+
+    @pytest.mark.asyncio
+    async def test_registrar(self):
+        """Test envio rows and factura states written for each outcome"""
+        db = AsyncMock(spec=AsyncSession)
+        cola = ColaDian(Mock(), workers=1, lote=10, max_intentos=3)
+        envios = [_envio(1), _envio(2), _envio(3, intentos=0), _envio(4, intentos=2)]
+        ahora = datetime(2024, 1, 15, 10, 0, 0)
+        resultados = [
+            ResultadoEnvio(1, 101, ACEPTADA, "Procesado Correctamente."),
+            ResultadoEnvio(2, 102, RECHAZADA, "FAD06"),
+            ResultadoEnvio(3, 103, REINTENTAR, "HTTP 503"),
+            ResultadoEnvio(4, 104, REINTENTAR, "HTTP 503"),
+        ]
+
+        await cola.registrar(db, envios, resultados, ahora)
+
+        filas = {fila["id"]: fila for fila in db.execute.await_args_list[0].args[1]}
+        assert filas[1]["estado"] == "ACEPTADA"
+        assert filas[2]["estado"] == "RECHAZADA"
+        assert filas[3]["estado"] == "PENDIENTE"
+        assert filas[3]["intentos"] == 1
+        assert filas[3]["proximo_intento"] > ahora
+        assert filas[4]["estado"] == "ERROR"
+        # One UPDATE for the envios plus one per final factura state
+        assert db.execute.await_count == 3
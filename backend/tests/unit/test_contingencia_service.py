@@ -0,0 +1,162 @@
+"""
+Unit tests for the DIAN contingency journal and replayer
+"""
+
+import asyncio
+import fcntl
+import os
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from sqlalchemy.dialects import postgresql
+
+from app.services.contingencia_service import ContingenciaDian, JournalContingencia
+
+
+def _registro(n, empresa_id=1, cufe=None):
+    return {"empresa_id": empresa_id, "factura_id": n, "cufe": cufe or f"cufe-{n}"}
+
+
+def _session_factory(vigentes):
+    """Session factory whose first query returns the facturas still in CONTINGENCIA"""
+    db = AsyncMock()
+    consulta = MagicMock()
+    consulta.scalars.return_value.all.return_value = list(vigentes)
+    db.execute.side_effect = [consulta] + [MagicMock()] * 10
+    sesion = MagicMock()
+    sesion.__aenter__ = AsyncMock(return_value=db)
+    sesion.__aexit__ = AsyncMock(return_value=False)
+    return MagicMock(return_value=sesion), db
+
+
+class TestJournalContingencia:
+    """Test the append-only journal"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_appends_share_fsync(self, tmp_path, monkeypatch):
+        """Test that concurrent appends are all persisted with fewer fsyncs"""
+        llamadas = []
+        fsync = os.fsync
+        monkeypatch.setattr(os, "fsync", lambda fd: (llamadas.append(fd), fsync(fd)))
+        journal = JournalContingencia(str(tmp_path / "journal.log"))
+
+        await asyncio.gather(*(journal.agregar(_registro(n)) for n in range(200)))
+        await journal.cerrar()
+
+        registros = [registro for _, registro in journal.leer()]
+        assert [r["factura_id"] for r in registros] == list(range(200))
+        assert len(llamadas) < 200
+
+    @pytest.mark.asyncio
+    async def test_torn_tail_is_ignored(self, tmp_path):
+        """Test that a partially written last line is not replayed"""
+        journal = JournalContingencia(str(tmp_path / "journal.log"))
+        await journal.agregar(_registro(1))
+        await journal.cerrar()
+        with open(journal.ruta, "ab") as archivo:
+            archivo.write(b'{"empresa_id":1,"factu')
+
+        assert [r["factura_id"] for _, r in journal.leer()] == [1]
+
+    @pytest.mark.asyncio
+    async def test_offset_and_compaction(self, tmp_path):
+        """Test that the journal is truncated only once fully replayed"""
+        journal = JournalContingencia(str(tmp_path / "journal.log"))
+        await journal.agregar(_registro(1))
+        await journal.agregar(_registro(2))
+        await journal.cerrar()
+
+        primero, _ = next(journal.leer())
+        journal.guardar_offset(primero)
+        assert [r["factura_id"] for _, r in journal.leer(journal.offset())] == [2]
+        assert not journal.compactar()
+
+        journal.guardar_offset(journal.ruta.stat().st_size)
+        assert journal.compactar()
+        assert journal.pendientes() == 0
+        assert journal.offset() == 0
+
+    @pytest.mark.asyncio
+    async def test_compaction_waits_for_other_process_append(self, tmp_path):
+        """Test that compaction cannot truncate a record another worker is appending"""
+        journal = JournalContingencia(str(tmp_path / "journal.log"))
+        await journal.agregar(_registro(1))
+        await journal.cerrar()
+        journal.guardar_offset(journal.ruta.stat().st_size)
+        otro_worker = JournalContingencia(str(journal.ruta))
+
+        with otro_worker._flock(otro_worker.ruta_lock, fcntl.LOCK_SH):
+            compactacion = asyncio.create_task(asyncio.to_thread(journal.compactar))
+            await asyncio.sleep(0.2)
+            assert not compactacion.done()
+            with open(otro_worker.ruta, "ab") as archivo:
+                archivo.write(b'{"empresa_id":1,"factura_id":2,"cufe":"cufe-2"}\n')
+
+        assert not await compactacion
+        assert [r["factura_id"] for _, r in journal.leer(journal.offset())] == [2]
+
+
+class TestContingenciaDian:
+    """Test activation and replay"""
+
+    def test_activates_after_consecutive_failures(self, tmp_path):
+        """Test automatic activation and recovery"""
+        contingencia = ContingenciaDian(JournalContingencia(str(tmp_path / "j.log")), max_fallos=3)
+
+        contingencia.reportar(False)
+        contingencia.reportar(False)
+        contingencia.reportar(True)
+        contingencia.reportar(False)
+        contingencia.reportar(False)
+        assert not contingencia.activa
+        contingencia.reportar(False)
+        assert contingencia.activa
+        contingencia.reportar(True)
+        assert not contingencia.activa
+
+    def test_forced(self, tmp_path):
+        """Test that forced contingency ignores successful calls"""
+        contingencia = ContingenciaDian(JournalContingencia(str(tmp_path / "j.log")), forzada=True)
+        contingencia.reportar(True)
+        assert contingencia.activa
+
+    @pytest.mark.asyncio
+    async def test_replay_dedupes_and_keeps_order(self, tmp_path):
+        """Test that replay enqueues each CUFE once, in journal order, and skips stale facturas"""
+        journal = JournalContingencia(str(tmp_path / "journal.log"))
+        for registro in [
+            _registro(1, empresa_id=1), _registro(2, empresa_id=2), _registro(1, empresa_id=1),
+            _registro(3, empresa_id=1), _registro(4, empresa_id=1),
+        ]:
+            await journal.agregar(registro)
+        await journal.cerrar()
+
+        session_factory, db = _session_factory(vigentes=[1, 2, 3])  # 4 was anulled
+        contingencia = ContingenciaDian(journal, session_factory=session_factory)
+
+        assert await contingencia.reproducir() == 3
+
+        insert_stmt = db.execute.await_args_list[1].args[0]
+        filas = insert_stmt.compile().params
+        assert [filas[f"factura_id_m{i}"] for i in range(3)] == [1, 2, 3]
+        assert "ON CONFLICT" in str(insert_stmt.compile(dialect=postgresql.dialect()))
+        db.commit.assert_awaited_once()
+        assert journal.pendientes() == 0
+        assert await contingencia.reproducir() == 0
+
+    @pytest.mark.asyncio
+    async def test_single_replayer_across_processes(self, tmp_path):
+        """Test that replay is skipped while another worker holds the journal"""
+        journal = JournalContingencia(str(tmp_path / "journal.log"))
+        await journal.agregar(_registro(1))
+        await journal.cerrar()
+        session_factory, _ = _session_factory(vigentes=[1])
+        contingencia = ContingenciaDian(journal, session_factory=session_factory)
+
+        with JournalContingencia(str(journal.ruta)).reproduccion() as propia:
+            assert propia
+            assert await contingencia.reproducir() == 0
+            session_factory.assert_not_called()
+            assert journal.pendientes()
+
+        assert await contingencia.reproducir() == 1
@@ -0,0 +1,98 @@
+"""
+Unit tests for the DIAN CUFE generator
+"""
+
+import pytest
+from dataclasses import replace
+from datetime import date, time
+from decimal import Decimal
+
+from app.models import Cliente, Empresa, Factura
+from app.services.cufe_service import (
+    DatosCufe, cadena_cufe, calcular_cufe, calcular_cufes_lote, codigo_ambiente, datos_cufe, formato_valor
+)
+
+# Example invoice from the DIAN technical annex (Anexo Técnico, CUFE section)
+DATOS_ANEXO = DatosCufe(
+    numero_completo="323200000129",
+    fecha_emision=date(2019, 1, 16),
+    hora_emision=time(10, 53, 10),
+    subtotal=Decimal("1500000.00"),
+    total_iva=Decimal("285000.00"),
+    total_inc=Decimal("0.00"),
+    total_ica=Decimal("0.00"),
+    total_factura=Decimal("1785000.00"),
+    nit_emisor="700085371",
+    documento_adquiriente="800199436",
+    clave_tecnica="693ff6f2a553c3646a063436fd4dd9ded0311471",
+    ambiente="1",
+)
+CADENA_ANEXO = (
+    "3232000001292019-01-1610:53:10-05:001500000.0001285000.00040.00030.00"
+    "1785000.00700085371800199436693ff6f2a553c3646a063436fd4dd9ded03114711"
+)
+CUFE_ANEXO = (
+    "8bb918b19ba22a694f1da11c643b5e9de39adf60311cf179"
+    "179e9b33381030bcd4c3c3f156c506ed5908f9276f5bd9b4"
+)
+
+
+class TestCufe:
+    """Test CUFE concatenation and hashing"""
+
+    @pytest.mark.unit
+    def test_dian_vector(self):
+        """The annex example produces the published concatenation and CUFE"""
+        assert cadena_cufe(DATOS_ANEXO) == CADENA_ANEXO
+        assert calcular_cufe(DATOS_ANEXO) == CUFE_ANEXO
+        assert len(CUFE_ANEXO) == 96
+
+    @pytest.mark.unit
+    def test_values_formatted_with_two_decimals(self):
+        """Amounts are rounded to cents without thousands separators"""
+        assert formato_valor(Decimal("1500000")) == "1500000.00"
+        assert formato_valor(Decimal("0.005")) == "0.01"
+        assert formato_valor(Decimal("0E-2")) == "0.00"
+
+    @pytest.mark.unit
+    def test_any_field_changes_cufe(self):
+        """Changing a single field yields a different CUFE"""
+        assert calcular_cufe(replace(DATOS_ANEXO, total_inc=Decimal("0.01"))) != CUFE_ANEXO
+        assert calcular_cufe(replace(DATOS_ANEXO, ambiente="2")) != CUFE_ANEXO
+
+    @pytest.mark.unit
+    def test_datos_from_models(self):
+        """Check digits are removed from NITs and the environment is coded"""
+        factura = Factura(
+            numero_completo="323200000129", fecha_emision=date(2019, 1, 16), hora_emision=time(10, 53, 10),
+            subtotal=Decimal("1500000.00"), total_iva=Decimal("285000.00"), total_inc=Decimal("0.00"),
+            total_ica=Decimal("0.00"), total_factura=Decimal("1785000.00")
+        )
+        empresa = Empresa(
+            nit="700085371-5", ambiente_dian="PRODUCCION",
+            clave_tecnica="693ff6f2a553c3646a063436fd4dd9ded0311471"
+        )
+        cliente = Cliente(tipo_documento="NIT", numero_documento="800.199.436-1")
+
+        assert datos_cufe(factura, empresa, cliente) == DATOS_ANEXO
+        assert codigo_ambiente("PRUEBAS") == "2"
+
+
+class TestCufeLote:
+    """Test batch CUFE generation"""
+
+    @pytest.mark.unit
+    def test_batch_in_process_pool_keeps_order(self):
+        """Blocks hashed in worker processes come back in input order"""
+        lote = [replace(DATOS_ANEXO, numero_completo=f"SETP{i}") for i in range(50)]
+
+        cufes = calcular_cufes_lote(lote, procesos=2, tamano_bloque=10)
+
+        assert cufes == [calcular_cufe(datos) for datos in lote]
+        assert len(set(cufes)) == 50
+
+    @pytest.mark.unit
+    def test_small_batch_inline(self):
+        """A batch that fits in one block is hashed inline"""
+        assert calcular_cufes_lote([DATOS_ANEXO]) == [CUFE_ANEXO]
+        assert calcular_cufes_lote([]) == []
@@ -0,0 +1,242 @@
+"""
+Unit tests for the database session dependencies
+"""
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from fastapi.routing import APIRoute
+
+
+def _dependencias(dependant):
+    """All dependency callables of a route, recursively"""
+    for dependencia in dependant.dependencies:
+        yield dependencia.call
+        yield from _dependencias(dependencia)
+
+
+class TestSesionLectura:
+    """Test the read-only session dependency"""
+
+    @pytest.mark.asyncio
+    async def test_read_session_never_commits(self, monkeypatch):
+        """Test that the read-only dependency closes its session without committing"""
+        import app.core.database as database
+
+        session = AsyncMock()
+        contexto = MagicMock()
+        contexto.__aenter__ = AsyncMock(return_value=session)
+        contexto.__aexit__ = AsyncMock(return_value=False)
+        monkeypatch.setattr(database, "AsyncSessionLectura", MagicMock(return_value=contexto))
+
+        dependencia = database.get_db_lectura()
+        assert await dependencia.__anext__() is session
+        with pytest.raises(StopAsyncIteration):
+            await dependencia.__anext__()
+
+        session.commit.assert_not_awaited()
+        contexto.__aexit__.assert_awaited_once()
+
+    def test_read_engine_has_own_pool(self):
+        """Test that reads use a separate autocommit engine"""
+        from app.core.database import engine, engine_lectura
+
+        assert engine_lectura.sync_engine.pool is not engine.sync_engine.pool
+        assert engine_lectura.sync_engine.dialect._on_connect_isolation_level == "AUTOCOMMIT"
+
+    def test_every_pool_reported(self):
+        """Test that the pool metrics cover the write, read and replica pools"""
+        from app.core.database import metricas_pools
+
+        pools = metricas_pools()
+
+        assert {"primario", "lectura"} <= set(pools)
+        assert all("espera_ms_histograma" in estado for estado in pools.values())
+
+    def test_get_routes_use_read_session(self):
+        """Test that GET endpoints, including their auth dependencies, never open a get_db session"""
+        from app.core.database import get_db, get_db_lectura, get_db_replica
+        from app.main import app
+
+        rutas = [ruta for ruta in app.routes if isinstance(ruta, APIRoute) and "GET" in ruta.methods]
+        assert rutas
+        for ruta in rutas:
+            assert get_db not in _dependencias(ruta.dependant), ruta.path
+        assert any(get_db_lectura in _dependencias(ruta.dependant) for ruta in rutas)
+
+        listados = {ruta.path: ruta for ruta in rutas if ruta.path.endswith(("/facturas/", "/clientes/", "/productos/"))}
+        assert len(listados) == 3
+        for ruta in listados.values():
+            assert get_db_replica in _dependencias(ruta.dependant), ruta.path
+
+
+    @pytest.mark.asyncio
+    async def test_user_lookup_session_closed_before_endpoint(self, monkeypatch):
+        """Test that a principal-cache miss uses a short read session that is closed right away"""
+        from fastapi.security import HTTPAuthorizationCredentials
+
+        import app.core.auth as auth
+        from app.models import Usuario
+        from app.services.auth_service import AuthService, CachePrincipales
+
+        monkeypatch.setattr(auth, "cache_principales", CachePrincipales(ttl=30, max_entradas=10))
+        session = AsyncMock()
+        resultado = MagicMock()
+        resultado.scalar_one_or_none.return_value = Usuario(id=1, empresa_id=1, email="a@x.co", activo=True)
+        session.execute.return_value = resultado
+        contexto = MagicMock()
+        contexto.__aenter__ = AsyncMock(return_value=session)
+        contexto.__aexit__ = AsyncMock(return_value=False)
+        credenciales = HTTPAuthorizationCredentials(
+            scheme="Bearer", credentials=AuthService(None).create_access_token({"sub": "a@x.co"})
+        )
+
+        usuario = await auth.get_current_user(credenciales, MagicMock(return_value=contexto))
+
+        assert usuario.email == "a@x.co"
+        session.execute.assert_awaited_once()
+        session.commit.assert_not_awaited()
+        contexto.__aexit__.assert_awaited_once()
+
+
+class TestReplicasLectura:
+    """Test primary/replica routing for heavy reads"""
+
+    def _replicas(self, max_lag=5.0):
+        from app.core.database import ReplicasLectura
+
+        primario = MagicMock(name="primario")
+        replicas = ReplicasLectura(
+            ["postgresql://u:p@replica-1/db", "postgresql://u:p@replica-2:5433/db"], max_lag, 2.0, primario
+        )
+        return replicas, primario
+
+    def test_round_robin_between_healthy_replicas(self):
+        """Test that idle replicas take turns and the primary is not used"""
+        replicas, primario = self._replicas()
+        replicas._retrasos = [0.0, 0.5]
+
+        elegidas = [replicas.elegir() for _ in range(4)]
+
+        assert elegidas[0] is not elegidas[1]
+        assert elegidas[0] is elegidas[2] and elegidas[1] is elegidas[3]
+        assert primario not in elegidas
+        assert [replica["lecturas"] for replica in replicas.metricas()["replicas"]] == [2, 2]
+
+    def test_least_loaded_replica_preferred(self, monkeypatch):
+        """Test that the replica with fewer checked-out connections wins"""
+        replicas, _ = self._replicas()
+        replicas._retrasos = [0.0, 0.0]
+        monkeypatch.setattr(replicas._engines[0].sync_engine.pool, "checkedout", lambda: 3)
+
+        assert all(replicas.elegir() is replicas._sesiones[1] for _ in range(3))
+
+    def test_lagging_or_down_replicas_fall_back_to_primary(self):
+        """Test that replicas behind max_lag or unreachable leave the rotation"""
+        replicas, primario = self._replicas(max_lag=5.0)
+        replicas._retrasos = [12.0, 1.0]
+        assert all(replicas.elegir() is replicas._sesiones[1] for _ in range(3))
+
+        replicas._retrasos = [12.0, None]
+        assert replicas.elegir() is primario
+        assert replicas.metricas()["lecturas_primario"] == 1
+
+    def test_read_your_writes_uses_primary(self, monkeypatch):
+        """Test that a client reads from the primary for max_lag seconds after writing"""
+        import app.core.database as database
+
+        replicas, primario = self._replicas(max_lag=5.0)
+        replicas._retrasos = [0.0, 0.0]
+        replicas.marcar_escritura("a@x.co")
+
+        assert replicas.elegir("a@x.co") is primario
+        assert replicas.elegir("b@x.co") is not primario
+
+        ahora = database.time.monotonic()
+        monkeypatch.setattr(database.time, "monotonic", lambda: ahora + 6.0)
+        assert replicas.elegir("a@x.co") is not primario
+        assert replicas.metricas()["lecturas_tras_escritura"] == 1
+
+    def test_commit_marks_client_write(self, monkeypatch):
+        """Test that committing a write session starts the read-your-writes window"""
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import Session
+
+        import app.core.database as database
+
+        replicas, primario = self._replicas()
+        replicas._retrasos = [0.0, 0.0]
+        monkeypatch.setattr(database, "replicas", replicas)
+
+        with Session(create_engine("sqlite://")) as session:
+            session.info[database.CLIENTE_ESCRITURA] = "a@x.co"
+            session.commit()
+
+        assert replicas.elegir("a@x.co") is primario
+
+    def test_client_keyed_on_token_subject(self):
+        """Test that read-your-writes is keyed on the user, not on the bearer token"""
+        from datetime import timedelta
+
+        from starlette.requests import Request
+
+        from app.core.database import _cliente
+        from app.services.auth_service import AuthService
+
+        def _request(authorization=None):
+            headers = [(b"authorization", authorization.encode())] if authorization is not None else []
+            return Request({"type": "http", "method": "POST", "headers": headers})
+
+        token = AuthService(None).create_access_token({"sub": "a@x.co"})
+        renovado = AuthService(None).create_access_token({"sub": "a@x.co"}, expires_delta=timedelta(minutes=5))
+        assert token != renovado
+
+        replicas, primario = self._replicas()
+        replicas._retrasos = [0.0, 0.0]
+        replicas.marcar_escritura(_cliente(_request(f"Bearer {token}")))
+
+        assert replicas.elegir(_cliente(_request(f"Bearer {renovado}"))) is primario
+        assert list(replicas._escrituras) == ["a@x.co"]
+        assert _cliente(_request()) is None
+        assert _cliente(_request("Bearer no-es-un-jwt")) is None
+        assert _cliente(_request(f"Basic {token}")) is None
+
+    @pytest.mark.asyncio
+    async def test_failed_measurement_removes_replica(self):
+        """Test that a replica that cannot be measured leaves the rotation"""
+        from app.core.database import ReplicasLectura
+
+        primario = MagicMock(name="primario")
+        replicas = ReplicasLectura(["postgresql://u:p@127.0.0.1:1/db"], 5.0, 1.0, primario)
+        replicas._retrasos = [0.0]
+
+        await replicas.medir()
+        await replicas.detener()
+
+        assert replicas._retrasos == [None]
+        assert replicas.elegir() is primario
+        assert replicas.metricas()["replicas"][0]["servidor"] == "127.0.0.1:1"
+
+    @pytest.mark.asyncio
+    async def test_unresponsive_replica_connect_times_out(self, monkeypatch):
+        """Test that a replica whose connect hangs leaves the rotation within the measurement timeout"""
+        import asyncio
+
+        from sqlalchemy.ext.asyncio import AsyncEngine
+
+        class _ConexionColgada:
+            async def __aenter__(self):
+                await asyncio.sleep(3600)
+
+            async def __aexit__(self, *exc):
+                return False
+
+        replicas, primario = self._replicas()
+        replicas.intervalo = 0.1
+        replicas._retrasos = [0.0, 0.0]
+        monkeypatch.setattr(AsyncEngine, "connect", lambda self: _ConexionColgada())
+
+        await asyncio.wait_for(replicas.medir(), timeout=5)
+
+        assert replicas._retrasos == [None, None]
+        assert replicas.elegir() is primario
@@ -0,0 +1,63 @@
+"""
+Unit tests for compressed invoice document storage
+"""
+
+import hashlib
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.services.documentos_service import TIPO_XML, DocumentosService, comprimir, descomprimir
+from app.services.ubl_service import generar_xml
+from tests.unit.test_ubl_service import _cliente, _detalles, _empresa, _factura, _impuestos
+
+
+def _xml(n=100) -> bytes:
+    return generar_xml(_factura(n), _empresa(), _cliente(), _detalles(n), _impuestos(n)).encode("utf-8")
+
+
+class TestCompresion:
+    """Test zstd compression of UBL documents"""
+
+    def test_round_trip_and_ratio(self):
+        """Test that UBL XML round-trips and compresses well"""
+        xml = _xml()
+        comprimido = comprimir(xml)
+
+        assert descomprimir(comprimido) == xml
+        assert len(comprimido) * 10 < len(xml)
+
+
+class TestDocumentosService:
+    """Test storing and loading documents"""
+
+    @pytest.mark.asyncio
+    async def test_guardar_upserts_compressed_content(self):
+        """Test that the document is stored compressed with its hash and size"""
+        db = AsyncMock(spec=AsyncSession)
+        xml = _xml(10)
+
+        await DocumentosService(db).guardar(7, TIPO_XML, xml.decode("utf-8"))
+
+        stmt = db.execute.await_args.args[0]
+        compilado = stmt.compile(dialect=postgresql.dialect())
+        assert "ON CONFLICT ON CONSTRAINT uq_documentos_factura_factura_tipo DO UPDATE" in str(compilado)
+        assert compilado.params["factura_id"] == 7
+        assert compilado.params["sha256"] == hashlib.sha256(xml).hexdigest()
+        assert compilado.params["tamano"] == len(xml)
+        assert descomprimir(compilado.params["contenido"]) == xml
+
+    @pytest.mark.asyncio
+    async def test_obtener_lote(self):
+        """Test that several documents are loaded with one query and decompressed"""
+        db = AsyncMock(spec=AsyncSession)
+        result = MagicMock()
+        result.all.return_value = [(1, comprimir(b"<a/>")), (2, comprimir(b"<b/>"))]
+        db.execute.return_value = result
+
+        documentos = await DocumentosService(db).obtener_lote([1, 2, 3], TIPO_XML)
+
+        assert documentos == {1: b"<a/>", 2: b"<b/>"}
+        db.execute.assert_awaited_once()
@@ -0,0 +1,150 @@
+"""
+Unit tests for the invoice creation service
+"""
+
+import pytest
+from datetime import date
+from decimal import Decimal
+from unittest.mock import AsyncMock, Mock
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Empresa, Producto
+from app.schemas.factura import FacturaCreate
+from app.services.factura_service import FacturaService
+
+
+def _producto(producto_id, **kwargs):
+    datos = {
+        "id": producto_id,
+        "codigo": f"P{producto_id}",
+        "nombre": f"Producto {producto_id}",
+        "incluye_iva": True,
+        "porcentaje_iva": Decimal("19.00"),
+        "incluye_inc": False,
+        "porcentaje_inc": Decimal("0.00"),
+        "incluye_ica": False,
+        "porcentaje_ica": Decimal("0.00"),
+    }
+    datos.update(kwargs)
+    return Producto(**datos)
+
+
+def _factura_data(*producto_ids):
+    return FacturaCreate(
+        cliente_id=1,
+        fecha_emision=date(2024, 1, 15),
+        detalles=[
+            {"producto_id": producto_id, "cantidad": Decimal("2"), "precio_unitario": Decimal("100.00")}
+            for producto_id in producto_ids
+        ]
+    )
+
+
+class TestBuildFactura:
+    """Test in-memory construction of a complete invoice"""
+
+    @pytest.mark.unit
+    def test_build_factura_with_totals(self):
+        """Header, lines and tax summary are computed before the flush"""
+        empresa = Empresa(id=1, prefijo_factura="FT")
+        productos = {1: _producto(1), 2: _producto(2, incluye_iva=False)}
+
+        factura = FacturaService.build_factura(_factura_data(1, 2), empresa, 15, productos)
+
+        assert factura.numero == 15
+        assert factura.numero_completo == "FT15"
+        assert factura.estado_dian == "BORRADOR"
+        assert len(factura.detalles) == 2
+        assert factura.detalles[0].codigo_producto == "P1"
+        assert factura.detalles[0].total_linea == Decimal("238.00")
+        assert factura.detalles[1].total_linea == Decimal("200.00")
+        assert factura.subtotal == Decimal("400.00")
+        assert factura.total_iva == Decimal("38.00")
+        assert factura.total_factura == Decimal("438.00")
+        assert [i.tipo_impuesto for i in factura.impuestos] == ["IVA"]
+
+    @pytest.mark.unit
+    def test_build_factura_without_prefix(self):
+        """Empresas without prefix get the bare number"""
+        factura = FacturaService.build_factura(_factura_data(1), Empresa(id=1), 3, {1: _producto(1)})
+        assert factura.numero_completo == "3"
+        assert factura.prefijo is None
+
+
+class TestProductosValidation:
+    """Test batched product validation"""
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_productos_single_query(self):
+        """All referenced products are loaded with one query"""
+        mock_session = AsyncMock(spec=AsyncSession)
+        result = Mock()
+        result.scalars.return_value.all.return_value = [_producto(1), _producto(2)]
+        mock_session.execute.return_value = result
+
+        productos = await FacturaService(mock_session).get_productos_activos(1, [1, 2, 1, 2, 1])
+
+        assert set(productos) == {1, 2}
+        assert mock_session.execute.await_count == 1
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_producto_missing(self):
+        """A missing product is reported with its ID"""
+        mock_session = AsyncMock(spec=AsyncSession)
+        result = Mock()
+        result.scalars.return_value.all.return_value = [_producto(1)]
+        mock_session.execute.return_value = result
+
+        with pytest.raises(HTTPException) as exc_info:
+            await FacturaService(mock_session).get_productos_activos(1, [1, 99])
+
+        assert exc_info.value.status_code == 404
+        assert "99" in exc_info.value.detail
+
+
+class TestCrearLote:
+    """Test per-item results of batch invoice creation"""
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_crear_lote_reports_invalid_items(self):
+        """Invalid items are reported without blocking the valid ones"""
+        mock_session = AsyncMock(spec=AsyncSession)
+        mock_session.add_all = Mock()
+        service = FacturaService(mock_session)
+        service.get_clientes_activos = AsyncMock(return_value={1})
+        service.cargar_productos = AsyncMock(return_value={1: _producto(1)})
+        service.get_empresa = AsyncMock(return_value=Empresa(id=1, prefijo_factura="FT"))
+        service.asignar_numeros = AsyncMock(return_value=range(10, 12))
+
+        invalido_cliente = _factura_data(1).model_copy(update={"cliente_id": 7})
+        resultados = await service.crear_lote(
+            [_factura_data(1), invalido_cliente, _factura_data(1, 99), _factura_data(1)], 1
+        )
+
+        assert [r["creada"] for r in resultados] == [True, False, False, True]
+        assert resultados[1]["error"] == "Cliente no encontrado"
+        assert "99" in resultados[2]["error"]
+        assert [r["numero_completo"] for r in resultados if r["creada"]] == ["FT10", "FT11"]
+        service.asignar_numeros.assert_awaited_once()
+        assert len(mock_session.add_all.call_args.args[0]) == 2
+        mock_session.commit.assert_awaited_once()
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_crear_lote_all_invalid(self):
+        """No numbers are allocated when every item is invalid"""
+        mock_session = AsyncMock(spec=AsyncSession)
+        service = FacturaService(mock_session)
+        service.get_clientes_activos = AsyncMock(return_value=set())
+        service.cargar_productos = AsyncMock(return_value={})
+        service.asignar_numeros = AsyncMock()
+
+        resultados = await service.crear_lote([_factura_data(1)], 1)
+
+        assert resultados[0]["creada"] is False
+        service.asignar_numeros.assert_not_awaited()
+        mock_session.commit.assert_not_awaited()
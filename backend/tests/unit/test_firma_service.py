@@ -0,0 +1,99 @@
+"""
+Unit tests for XAdES signing
+"""
+
+import pytest
+from datetime import datetime, timedelta, timezone
+
+from app.services.firma_service import (
+    CertificadoInvalidoError, FirmaService, cargar_certificado, firmar_documento,
+    generar_certificado_prueba, verificar_firma
+)
+
+DOCUMENTO = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n'
+    '<Invoice xmlns="urn:oasis:names:specification:ubl:schema:xsd:Invoice-2"'
+    ' xmlns:cbc="urn:oasis:names:specification:ubl:schema:xsd:CommonBasicComponents-2"'
+    ' xmlns:ds="http://www.w3.org/2000/09/xmldsig#"'
+    ' xmlns:ext="urn:oasis:names:specification:ubl:schema:xsd:CommonExtensionComponents-2"'
+    ' xmlns:xades="http://uri.etsi.org/01903/v1.3.2#">\n'
+    '<ext:UBLExtensions>\n'
+    '<ext:UBLExtension><ext:ExtensionContent><cbc:Note>DIAN</cbc:Note></ext:ExtensionContent></ext:UBLExtension>\n'
+    '<ext:UBLExtension><ext:ExtensionContent/></ext:UBLExtension>\n'
+    '</ext:UBLExtensions>\n'
+    '<cbc:ID>{numero}</cbc:ID>\n'
+    '<cbc:PayableAmount currencyID="COP">119000.00</cbc:PayableAmount>\n'
+    '</Invoice>\n'
+)
+
+
+@pytest.fixture(scope="module")
+def certificado(tmp_path_factory):
+    """Self-signed PKCS#12 test certificate"""
+    ruta = str(tmp_path_factory.mktemp("certificados") / "pruebas.p12")
+    generar_certificado_prueba(ruta, "secreto")
+    return ruta
+
+
+class TestFirmaDocumento:
+    """Test XAdES-EPES signature generation"""
+
+    @pytest.mark.unit
+    def test_sign_and_verify(self, certificado):
+        """A signed document verifies and carries the XAdES properties"""
+        llave, cert = cargar_certificado(certificado, "secreto")
+        momento = datetime(2024, 1, 15, 10, 0, 0, tzinfo=timezone(timedelta(hours=-5)))
+
+        firmado = firmar_documento(DOCUMENTO.format(numero="FT1"), llave, cert, momento)
+
+        assert verificar_firma(firmado)
+        assert "<xades:SigningTime>2024-01-15T10:00:00.000-05:00</xades:SigningTime>" in firmado
+        assert "politicadefirmav2.pdf" in firmado
+        assert firmado.count("<ds:Signature ") == 1
+
+    @pytest.mark.unit
+    def test_tampering_detected(self, certificado):
+        """Changing a signed value invalidates the signature"""
+        llave, cert = cargar_certificado(certificado, "secreto")
+        firmado = firmar_documento(DOCUMENTO.format(numero="FT1"), llave, cert)
+
+        assert not verificar_firma(firmado.replace("119000.00", "1.00"))
+
+    @pytest.mark.unit
+    def test_document_without_signature_slot(self, certificado):
+        """Documents without an empty extension are rejected"""
+        llave, cert = cargar_certificado(certificado, "secreto")
+        sin_espacio = DOCUMENTO.replace("<ext:UBLExtension><ext:ExtensionContent/></ext:UBLExtension>\n", "")
+
+        with pytest.raises(ValueError):
+            firmar_documento(sin_espacio.format(numero="FT1"), llave, cert)
+
+    @pytest.mark.unit
+    def test_wrong_password(self, certificado):
+        """A wrong certificate password fails early"""
+        with pytest.raises(CertificadoInvalidoError):
+            cargar_certificado(certificado, "incorrecta")
+
+
+class TestFirmaService:
+    """Test the process-pool signing service"""
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_sign_batch_in_pool(self, certificado):
+        """Documents are signed in worker processes, in order, with metrics"""
+        servicio = FirmaService(certificado, "secreto", procesos=2, max_pendientes=2)
+        try:
+            firmados = await servicio.firmar_lote([DOCUMENTO.format(numero=f"FT{i}") for i in range(5)])
+        finally:
+            servicio.cerrar()
+
+        assert all(verificar_firma(firmado) for firmado in firmados)
+        assert [f"<cbc:ID>FT{i}</cbc:ID>" in firmado for i, firmado in enumerate(firmados)] == [True] * 5
+
+        metricas = servicio.metricas()
+        assert metricas["firmadas"] == 5
+        assert metricas["pendientes"] == 0
+        assert metricas["errores"] == 0
+        assert metricas["latencia_ms_p95"] >= metricas["latencia_ms_p50"] > 0
+        assert metricas["firma_ms_promedio"] > 0
@@ -0,0 +1,135 @@
+"""
+Unit tests for the invoice tax engine
+"""
+
+import pytest
+from decimal import Decimal
+from unittest.mock import AsyncMock, Mock
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.services.impuestos_service import (
+    ImpuestosService, calcular_totales, tarifas_desde_fila, redondear
+)
+
+
+def _linea(producto_id=1, cantidad="1", precio="100.00", descuento="0"):
+    return {
+        "producto_id": producto_id,
+        "cantidad": Decimal(cantidad),
+        "precio_unitario": Decimal(precio),
+        "descuento_porcentaje": Decimal(descuento),
+    }
+
+
+class TestTarifas:
+    """Test construction of product tax rates"""
+
+    @pytest.mark.unit
+    def test_tarifas_solo_iva(self):
+        """Only enabled taxes produce a rate"""
+        tarifas = tarifas_desde_fila(True, Decimal("19.00"), False, Decimal("8.00"), False, Decimal("1.00"))
+        assert tarifas == [("IVA", Decimal("19.00"))]
+
+    @pytest.mark.unit
+    def test_tarifas_todas(self):
+        """All enabled taxes are returned in IVA, INC, ICA order"""
+        tarifas = tarifas_desde_fila(True, Decimal("5.00"), True, Decimal("8.00"), True, Decimal("0.41"))
+        assert [tipo for tipo, _ in tarifas] == ["IVA", "INC", "ICA"]
+
+    @pytest.mark.unit
+    def test_redondear_half_up(self):
+        """Amounts are rounded to cents using half-up"""
+        assert redondear(Decimal("10.005")) == Decimal("10.01")
+        assert redondear(Decimal("10.004")) == Decimal("10.00")
+
+
+class TestCalcularTotales:
+    """Test single-pass invoice total calculation"""
+
+    @pytest.mark.unit
+    def test_linea_con_descuento_e_iva(self):
+        """Line totals match the manual calculation"""
+        tarifas = {1: [("IVA", Decimal("19.00"))]}
+        calculo = calcular_totales([_linea(cantidad="3", precio="100000.00", descuento="10")], tarifas)
+
+        linea = calculo["lineas"][0]
+        assert linea["subtotal_linea"] == Decimal("300000.00")
+        assert linea["total_descuentos_linea"] == Decimal("30000.00")
+        assert linea["total_impuestos_linea"] == Decimal("51300.00")
+        assert linea["total_linea"] == Decimal("321300.00")
+        assert (linea["porcentaje_iva"], linea["porcentaje_inc"], linea["porcentaje_ica"]) == (Decimal("19.00"), None, None)
+
+        totales = calculo["totales"]
+        assert totales["subtotal"] == Decimal("270000.00")
+        assert totales["total_iva"] == Decimal("51300.00")
+        assert totales["total_factura"] == Decimal("321300.00")
+
+    @pytest.mark.unit
+    def test_resumen_por_tarifa(self):
+        """Tax summary is grouped by type and rate"""
+        tarifas = {
+            1: [("IVA", Decimal("19.00"))],
+            2: [("IVA", Decimal("5.00")), ("INC", Decimal("8.00"))],
+        }
+        lineas = [_linea(1), _linea(2), _linea(1)]
+        calculo = calcular_totales(lineas, tarifas)
+
+        resumen = {(i["tipo_impuesto"], i["porcentaje"]): i for i in calculo["impuestos"]}
+        assert resumen[("IVA", Decimal("19.00"))]["base_gravable"] == Decimal("200.00")
+        assert resumen[("IVA", Decimal("19.00"))]["valor_impuesto"] == Decimal("38.00")
+        assert resumen[("IVA", Decimal("5.00"))]["valor_impuesto"] == Decimal("5.00")
+        assert resumen[("INC", Decimal("8.00"))]["valor_impuesto"] == Decimal("8.00")
+
+        totales = calculo["totales"]
+        assert totales["total_iva"] == Decimal("43.00")
+        assert totales["total_inc"] == Decimal("8.00")
+        assert totales["total_impuestos"] == Decimal("51.00")
+        assert totales["total_factura"] == Decimal("351.00")
+
+    @pytest.mark.unit
+    def test_producto_exento(self):
+        """Exempt products add no taxes and no summary rows"""
+        calculo = calcular_totales([_linea()], {1: []})
+        assert calculo["impuestos"] == []
+        assert calculo["totales"]["total_impuestos"] == Decimal("0.00")
+        assert calculo["totales"]["total_factura"] == Decimal("100.00")
+
+    @pytest.mark.unit
+    def test_header_matches_sum_of_lines(self):
+        """Header totals are the sum of the rounded line totals"""
+        tarifas = {1: [("IVA", Decimal("19.00"))]}
+        lineas = [_linea(cantidad="0.333", precio="10.01", descuento="3.5") for _ in range(50)]
+        calculo = calcular_totales(lineas, tarifas)
+
+        assert calculo["totales"]["total_factura"] == sum(
+            (linea["total_linea"] for linea in calculo["lineas"]), Decimal("0.00")
+        )
+
+
+class TestImpuestosServiceQueries:
+    """Test that the service batches its database access"""
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_get_tarifas_single_query(self):
+        """Rates for many products are loaded with one query"""
+        mock_session = AsyncMock(spec=AsyncSession)
+        result = Mock()
+        result.all.return_value = [
+            (1, True, Decimal("19.00"), False, Decimal("0"), False, Decimal("0")),
+            (2, False, Decimal("0"), True, Decimal("8.00"), False, Decimal("0")),
+        ]
+        mock_session.execute.return_value = result
+
+        tarifas = await ImpuestosService(mock_session).get_tarifas([1, 2, 1, 2])
+
+        assert mock_session.execute.await_count == 1
+        assert tarifas == {1: [("IVA", Decimal("19.00"))], 2: [("INC", Decimal("8.00"))]}
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_get_tarifas_empty(self):
+        """No query is issued when there are no products"""
+        mock_session = AsyncMock(spec=AsyncSession)
+        assert await ImpuestosService(mock_session).get_tarifas([]) == {}
+        mock_session.execute.assert_not_awaited()
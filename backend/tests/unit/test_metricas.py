@@ -0,0 +1,21 @@
+"""
+Unit tests for the shared metrics helpers
+"""
+
+from app.core.metricas import percentil_ms
+
+
+class TestPercentilMs:
+    """Test the percentile helper used by the service metrics"""
+
+    def test_percentiles_in_milliseconds(self):
+        """Test that sorted second durations give millisecond percentiles"""
+        ordenados = [i / 1000 for i in range(1, 101)]
+
+        assert percentil_ms(ordenados, 0.50) == 51.0
+        assert percentil_ms(ordenados, 0.99) == 100.0
+        assert percentil_ms(ordenados, 1.0) == 100.0
+
+    def test_no_samples(self):
+        """Test that no samples report None"""
+        assert percentil_ms([], 0.99) is None
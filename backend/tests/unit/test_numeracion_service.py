@@ -0,0 +1,160 @@
+"""
+Unit tests for the invoice numbering service
+"""
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock, Mock, patch
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Empresa
+from app.services.numeracion_service import (
+    BloquesNumeracion, NumeracionService, RangoNumeracionAgotadoError, agrupar_tramos
+)
+
+
+def _session(*ultimos):
+    """Mock session whose UPDATE ... RETURNING calls yield the given values in order"""
+    mock_session = AsyncMock(spec=AsyncSession)
+    results = []
+    for ultimo in ultimos:
+        result = Mock()
+        result.scalar_one_or_none.return_value = ultimo
+        results.append(result)
+    mock_session.execute.side_effect = results
+    return mock_session
+
+
+def _empresa(**kwargs):
+    datos = {"id": 1, "prefijo_factura": "FT", "rango_autorizado_desde": 1, "rango_autorizado_hasta": 5000}
+    datos.update(kwargs)
+    return Empresa(**datos)
+
+
+class TestNumeracionService:
+    """Test number allocation against the DIAN range"""
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_asignar_existing_counter(self):
+        """An existing counter is advanced with a single statement"""
+        mock_session = _session(42)
+
+        numeros = await NumeracionService(mock_session, bloques=BloquesNumeracion(tamano=0)).asignar(_empresa())
+
+        assert list(numeros) == [42]
+        assert mock_session.execute.await_count == 1
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_reservar_creates_counter(self):
+        """A missing counter is created and the allocation retried"""
+        # UPDATE (no row), INSERT ... ON CONFLICT DO NOTHING, UPDATE
+        mock_session = _session(None, None, 1)
+
+        numeros = await NumeracionService(mock_session).reservar(_empresa())
+
+        assert list(numeros) == [1]
+        assert mock_session.execute.await_count == 3
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_reservar_block(self):
+        """Several consecutive numbers can be reserved at once"""
+        mock_session = _session(110)
+
+        numeros = await NumeracionService(mock_session).reservar(_empresa(), cantidad=10)
+
+        assert list(numeros) == list(range(101, 111))
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_reservar_range_exhausted(self):
+        """A clear error is raised when the authorized range is exhausted"""
+        mock_session = _session(None, None, None)
+
+        with pytest.raises(RangoNumeracionAgotadoError) as exc_info:
+            await NumeracionService(mock_session).reservar(_empresa(rango_autorizado_hasta=100))
+
+        assert exc_info.value.rango_hasta == 100
+        assert "100" in str(exc_info.value)
+
+
+def _session_factory():
+    """Session factory returning an async context manager around a mock session"""
+    mock_session = AsyncMock(spec=AsyncSession)
+    factory = MagicMock()
+    factory.return_value.__aenter__.return_value = mock_session
+    return factory, mock_session
+
+
+class TestBloquesNumeracion:
+    """Test per-process pre-allocated number blocks"""
+
+    @pytest.mark.unit
+    def test_agrupar_tramos(self):
+        """Unused numbers are grouped into consecutive ranges"""
+        assert agrupar_tramos([7, 3, 4, 5, 9]) == [(3, 5), (7, 7), (9, 9)]
+        assert agrupar_tramos([]) == []
+
+    @pytest.mark.unit
+    def test_disabled_by_default(self):
+        """Block mode is off unless a block size is configured"""
+        assert not BloquesNumeracion(tamano=0).habilitado(1)
+        assert BloquesNumeracion(tamano=50).habilitado(1)
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_tomar_reserves_one_block(self):
+        """Numbers are handed out from memory after a single block reservation"""
+        factory, _ = _session_factory()
+        bloques = BloquesNumeracion(session_factory=factory, tamano=10)
+
+        with patch.object(NumeracionService, "reservar_bloque", AsyncMock(return_value=range(1, 11))) as reservar:
+            numeros = [(await bloques.tomar(_empresa()))[0] for _ in range(10)]
+
+        assert numeros == list(range(1, 11))
+        assert reservar.await_count == 1
+        assert bloques.disponibles(1, "FT") == 0
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_devolver_hands_number_out_first(self):
+        """Returned numbers are reused before the rest of the block"""
+        factory, _ = _session_factory()
+        bloques = BloquesNumeracion(session_factory=factory, tamano=10)
+
+        with patch.object(NumeracionService, "reservar_bloque", AsyncMock(return_value=range(1, 11))):
+            primero = await bloques.tomar(_empresa())
+            await bloques.tomar(_empresa())
+            await bloques.devolver(_empresa(), primero)
+            assert await bloques.tomar(_empresa()) == [1]
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_liberar_todo_reports_unused(self):
+        """Unused numbers are released on shutdown"""
+        factory, _ = _session_factory()
+        bloques = BloquesNumeracion(session_factory=factory, tamano=10)
+
+        with patch.object(NumeracionService, "reservar_bloque", AsyncMock(return_value=range(1, 11))):
+            await bloques.tomar(_empresa(), cantidad=3)
+
+        with patch.object(NumeracionService, "liberar", AsyncMock(return_value=[(4, 10)])) as liberar:
+            reporte = await bloques.liberar_todo()
+
+        liberar.assert_awaited_once_with(1, "FT", list(range(4, 11)))
+        assert reporte == {(1, "FT"): [(4, 10)]}
+        assert bloques.disponibles(1, "FT") == 0
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_liberar_returns_tail_to_counter(self):
+        """The last range goes back to the counter when nobody reserved after it"""
+        mock_session = AsyncMock(spec=AsyncSession)
+        mock_session.add = Mock()
+        mock_session.execute.return_value = Mock(rowcount=1)
+
+        huecos = await NumeracionService(mock_session).liberar(1, "FT", [2, 5, 6, 7])
+
+        assert huecos == [(2, 2)]
+        assert mock_session.add.call_count == 1
@@ -0,0 +1,72 @@
+"""
+Unit tests for keyset (cursor) pagination
+"""
+
+import pytest
+from datetime import datetime
+from fastapi import HTTPException, Response
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+
+from app.core.paginacion import (
+    HEADER_SIGUIENTE_CURSOR, codificar_cursor, decodificar_cursor, paginar_keyset, publicar_siguiente_cursor
+)
+from app.models import Cliente, Factura
+
+
+class TestCursor:
+    """Test cursor encoding"""
+
+    @pytest.mark.unit
+    def test_roundtrip(self):
+        """A cursor decodes back to the typed sort values"""
+        created_at = datetime(2024, 1, 15, 10, 30, 0, 123456)
+        cursor = codificar_cursor([created_at, 42])
+
+        assert "=" not in cursor
+        assert decodificar_cursor(cursor, (Factura.created_at, Factura.id)) == [created_at, 42]
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("cursor", ["no-es-un-cursor", codificar_cursor([1, 2]), codificar_cursor(["x"])])
+    def test_invalid_cursor(self, cursor):
+        """Malformed cursors are rejected with 400"""
+        with pytest.raises(HTTPException) as exc_info:
+            decodificar_cursor(cursor, (Cliente.id,))
+
+        assert exc_info.value.status_code == 400
+
+
+class TestPaginarKeyset:
+    """Test keyset query construction"""
+
+    @staticmethod
+    def _sql(stmt):
+        return str(stmt.compile(dialect=postgresql.dialect()))
+
+    @pytest.mark.unit
+    def test_first_page_has_no_filter(self):
+        """Without a cursor only ORDER BY and LIMIT are added"""
+        sql = self._sql(paginar_keyset(select(Cliente), (Cliente.id,), None, 10))
+
+        assert "ORDER BY clientes.id ASC" in sql
+        assert "LIMIT" in sql
+        assert "OFFSET" not in sql
+
+    @pytest.mark.unit
+    def test_descending_tuple_comparison(self):
+        """Later pages compare the (created_at, id) tuple against the cursor"""
+        cursor = codificar_cursor([datetime(2024, 1, 15), 7])
+        sql = self._sql(paginar_keyset(select(Factura), (Factura.created_at, Factura.id), cursor, 10, descendente=True))
+
+        assert "(facturas.created_at, facturas.id) < (" in sql
+        assert "ORDER BY facturas.created_at DESC, facturas.id DESC" in sql
+
+    @pytest.mark.unit
+    def test_next_cursor_only_on_full_page(self):
+        """The next cursor header is published only when more rows may follow"""
+        response = Response()
+        publicar_siguiente_cursor(response, [Cliente(id=1)], (Cliente.id,), limit=2)
+        assert HEADER_SIGUIENTE_CURSOR not in response.headers
+
+        publicar_siguiente_cursor(response, [Cliente(id=1), Cliente(id=2)], (Cliente.id,), limit=2)
+        assert decodificar_cursor(response.headers[HEADER_SIGUIENTE_CURSOR], (Cliente.id,)) == [2]
@@ -0,0 +1,53 @@
+"""
+Unit tests for the bounded bcrypt executor
+"""
+
+import asyncio
+import threading
+import pytest
+from fastapi import HTTPException
+from passlib.hash import bcrypt
+
+from app.services.password_service import PasswordService, pwd_context
+
+
+class TestPasswordService:
+    """Test off-loop hashing, backpressure and metrics"""
+
+    @pytest.mark.asyncio
+    async def test_verify_and_hash(self):
+        """Test that verification and hashing give the same results as passlib"""
+        servicio = PasswordService(hilos=2, max_pendientes=10)
+        hashed = bcrypt.using(rounds=4).hash("secreto123")
+        try:
+            assert await servicio.verificar("secreto123", hashed) is True
+            assert await servicio.verificar("otra", hashed) is False
+            assert pwd_context.verify("nueva", await servicio.hash("nueva"))
+        finally:
+            servicio.cerrar()
+
+        metricas = servicio.metricas()
+        assert metricas["completadas"] == 3
+        assert metricas["bcrypt_ms_p50"] is not None and metricas["espera_ms_p99"] is not None
+
+    @pytest.mark.asyncio
+    async def test_rejects_with_503_when_saturated(self):
+        """Test that requests beyond max_pendientes are rejected instead of queued"""
+        servicio = PasswordService(hilos=1, max_pendientes=2)
+        liberar = threading.Event()
+        try:
+            ocupadas = [asyncio.create_task(servicio._ejecutar(liberar.wait, 5)) for _ in range(2)]
+            await asyncio.sleep(0.01)
+
+            with pytest.raises(HTTPException) as exc_info:
+                await servicio.verificar("x", bcrypt.using(rounds=4).hash("x"))
+            assert exc_info.value.status_code == 503
+            assert exc_info.value.headers["Retry-After"] == "1"
+
+            liberar.set()
+            await asyncio.gather(*ocupadas)
+        finally:
+            servicio.cerrar()
+
+        assert servicio.metricas()["rechazadas"] == 1
+        assert servicio.metricas()["pendientes"] == 0
@@ -0,0 +1,64 @@
+"""
+Unit tests for invoice PDF rendering
+"""
+
+import asyncio
+import pytest
+
+from app.services.pdf_service import PdfService, compilar_plantilla, datos_pdf, plantilla_empresa, renderizar_pdf
+from tests.unit.test_ubl_service import _cliente, _detalles, _empresa, _factura, _impuestos
+
+
+def _datos(n=3, **kwargs):
+    empresa = _empresa(regimen_fiscal="COMUN", telefono="6011234567", **kwargs)
+    return datos_pdf(_factura(n), empresa, _cliente(), _detalles(n), _impuestos(n))
+
+
+class TestRenderizarPdf:
+    """Test PDF generation"""
+
+    def test_renders_pdf(self):
+        """Test that a complete invoice renders to a PDF"""
+        contenido = renderizar_pdf(_datos())
+        assert contenido.startswith(b"%PDF")
+
+    def test_long_invoice_spans_pages(self):
+        """Test that many lines break across pages"""
+        assert renderizar_pdf(_datos(200)).count(b"/Type /Page\n") > 1
+
+    def test_template_compiled_once_per_empresa(self):
+        """Test that the template cache is keyed by the empresa data"""
+        compilar_plantilla.cache_clear()
+        renderizar_pdf(_datos())
+        renderizar_pdf(_datos())
+        renderizar_pdf(_datos(razon_social="Otra Empresa S.A.S."))
+
+        info = compilar_plantilla.cache_info()
+        assert info.misses == 2
+        assert info.hits == 1
+
+    def test_resolution_text(self):
+        """Test the resolution text of the template"""
+        plantilla = compilar_plantilla(plantilla_empresa(_empresa(regimen_fiscal="COMUN")))
+        assert plantilla["resolucion"].startswith("Resolución DIAN N° 18760000001 del 2024-01-01. Prefijo FT del 1 al 5000")
+
+
+class TestPdfService:
+    """Test the rendering pool and persistence"""
+
+    @pytest.mark.asyncio
+    async def test_persist_once(self, tmp_path, monkeypatch):
+        """Test that concurrent downloads of an immutable invoice render it once"""
+        monkeypatch.setattr("app.services.pdf_service.settings.PDF_DIR", str(tmp_path))
+        servicio = PdfService(procesos=1)
+        datos = _datos()
+        try:
+            rutas = await asyncio.gather(*(servicio.persistir(1, datos) for _ in range(4)))
+        finally:
+            servicio.cerrar()
+
+        assert len(set(rutas)) == 1
+        assert rutas[0] == tmp_path / "1" / f"{datos.cufe}.pdf"
+        assert rutas[0].read_bytes().startswith(b"%PDF")
+        assert servicio.persistido(1, datos.cufe) == rutas[0]
+        assert servicio.metricas()["renderizados"] == 1
@@ -0,0 +1,80 @@
+"""
+Unit tests for the compiled RBAC permission matrix
+"""
+
+import pytest
+from unittest.mock import MagicMock
+from fastapi import HTTPException
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+
+from app.core.auth import require_permission
+from app.models import Permiso, Rol, Usuario
+from app.models.rol import rol_permisos
+from app.services.permisos_service import MatrizPermisos, matriz_permisos
+
+PERMISOS = [(1, "FACTURAS", "VER"), (2, "FACTURAS", "ANULAR"), (3, "CLIENTES", "VER")]
+
+
+def _matriz():
+    # Any query on the hot path would call the session factory and fail
+    matriz = MatrizPermisos(recarga=0, session_factory=MagicMock(side_effect=AssertionError("query")))
+    matriz.compilar(PERMISOS, [(10, 1), (10, 2), (20, 1)])
+    return matriz
+
+
+class TestMatrizPermisos:
+    """Test permission checks against the compiled bitsets"""
+
+    @pytest.mark.asyncio
+    async def test_checks_without_queries(self):
+        """Test role bits, case-insensitive keys and unknown permissions"""
+        matriz = _matriz()
+
+        assert await matriz.permite(10, "facturas", "anular")
+        assert await matriz.permite(20, "FACTURAS", "VER")
+        assert not await matriz.permite(20, "facturas", "anular")
+        assert not await matriz.permite(10, "clientes", "ver")
+        assert not await matriz.permite(10, "facturas", "emitir")
+        assert not await matriz.permite(99, "facturas", "ver")
+        assert matriz.metricas()["denegadas"] == 4
+
+    @pytest.mark.asyncio
+    async def test_require_permission_dependency(self, monkeypatch):
+        """Test that the dependency returns the user or raises 403"""
+        import app.core.auth as auth
+
+        monkeypatch.setattr(auth, "matriz_permisos", _matriz())
+        usuario = Usuario(id=1, email="a@x.co", rol_id=20, activo=True)
+
+        assert await require_permission("facturas", "ver")(current_user=usuario) is usuario
+        with pytest.raises(HTTPException) as exc_info:
+            await require_permission("facturas", "anular")(current_user=usuario)
+        assert exc_info.value.status_code == 403
+
+    def test_invalidated_after_committed_changes(self):
+        """Test that committed role/permission changes, including rol_permisos rows, force a recompile"""
+        engine = create_engine("sqlite://")
+        for tabla in (Rol.__table__, Permiso.__table__, rol_permisos):
+            tabla.create(engine)
+
+        with Session(engine) as session:
+            session.add(Rol(id=1, nombre="VENDEDOR", activo=True))
+            session.add(Permiso(id=1, modulo="FACTURAS", accion="VER"))
+            matriz_permisos.compilar([], [])
+            session.commit()
+            assert matriz_permisos._compilada is None
+
+            matriz_permisos.compilar([], [])
+            session.execute(insert(rol_permisos).values(rol_id=1, permiso_id=1))
+            session.rollback()
+            assert matriz_permisos._compilada is not None
+
+            session.execute(insert(rol_permisos).values(rol_id=1, permiso_id=1))
+            session.commit()
+            assert matriz_permisos._compilada is None
+
+            matriz_permisos.compilar([], [])
+            session.get(Rol, 1).activo = False
+            session.commit()
+            assert matriz_permisos._compilada is None
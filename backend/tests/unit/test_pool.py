@@ -0,0 +1,119 @@
+"""
+Unit tests for the instrumented connection pool
+"""
+
+import pytest
+from sqlalchemy import exc, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core.pool import MetricasPool, PoolMedido, opciones_pool
+
+
+def _engine(pool_size=1, max_overflow=0, timeout=0.2):
+    return create_async_engine(
+        "sqlite+aiosqlite://",
+        poolclass=PoolMedido,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=timeout,
+    )
+
+
+class TestPoolMedido:
+    """Test pool wait and connection metrics"""
+
+    @pytest.mark.asyncio
+    async def test_checkouts_and_connections_counted(self):
+        """Test that reused connections are counted once and every checkout is timed"""
+        engine = _engine(pool_size=2)
+        try:
+            for _ in range(3):
+                async with engine.connect() as conn:
+                    await conn.execute(text("SELECT 1"))
+
+            estado = engine.sync_engine.pool.estado()
+        finally:
+            await engine.dispose()
+
+        assert estado["tamano"] == 2
+        assert estado["en_uso"] == 0
+        assert estado["adquisiciones"] == 3
+        assert estado["conexiones_abiertas_total"] == 1
+        assert estado["conexiones_ultimo_minuto"] == 1
+        assert sum(estado["espera_ms_histograma"].values()) == 3
+        assert estado["espera_ms_p99"] is not None
+
+    @pytest.mark.asyncio
+    async def test_exhausted_pool_records_wait_and_timeout(self):
+        """Test that waiting on a full pool lands in the slow buckets and counts timeouts"""
+        engine = _engine(pool_size=1, max_overflow=0, timeout=0.2)
+        try:
+            async with engine.connect():
+                with pytest.raises(exc.TimeoutError):
+                    async with engine.connect():
+                        pass
+                estado = engine.sync_engine.pool.estado()
+        finally:
+            await engine.dispose()
+
+        assert estado["en_uso"] == 1
+        assert estado["timeouts"] == 1
+        assert estado["adquisiciones"] == 2
+        assert estado["espera_ms_histograma"]["<=250ms"] == 1
+
+    @pytest.mark.asyncio
+    async def test_overflow_in_use_reported(self):
+        """Test that connections beyond pool_size show up as overflow"""
+        engine = _engine(pool_size=1, max_overflow=2)
+        try:
+            async with engine.connect(), engine.connect():
+                estado = engine.sync_engine.pool.estado()
+        finally:
+            await engine.dispose()
+
+        assert estado["en_uso"] == 2
+        assert estado["overflow_en_uso"] == 1
+        assert estado["max_overflow"] == 2
+
+    @pytest.mark.asyncio
+    async def test_metrics_survive_pool_recreate(self):
+        """Test that dispose() keeps the accumulated metrics and counts later connections once"""
+        engine = _engine()
+        async with engine.connect():
+            pass
+        await engine.dispose()
+        try:
+            async with engine.connect():
+                pass
+            estado = engine.sync_engine.pool.estado()
+        finally:
+            await engine.dispose()
+
+        assert estado["adquisiciones"] == 2
+        assert estado["conexiones_abiertas_total"] == 2
+
+    def test_histogram_buckets(self):
+        """Test that waits are bucketed by their upper bound"""
+        metricas = MetricasPool()
+        for segundos in (0.0005, 0.001, 0.003, 0.3, 9.0):
+            metricas.registrar_espera(segundos)
+
+        histograma = metricas.resumen()["espera_ms_histograma"]
+        assert histograma["<=1ms"] == 2
+        assert histograma["<=5ms"] == 1
+        assert histograma["<=500ms"] == 1
+        assert histograma[">5000ms"] == 1
+
+    def test_options_come_from_settings(self, monkeypatch):
+        """Test that pool and statement cache parameters are read from Settings"""
+        from app.core import pool
+
+        monkeypatch.setattr(pool.settings, "DB_POOL_RECYCLE", -1)
+        monkeypatch.setattr(pool.settings, "DB_STATEMENT_CACHE_SIZE", 0)
+        opciones = opciones_pool(5, 3, connect_args={"server_settings": {"application_name": "api"}})
+
+        assert opciones["poolclass"] is PoolMedido
+        assert (opciones["pool_size"], opciones["max_overflow"], opciones["pool_recycle"]) == (5, 3, -1)
+        assert opciones["connect_args"]["statement_cache_size"] == 0
+        assert opciones["connect_args"]["prepared_statement_cache_size"] == 0
+        assert opciones["connect_args"]["server_settings"] == {"application_name": "api"}
@@ -0,0 +1,169 @@
+"""
+Unit tests for the DIAN QR service
+"""
+
+import asyncio
+import pytest
+from datetime import date, time
+from decimal import Decimal
+from unittest.mock import AsyncMock, MagicMock
+
+from app.models import Cliente, Empresa, Factura, FacturaImpuesto
+from app.services.qr_service import (
+    CacheQR,
+    ContenidoQrNoDisponibleError,
+    QrService,
+    contenido_qr,
+    contenido_qr_emitido,
+    contenido_qr_xml,
+    referencia_qr,
+    renderizar_qr,
+)
+from app.services.ubl_service import generar_xml
+
+
+def _factura():
+    factura = Factura(
+        numero_completo="SETP990000002",
+        fecha_emision=date(2019, 6, 21),
+        hora_emision=time(7, 46, 15),
+        subtotal=Decimal("1500000.00"),
+        total_iva=Decimal("285000.00"),
+        total_inc=Decimal("0.00"),
+        total_ica=Decimal("0.00"),
+        total_factura=Decimal("1785000.00"),
+        cufe="941cf36af62dbbc06f105d2a80e9bfe683a90e84960eae4d351cc3afbe8f848c26c39bac4fbc80fa254824c6369ea694",
+    )
+    empresa = Empresa(nit="700085371-5", ambiente_dian="PRUEBAS")
+    cliente = Cliente(tipo_documento="NIT", numero_documento="800199436-2")
+    return factura, empresa, cliente
+
+
+class TestContenidoQr:
+    """Test the DIAN QR payload"""
+
+    def test_payload(self):
+        """Test the fields and validation URL of the payload"""
+        contenido = contenido_qr(*_factura())
+        lineas = contenido.split("\n")
+
+        assert lineas[0] == "NumFac: SETP990000002"
+        assert "HorFac: 07:46:15-05:00" in lineas
+        assert "NitFac: 700085371" in lineas
+        assert "DocAdq: 800199436" in lineas
+        assert "ValTolFac: 1785000.00" in lineas
+        assert lineas[-1].startswith("QRCode: https://catalogo-vpfe-hab.dian.gov.co/document/searchqr?documentkey=941cf36a")
+        assert len(referencia_qr(contenido)) == 64
+
+    def test_render_formats(self):
+        """Test PNG and SVG rendering"""
+        contenido = contenido_qr(*_factura())
+        assert renderizar_qr(contenido, "png").startswith(b"\x89PNG")
+        assert b"<svg" in renderizar_qr(contenido, "svg")
+
+
+class TestContenidoQrEmitido:
+    """Test that the served QR matches the emitted document"""
+
+    def _emitida(self):
+        factura, empresa, cliente = _factura()
+        cliente.tipo_persona = "JURIDICA"
+        factura.qr_code = referencia_qr(contenido_qr(factura, empresa, cliente))
+        impuestos = [FacturaImpuesto(
+            tipo_impuesto="IVA", porcentaje=Decimal("19.00"),
+            base_gravable=Decimal("1500000.00"), valor_impuesto=Decimal("285000.00"),
+        )]
+        xml = generar_xml(factura, empresa, cliente, [], impuestos).encode("utf-8")
+        return factura, empresa, cliente, xml
+
+    def _documentos(self, monkeypatch, xml):
+        import app.services.qr_service as qr_service
+
+        documentos = MagicMock()
+        documentos.obtener = AsyncMock(return_value=xml)
+        monkeypatch.setattr(qr_service, "DocumentosService", MagicMock(return_value=documentos))
+        return documentos
+
+    def test_payload_from_emitted_xml(self):
+        """Test that the payload read back from the UBL XML is the one computed at emission"""
+        factura, empresa, cliente, xml = self._emitida()
+
+        assert contenido_qr_xml(xml) == contenido_qr(factura, empresa, cliente)
+
+    @pytest.mark.asyncio
+    async def test_unchanged_rows_skip_xml(self, monkeypatch):
+        """Test that current rows are used when they reproduce the stored reference"""
+        factura, empresa, cliente, xml = self._emitida()
+        documentos = self._documentos(monkeypatch, xml)
+
+        contenido = await contenido_qr_emitido(AsyncMock(), factura, empresa, cliente)
+
+        assert referencia_qr(contenido) == factura.qr_code
+        documentos.obtener.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_edited_rows_use_emitted_xml(self, monkeypatch):
+        """Test that a company or client edited after emission does not change the QR"""
+        factura, empresa, cliente, xml = self._emitida()
+        documentos = self._documentos(monkeypatch, xml)
+        cliente.numero_documento = "900000001-1"
+        empresa.ambiente_dian = "PRODUCCION"
+
+        contenido = await contenido_qr_emitido(AsyncMock(), factura, empresa, cliente)
+
+        assert referencia_qr(contenido) == factura.qr_code
+        assert "DocAdq: 800199436" in contenido.split("\n")
+        documentos.obtener.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_edited_rows_without_xml_rejected(self, monkeypatch):
+        """Test that the QR is not re-derived from edited rows when the emitted XML is missing"""
+        factura, empresa, cliente, _ = self._emitida()
+        self._documentos(monkeypatch, None)
+        empresa.nit = "900000002-3"
+
+        with pytest.raises(ContenidoQrNoDisponibleError):
+            await contenido_qr_emitido(AsyncMock(), factura, empresa, cliente)
+
+
+class TestCacheQr:
+    """Test the content-addressed disk cache"""
+
+    def test_lru_eviction(self, tmp_path):
+        """Test that the least recently used files are evicted over the size limit"""
+        cache = CacheQR(str(tmp_path), max_bytes=250)
+        cache.guardar("a", "png", b"x" * 100)
+        cache.guardar("b", "png", b"x" * 100)
+        assert cache.obtener("a", "png") is not None  # a is now the most recent
+        cache.guardar("c", "png", b"x" * 100)
+
+        assert cache.obtener("b", "png") is None
+        assert not (tmp_path / "b.png").exists()
+        assert cache.obtener("a", "png") is not None
+        assert cache.metricas()["bytes"] == 200
+
+    def test_index_rebuilt_from_disk(self, tmp_path):
+        """Test that a new process sees the files already cached"""
+        CacheQR(str(tmp_path), max_bytes=1000).guardar("a", "svg", b"<svg/>")
+        assert CacheQR(str(tmp_path), max_bytes=1000).obtener("a", "svg") == tmp_path / "a.svg"
+
+
+class TestQrService:
+    """Test rendering through the pool"""
+
+    @pytest.mark.asyncio
+    async def test_renders_once(self, tmp_path):
+        """Test that concurrent and repeated requests render the QR only once"""
+        servicio = QrService(str(tmp_path), max_bytes=10 * 1024 * 1024, procesos=1)
+        contenido = contenido_qr(*_factura())
+        try:
+            rutas = await asyncio.gather(*(servicio.obtener(contenido, "png") for _ in range(5)))
+            otra = await servicio.obtener(contenido, "png")
+        finally:
+            servicio.cerrar()
+
+        assert len(set(rutas)) == 1 and otra == rutas[0]
+        assert rutas[0].read_bytes().startswith(b"\x89PNG")
+        metricas = servicio.metricas()
+        assert metricas["fallos"] == 1
+        assert metricas["archivos"] == 1
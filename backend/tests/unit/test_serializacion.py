@@ -0,0 +1,69 @@
+"""
+Unit tests for the projected-row JSON serialization of listings
+"""
+
+import json
+import pytest
+from collections import namedtuple
+from datetime import date, datetime
+from decimal import Decimal
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from app.core.serializacion import respuesta_json
+from app.schemas.cliente import ClienteList, ClienteListFila
+from app.schemas.factura import FacturaList, FacturaListFila
+
+FilaFactura = namedtuple(
+    "FilaFactura",
+    "id numero_completo fecha_emision cliente_nombre estado_dian total_factura activo created_at"
+)
+FilaCliente = namedtuple(
+    "FilaCliente", "id tipo_documento numero_documento nombre_completo email telefono ciudad activo"
+)
+
+
+def _filas_factura(n):
+    return [
+        FilaFactura(
+            i, f"SETP{990000000 + i}", date(2024, 1, 15), f"Cliente {i}", "EMITIDA",
+            Decimal("119000.00") + i, True, datetime(2024, 1, 15, 10, 30, i % 60)
+        )
+        for i in range(n)
+    ]
+
+
+class TestRespuestaJson:
+    """Test that the raw JSON matches what the Pydantic response models produced"""
+
+    @pytest.mark.unit
+    def test_facturas_match_response_model(self):
+        """Projected factura rows serialize like FacturaList, without the sort-only columns"""
+        filas = _filas_factura(3)
+
+        response = respuesta_json(TypeAdapter(List[FacturaListFila]), filas)
+
+        esperado = jsonable_encoder([FacturaList(**fila._asdict()) for fila in filas])
+        assert response.media_type == "application/json"
+        assert json.loads(response.body) == esperado
+        assert "created_at" not in json.loads(response.body)[0]
+
+    @pytest.mark.unit
+    def test_clientes_match_response_model(self):
+        """Projected cliente rows keep nulls and serialize like ClienteList"""
+        filas = [
+            FilaCliente(1, "NIT", "900123456", "Empresa S.A.S.", "a@b.co", None, "Bogotá", True),
+            FilaCliente(2, "CC", "1020304050", "Ana María Pérez", None, "3001234567", "Cali", False),
+        ]
+
+        response = respuesta_json(TypeAdapter(List[ClienteListFila]), filas)
+
+        esperado = jsonable_encoder([ClienteList(**fila._asdict()) for fila in filas])
+        assert json.loads(response.body) == esperado
+
+    @pytest.mark.unit
+    def test_empty_page(self):
+        """An empty page is an empty JSON array"""
+        assert respuesta_json(TypeAdapter(List[FacturaListFila]), []).body == b"[]"
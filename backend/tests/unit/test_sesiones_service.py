@@ -0,0 +1,186 @@
+"""
+Unit tests for session revocation tracking
+"""
+
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, MagicMock
+
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+
+from app.core.auth import get_current_user
+from app.services.auth_service import AuthService
+from app.services.sesiones_service import (
+    SOLAPAMIENTO_SINCRONIZACION,
+    RevocacionesSesion,
+    SesionesService,
+    hash_refresh_token,
+    nuevo_refresh_token,
+)
+
+
+def _session_factory(*resultados):
+    """Session factory whose successive queries return the given rows"""
+    db = AsyncMock()
+    consultas = []
+    for filas in resultados:
+        consulta = MagicMock()
+        consulta.all.return_value = filas
+        consultas.append(consulta)
+    db.execute.side_effect = consultas
+    sesion = MagicMock()
+    sesion.__aenter__ = AsyncMock(return_value=db)
+    sesion.__aexit__ = AsyncMock(return_value=False)
+    return MagicMock(return_value=sesion), db
+
+
+class TestRevocacionesSesion:
+    """Test the in-memory revocation set"""
+
+    @pytest.mark.asyncio
+    async def test_incremental_sync_with_overlap(self):
+        """Test that syncs read only recent revocations and drop expired ones"""
+        ahora = datetime.utcnow()
+        vence = ahora + timedelta(minutes=30)
+        session_factory, db = _session_factory(
+            [("a", vence, ahora - timedelta(seconds=10)), ("b", ahora + timedelta(milliseconds=1), ahora)],
+            [("a", vence, ahora - timedelta(seconds=10)), ("c", vence, ahora + timedelta(seconds=1))],
+        )
+        revocaciones = RevocacionesSesion(intervalo=5, session_factory=session_factory)
+
+        assert await revocaciones.sincronizar() == 2
+        assert revocaciones.revocada("a")
+        assert await revocaciones.sincronizar() == 1
+
+        segunda = str(db.execute.await_args_list[1].args[0].compile(compile_kwargs={"literal_binds": True}))
+        desde = (ahora - SOLAPAMIENTO_SINCRONIZACION).isoformat(sep=" ")
+        assert f"sesiones.revocada_en >= '{desde}" in segunda
+        assert revocaciones.revocada("c")
+        assert not revocaciones.revocada("b")  # Expired, purged
+        assert not revocaciones.revocada(None)
+
+    @pytest.mark.asyncio
+    async def test_revoked_token_rejected_without_queries(self, monkeypatch):
+        """Test that get_current_user rejects a revoked jti before touching the database"""
+        import app.core.auth as auth
+
+        revocaciones = RevocacionesSesion(intervalo=5)
+        monkeypatch.setattr(auth, "revocaciones", revocaciones)
+        sesiones_lectura = MagicMock()
+        token = AuthService(AsyncMock()).create_access_token({"sub": "a@x.co", "jti": "revocado"})
+        revocaciones.agregar("revocado", datetime.utcnow() + timedelta(minutes=30))
+
+        with pytest.raises(HTTPException) as exc_info:
+            await get_current_user(HTTPAuthorizationCredentials(scheme="Bearer", credentials=token), sesiones_lectura)
+
+        assert exc_info.value.status_code == 401
+        assert exc_info.value.detail == "Sesión revocada"
+        sesiones_lectura.assert_not_called()
+
+    def test_tokens_carry_unique_jti(self):
+        """Test that every access token gets its own jti claim"""
+        servicio = AuthService(MagicMock())
+        primero = servicio.decode_token(servicio.create_access_token({"sub": "a@x.co"}))
+        segundo = servicio.decode_token(servicio.create_access_token({"sub": "a@x.co"}))
+
+        assert primero["jti"] and primero["jti"] != segundo["jti"]
+
+
+class TestRevocarSesion:
+    """Test explicit session revocation"""
+
+    @pytest.mark.asyncio
+    async def test_revocation_time_comes_from_database(self, monkeypatch):
+        """Test that revocada_en uses the database clock, not the app server's"""
+        import app.services.sesiones_service as sesiones_service
+
+        revocaciones = RevocacionesSesion(intervalo=5)
+        monkeypatch.setattr(sesiones_service, "revocaciones", revocaciones)
+        actualizadas, existe = MagicMock(rowcount=0), MagicMock()
+        existe.scalar_one_or_none.return_value = None
+        db = AsyncMock()
+        db.add = MagicMock()
+        db.execute.side_effect = [actualizadas, existe]
+
+        await SesionesService(db).revocar(1, "jti-1", datetime.utcnow() + timedelta(minutes=15))
+
+        revocacion = str(db.execute.await_args_list[0].args[0].compile(compile_kwargs={"literal_binds": True}))
+        assert "revocada_en=timezone('utc', now())" in revocacion
+        assert db.add.call_args.args[0].revocada_en is sesiones_service.AHORA_BD
+        assert revocaciones.revocada("jti-1")
+
+
+class TestRefreshTokens:
+    """Test refresh token rotation and reuse detection"""
+
+    def test_refresh_tokens_stored_hashed(self):
+        """Test that sessions keep only the refresh token hash, in the login's family"""
+        db = MagicMock()
+        refresh_token = nuevo_refresh_token()
+        SesionesService(db).registrar(1, "jti-1", datetime.utcnow(), refresh_token=refresh_token)
+
+        sesion = db.add.call_args.args[0]
+        assert sesion.refresh_hash == hash_refresh_token(refresh_token) != refresh_token
+        assert len(sesion.refresh_hash) == 64
+        assert sesion.refresh_expiracion > datetime.utcnow()
+        assert sesion.familia == "jti-1"
+        assert nuevo_refresh_token() != refresh_token
+
+    @pytest.mark.asyncio
+    async def test_rotation_is_single_update(self):
+        """Test that a valid refresh token is consumed with one UPDATE ... FROM ... RETURNING"""
+        from sqlalchemy.dialects import postgresql
+
+        db = AsyncMock()
+        resultado = MagicMock()
+        fila = MagicMock(familia="jti-1", id=1, email="a@x.co")
+        resultado.one_or_none.return_value = fila
+        db.execute.return_value = resultado
+
+        assert await SesionesService(db).rotar("token") is fila
+
+        db.execute.assert_awaited_once()
+        sql = str(db.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+        assert sql.startswith("UPDATE sesiones SET rotada_en=")
+        assert "FROM usuarios" in sql
+        assert "sesiones.refresh_hash = " in sql
+        assert "sesiones.rotada_en IS NULL" in sql
+        assert "RETURNING sesiones.familia, usuarios.id, usuarios.email" in sql
+        db.commit.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_reused_token_revokes_family(self, monkeypatch):
+        """Test that presenting an already rotated refresh token revokes its whole family"""
+        import app.services.sesiones_service as sesiones_service
+
+        revocaciones = RevocacionesSesion(intervalo=5)
+        monkeypatch.setattr(sesiones_service, "revocaciones", revocaciones)
+        vence = datetime.utcnow() + timedelta(minutes=15)
+        sin_fila, familia, revocadas = MagicMock(), MagicMock(), MagicMock()
+        sin_fila.one_or_none.return_value = None
+        familia.scalar_one_or_none.return_value = "jti-1"
+        revocadas.all.return_value = [("jti-1", vence), ("jti-2", vence)]
+        db = AsyncMock()
+        db.execute.side_effect = [sin_fila, familia, revocadas]
+
+        assert await SesionesService(db).rotar("token-robado") is None
+
+        revocacion = str(db.execute.await_args_list[2].args[0].compile(compile_kwargs={"literal_binds": True}))
+        assert "sesiones.familia = 'jti-1'" in revocacion
+        assert "revocada_en=timezone('utc', now())" in revocacion
+        db.commit.assert_awaited_once()
+        assert revocaciones.revocada("jti-1") and revocaciones.revocada("jti-2")
+
+    @pytest.mark.asyncio
+    async def test_unknown_token_revokes_nothing(self):
+        """Test that an unknown or expired refresh token is rejected without revocations"""
+        sin_fila, sin_familia = MagicMock(), MagicMock()
+        sin_fila.one_or_none.return_value = None
+        sin_familia.scalar_one_or_none.return_value = None
+        db = AsyncMock()
+        db.execute.side_effect = [sin_fila, sin_familia]
+
+        assert await SesionesService(db).rotar("desconocido") is None
+        assert db.execute.await_count == 2
+        db.commit.assert_not_awaited()
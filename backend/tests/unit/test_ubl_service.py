@@ -0,0 +1,155 @@
+"""
+Unit tests for the UBL 2.1 invoice XML generator
+"""
+
+import io
+import pytest
+import xml.etree.ElementTree as ET
+from datetime import date, time
+from decimal import Decimal
+
+from app.models import Cliente, Empresa, Factura, FacturaDetalle, FacturaImpuesto
+from app.services.ubl_service import (
+    ImpuestosLineaInconsistentesError, _compilar_fragmentos, escribir_xml, generar_xml, iter_xml
+)
+
+NS = {
+    "inv": "urn:oasis:names:specification:ubl:schema:xsd:Invoice-2",
+    "cac": "urn:oasis:names:specification:ubl:schema:xsd:CommonAggregateComponents-2",
+    "cbc": "urn:oasis:names:specification:ubl:schema:xsd:CommonBasicComponents-2",
+    "sts": "dian:gov:co:facturaelectronica:Structures-2-1",
+}
+
+
+def _empresa(**kwargs):
+    datos = {
+        "id": 1, "nit": "900123456-1", "razon_social": "Empresa Test S.A.S.", "tipo_contribuyente": "PERSONA_JURIDICA",
+        "direccion": "Carrera 10 # 20-30", "ciudad": "Bogotá", "departamento": "Cundinamarca",
+        "email": "test@empresa.com", "responsabilidades_fiscales": ["O-13", "O-15"], "ambiente_dian": "PRUEBAS",
+        "prefijo_factura": "FT", "resolucion_dian": "18760000001", "fecha_resolucion": date(2024, 1, 1),
+        "rango_autorizado_desde": 1, "rango_autorizado_hasta": 5000,
+    }
+    datos.update(kwargs)
+    return Empresa(**datos)
+
+
+def _cliente():
+    return Cliente(
+        tipo_persona="NATURAL", tipo_documento="CC", numero_documento="98765432",
+        primer_nombre="Juan", primer_apellido="Pérez & Hijos", direccion="Calle 15 # 10-20",
+        ciudad="Bogotá", departamento="Cundinamarca", email="juan@email.com"
+    )
+
+
+def _detalles(n):
+    return [
+        FacturaDetalle(
+            producto_id=1, codigo_producto=f"P{i}", nombre_producto=f"Producto <{i}>",
+            cantidad=Decimal("2.000"), precio_unitario=Decimal("100.00"), descuento_porcentaje=Decimal("10.00"),
+            subtotal_linea=Decimal("200.00"), total_descuentos_linea=Decimal("20.00"),
+            total_impuestos_linea=Decimal("34.20"), total_linea=Decimal("214.20"),
+            porcentaje_iva=Decimal("19.00")
+        )
+        for i in range(n)
+    ]
+
+
+def _factura(n):
+    return Factura(
+        numero_completo="FT15", fecha_emision=date(2024, 1, 15), hora_emision=time(10, 53, 10),
+        cufe="a" * 96, subtotal=Decimal("180.00") * n, total_iva=Decimal("34.20") * n,
+        total_factura=Decimal("214.20") * n, observaciones="Nota"
+    )
+
+
+def _impuestos(n):
+    return [FacturaImpuesto(
+        tipo_impuesto="IVA", porcentaje=Decimal("19.00"),
+        base_gravable=Decimal("180.00") * n, valor_impuesto=Decimal("34.20") * n
+    )]
+
+
+class TestUblGenerator:
+    """Test UBL 2.1 document generation"""
+
+    @pytest.mark.unit
+    def test_document_structure(self):
+        """The document is well-formed and carries header, parties, totals and lines"""
+        xml = generar_xml(_factura(3), _empresa(), _cliente(), _detalles(3), _impuestos(3))
+        root = ET.fromstring(xml.encode("utf-8"))
+
+        assert root.tag == f"{{{NS['inv']}}}Invoice"
+        assert root.findtext("cbc:UBLVersionID", namespaces=NS) == "UBL 2.1"
+        assert root.findtext("cbc:ID", namespaces=NS) == "FT15"
+        assert root.findtext("cbc:IssueTime", namespaces=NS) == "10:53:10-05:00"
+        assert root.find("cbc:UUID", NS).get("schemeName") == "CUFE-SHA384"
+        assert root.findtext(".//sts:AuthorizedInvoices/sts:To", namespaces=NS) == "5000"
+        assert root.findtext("cbc:LineCountNumeric", namespaces=NS) == "3"
+        assert root.findtext(
+            "cac:AccountingSupplierParty//cbc:CompanyID", namespaces=NS
+        ) == "900123456"
+        assert root.findtext(
+            "cac:AccountingCustomerParty//cac:PartyName/cbc:Name", namespaces=NS
+        ) == "Juan Pérez & Hijos"
+        assert root.findtext("cac:TaxTotal/cbc:TaxAmount", namespaces=NS) == "102.60"
+        assert root.findtext("cac:LegalMonetaryTotal/cbc:PayableAmount", namespaces=NS) == "642.60"
+
+        lineas = root.findall("cac:InvoiceLine", NS)
+        assert [linea.findtext("cbc:ID", namespaces=NS) for linea in lineas] == ["1", "2", "3"]
+        assert lineas[0].findtext("cbc:LineExtensionAmount", namespaces=NS) == "180.00"
+        assert lineas[0].findtext("cac:TaxTotal/cbc:TaxAmount", namespaces=NS) == "34.20"
+        assert lineas[0].findtext("cac:Item/cbc:Description", namespaces=NS) == "Producto <0>"
+
+    @pytest.mark.unit
+    def test_lines_streamed_one_fragment_each(self):
+        """Each invoice line is produced as its own fragment"""
+        fragmentos = list(iter_xml(_factura(100), _empresa(), _cliente(), _detalles(100), _impuestos(100)))
+
+        assert sum(1 for f in fragmentos if f.startswith("<cac:InvoiceLine>")) == 100
+
+    @pytest.mark.unit
+    def test_empresa_fragments_cached(self):
+        """Empresa fragments are compiled once and recompiled when the empresa changes"""
+        _compilar_fragmentos.cache_clear()
+        argumentos = (_factura(1), _empresa(), _cliente(), _detalles(1), _impuestos(1))
+
+        generar_xml(*argumentos)
+        generar_xml(*argumentos)
+        assert _compilar_fragmentos.cache_info().hits == 1
+
+        generar_xml(_factura(1), _empresa(rango_autorizado_hasta=9000), _cliente(), _detalles(1), _impuestos(1))
+        assert _compilar_fragmentos.cache_info().misses == 2
+
+    @pytest.mark.unit
+    def test_escribir_xml_matches_generar(self):
+        """Writing to a file produces the same document"""
+        argumentos = (_factura(2), _empresa(), _cliente(), _detalles(2), _impuestos(2))
+        destino = io.StringIO()
+
+        escribir_xml(destino, *argumentos)
+
+        assert destino.getvalue() == generar_xml(*argumentos)
+
+    @pytest.mark.unit
+    def test_line_taxes_use_stored_rates(self):
+        """Line TaxTotals come from the rates saved on the line, not from the product"""
+        detalles = _detalles(1)
+        detalles[0].porcentaje_iva = Decimal("5.00")
+        detalles[0].total_impuestos_linea = Decimal("9.00")
+        root = ET.fromstring(generar_xml(_factura(1), _empresa(), _cliente(), detalles, _impuestos(1)).encode("utf-8"))
+
+        linea = root.find("cac:InvoiceLine", NS)
+        assert linea.findtext("cac:TaxTotal/cbc:TaxAmount", namespaces=NS) == "9.00"
+        assert linea.findtext(".//cac:TaxCategory/cbc:Percent", namespaces=NS) == "5.00"
+
+    @pytest.mark.unit
+    def test_inconsistent_line_taxes_rejected(self):
+        """A line whose taxes do not add up to its stored total is not emitted"""
+        detalles = _detalles(2)
+        detalles[1].total_impuestos_linea = Decimal("30.00")
+
+        with pytest.raises(ImpuestosLineaInconsistentesError) as exc_info:
+            generar_xml(_factura(2), _empresa(), _cliente(), detalles, _impuestos(2))
+
+        assert exc_info.value.numero == 2
+        assert exc_info.value.calculado == Decimal("34.20")